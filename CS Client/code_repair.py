@@ -0,0 +1,264 @@
+import ast
+import re
+import time
+import warnings
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Characters OCR commonly reads for one another, most likely substitute first
+CONFUSIONS = {
+    '1': 'lI',
+    'l': '1I',
+    'I': 'l1',
+    '|': 'lI1',
+    '0': 'Oo',
+    'O': '0',
+    'o': '0',
+    '5': 'S',
+    'S': '5',
+    '8': 'B',
+    'B': '8',
+    '$': 'S',
+}
+
+# Letters that stand in for digits inside numbers like '1O0', and digits inside names like '11ama'
+DIGIT_LOOKALIKES = {'O': '0', 'o': '0', 'l': '1', 'I': '1', '|': '1', 'S': '5', 'B': '8'}
+LETTER_LOOKALIKES = {'1': 'l', '0': 'o', '5': 's', '8': 'B', '|': 'l'}
+
+BRACKETS = {'(': ')', '[': ']', '{': '}'}
+CLOSERS = {closer: opener for opener, closer in BRACKETS.items()}
+BLOCK_KEYWORDS = ('if', 'elif', 'else', 'for', 'while', 'def', 'class', 'try', 'except',
+                  'finally', 'with', 'async', 'match', 'case')
+
+Candidate = Tuple[str, List[str]]
+
+
+def syntax_error(code: str) -> Optional[SyntaxError]:
+    """The first SyntaxError in code, or None when it parses."""
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', SyntaxWarning)  # e.g. '1or x' while trying candidates
+            ast.parse(code)
+    except SyntaxError as e:
+        return e
+    except ValueError as e:  # e.g. null bytes
+        return SyntaxError(str(e), ('<ocr>', 1, 1, ''))
+    return None
+
+
+def _indent(line: str) -> int:
+    return len(line) - len(line.lstrip(' '))
+
+
+def _reindent(line: str, width: int) -> str:
+    return ' ' * width + line.lstrip(' ')
+
+
+def _enclosing_levels(lines: List[str], index: int) -> List[int]:
+    """Indentation widths a line at index may use, nearest block first."""
+    levels = []
+    for previous in reversed(lines[:index]):
+        if not previous.strip() or previous.lstrip().startswith('#'):
+            continue
+        width = _indent(previous)
+        if not levels:
+            if previous.rstrip().endswith(':'):
+                levels.append(width + 4)
+            levels.append(width)
+        elif width < levels[-1]:
+            levels.append(width)
+        if width == 0:
+            break
+    return levels or [0]
+
+
+def _replace_line(lines: List[str], index: int, line: str) -> List[str]:
+    return lines[:index] + [line] + lines[index + 1:]
+
+
+def _indentation_candidates(lines: List[str], index: int, message: str) -> Iterator[Candidate]:
+    line = lines[index]
+    levels = _enclosing_levels(lines, index)
+    if message.startswith('expected an indented block'):
+        width = max(levels)
+        yield f"line {index + 1}: indent to {width} spaces", _replace_line(lines, index, _reindent(line, width))
+        return
+    current = _indent(line)
+    for width in sorted(set(levels), key=lambda level: (abs(level - current), level)):
+        if width != current:
+            yield f"line {index + 1}: realign to {width} spaces", _replace_line(lines, index, _reindent(line, width))
+
+
+def _bracket_candidates(lines: List[str], index: int, column: int, message: str) -> Iterator[Candidate]:
+    line = lines[index]
+    never_closed = re.match(r"'(.)' was never closed", message)
+    if never_closed:
+        closer = BRACKETS.get(never_closed.group(1))
+        # Usually the closer was dropped at the end of the same line or of a continuation line
+        for target in range(index, min(index + 4, len(lines))):
+            text = lines[target].rstrip()
+            if not text:
+                continue
+            if text.endswith(':') and lines[target].lstrip().startswith(BLOCK_KEYWORDS):
+                fixed = text[:-1] + closer + ':'
+            else:
+                fixed = text + closer
+            yield f"line {target + 1}: close '{never_closed.group(1)}'", _replace_line(lines, target, fixed)
+        return
+
+    mismatch = re.match(r"closing parenthesis '(.)' does not match opening parenthesis '(.)'", message)
+    unmatched = re.match(r"unmatched '(.)'", message)
+    if (mismatch or unmatched) and 0 <= column < len(line) and line[column] in CLOSERS:
+        if mismatch:
+            wanted = BRACKETS[mismatch.group(2)]
+            yield (f"line {index + 1}: replace '{line[column]}' with '{wanted}'",
+                   _replace_line(lines, index, line[:column] + wanted + line[column + 1:]))
+        yield f"line {index + 1}: drop '{line[column]}'", _replace_line(lines, index, line[:column] + line[column + 1:])
+
+
+def _string_candidates(lines: List[str], index: int, column: int, message: str) -> Iterator[Candidate]:
+    line = lines[index]
+    if message.startswith('unterminated triple-quoted string'):
+        quote = line[column:column + 3] if line[column:column + 3] in ('"""', "'''") else '"""'
+        yield f"end of code: close {quote} string", lines + [quote]
+    elif message.startswith('unterminated string literal') and 0 <= column < len(line):
+        quote = line[column] if line[column] in '\'"' else '"'
+        other = '"' if quote == "'" else "'"
+        text = line.rstrip()
+        # A doubled quote ('topic'') or a string closed with the other quote ('url")
+        doubled = text.find(quote * 2, column + 1)
+        if doubled > 0:
+            yield (f"line {index + 1}: drop doubled {quote}",
+                   _replace_line(lines, index, text[:doubled] + text[doubled + 1:]))
+        closing = text.rfind(other)
+        if closing > column:
+            yield (f"line {index + 1}: close with {quote}",
+                   _replace_line(lines, index, text[:closing] + quote + text[closing + 1:]))
+        # Put the quote before trailing call/collection closers and colons
+        stripped = text.rstrip(')]}:,')
+        yield (f"line {index + 1}: close {quote} string",
+               _replace_line(lines, index, stripped + quote + text[len(stripped):]))
+        yield f"line {index + 1}: drop stray {quote}", _replace_line(lines, index, text[:column] + text[column + 1:])
+        yield f"line {index + 1}: close {quote} string", _replace_line(lines, index, text + quote)
+
+
+def _colon_candidates(lines: List[str], index: int) -> Iterator[Candidate]:
+    text = lines[index].rstrip()
+    if lines[index].lstrip().startswith(BLOCK_KEYWORDS) and not text.endswith(':'):
+        fixed = text[:-1] + ':' if text[-1:] in ';.,' else text + ':'
+        yield f"line {index + 1}: add ':'", _replace_line(lines, index, fixed)
+
+
+def _underscore_candidates(lines: List[str], index: int, column: int, end_column: int) -> Iterator[Candidate]:
+    """Rejoin a name OCR split at an underscore ('load dotenv' -> 'load_dotenv')."""
+    line = lines[index]
+    previous_gap = line.rfind(' ', 0, column)
+    for gap in re.finditer(r'(?<=\w) (?=\w)', line):
+        if column - 1 <= gap.start() <= end_column or gap.start() == previous_gap:
+            yield (f"line {index + 1}: join words with '_'",
+                   _replace_line(lines, index, line[:gap.start()] + '_' + line[gap.end():]))
+
+
+def _confusion_candidates(lines: List[str], index: int, column: int) -> Iterator[Candidate]:
+    """Swap easily confused characters in the word at the error and the word before it."""
+    line = lines[index]
+    words = [match for match in re.finditer(r'[\w$|]+', line) if match.start() <= column + 1]
+    for word in reversed(words[-2:]):
+        text = word.group()
+        if text[0].isdigit() and all(char.isdigit() or char in DIGIT_LOOKALIKES for char in text):
+            fixed = ''.join(DIGIT_LOOKALIKES.get(char, char) for char in text)
+            yield (f"line {index + 1}: '{text}' -> '{fixed}'",
+                   _replace_line(lines, index, line[:word.start()] + fixed + line[word.end():]))
+        elif text[0].isdigit():
+            # Identifiers cannot start with a digit: read the leading digits as letters
+            head = len(text) - len(text.lstrip('0123456789|'))
+            fixed = ''.join(LETTER_LOOKALIKES.get(char, char) for char in text[:head]) + text[head:]
+            yield (f"line {index + 1}: '{text}' -> '{fixed}'",
+                   _replace_line(lines, index, line[:word.start()] + fixed + line[word.end():]))
+        # Otherwise try single swaps, digits at the start of a word first
+        positions = sorted(range(len(text)), key=lambda i: (not (i == 0 and text[0].isdigit()), i))
+        for position in positions:
+            for substitute in CONFUSIONS.get(text[position], ''):
+                fixed = text[:position] + substitute + text[position + 1:]
+                yield (f"line {index + 1}: '{text}' -> '{fixed}'",
+                       _replace_line(lines, index, line[:word.start()] + fixed + line[word.end():]))
+
+
+def _candidates(lines: List[str], error: SyntaxError) -> Iterator[Candidate]:
+    """Ranked edits that might fix error: targeted fixes first, then confusions, then deletions."""
+    index = (error.lineno or 1) - 1
+    if index >= len(lines):
+        index = len(lines) - 1
+    if index < 0:
+        return
+    message = error.msg or ''
+    line = lines[index]
+    column = (error.offset or 1) - 1
+    if column > len(line):  # Offsets may count bytes rather than characters
+        column = len(line)
+
+    if message.startswith('expected an indented block') and not any(rest.strip() for rest in lines[index + 1:]):
+        # The screenshot cut off the body of the last block
+        yield "end of code: add 'pass'", lines + [' ' * (_indent(line) + 4) + 'pass']
+    if isinstance(error, IndentationError) or 'indent' in message:
+        yield from _indentation_candidates(lines, index, message)
+    yield from _bracket_candidates(lines, index, column, message)
+    yield from _string_candidates(lines, index, column, message)
+    if message.startswith("expected ':'") or message == 'invalid syntax':
+        yield from _colon_candidates(lines, index)
+    if message.startswith('invalid character') and column < len(line):
+        yield f"line {index + 1}: drop '{line[column]}'", _replace_line(lines, index, line[:column] + line[column + 1:])
+    if message.startswith('unexpected character after line continuation'):
+        yield f"line {index + 1}: drop '\\'", _replace_line(lines, index, line.replace('\\', '', 1))
+    if message.startswith(('invalid syntax', "expected '('", "expected ':'")):
+        end_column = max(column, (error.end_offset or 0) - 1) if error.end_lineno == error.lineno else column
+        yield from _underscore_candidates(lines, index, column, end_column)
+    yield from _confusion_candidates(lines, index, column)
+    if 'comma' in message and error.end_offset:
+        gap = line.rfind(' ', column, error.end_offset - 1)
+        if gap > 0:
+            yield f"line {index + 1}: add ','", _replace_line(lines, index, line[:gap] + ',' + line[gap:])
+    if not isinstance(error, IndentationError):
+        yield from _indentation_candidates(lines, index, message)
+    if 0 <= column < len(line) and not line[column].isspace():
+        # A speck read as punctuation
+        yield f"line {index + 1}: drop '{line[column]}'", _replace_line(lines, index, line[:column] + line[column + 1:])
+
+
+def repair_code(code: str, max_attempts: int = 200, max_seconds: float = 0.5) -> Dict:
+    """Try ranked local fixes on code that does not parse, until it parses or the budget runs out.
+
+    Each SyntaxError location is used to generate candidate edits (indentation
+    realignment, bracket and string closing, missing colons, OCR character
+    confusions). A candidate is kept when the code then parses or the first
+    error moves further down the file, so the loop always makes progress.
+    Returns {'code', 'parsed', 'fixes', 'attempts', 'seconds', 'error'}.
+    """
+    start = time.perf_counter()
+    error = syntax_error(code)
+    result = {'code': code, 'parsed': error is None, 'fixes': [], 'attempts': 0,
+              'seconds': 0.0, 'error': None}
+    lines = code.splitlines()
+
+    while error is not None:
+        position = (error.lineno or 0, error.offset or 0)
+        for description, candidate in _candidates(lines, error):
+            if result['attempts'] >= max_attempts or time.perf_counter() - start > max_seconds:
+                break
+            result['attempts'] += 1
+            candidate_error = syntax_error('\n'.join(candidate) + '\n')
+            if candidate_error is None or (candidate_error.lineno or 0, candidate_error.offset or 0) > position:
+                lines, error = candidate, candidate_error
+                result['fixes'].append(description)
+                break
+        else:
+            break  # No candidate made progress
+        if error is not None and position >= (error.lineno or 0, error.offset or 0):
+            break  # Budget ran out mid-candidates
+
+    if result['fixes']:
+        result['code'] = '\n'.join(lines) + '\n'
+    result['parsed'] = error is None
+    if error is not None:
+        result['error'] = f"{error.msg} (line {error.lineno})"
+    result['seconds'] = time.perf_counter() - start
+    return result
@@ -1,12 +1,13 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Request, request, jsonify
 from imageToCode import CodeExtractor
-import tempfile
+from document_ingest import DocumentError, expand_uploads, is_pdf
 import os
 from flask_cors import CORS
 import pytesseract
 
 from static_analyzer import StaticCodeAnalyzer
 from code_reformatter import refactor_code
+from rewrite_rules import describe_rules
 import ast
 import time
 import sys
@@ -19,7 +20,17 @@ import base64
 
 # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe';
 
+# Largest accepted upload; werkzeug aborts with 413 while streaming once it is exceeded
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 16 * 1024 * 1024))
+
+class InMemoryRequest(Request):
+    """Keep uploaded files in memory instead of spooling them to a temporary file."""
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return io.BytesIO()
+
 app = Flask(__name__)
+app.request_class = InMemoryRequest
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
 CORS(app) 
 extractor = CodeExtractor()
 analyzer = StaticCodeAnalyzer()
@@ -33,26 +44,50 @@ def image_to_code():
     if 'file' not in request.files:
         return jsonify({'error': 'No file part'}), 400
 
-    file = request.files['file']
-    if file.filename == '':
+    files = [file for file in request.files.getlist('file') if file.filename != '']
+    if not files:
         return jsonify({'error': 'No selected file'}), 400
 
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp:
-            file.save(tmp.name)
-            extracted_code = extractor.extract_code_from_image(tmp.name)
-        os.remove(tmp.name)
-        if extracted_code is None:
-            return jsonify({'error': 'Could not extract code'}), 500
-        print("EXTRACTED CODE:", extracted_code)
-        return jsonify({'code': extracted_code})
-        
+        uploads = [(file.filename, file.stream.read()) for file in files]
+        if len(uploads) == 1 and not is_pdf(uploads[0][1]):
+            extracted_code = extractor.extract_code_from_image(uploads[0][1])
+            if extracted_code is None:
+                return jsonify({'error': 'Could not extract code'}), 500
+            print("EXTRACTED CODE:", extracted_code)
+            return jsonify({'code': extracted_code})
+
+        # Several screenshots or a PDF: OCR every page in parallel, stitched in upload order
+        start = time.perf_counter()
+        result = extractor.extract_code_from_pages(expand_uploads(uploads))
+        if all(page['code'] is None for page in result['pages']):
+            return jsonify({'error': 'Could not extract code', 'pages': result['pages']}), 500
+        result['total_seconds'] = round(time.perf_counter() - start, 3)
+        print("EXTRACTED CODE:", result['code'])
+        return jsonify(result)
+
+    except DocumentError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print("ERROR:", e)
         return jsonify({'error': str(e)}), 500
 
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({'error': f'File too large (max {MAX_UPLOAD_BYTES // (1024 * 1024)} MB)'}), 413
+
+@app.route('/ocr-cache-stats', methods=['GET'])
+def ocr_cache_stats():
+    """Hit rate of the OCR result cache."""
+    return jsonify(extractor.cache_stats() or {'error': 'OCR cache disabled'})
+
 #----------------------------------------------- OPTIMIZE -----------------------------------------------
 
+@app.route('/refactor-rules', methods=['GET'])
+def refactor_rules():
+    """Rewrite rules that /optimize can apply and switch on or off through 'rules'."""
+    return jsonify(describe_rules())
+
 print("CONNECT.PY IS RUNNING")
 
 @app.route('/optimize', methods=['POST'])
@@ -72,9 +107,12 @@ def optimize_code():
         lon = data.get('lon')
         keep_comments = data.get('keep_comments', True)
         keep_fstrings = data.get('keep_fstrings', True)
+        rules = data.get('rules')  # {rule name: enabled}, see /refactor-rules
 
         # First, try to refactor the code
-        refactored_code, changes = refactor_code(original_code, keep_comments=keep_comments, keep_fstrings=keep_fstrings)
+        # Each change comes back as {rule, message, line, end_line, column, runtime_delta_s, energy_delta_kwh}
+        refactored_code, changes = refactor_code(original_code, keep_comments=keep_comments, keep_fstrings=keep_fstrings,
+                                                 rules=rules, input_size_n=input_size_n, detailed=True)
         print("Refactored code:", refactored_code)
         print("Changes:", changes)
         
@@ -126,6 +164,8 @@ def optimize_code():
                     'time_complexity': original_analysis['metrics']['time_complexity'],
                     'space_complexity': original_analysis['metrics']['space_complexity'],
                     'cyclomatic_complexity': original_analysis['metrics']['cyclomatic_complexity'],
+                    'bytecode_ops_per_iteration': original_analysis['metrics']['bytecode_ops_per_iteration'],
+                    'native_ops': original_analysis['metrics']['native_ops'],
                     'eco_score': original_analysis['eco_score']
                 },
                 'optimized': {
@@ -135,6 +175,8 @@ def optimize_code():
                     'time_complexity': optimized_analysis['metrics']['time_complexity'],
                     'space_complexity': optimized_analysis['metrics']['space_complexity'],
                     'cyclomatic_complexity': optimized_analysis['metrics']['cyclomatic_complexity'],
+                    'bytecode_ops_per_iteration': optimized_analysis['metrics']['bytecode_ops_per_iteration'],
+                    'native_ops': optimized_analysis['metrics']['native_ops'],
                     'eco_score': optimized_analysis['eco_score']
                 },
                 'improvements': {
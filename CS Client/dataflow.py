@@ -0,0 +1,717 @@
+import ast
+import builtins
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional
+
+SCOPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda, ast.ClassDef)
+COMPREHENSIONS = (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+
+# pandas functions returning a DataFrame, and DataFrame methods returning one
+PANDAS_FRAME_FUNCTIONS = {'DataFrame', 'read_csv', 'read_excel', 'read_json', 'read_parquet', 'read_sql',
+                          'read_table', 'read_feather', 'merge'}
+FRAME_METHODS = {'copy', 'reset_index', 'dropna', 'fillna', 'sort_values', 'sort_index', 'query', 'assign',
+                 'head', 'tail', 'merge', 'join', 'drop', 'rename', 'astype', 'drop_duplicates'}
+SERIES_METHODS = {'copy', 'dropna', 'fillna', 'sort_values', 'sort_index', 'head', 'tail', 'astype', 'abs',
+                  'round', 'clip', 'cumsum', 'map', 'apply', 'drop_duplicates', 'isin', 'isna', 'notna'}
+# NumPy functions returning a new 1-D array when their first argument is a length (not a shape)
+NUMPY_SIZED = {'zeros', 'ones', 'empty', 'full', 'arange', 'linspace'}
+NUMPY_RANDOM_SIZED = {'rand': 0, 'randn': 0, 'random': 0, 'randint': 2, 'uniform': 2, 'normal': 2}
+# Element-wise NumPy functions: a 1-D array in, a new 1-D array out
+NUMPY_ELEMENTWISE = {'abs', 'sqrt', 'exp', 'log', 'log10', 'log2', 'sin', 'cos', 'tan', 'floor', 'ceil', 'round',
+                     'minimum', 'maximum', 'where', 'clip', 'cumsum', 'sort'}
+NUMPY_ARRAY_METHODS = {'copy', 'reshape', 'astype', 'flatten', 'ravel', 'cumsum', 'clip', 'round'}
+
+# What builtins and methods of builtin types certainly return
+BUILTIN_TYPES = {'int': 'int', 'len': 'int', 'ord': 'int', 'hash': 'int', 'float': 'float', 'bool': 'bool',
+                 'str': 'str', 'repr': 'str', 'ascii': 'str', 'chr': 'str', 'format': 'str', 'hex': 'str',
+                 'oct': 'str', 'bin': 'str', 'input': 'str', 'list': 'list', 'sorted': 'list', 'dict': 'dict',
+                 'set': 'set', 'frozenset': 'frozenset', 'tuple': 'tuple', 'range': 'range',
+                 'isinstance': 'bool', 'callable': 'bool'}
+STR_METHODS = {'split': 'list', 'rsplit': 'list', 'splitlines': 'list', 'find': 'int', 'rfind': 'int',
+               'index': 'int', 'count': 'int', 'startswith': 'bool', 'endswith': 'bool', 'isdigit': 'bool',
+               'isalpha': 'bool', 'isalnum': 'bool', 'isspace': 'bool', 'islower': 'bool', 'isupper': 'bool',
+               'encode': 'bytes'}
+STR_TO_STR = {'upper', 'lower', 'strip', 'lstrip', 'rstrip', 'title', 'capitalize', 'casefold', 'swapcase',
+              'replace', 'join', 'format', 'center', 'ljust', 'rjust', 'zfill', 'removeprefix', 'removesuffix'}
+CONTAINER_METHODS = {'copy': None, 'index': 'int', 'count': 'int'}
+NUMBERS = ('bool', 'int', 'float', 'complex')
+INT_OPS = (ast.Add, ast.Sub, ast.Mult, ast.FloorDiv, ast.Mod, ast.LShift, ast.RShift, ast.BitAnd, ast.BitOr,
+           ast.BitXor)
+ARRAY_TYPES = ('ndarray', 'Series', 'DataFrame')
+
+
+def imported_alias(module: str, root: ast.AST) -> Optional[str]:
+    """The name a top-level `import module [as alias]` binds, if any"""
+    for statement in getattr(root, 'body', []):
+        if isinstance(statement, ast.Import):
+            for alias in statement.names:
+                if alias.name == module:
+                    return alias.asname or module
+    return None
+
+
+class Definition(NamedTuple):
+    """One binding of name that may reach a point.
+
+    value is the assigned expression, the ast.arg of a parameter, the
+    ast.alias of an import, the For or AugAssign statement that binds it,
+    or None when nothing is known (tuple unpacking, with/except targets,
+    del, rebinding by other scopes).
+    """
+    name: str
+    value: Optional[ast.AST]
+    point: Optional[int]
+
+
+class DataFlow:
+    """Reaching definitions, liveness and type provenance for one scope.
+
+    The scope (a module, class or function body) is split into a control-flow
+    graph with one point per simple statement or compound-statement header;
+    nested functions and classes are single points whose bodies are not
+    entered. Definitions and live names are bit sets over each point, solved
+    with a worklist, so building the analysis is linear in the size of the
+    scope for code without deeply nested loops. Queries take a node of the
+    scope and answer for the point that evaluates it.
+
+    Names read by nested scopes count as live everywhere, and names rebound
+    by them (global/nonlocal) get an unknown definition everywhere.
+    """
+
+    def __init__(self, scope: ast.AST, root: Optional[ast.AST] = None):
+        self.scope = scope
+        self.root = root if root is not None else scope
+        self.definitions_list: List[Definition] = []
+        self._uses: List[List[ast.Name]] = []
+        self._gen: List[List[int]] = []
+        self._succ: List[List[int]] = []
+        self._point_of: Dict[int, int] = {}
+        self._span: Dict[int, range] = {}
+        self._loops: List[tuple] = []
+        self._returns: List[int] = []
+        self._defs_of: Dict[str, List[int]] = {}
+        # Names closures read (live everywhere) and names other scopes rebind (never known)
+        self.captured = set()
+        self.foreign = set()
+        self._module_flow = None
+        self._bound = None
+        self._typing = set()
+        self._types: Dict[Definition, Optional[str]] = {}
+        # Names comprehensions bind -> what they iterate over (None when unpacked), for typing their items
+        self._items_of: Dict[int, Optional[ast.AST]] = {}
+        self._itemizing = set()
+        self._mutated: Optional[set] = None
+
+        entry = self._new_point()
+        if isinstance(scope, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            arguments = scope.args
+            for argument in (arguments.posonlyargs + arguments.args + arguments.kwonlyargs +
+                             [arguments.vararg, arguments.kwarg]):
+                if argument is not None:
+                    self._define(argument.arg, argument, entry)
+                    self._point_of[id(argument)] = entry
+        exits = self._block(scope.body, [entry])
+        self.exit = self._new_point()
+        for point in exits + self._returns:
+            self._succ[point].append(self.exit)
+        self._solve()
+
+    # --- building the graph ---
+
+    def _new_point(self) -> int:
+        self._uses.append([])
+        self._gen.append([])
+        self._succ.append([])
+        return len(self._succ) - 1
+
+    def _define(self, name: str, value: Optional[ast.AST], point: int):
+        self._defs_of.setdefault(name, []).append(len(self.definitions_list))
+        self._gen[point].append(len(self.definitions_list))
+        self.definitions_list.append(Definition(name, value, point))
+
+    def _point(self, node: Optional[ast.AST], parts: List[ast.AST], preds: List[int], values=None) -> int:
+        """A point after preds that evaluates parts; values maps id(Name) of a target to what it is bound to"""
+        point = self._new_point()
+        for pred in preds:
+            self._succ[pred].append(point)
+        if node is not None:
+            self._point_of[id(node)] = point
+        for part in parts:
+            self._scan(part, point, values or {}, {})
+        return point
+
+    def _scan(self, node: ast.AST, point: int, values: Dict[int, ast.AST], hidden: Dict[str, Optional[ast.AST]]):
+        self._point_of[id(node)] = point
+        if isinstance(node, ast.Name):
+            if node.id in hidden:
+                self._items_of[id(node)] = hidden[node.id]
+                return
+            if isinstance(node.ctx, ast.Load):
+                self._uses[point].append(node)
+            else:
+                self._define(node.id, values.get(id(node)), point)
+            return
+        if isinstance(node, ast.Lambda):
+            for default in node.args.defaults + [d for d in node.args.kw_defaults if d is not None]:
+                self._scan(default, point, values, hidden)
+            self._capture(node.body)
+            return
+        if isinstance(node, SCOPES):
+            # Nested def/class: only what runs now (decorators, defaults, bases) is scanned here
+            self._capture(node)
+            return
+        if isinstance(node, ast.NamedExpr):
+            self._scan(node.value, point, values, hidden)
+            self._define(node.target.id, node.value, point)
+            self._point_of[id(node.target)] = point
+            return
+        if isinstance(node, COMPREHENSIONS):
+            # The first iterable runs here; the rest is the comprehension's own scope
+            generators = node.generators
+            self._scan(generators[0].iter, point, values, hidden)
+            inner = dict(hidden)
+            for generator in generators:
+                inner.update((child.id, generator.iter if child is generator.target else None)
+                             for child in ast.walk(generator.target) if isinstance(child, ast.Name))
+            for index, generator in enumerate(generators):
+                if index:
+                    self._scan(generator.iter, point, values, inner)
+                for condition in generator.ifs:
+                    self._scan(condition, point, values, inner)
+            for element in ([node.key, node.value] if isinstance(node, ast.DictComp) else [node.elt]):
+                self._scan(element, point, values, inner)
+            return
+        for child in ast.iter_child_nodes(node):
+            self._scan(child, point, values, hidden)
+
+    def _capture(self, node: ast.AST):
+        for child in ast.walk(node):
+            if isinstance(child, ast.Name):
+                self.captured.add(child.id)
+            elif isinstance(child, (ast.Global, ast.Nonlocal)):
+                self.foreign.update(child.names)
+
+    def _block(self, body: List[ast.stmt], preds: List[int]) -> List[int]:
+        for statement in body:
+            start = len(self._succ)
+            preds = self._statement(statement, preds)
+            self._span[id(statement)] = range(start, len(self._succ))
+        return preds
+
+    def _statement(self, node: ast.stmt, preds: List[int]) -> List[int]:
+        """Add the points of node after preds; returns the points control leaves it from"""
+        if isinstance(node, ast.If):
+            test = self._point(node, [node.test], preds)
+            return self._block(node.body, [test]) + self._block(node.orelse, [test])
+        if isinstance(node, (ast.For, ast.AsyncFor, ast.While)):
+            header = self._point(node, [node.test] if isinstance(node, ast.While) else [node.iter], preds)
+            entry = header
+            if not isinstance(node, ast.While):
+                values = {id(node.target): node} if isinstance(node.target, ast.Name) else {}
+                entry = self._point(None, [node.target], [header], values)
+            breaks = []
+            self._loops.append((header, breaks))
+            for point in self._block(node.body, [entry]):
+                self._succ[point].append(header)
+            self._loops.pop()
+            return self._block(node.orelse, [header]) + breaks
+        if isinstance(node, (ast.With, ast.AsyncWith)):
+            items = self._point(node, [item.context_expr for item in node.items] +
+                                [item.optional_vars for item in node.items if item.optional_vars is not None], preds)
+            return self._block(node.body, [items])
+        if isinstance(node, (ast.Try, getattr(ast, 'TryStar', ast.Try))):
+            start = len(self._succ)
+            body = self._block(node.body, preds)
+            # Any statement of the body may raise, before or after it runs
+            raising = preds + list(range(start, len(self._succ)))
+            exits = self._block(node.orelse, body)
+            for handler in node.handlers:
+                point = self._point(handler, [handler.type] if handler.type is not None else [], raising)
+                if handler.name:
+                    self._define(handler.name, None, point)
+                exits += self._block(handler.body, [point])
+            if node.finalbody:
+                # Also reached on the way out of exceptions, returns and breaks
+                exits = self._block(node.finalbody, exits + list(range(start, len(self._succ))))
+            return exits
+        if isinstance(node, ast.Match):
+            subject = self._point(node, [node.subject], preds)
+            exits = [subject]
+            for case in node.cases:
+                point = self._point(case, [case.guard] if case.guard is not None else [], [subject])
+                for child in ast.walk(case.pattern):
+                    name = getattr(child, 'name', None)
+                    if isinstance(child, (ast.MatchAs, ast.MatchStar)) and name:
+                        self._define(name, None, point)
+                    elif isinstance(child, ast.MatchMapping) and child.rest:
+                        self._define(child.rest, None, point)
+                    elif isinstance(child, ast.MatchValue):
+                        self._scan(child.value, point, {}, {})
+                exits += self._block(case.body, [point])
+            return exits
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            parts = list(node.decorator_list)
+            if isinstance(node, ast.ClassDef):
+                parts += node.bases + [keyword.value for keyword in node.keywords]
+            else:
+                parts += node.args.defaults + [default for default in node.args.kw_defaults if default is not None]
+            point = self._point(node, parts, preds)
+            self._capture(node)
+            self._define(node.name, node, point)
+            return [point]
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            point = self._point(node, [], preds)
+            for alias in node.names:
+                if alias.name != '*':
+                    plain = isinstance(node, ast.Import) and (alias.asname or '.' not in alias.name)
+                    self._define((alias.asname or alias.name).split('.')[0], alias if plain else None, point)
+            return [point]
+        if isinstance(node, (ast.Global, ast.Nonlocal)):
+            self.foreign.update(node.names)
+            return [self._point(node, [], preds)]
+
+        values = {}
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    values[id(target)] = node.value
+                elif (isinstance(target, (ast.Tuple, ast.List)) and isinstance(node.value, (ast.Tuple, ast.List)) and
+                      len(target.elts) == len(node.value.elts) and
+                      not any(isinstance(item, ast.Starred) for item in target.elts + node.value.elts)):
+                    values.update((id(item), value) for item, value in zip(target.elts, node.value.elts))
+        elif isinstance(node, ast.AnnAssign):
+            if node.value is None:
+                # `x: int` alone binds nothing
+                return [self._point(node, [node.annotation], preds)]
+            values[id(node.target)] = node.value
+        elif isinstance(node, ast.AugAssign):
+            values[id(node.target)] = node
+        point = self._point(node, [node], preds, values)
+        if isinstance(node, ast.AugAssign) and isinstance(node.target, ast.Name):
+            # x += 1 reads x before rebinding it
+            self._uses[point].append(node.target)
+        if isinstance(node, ast.Return):
+            self._returns.append(point)
+            return []
+        if isinstance(node, ast.Raise):
+            return []
+        if isinstance(node, ast.Break) and self._loops:
+            self._loops[-1][1].append(point)
+            return []
+        if isinstance(node, ast.Continue) and self._loops:
+            self._succ[point].append(self._loops[-1][0])
+            return []
+        return [point]
+
+    # --- solving ---
+
+    def _solve(self):
+        count = len(self._succ)
+        preds = [[] for _ in range(count)]
+        for point, successors in enumerate(self._succ):
+            for successor in successors:
+                preds[successor].append(point)
+
+        # Reaching definitions: forward, over definition indices
+        masks = {}
+        for name, indices in self._defs_of.items():
+            masks[name] = sum(1 << index for index in indices)
+        gen, kill = [0] * count, [0] * count
+        for point, defined in enumerate(self._gen):
+            for index in defined:
+                same = masks[self.definitions_list[index].name]
+                gen[point] = (gen[point] & ~same) | (1 << index)
+                kill[point] |= same
+        self.reach_in, reach_out = [0] * count, [0] * count
+        pending, queued = deque(range(count)), [True] * count
+        while pending:
+            point = pending.popleft()
+            queued[point] = False
+            reach_in = 0
+            for pred in preds[point]:
+                reach_in |= reach_out[pred]
+            self.reach_in[point] = reach_in
+            out = gen[point] | (reach_in & ~kill[point])
+            if out != reach_out[point]:
+                reach_out[point] = out
+                for successor in self._succ[point]:
+                    if not queued[successor]:
+                        queued[successor] = True
+                        pending.append(successor)
+
+        # Liveness: backward, over names
+        self._names = {name: index for index, name in
+                       enumerate(sorted(set(self._defs_of) | {use.id for uses in self._uses for use in uses}))}
+        use, define = [0] * count, [0] * count
+        for point in range(count):
+            for node in self._uses[point]:
+                use[point] |= 1 << self._names[node.id]
+            for index in self._gen[point]:
+                define[point] |= 1 << self._names[self.definitions_list[index].name]
+        at_exit = 0
+        for name, index in self._names.items():
+            # Module and class names outlive the body; so do names other scopes share
+            if name in self.foreign or not isinstance(self.scope, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                at_exit |= 1 << index
+        self.live_in, self.live_out = [0] * count, [0] * count
+        self.live_in[self.exit] = at_exit
+        pending, queued = deque(range(count - 1, -1, -1)), [True] * count
+        while pending:
+            point = pending.popleft()
+            queued[point] = False
+            out = at_exit if point == self.exit else 0
+            for successor in self._succ[point]:
+                out |= self.live_in[successor]
+            self.live_out[point] = out
+            live_in = use[point] | (out & ~define[point])
+            if live_in != self.live_in[point]:
+                self.live_in[point] = live_in
+                for pred in preds[point]:
+                    if not queued[pred]:
+                        queued[pred] = True
+                        pending.append(pred)
+
+    # --- queries ---
+
+    def point_of(self, node: ast.AST) -> Optional[int]:
+        return self._point_of.get(id(node))
+
+    def is_local(self, name: str) -> bool:
+        return name in self._defs_of
+
+    def definitions(self, name: str, node: ast.AST) -> List[Definition]:
+        """Definitions of name that may reach the point evaluating node; an unknown one if any could come from elsewhere"""
+        return self._reaching(name, self.point_of(node))
+
+    def _reaching(self, name: str, point: Optional[int]) -> List[Definition]:
+        unknown = Definition(name, None, None)
+        if point is None or name not in self._defs_of:
+            return [unknown]
+        found = [self.definitions_list[index] for index in self._defs_of[name] if self.reach_in[point] >> index & 1]
+        return found + [unknown] if name in self.foreign else found
+
+    def uses(self, definition: Definition) -> List[ast.Name]:
+        """Every read of the name that definition may reach (the def-use chain)"""
+        index = self.definitions_list.index(definition)
+        return [node for point, uses in enumerate(self._uses) for node in uses
+                if node.id == definition.name and self.reach_in[point] >> index & 1]
+
+    def span(self, statement: ast.stmt) -> range:
+        """The points of statement, in source order (empty if it is not a statement of the scope)"""
+        return self._span.get(id(statement), range(0))
+
+    def live_after(self, statement: ast.stmt) -> set:
+        """Names that may still be read once statement has run"""
+        span = self._span.get(id(statement))
+        if span is None:
+            return set(self._names) | self.captured
+        live = 0
+        for point in span:
+            for successor in self._succ[point]:
+                if successor not in span:
+                    live |= self.live_in[successor]
+        return {name for name, index in self._names.items() if live >> index & 1} | self.captured
+
+    def module_of(self, node: ast.AST, at: Optional[ast.AST] = None) -> Optional[str]:
+        """The module a name refers to when every binding of it is `import module [as name]`"""
+        point = self.point_of(at if at is not None else node)
+        if not isinstance(node, ast.Name) or point is None:
+            return None
+        return self._module(node.id, point)
+
+    def type_of(self, node: ast.AST, at: Optional[ast.AST] = None) -> Optional[str]:
+        """Name of the type node certainly evaluates to ('int', 'str', 'list', 'DataFrame', 'ndarray' ...), or None.
+
+        at is a node of the scope to evaluate names at, for nodes built by a rewrite.
+        """
+        point = self.point_of(at if at is not None else node)
+        return None if point is None else self._type(node, point)
+
+    def _resolve(self, name: str, point: int) -> list:
+        """(flow, definition) for the definitions reaching a read of name, or for every binding of a global.
+
+        Empty when any of them is unknown.
+        """
+        if self.is_local(name) or self.root is self.scope or not isinstance(self.root, ast.Module):
+            flow, definitions = self, self._reaching(name, point)
+        else:
+            if self._module_flow is None:
+                self._module_flow = DataFlow(self.root)
+            flow = self._module_flow
+            if name in flow.foreign:
+                return []
+            definitions = [flow.definitions_list[index] for index in flow._defs_of.get(name, [])]
+        if any(definition.value is None for definition in definitions):
+            return []
+        return [(flow, definition) for definition in definitions]
+
+    def _module(self, name: str, point: int) -> Optional[str]:
+        definitions = self._resolve(name, point)
+        modules = {definition.value.name if isinstance(definition.value, ast.alias) else None
+                   for _, definition in definitions}
+        return modules.pop() if len(modules) == 1 else None
+
+    def _name_type(self, name: str, point: int) -> Optional[str]:
+        # A definition already being typed (x += 1 in a loop) is assumed to agree with the others
+        types = {flow._definition_type(definition) for flow, definition in self._resolve(name, point)
+                 if definition not in flow._typing}
+        return types.pop() if len(types) == 1 else None
+
+    def _definition_type(self, definition: Definition) -> Optional[str]:
+        if definition in self._types:
+            return self._types[definition]
+        self._typing.add(definition)
+        try:
+            kind = self._value_type(definition)
+        finally:
+            self._typing.discard(definition)
+        if not self._typing:
+            # Only results that assumed nothing are kept
+            self._types[definition] = kind
+        return kind
+
+    def _value_type(self, definition: Definition) -> Optional[str]:
+        value, point = definition.value, definition.point
+        if isinstance(value, ast.arg):
+            arguments = self.scope.args
+            if value is arguments.vararg:
+                return 'tuple'
+            if value is arguments.kwarg:
+                return 'dict'
+            return self._annotation_type(value.annotation, point)
+        if isinstance(value, (ast.For, ast.AsyncFor)):
+            return self._element_type(value.iter, point)
+        if isinstance(value, ast.AugAssign):
+            return self._binop_type(value.op, self._type(value.target, point), self._type(value.value, point),
+                                    value.value)
+        if isinstance(value, (ast.alias, ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            return None
+        return self._type(value, point)
+
+    def _annotation_type(self, annotation: Optional[ast.AST], point: int) -> Optional[str]:
+        if isinstance(annotation, ast.Subscript):
+            annotation = annotation.value
+        if isinstance(annotation, ast.Name) and annotation.id in BUILTIN_TYPES.values():
+            return annotation.id
+        if isinstance(annotation, ast.Attribute) and isinstance(annotation.value, ast.Name):
+            module = self._module(annotation.value.id, point)
+            if (module, annotation.attr) in (('pandas', 'DataFrame'), ('pandas', 'Series'), ('numpy', 'ndarray')):
+                return annotation.attr
+        return None
+
+    def _builtin(self, name: str) -> bool:
+        """Whether name certainly refers to the builtin of that name: nothing in the tree binds it"""
+        if self._bound is None:
+            self._bound = set()
+            for child in ast.walk(self.root):
+                if isinstance(child, ast.Name) and not isinstance(child.ctx, ast.Load):
+                    self._bound.add(child.id)
+                elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    self._bound.add(child.name)
+                elif isinstance(child, (ast.Import, ast.ImportFrom)):
+                    self._bound.update((alias.asname or alias.name).split('.')[0] for alias in child.names)
+                elif isinstance(child, ast.arg):
+                    self._bound.add(child.arg)
+        return name not in self._bound and hasattr(builtins, name)
+
+    def _type(self, node: ast.AST, point: int) -> Optional[str]:
+        if isinstance(node, ast.Constant):
+            return type(node.value).__name__
+        if isinstance(node, ast.JoinedStr):
+            return 'str'
+        if isinstance(node, (ast.List, ast.ListComp)):
+            return 'list'
+        if isinstance(node, ast.Tuple):
+            return 'tuple'
+        if isinstance(node, (ast.Dict, ast.DictComp)):
+            return 'dict'
+        if isinstance(node, (ast.Set, ast.SetComp)):
+            return 'set'
+        if isinstance(node, ast.Name):
+            if id(node) in self._items_of:
+                iterable = self._items_of[id(node)]
+                return None if iterable is None else self._element_type(iterable, point)
+            return self._name_type(node.id, point)
+        if isinstance(node, ast.NamedExpr):
+            return self._type(node.value, point)
+        if isinstance(node, ast.BinOp):
+            return self._binop_type(node.op, self._type(node.left, point), self._type(node.right, point), node.right)
+        if isinstance(node, ast.UnaryOp):
+            operand = self._type(node.operand, point)
+            if isinstance(node.op, ast.Not):
+                return None if operand in ARRAY_TYPES else 'bool'
+            if operand == 'bool':
+                return 'int'
+            if isinstance(node.op, ast.Invert):
+                return operand if operand in ('int',) + ARRAY_TYPES else None
+            return operand if operand in NUMBERS + ARRAY_TYPES else None
+        if isinstance(node, (ast.BoolOp, ast.IfExp)):
+            parts = node.values if isinstance(node, ast.BoolOp) else [node.body, node.orelse]
+            types = {self._type(part, point) for part in parts}
+            return types.pop() if len(types) == 1 else None
+        if isinstance(node, ast.Compare):
+            types = [self._type(part, point) for part in [node.left] + node.comparators]
+            if types[0] in ARRAY_TYPES and len(types) == 2:
+                return types[0]
+            return 'bool' if None not in types and not set(types) & set(ARRAY_TYPES) else None
+        if isinstance(node, ast.Subscript):
+            return self._subscript_type(self._type(node.value, point), node.slice, point)
+        if isinstance(node, ast.Attribute):
+            owner = self._type(node.value, point)
+            if owner in ('DataFrame', 'Series') and node.attr == 'values' or owner == 'ndarray' and node.attr == 'T':
+                return 'ndarray'
+            return 'tuple' if owner in ARRAY_TYPES and node.attr == 'shape' else None
+        if isinstance(node, ast.Call):
+            return self._call_type(node, point)
+        return None
+
+    def _element_type(self, iterable: ast.AST, point: int) -> Optional[str]:
+        """Type of every item iterating over iterable yields, or None"""
+        if isinstance(iterable, (ast.List, ast.Tuple, ast.Set)):
+            types = {self._type(element, point) for element in iterable.elts}
+            return types.pop() if len(types) == 1 else None
+        if isinstance(iterable, ast.BinOp) and isinstance(iterable.op, (ast.Add, ast.Mult)):
+            # [0] * n, xs + ys
+            sides = [iterable.left, iterable.right]
+            if isinstance(iterable.op, ast.Mult):
+                sides = [side for side in sides if self._type(side, point) != 'int']
+            types = {self._element_type(side, point) for side in sides}
+            return types.pop() if len(types) == 1 else None
+        if isinstance(iterable, ast.Call) and isinstance(iterable.func, ast.Name):
+            if iterable.func.id == 'range' and self._builtin('range'):
+                return 'int'
+            if (iterable.func.id in ('list', 'tuple', 'sorted') and len(iterable.args) == 1 and
+                    self._builtin(iterable.func.id)):
+                return self._element_type(iterable.args[0], point)
+        if isinstance(iterable, ast.Name) and id(iterable) not in self._items_of and not self.mutated(iterable.id):
+            # Whatever each binding of the name was built from, unless something may add other items
+            types = set()
+            for flow, definition in self._resolve(iterable.id, point):
+                if definition in flow._itemizing or not isinstance(definition.value, ast.expr):
+                    return None
+                flow._itemizing.add(definition)
+                try:
+                    types.add(flow._element_type(definition.value, definition.point))
+                finally:
+                    flow._itemizing.discard(definition)
+            if len(types) == 1:
+                return types.pop()
+        kind = self._type(iterable, point)
+        if kind == 'str' or (isinstance(iterable, ast.Call) and isinstance(iterable.func, ast.Attribute) and
+                             iterable.func.attr in ('split', 'rsplit', 'splitlines') and
+                             self._type(iterable.func.value, point) == 'str'):
+            return 'str'
+        return 'int' if kind in ('bytes', 'range') else None
+
+    def mutated(self, name: str) -> bool:
+        """Whether anything in the tree may change the items of the container name is bound to"""
+        if self._mutated is None:
+            self._mutated = set()
+            for child in ast.walk(self.root):
+                if isinstance(child, ast.Call):
+                    # A method of the container other than a read, or the container handed to a function
+                    function = child.func
+                    if (isinstance(function, ast.Attribute) and isinstance(function.value, ast.Name) and
+                            function.attr not in ('count', 'index', 'copy')):
+                        self._mutated.add(function.value.id)
+                    if not (isinstance(function, ast.Name) and self._builtin(function.id)):
+                        self._mutated.update(argument.id for argument in child.args + [k.value for k in child.keywords]
+                                             if isinstance(argument, ast.Name))
+                elif isinstance(child, (ast.Subscript, ast.Attribute)) and not isinstance(child.ctx, ast.Load):
+                    if isinstance(child.value, ast.Name):
+                        self._mutated.add(child.value.id)
+                elif isinstance(child, ast.AugAssign) and isinstance(child.target, ast.Name):
+                    self._mutated.add(child.target.id)
+                elif (isinstance(child, (ast.Assign, ast.AnnAssign, ast.NamedExpr)) and
+                      isinstance(child.value, ast.Name)):
+                    self._mutated.add(child.value.id)  # An alias may be changed instead
+        return name in self._mutated
+
+    def _binop_type(self, op: ast.operator, left: Optional[str], right: Optional[str],
+                    right_node: ast.AST) -> Optional[str]:
+        if left is None or right is None:
+            return None
+        for kind in ARRAY_TYPES:
+            if kind in (left, right):
+                other = right if left == kind else left
+                return kind if other in NUMBERS + (kind,) else None
+        if left in NUMBERS and right in NUMBERS:
+            if 'complex' in (left, right):
+                return None
+            if isinstance(op, ast.Pow):
+                # int ** -1 is a float and float ** 0.5 may be complex
+                non_negative = isinstance(right_node, ast.Constant) and right_node.value >= 0
+                return 'int' if non_negative and 'float' not in (left, right) else None
+            if isinstance(op, (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod)):
+                return 'float' if isinstance(op, ast.Div) or 'float' in (left, right) else 'int'
+            return 'int' if isinstance(op, INT_OPS) and 'float' not in (left, right) else None
+        if isinstance(op, ast.Add) and left == right and left in ('str', 'list', 'tuple', 'bytes'):
+            return left
+        if isinstance(op, ast.Mult) and {left, right} in ({'str', 'int'}, {'list', 'int'}, {'tuple', 'int'}):
+            return (left if left != 'int' else right)
+        if isinstance(op, ast.Mod) and left == 'str':
+            return 'str'
+        if isinstance(op, (ast.BitOr, ast.BitAnd, ast.Sub, ast.BitXor)) and left == right == 'set':
+            return 'set'
+        return None
+
+    def _subscript_type(self, owner: Optional[str], index: ast.AST, point: int) -> Optional[str]:
+        sliced = isinstance(index, ast.Slice)
+        if owner in ('str', 'bytes'):
+            return owner if sliced or owner == 'str' else 'int'
+        if owner in ('list', 'tuple', 'range'):
+            return owner if sliced else None
+        if owner == 'DataFrame':
+            if isinstance(index, ast.Constant) and isinstance(index.value, str):
+                return 'Series'
+            if isinstance(index, ast.List) or self._type(index, point) in ('Series', 'list'):
+                return 'DataFrame'
+            return None
+        if owner in ('Series', 'ndarray'):
+            return owner if sliced or self._type(index, point) == owner else None
+        return None
+
+    def _call_type(self, node: ast.Call, point: int) -> Optional[str]:
+        function = node.func
+        if isinstance(function, ast.Name):
+            if not self._builtin(function.id):
+                return None
+            if function.id in ('abs', 'round', 'min', 'max', 'sum') and node.args and not node.keywords:
+                argument = self._type(node.args[0], point)
+                if function.id in ('abs', 'round') and argument in ('int', 'float'):
+                    return 'int' if function.id == 'round' and len(node.args) == 1 else argument
+                return None
+            return BUILTIN_TYPES.get(function.id)
+        if not isinstance(function, ast.Attribute):
+            return None
+        owner, method = function.value, function.attr
+        # Module functions: pd.DataFrame(...), np.zeros(...), np.random.rand(...)
+        module = self._module(owner.id, point) if isinstance(owner, ast.Name) else None
+        if module == 'pandas':
+            if method in PANDAS_FRAME_FUNCTIONS:
+                return 'DataFrame'
+            return 'Series' if method == 'Series' else None
+        if module == 'numpy':
+            if method in NUMPY_SIZED | NUMPY_ELEMENTWISE | {'array', 'asarray', 'concatenate'}:
+                return 'ndarray'
+            return None
+        if (isinstance(owner, ast.Attribute) and owner.attr == 'random' and isinstance(owner.value, ast.Name) and
+                self._module(owner.value.id, point) == 'numpy'):
+            return 'ndarray' if method in NUMPY_RANDOM_SIZED else None
+        kind = self._type(owner, point)
+        if kind == 'str':
+            return 'str' if method in STR_TO_STR else STR_METHODS.get(method)
+        if kind in ('list', 'dict', 'set', 'tuple'):
+            return kind if method == 'copy' else CONTAINER_METHODS.get(method)
+        inplace = any(keyword.arg == 'inplace' for keyword in node.keywords)
+        if kind == 'DataFrame' and not inplace:
+            if method in FRAME_METHODS:
+                return 'DataFrame'
+            return 'ndarray' if method == 'to_numpy' else None
+        if kind == 'Series' and not inplace:
+            if method in SERIES_METHODS:
+                return 'Series'
+            return 'ndarray' if method == 'to_numpy' else None
+        if kind == 'ndarray':
+            return 'ndarray' if method in NUMPY_ARRAY_METHODS else None
+        return None
@@ -1,195 +1,227 @@
-import pytesseract
-from PIL import Image
 import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from document_ingest import stitch_pages
+from code_repair import repair_code, syntax_error
+from ocr_cleanup import create_cleaner
+from ocr_cache import OCRCache, DEFAULT_CACHE_DIR
+from ocr_engines import ENGINES, OCRSpaceEngine, TesseractEngine, engine_names
+
+# Seconds a race waits for a result that parses before settling for the best one so far
+RACE_DEADLINE = float(os.environ.get('OPTIPY_OCR_DEADLINE', 10.0))
+# Images or pages OCR'd at once; engines bound their own concurrency below this
+WORKERS = 8
+
+CACHE_FILES = {'tesseract': 'tesseract_ocr_cache.json', 'ocr_space': 'ocr_space_cache.json'}
+
+def score_code(code):
+    """How usable extracted code is: 1.0 when it parses, else the share of lines before the first syntax error"""
+    if not code:
+        return 0.0
+    error = syntax_error(code)
+    if error is None:
+        return 1.0
+    return min(0.99, ((error.lineno or 1) - 1) / len(code.splitlines()))
 
 class CodeExtractor:
-    def __init__(self):
-        # Set Tesseract path explicitly
-        tesseract_path = r'C:\Users\Mark\AppData\Local\Programs\Tesseract-OCR\tesseract.exe'
-        if os.path.exists(tesseract_path):
-            pytesseract.pytesseract.tesseract_cmd = tesseract_path
+    def __init__(self, engines=None, deadline=None, client=None, tesseract_cmd=None, tessdata_path=None,
+                 pool_size=None, use_cache=True, adaptive=True, repair=True):
+        # OCR engines: names from ENGINES (default $OPTIPY_OCR_ENGINES) or engine objects.
+        # With more than one, every image is raced across them; see _race
+        options = {
+            'tesseract': {'tesseract_cmd': tesseract_cmd, 'tessdata_path': tessdata_path,
+                          'pool_size': pool_size, 'adaptive': adaptive},
+            'ocr_space': {'client': client},
+        }
+        if engines is not None and not isinstance(engines, str) and not all(isinstance(e, str) for e in engines):
+            self.engines = {engine.name: engine for engine in engines}
+        else:
+            names = engine_names(engines) or (['ocr_space'] if client is not None else [])
+            if names:
+                self.engines = {name: ENGINES[name](**options[name]) for name in names}
+            else:
+                try:
+                    self.engines = {'tesseract': TesseractEngine(**options['tesseract'])}
+                except (ImportError, RuntimeError) as e:
+                    print(f"Tesseract unavailable ({e}); using OCR.space")
+                    self.engines = {'ocr_space': OCRSpaceEngine(**options['ocr_space'])}
+        self.deadline = RACE_DEADLINE if deadline is None else deadline
+
+        # OCR fix-up rules compiled once; extend them with $OPTIPY_OCR_RULES
+        self.cleaner = create_cleaner()
+        # Fix text that does not parse locally (indentation, brackets, 1/l and O/0 confusions)
+        self.repair = repair
+
+        # Cleaned text of already-seen images, keyed by image content and the cleanup that produced it
+        names = list(self.engines)
+        if len(names) == 1:
+            cache_name = CACHE_FILES.get(names[0], f'{names[0]}_ocr_cache.json')
         else:
-            raise RuntimeError(
-                "Tesseract not found at expected path. Please install Tesseract OCR from: "
-                "https://github.com/UB-Mannheim/tesseract/wiki"
-            )
-        
-        # Configure Tesseract for code recognition
-        self.custom_config = r'--oem 3 --psm 6'
-    
+            cache_name = f"{'_'.join(names)}_race_cache.json"
+        cache_path = os.environ.get('OPTIPY_OCR_CACHE', os.path.join(DEFAULT_CACHE_DIR, cache_name))
+        variant = f'rules={self.cleaner.signature};repair={bool(repair)}'
+        self.cache = OCRCache(path=cache_path, variant=variant) if use_cache else None
+
+        # Images and pages run on _workers; the engine reads of a race run on _readers,
+        # so a race never waits for a worker held by another race
+        self._workers = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='ocr')
+        self._readers = ThreadPoolExecutor(max_workers=WORKERS * len(self.engines), thread_name_prefix='ocr-race')
+        self._race_stats = {'races': 0, 'deadline_hits': 0, 'wins': dict.fromkeys(self.engines, 0)}
+        self._stats_lock = threading.Lock()
+
     def extract_code_from_image(self, image_path):
-        """Extract code from an image using Tesseract OCR"""
+        """Extract code from an image, racing the engines when there are several"""
         try:
-            # Load and preprocess the image
-            image = Image.open(image_path)
-            
-            # Convert to grayscale
-            image = image.convert('L')
-            
-            # Increase contrast
-            from PIL import ImageEnhance
-            enhancer = ImageEnhance.Contrast(image)
-            image = enhancer.enhance(2.0)
-            
-            # Increase resolution while maintaining aspect ratio
-            scale_factor = 2
-            image = image.resize(
-                (image.width * scale_factor, image.height * scale_factor),
-                Image.Resampling.LANCZOS
-            )
-            
-            # Configure Tesseract with improved whitespace handling
-            self.custom_config = (
-                '--oem 3 '           # Use neural network mode
-                '--psm 6 '           # Assume uniform text block
-                '-c preserve_interword_spaces=1 '  # Preserve spaces between words
-                '-c preserve_whitespace=1 '        # Preserve all whitespace
-                '-c tessedit_char_blacklist=¬ '    # Remove problematic characters
-            )
-            
-            # Extract text with raw output to preserve spacing
-            extracted_text = pytesseract.image_to_string(
-                image,
-                config=self.custom_config,
-                lang='eng'
-            )
-            
-            return self._clean_extracted_text(extracted_text)
-            
+            image_bytes = self._read_image(image_path)
+            if self.cache is not None:
+                cached = self.cache.get(image_bytes)
+                if cached is not None:
+                    return cached
+
+            cleaned_text = self._extract(image_bytes)
+            if self.cache is not None and cleaned_text is not None:
+                self.cache.put(image_bytes, cleaned_text)
+            return cleaned_text
+
         except Exception as e:
             print(f"Error during extraction: {str(e)}")
             return None
-    
-    def _clean_extracted_text(self, text):
-        """Clean up the extracted text specifically for Python code"""
-        if not text:
+
+    def extract_code_from_images(self, image_paths):
+        """Extract code from several images concurrently, in input order"""
+        images = [self._read_image(image_path) for image_path in image_paths]
+        results = [self.cache.get(image) if self.cache is not None else None for image in images]
+        missing = [index for index, result in enumerate(results) if result is None]
+
+        if len(self.engines) == 1:
+            # One engine: let it batch the images its own way (pooled workers, grouped uploads)
+            engine, = self.engines.values()
+            texts = engine.read_many([images[index] for index in missing])
+            codes = [self._clean_extracted_text(text) if text and text.strip() else None for text in texts]
+        else:
+            codes = list(self._workers.map(self._extract, [images[index] for index in missing]))
+        for index, code in zip(missing, codes):
+            results[index] = code
+            if self.cache is not None and code is not None:
+                self.cache.put(images[index], code, persist=False)
+        if self.cache is not None and missing:
+            self.cache.save()
+        return results
+
+    def extract_code_from_pages(self, pages):
+        """OCR ordered pages ({'source', 'page', 'image'}) in parallel and stitch them into one source.
+
+        Returns {'code': ..., 'pages': [...]} with each page's code, OCR time and cache status.
+        """
+        results = list(self._workers.map(self._extract_page, pages))
+        if self.cache is not None and not all(result['cached'] for result in results):
+            self.cache.save()
+        return {'code': stitch_pages(results), 'pages': results}
+
+    def _extract_page(self, page):
+        """Prepare and OCR one page on a worker, timing it"""
+        start = time.perf_counter()
+        result = {'source': page['source'], 'page': page['page'], 'code': None, 'cached': False}
+        try:
+            cached = self.cache.get(page['image']) if self.cache is not None else None
+            if cached is not None:
+                result['code'], result['cached'] = cached, True
+            else:
+                result['code'] = self._extract(page['image'])
+                if self.cache is not None and result['code'] is not None:
+                    self.cache.put(page['image'], result['code'], persist=False)
+        except Exception as e:
+            print(f"Error during extraction of {page['source']} page {page['page']}: {str(e)}")
+            result['error'] = str(e)
+        result['seconds'] = round(time.perf_counter() - start, 3)
+        return result
+
+    def _extract(self, image_bytes):
+        """OCR, clean and repair one image with the only engine, or race them"""
+        if len(self.engines) == 1:
+            engine, = self.engines.values()
+            return self._read_and_clean(engine, image_bytes)
+        return self._race(image_bytes)['code']
+
+    def _read_and_clean(self, engine, image_bytes, cancelled=None):
+        text = engine.read(image_bytes, cancelled)
+        if not text or not text.strip() or (cancelled is not None and cancelled.is_set()):
             return None
-        
-        # Split into lines while preserving empty lines
-        lines = text.splitlines(True)
-        
-        # Remove duplicate lines while preserving structure
-        seen_content = set()
-        cleaned_lines = []
-        previous_was_empty = False
-        
-        for line in lines:
-            original_line = line
-            stripped_content = line.strip()
-            
-            # Handle empty lines
-            if not stripped_content:
-                if not previous_was_empty:  # Only add if previous line wasn't empty
-                    cleaned_lines.append('\n')
-                    previous_was_empty = True
-                continue
-            
-            previous_was_empty = False
-            
-            # Count leading spaces for Python indentation
-            leading_space_count = len(line) - len(line.lstrip())
-            
-            # Fix common OCR mistakes in Python code
-            replacements = {
-                # Basic character fixes
-                '|': 'I',
-                '›': '>',
-                '‹': '<',
-                "'": "'",
-                '"': '"',
-                '"': '"',
-                '—': '-',
-                '–': '-',
-                '…': '...',
-                '\t': '    ',  # Convert tabs to spaces (PEP 8)
-                
-                # Python-specific fixes
-                'def1ne': 'define',
-                'pr1nt': 'print',
-                'wh1le': 'while',
-                'y1eld': 'yield',
-                'ra1se': 'raise',
-                'ret urn': 'return',
-                'pass word': 'password',
-                'True1': 'True',
-                'False1': 'False',
-                'None1': 'None',
-                'class1': 'class',
-                
-                # Python spacing fixes
-                ' .': '.',
-                ' ,': ',',
-                '( ': '(',
-                ' )': ')',
-                '[ ': '[',
-                ' ]': ']',
-                '{ ': '{',
-                ' }': '}'
-            }
-            
-            # Clean the content
-            cleaned_content = stripped_content
-            for old, new in replacements.items():
-                cleaned_content = cleaned_content.replace(old, new)
-            
-            # Fix Python-specific patterns
-            if cleaned_content:
-                # Fix method/variable naming patterns (convert spaces to underscores)
-                if '_' in cleaned_content or ' ' in cleaned_content:
-                    words = cleaned_content.split()
-                    for i, word in enumerate(words):
-                        if ' ' in word and not any(char in word for char in '"\''):
-                            words[i] = word.replace(' ', '_')
-                    cleaned_content = ' '.join(words)
-                
-                # Fix Python import statements
-                if 'import' in cleaned_content or 'from' in cleaned_content:
-                    cleaned_content = self._fix_python_imports(cleaned_content)
-                
-                # Fix common Python number/letter confusions in specific contexts
-                if 'for ' in cleaned_content or 'if ' in cleaned_content:
-                    cleaned_content = cleaned_content.replace('1n ', 'in ')
-                    cleaned_content = cleaned_content.replace('1f ', 'if ')
-            
-            # Handle Python indentation (should be multiples of 4 spaces)
-            if leading_space_count > 0:
-                leading_space_count = ((leading_space_count + 2) // 4) * 4
-            
-            # Add extra newline before class and function definitions
-            if cleaned_content.startswith(('class ', 'def ')) and cleaned_lines and cleaned_lines[-1].strip():
-                cleaned_lines.append('\n')
-            
-            # Add the cleaned line with proper Python indentation
-            if cleaned_content not in seen_content:
-                seen_content.add(cleaned_content)
-                final_line = ' ' * leading_space_count + cleaned_content + '\n'
-                cleaned_lines.append(final_line)
-        
-        # Join lines and normalize empty lines per Python conventions
-        cleaned_text = ''.join(cleaned_lines)
-        
-        # Ensure two blank lines before top-level classes/functions (PEP 8)
-        cleaned_text = cleaned_text.replace('\nclass ', '\n\n\nclass ')
-        cleaned_text = cleaned_text.replace('\ndef ', '\n\n\ndef ')
-        
-        # Normalize multiple empty lines to maximum of two (PEP 8)
-        while '\n\n\n\n' in cleaned_text:
-            cleaned_text = cleaned_text.replace('\n\n\n\n', '\n\n\n')
-        
+        return self._clean_extracted_text(text)
+
+    def _race(self, image_bytes):
+        """Run every engine on one image and keep the first result that parses.
+
+        Once the deadline passes, the best-scoring result so far wins (or the next
+        one to finish, if none has yet). The losers are cancelled: queued reads
+        never start and running ones skip their remaining optional passes.
+        Returns {'code', 'engine', 'parsed', 'seconds'}.
+        """
+        start = time.perf_counter()
+        cancelled = threading.Event()
+        futures = {self._readers.submit(self._read_and_clean, engine, image_bytes, cancelled): name
+                   for name, engine in self.engines.items()}
+        pending = set(futures)
+        best = None  # (score, engine name, code)
+        deadline = start + self.deadline
+        while pending and not (best and best[0] == 1.0):
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 and best is not None:
+                break
+            done, pending = wait(pending, timeout=remaining if remaining > 0 else None, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    code = future.result()
+                except Exception as e:
+                    print(f"Error during extraction with {futures[future]}: {str(e)}")
+                    continue
+                score = score_code(code)
+                if code is not None and (best is None or score > best[0]):
+                    best = (score, futures[future], code)
+        cancelled.set()
+        for future in pending:
+            future.cancel()
+
+        with self._stats_lock:
+            self._race_stats['races'] += 1
+            if best is not None:
+                self._race_stats['wins'][best[1]] += 1
+                self._race_stats['deadline_hits'] += bool(pending) and best[0] < 1.0
+        return {'code': best[2] if best else None, 'engine': best[1] if best else None,
+                'parsed': bool(best) and best[0] == 1.0, 'seconds': time.perf_counter() - start}
+
+    def cache_stats(self):
+        """Hit rate and size of the OCR result cache"""
+        return self.cache.stats() if self.cache is not None else None
+
+    def ocr_stats(self):
+        """Tesseract line re-read counts and, when racing, how often each engine won"""
+        stats = self.engines['tesseract'].stats() if 'tesseract' in self.engines else {}
+        if len(self.engines) > 1:
+            with self._stats_lock:
+                stats.update(self._race_stats, wins=dict(self._race_stats['wins']))
+        return stats
+
+    def close(self):
+        """Stop the workers and release every engine"""
+        self._workers.shutdown()
+        self._readers.shutdown(cancel_futures=True)
+        for engine in self.engines.values():
+            engine.close()
+
+    def _read_image(self, image_path):
+        """Read image bytes from a path, raw bytes or a file-like object"""
+        if isinstance(image_path, (bytes, bytearray, memoryview)):
+            return bytes(image_path)
+        if hasattr(image_path, 'read'):
+            return image_path.read()
+        with open(image_path, 'rb') as image_file:
+            return image_file.read()
+
+    def _clean_extracted_text(self, text):
+        """Clean up the extracted text specifically for Python code, then repair it until it parses"""
+        cleaned_text = self.cleaner.clean(text)
+        if cleaned_text and self.repair:
+            cleaned_text = repair_code(cleaned_text)['code']
         return cleaned_text
-    
-    def _fix_python_imports(self, content):
-        """Fix Python import statement formatting"""
-        words = content.split()
-        try:
-            if 'from' in words:
-                from_idx = words.index('from')
-                import_idx = words.index('import')
-                if from_idx < import_idx:
-                    return f"from {' '.join(words[from_idx + 1:import_idx])} import {' '.join(words[import_idx + 1:])}"
-            elif 'import' in words:
-                import_idx = words.index('import')
-                return f"import {' '.join(words[import_idx + 1:])}"
-        except (ValueError, IndexError):
-            pass
-        return content
@@ -0,0 +1,257 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+# Tesseract's LSTM models are most accurate when text lines are roughly 30px tall;
+# below ~20px accuracy drops off, above that upscaling only costs time.
+MIN_TEXT_HEIGHT = 20
+TARGET_TEXT_HEIGHT = 32
+MAX_UPSCALE = 3.0
+# Lines taller than this are downscaled: OCR cost grows with pixels, accuracy does not
+MAX_TEXT_HEIGHT = 64
+# Text height of the first, cheap adaptive pass. Downscaling the binarized page with
+# box filtering anti-aliases the glyphs; on the bundled dataset this was both faster
+# and more accurate than OCR at the native ~40px.
+FAST_TEXT_HEIGHT = 24
+
+# Decoded images larger than this are reduced while decoding (phone/4K screenshots)
+MAX_DECODE_PIXELS = 16_000_000
+# Tall screenshots are cut between text lines into tiles OCR'd in parallel: at least
+# TILE_MIN_LINES lines per tile so each keeps some layout context, and at most
+# TILE_MAX_LINES so no single OCR request grows unbounded
+TILE_MIN_LINES = 12
+TILE_MAX_LINES = 60
+
+
+def load_image(image_bytes: bytes, max_pixels: int = MAX_DECODE_PIXELS) -> Image.Image:
+    """Decode image bytes, shrinking oversized images as cheaply as possible."""
+    image = Image.open(io.BytesIO(image_bytes))
+    pixels = image.width * image.height
+    if pixels > max_pixels:
+        # JPEG can decode directly at 1/2, 1/4 or 1/8 scale, skipping most of the work
+        scale = (max_pixels / pixels) ** 0.5
+        image.draft(image.mode, (int(image.width * scale), int(image.height * scale)))
+    image.load()
+    pixels = image.width * image.height
+    if pixels > max_pixels:
+        factor = int(np.ceil((pixels / max_pixels) ** 0.5))
+        image = image.reduce(factor)
+    return image
+
+
+def shrink_for_upload(image_bytes: bytes, max_bytes: int = 1_000_000,
+                      max_side: int = 4000):
+    """Downscale and recompress an image for a remote OCR API.
+
+    Returns (bytes, filetype). Images already within max_bytes and max_side are
+    passed through untouched. Otherwise the image is converted to grayscale and
+    downscaled, but never below MIN_TEXT_HEIGHT text lines, then saved as PNG
+    (ideal for flat screenshots) or progressively lower-quality JPEG.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as header:
+        if len(image_bytes) <= max_bytes and max(header.size) <= max_side:
+            return image_bytes, 'JPG' if header.format == 'JPEG' else (header.format or 'PNG')
+
+    gray = load_image(image_bytes).convert('L')
+    text_height = estimate_text_height(adaptive_threshold(to_grayscale(gray)))
+    floor = MIN_TEXT_HEIGHT / text_height if text_height else 0.25
+    scale = min(1.0, max_side / max(gray.size))
+
+    while True:
+        candidate = gray
+        if scale < 1.0:
+            candidate = gray.resize((max(1, round(gray.width * scale)), max(1, round(gray.height * scale))),
+                                    Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        candidate.save(buffer, format='PNG', optimize=True)
+        if buffer.tell() <= max_bytes:
+            return buffer.getvalue(), 'PNG'
+        for quality in (90, 80, 70, 60):
+            buffer = io.BytesIO()
+            candidate.save(buffer, format='JPEG', quality=quality, optimize=True)
+            if buffer.tell() <= max_bytes:
+                return buffer.getvalue(), 'JPG'
+        if scale * 0.8 < floor:
+            # Smaller would make the text unreadable; send the best effort
+            return buffer.getvalue(), 'JPG'
+        scale *= 0.8
+
+
+def to_grayscale(image: Image.Image) -> np.ndarray:
+    """Return the image as a 2-D uint8 array with dark text on a light background."""
+    gray = np.asarray(image.convert('L'), dtype=np.uint8)
+    # Dark-theme screenshots: invert so text is always darker than the background
+    if np.median(gray) < 128:
+        gray = 255 - gray
+    return gray
+
+
+def adaptive_threshold(gray: np.ndarray, window: int = None, sensitivity: float = 0.15) -> np.ndarray:
+    """Bradley-Roth adaptive threshold computed with an integral image.
+
+    A pixel is text when it is darker than (1 - sensitivity) times the mean of
+    the window around it. Returns a boolean array, True for text pixels.
+    """
+    height, width = gray.shape
+    window = window or max(15, (min(height, width) // 16) | 1)
+    half = window // 2
+
+    integral = np.zeros((height + 1, width + 1), dtype=np.int64)
+    integral[1:, 1:] = gray.cumsum(axis=0, dtype=np.int64).cumsum(axis=1)
+
+    rows = np.arange(height)
+    cols = np.arange(width)
+    top = np.clip(rows - half, 0, height)[:, None]
+    bottom = np.clip(rows + half + 1, 0, height)[:, None]
+    left = np.clip(cols - half, 0, width)[None, :]
+    right = np.clip(cols + half + 1, 0, width)[None, :]
+
+    window_sum = integral[bottom, right] - integral[top, right] - integral[bottom, left] + integral[top, left]
+    window_area = (bottom - top) * (right - left)
+    return gray.astype(np.int64) * window_area < window_sum * (1.0 - sensitivity)
+
+
+def strip_rules(binary: np.ndarray, max_fill: float = 0.5) -> np.ndarray:
+    """Drop long horizontal/vertical lines (window frames, borders) that would merge text bands."""
+    cleaned = binary.copy()
+    cleaned[:, binary.mean(axis=0) > max_fill] = False
+    cleaned[binary.mean(axis=1) > max_fill, :] = False
+    return cleaned
+
+
+def line_bands(binary: np.ndarray, min_height: int = 2):
+    """Return (start, end) row ranges of horizontal text bands from the row projection profile."""
+    has_ink = strip_rules(binary).any(axis=1).astype(np.int8)
+    edges = np.diff(np.concatenate(([0], has_ink, [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+    return [(int(s), int(e)) for s, e in zip(starts, ends) if e - s >= min_height]
+
+
+def estimate_text_height(binary: np.ndarray) -> float:
+    """Median height in pixels of the text lines in a binarized image."""
+    bands = line_bands(binary)
+    if not bands:
+        return 0.0
+    return float(np.median([end - start for start, end in bands]))
+
+
+def estimate_image_text_height(image: Image.Image, max_side: int = 1600) -> float:
+    """Median text line height in pixels of a full image, estimated on a reduced copy."""
+    factor = max(1, int(np.ceil(max(image.size) / max_side)))
+    reduced = image.reduce(factor) if factor > 1 else image
+    return estimate_text_height(adaptive_threshold(to_grayscale(reduced))) * factor
+
+
+def estimate_skew_angle(binary: np.ndarray, max_angle: float = 5.0, step: float = 0.25,
+                        max_points: int = 200000) -> float:
+    """Estimate text skew in degrees by maximizing the variance of the projection profile.
+
+    Instead of rotating the image for every candidate angle, the coordinates of
+    the text pixels are projected directly, so each candidate is a single
+    vectorized bincount.
+    """
+    ys, xs = np.nonzero(binary)
+    if ys.size == 0:
+        return 0.0
+    if ys.size > max_points:
+        sample = np.random.default_rng(0).choice(ys.size, max_points, replace=False)
+        ys, xs = ys[sample], xs[sample]
+
+    angles = np.arange(-max_angle, max_angle + step / 2, step)
+    best_angle, best_score = 0.0, -1.0
+    for angle in angles:
+        projected = ys - xs * np.tan(np.radians(angle))
+        projected = np.round(projected - projected.min()).astype(np.int64)
+        score = np.bincount(projected).var()
+        if score > best_score:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def preprocess_for_ocr(image: Image.Image, deskew: bool = True) -> Image.Image:
+    """Grayscale, rescale only when text is too small or too large, deskew and binarize for OCR."""
+    gray = to_grayscale(image)
+    binary = adaptive_threshold(gray)
+
+    text_height = estimate_text_height(binary)
+    if 0 < text_height < MIN_TEXT_HEIGHT or text_height > MAX_TEXT_HEIGHT:
+        scale = min(MAX_UPSCALE, TARGET_TEXT_HEIGHT / text_height)
+        resized = Image.fromarray(gray).resize(
+            (round(gray.shape[1] * scale), round(gray.shape[0] * scale)),
+            Image.Resampling.LANCZOS
+        )
+        gray = np.asarray(resized)
+        binary = adaptive_threshold(gray)
+
+    result = Image.fromarray(np.where(binary, 0, 255).astype(np.uint8))
+    if deskew:
+        angle = estimate_skew_angle(binary)
+        if angle:
+            # PIL rotates counter-clockwise, which undoes a clockwise skew of the same angle
+            result = result.rotate(angle, resample=Image.Resampling.BILINEAR,
+                                   expand=True, fillcolor=255)
+    return result
+
+
+def preprocess_for_adaptive_ocr(image: Image.Image, fast_text_height: int = FAST_TEXT_HEIGHT):
+    """Prepare an image for a cheap first OCR pass plus targeted re-OCR of single lines.
+
+    Returns (fast, detail, scale): `fast` is the binarized, deskewed page with text
+    scaled down to about fast_text_height; `detail` is the deskewed grayscale page
+    at full resolution, for re-reading doubtful lines; a box in `fast` coordinates
+    times `scale` is the same region of `detail`.
+    """
+    gray = to_grayscale(image)
+    binary = adaptive_threshold(gray)
+
+    text_height = estimate_text_height(binary)
+    if 0 < text_height < MIN_TEXT_HEIGHT:
+        scale = min(MAX_UPSCALE, TARGET_TEXT_HEIGHT / text_height)
+        gray = np.asarray(Image.fromarray(gray).resize(
+            (round(gray.shape[1] * scale), round(gray.shape[0] * scale)),
+            Image.Resampling.LANCZOS
+        ))
+        binary = adaptive_threshold(gray)
+        text_height *= scale
+
+    fast = Image.fromarray(np.where(binary, 0, 255).astype(np.uint8))
+    detail = Image.fromarray(gray)
+    angle = estimate_skew_angle(binary)
+    if angle:
+        fast = fast.rotate(angle, resample=Image.Resampling.BILINEAR, expand=True, fillcolor=255)
+        detail = detail.rotate(angle, resample=Image.Resampling.BILINEAR, expand=True, fillcolor=255)
+
+    if text_height > fast_text_height:
+        factor = fast_text_height / text_height
+        fast = fast.resize((max(1, round(fast.width * factor)), max(1, round(fast.height * factor))),
+                           Image.Resampling.BOX)
+    return fast, detail, detail.width / fast.width
+
+
+def split_into_tiles(image: Image.Image, parts: int = 1, min_lines: int = TILE_MIN_LINES,
+                     max_lines: int = TILE_MAX_LINES, max_width: int = 1000):
+    """Cut an image between text lines into horizontal tiles of about equal line counts.
+
+    Text bands come from the row projection profile (on a copy reduced to
+    max_width for speed) and cuts fall midway through the gaps between them, so
+    no line is split. There are as many tiles as parts allows while keeping
+    min_lines per tile, and more when a tile would exceed max_lines. Tiles keep
+    the full width, so x coordinates stay comparable across tiles. Returns
+    [(tile, top)] where top is the tile's first row in image.
+    """
+    factor = max(1, int(np.ceil(image.width / max_width)))
+    reduced = image.reduce(factor) if factor > 1 else image
+    bands = line_bands(adaptive_threshold(to_grayscale(reduced)))
+    count = max(min(parts, len(bands) // min_lines), -(-len(bands) // max_lines), 1)
+    if count == 1:
+        return [(image, 0)]
+
+    cuts = [0]
+    for number in range(1, count):
+        index = round(number * len(bands) / count)
+        cuts.append((bands[index - 1][1] + bands[index][0]) // 2 * factor)
+    cuts.append(image.height)
+    return [(image.crop((0, top, image.width, bottom)), top) for top, bottom in zip(cuts, cuts[1:])]
+
@@ -0,0 +1,245 @@
+import hashlib
+import json
+import os
+import re
+import statistics
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class Rule(NamedTuple):
+    """One OCR fix-up.
+
+    kind is 'literal' (exact text), 'word' (exact text on word boundaries) or
+    'regex'. The replacement is always literal text; use lookarounds for context.
+    trigger lists the characters a regex match can start with, so the scanner
+    can skip everything else. Rules without `when` run over the whole text and
+    must not match across lines; a rule with `when` only runs on stripped lines
+    matching that regex.
+    """
+    pattern: str
+    replacement: str
+    kind: str = 'literal'
+    when: Optional[str] = None
+    trigger: Optional[str] = None
+
+
+# Literal and word rules run before regex rules; the longest literal wins
+DEFAULT_RULES = [
+    # Typographic characters OCR produces for ASCII code
+    Rule('›', '>'),
+    Rule('‹', '<'),
+    Rule('‘', "'"),
+    Rule('’', "'"),
+    Rule('“', '"'),
+    Rule('”', '"'),
+    Rule('—', '-'),
+    Rule('–', '-'),
+    Rule('…', '...'),
+    Rule('\t', '    '),  # Convert tabs to spaces (PEP 8)
+
+    # Keywords with a 1 read for an i/l, or split by a stray space
+    Rule('def1ne', 'define'),
+    Rule('pr1nt', 'print'),
+    Rule('wh1le', 'while'),
+    Rule('y1eld', 'yield'),
+    Rule('ra1se', 'raise'),
+    Rule('el1f', 'elif', 'word'),
+    Rule('ret urn', 'return', 'word'),
+    Rule('pass word', 'password', 'word'),
+    Rule('True1', 'True', 'word'),
+    Rule('False1', 'False', 'word'),
+    Rule('None1', 'None', 'word'),
+    Rule('class1', 'class', 'word'),
+
+    # '|' read for 'I' inside a word; a spaced-out '|' is a real operator
+    Rule(r'(?<=\w)\||\|(?=\w)', 'I', 'regex', trigger='|'),
+    # Spaces OCR inserts around punctuation, leaving indentation alone
+    Rule(r'(?<=[\w)\]]) +\.(?=[A-Za-z_])', '.', 'regex', trigger=' '),  # obj .attr, but not 'from . import'
+    Rule(r'(?<=\S) +,', ',', 'regex', trigger=' '),
+    Rule(r'(?<=[(\[{]) +', '', 'regex', trigger=' '),
+    Rule(r'(?<=\S) +(?=[)\]}])', '', 'regex', trigger=' '),
+
+    # Context-dependent fixes
+    Rule('1f', 'if', 'word', when=r'^1f\b'),
+    Rule('1n', 'in', 'word', when=r'\b(?:for|if|while|not)\b'),
+    Rule(r'\s{2,}', ' ', 'regex', when=r'^(?:from|import)\b'),  # Normalize import spacing
+]
+
+
+def load_rules(path: str) -> List[Rule]:
+    """Read extra rules from a JSON list of {"pattern", "replacement", "kind", "when", "trigger"} objects."""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [Rule(**entry) for entry in json.load(f)]
+
+
+def create_cleaner(rules_path: Optional[str] = None) -> 'TextCleaner':
+    """TextCleaner with the default rules followed by any from rules_path or $OPTIPY_OCR_RULES."""
+    rules_path = rules_path or os.environ.get('OPTIPY_OCR_RULES')
+    return TextCleaner(DEFAULT_RULES + (load_rules(rules_path) if rules_path else []))
+
+
+def layout_lines(lines: List[Dict]) -> str:
+    """Join OCR'd lines into text, restoring indentation from their bounding boxes.
+
+    Each line is a dict with 'text' and 'box' (left, top, right, bottom) and
+    optionally 'words' as (text, confidence, box) tuples. Engines drop leading
+    whitespace, so indentation is recovered from how far each line starts to
+    the right of the leftmost one, in units of the median character width.
+    """
+    lines = [line for line in lines if line['text'].strip()]
+    if not lines:
+        return ''
+    widths = [(box[2] - box[0]) / len(text.strip())
+              for line in lines for text, _, box in line.get('words', ())
+              if len(text.strip()) >= 2]
+    if not widths:
+        widths = [(line['box'][2] - line['box'][0]) / len(line['text'].strip()) for line in lines]
+    char_width = statistics.median(widths) or 1.0
+    left = min(line['box'][0] for line in lines)
+    return ''.join(
+        ' ' * max(0, round((line['box'][0] - left) / char_width)) + line['text'].strip() + '\n'
+        for line in lines
+    )
+
+
+def _is_word_char(char: str) -> bool:
+    return char.isalnum() or char == '_'
+
+
+class _RuleSet:
+    """Rules compiled into two scans: one alternation of literals, one of regexes.
+
+    The literal alternation has no groups, so the regex engine can jump between
+    occurrences of their first characters; replacements are looked up by the
+    matched text. Regex rules are named groups behind a lookahead on their
+    trigger characters when every rule declares one.
+    """
+
+    def __init__(self, rules: List[Rule]):
+        self.literals: Dict[str, Tuple[str, bool]] = {}
+        regex_rules = []
+        for rule in rules:
+            if rule.kind in ('literal', 'word'):
+                self.literals.setdefault(rule.pattern, (rule.replacement, rule.kind == 'word'))
+            elif rule.kind == 'regex':
+                re.compile(rule.pattern)  # Report bad patterns against the rule, not the combined regex
+                regex_rules.append(rule)
+            else:
+                raise ValueError(f"Unknown rule kind: {rule.kind!r}")
+
+        self.literal_pattern = None
+        if self.literals:
+            self.literal_pattern = re.compile('|'.join(
+                re.escape(text) for text in sorted(self.literals, key=len, reverse=True)
+            ))
+
+        self.regex_pattern = None
+        self.regex_replacements = {f'r{index}': rule.replacement for index, rule in enumerate(regex_rules)}
+        if regex_rules:
+            pattern = '|'.join(f'(?P<r{index}>{rule.pattern})' for index, rule in enumerate(regex_rules))
+            if all(rule.trigger for rule in regex_rules):
+                triggers = ''.join(sorted({char for rule in regex_rules for char in rule.trigger}))
+                pattern = f'(?=[{re.escape(triggers)}])(?:{pattern})'
+            self.regex_pattern = re.compile(pattern)
+
+    def _replace_literal(self, match) -> str:
+        replacement, whole_word = self.literals[match.group()]
+        if whole_word:
+            text, start, end = match.string, match.start(), match.end()
+            if (start > 0 and _is_word_char(text[start - 1])) or (end < len(text) and _is_word_char(text[end])):
+                return match.group()
+        return replacement
+
+    def may_match(self, text: str) -> bool:
+        """Cheap whole-text check: False means no line of text needs this rule set."""
+        if self.literal_pattern is not None and self.literal_pattern.search(text):
+            return True
+        return self.regex_pattern is not None and self.regex_pattern.search(text) is not None
+
+    def apply(self, text: str) -> str:
+        if self.literal_pattern is not None:
+            text = self.literal_pattern.sub(self._replace_literal, text)
+        if self.regex_pattern is not None:
+            text = self.regex_pattern.sub(lambda match: self.regex_replacements[match.lastgroup], text)
+        return text
+
+
+class TextCleaner:
+    """Cleans OCR output of Python code in one pass over its lines.
+
+    The rule table is compiled once. Rules without a `when` context run over
+    the whole text in two regex scans; rules sharing a context are compiled
+    together and only run on lines matching it. The line pass then fixes
+    indentation, duplicate lines and blank lines without rescanning, so
+    cleanup time grows linearly with the listing.
+    """
+
+    def __init__(self, rules: Optional[List[Rule]] = None):
+        rules = DEFAULT_RULES if rules is None else rules
+        # Identifies the rule table, so text cleaned with other rules is never reused
+        self.signature = hashlib.sha256(repr([tuple(rule) for rule in rules]).encode('utf-8')).hexdigest()[:16]
+        by_context: Dict[Optional[str], List[Rule]] = {}
+        for rule in rules:
+            by_context.setdefault(rule.when, []).append(rule)
+        general = by_context.pop(None, [])
+        self.general = _RuleSet(general) if general else None
+        self.contextual = [(re.compile(when), _RuleSet(group)) for when, group in by_context.items()]
+
+    def clean_line(self, content: str, contextual=None) -> str:
+        """Apply the context-dependent rules to one stripped line."""
+        for when, rule_set in self.contextual if contextual is None else contextual:
+            if when.search(content):
+                content = rule_set.apply(content)
+        return content
+
+    def clean(self, text: str) -> Optional[str]:
+        """Clean up extracted text as Python code: fix characters, indentation and blank lines."""
+        if not text:
+            return None
+        if self.general is not None:
+            text = self.general.apply(text)
+        # Skip context rules that cannot fire anywhere in this text
+        contextual = [(when, rule_set) for when, rule_set in self.contextual if rule_set.may_match(text)]
+
+        output = []
+        previous_content = None
+        pending_blank = False
+        in_decorators = False
+
+        for line in text.expandtabs(4).splitlines():
+            stripped = line.strip()
+            if not stripped:
+                pending_blank = bool(output)  # Collapse runs of blank lines, drop leading ones
+                continue
+
+            content = self.clean_line(stripped, contextual) if contextual else stripped
+            # OCR repeats a line when text regions overlap; repeats further apart
+            # (a closing ')', a second 'pass') are real code
+            if content == previous_content:
+                continue
+            previous_content = content
+
+            # Python indentation should be a multiple of 4 spaces
+            indent = len(line) - len(line.lstrip())
+            if indent > 0:
+                indent = ((indent + 2) // 4) * 4
+
+            is_decorator = content.startswith('@')
+            is_definition = content.startswith(('class ', 'def ', 'async def '))
+            if in_decorators and (is_decorator or is_definition):
+                pending_blank = False  # Keep decorators attached to their definition
+            elif (is_decorator or is_definition) and output and not output[-1].rstrip().endswith(':'):
+                # Two blank lines before top-level definitions, one before methods (PEP 8)
+                blanks = 2 if indent == 0 else 1
+                present = 0
+                while present < len(output) and output[-1 - present] == '\n':
+                    present += 1
+                output.extend(['\n'] * max(0, blanks - present - pending_blank))
+            if pending_blank:
+                output.append('\n')
+                pending_blank = False
+
+            in_decorators = is_decorator
+            output.append(' ' * indent + content + '\n')
+
+        return ''.join(output)
@@ -0,0 +1,234 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from PIL import Image
+
+from image_preprocessing import (MIN_TEXT_HEIGHT, estimate_image_text_height, load_image,
+                                 preprocess_for_adaptive_ocr, preprocess_for_ocr, shrink_for_upload,
+                                 split_into_tiles)
+from ocr_cleanup import layout_lines
+
+# Lines whose mean word confidence is below this are re-read at full resolution
+RECHECK_CONFIDENCE = 40
+# A re-read replaces the line only when it is this much more confident
+RECHECK_MARGIN = 10
+RECHECK_UPSCALE = 2.0
+PSM_SINGLE_LINE = 7
+
+# Free OCR.space demo key; set OCR_SPACE_API_KEY to use your own
+OCR_SPACE_DEMO_KEY = 'K82580810488957'
+
+
+def _place(lines: List[Dict], top: int = 0, scale: float = 1.0) -> List[Dict]:
+    """Map line and word boxes from a tile or resized upload back to page coordinates"""
+    def box(b):
+        return (round(b[0] * scale), round(b[1] * scale) + top, round(b[2] * scale), round(b[3] * scale) + top)
+    return [dict(line, box=box(line['box']), words=[(text, conf, box(b)) for text, conf, b in line['words']])
+            for line in lines]
+
+
+class TesseractEngine:
+    """Local Tesseract OCR: a cheap pass over the page, then re-reads of doubtful lines.
+
+    With adaptive=False the whole page is OCR'd once at full resolution instead.
+    With tiled=True (the default) tall pages are cut between text lines and the
+    tiles are OCR'd in parallel, so large screenshots scale with the pool size.
+    """
+
+    name = 'tesseract'
+
+    def __init__(self, tesseract_cmd=None, tessdata_path=None, pool_size=None, adaptive=True, tiled=True):
+        from tesseract_engine import TesseractPool  # Needs pytesseract, which OCR.space-only installs may lack
+
+        # Long-lived Tesseract workers; the executable is found via tesseract_cmd,
+        # $TESSERACT_CMD, PATH or the usual install locations
+        self.pool = TesseractPool(size=pool_size, tesseract_cmd=tesseract_cmd, tessdata_path=tessdata_path)
+        self.adaptive = adaptive
+        self.tiled = tiled
+        # Tiles of one tall page; separate from the pool's executor, whose workers may be
+        # busy running read() itself
+        self._tiles = ThreadPoolExecutor(max_workers=self.pool.size, thread_name_prefix='tesseract-tile')
+        self._stats = {'images': 0, 'single_pass_images': 0, 'lines': 0, 'rechecked_lines': 0, 'replaced_lines': 0}
+        self._stats_lock = threading.Lock()
+
+    def read(self, image_bytes, cancelled=None):
+        """OCR one image to raw text; once cancelled is set, remaining line re-reads are skipped"""
+        if not self.adaptive:
+            return self.pool.image_to_string(preprocess_for_ocr(load_image(image_bytes)))
+
+        fast, detail, scale = preprocess_for_adaptive_ocr(load_image(image_bytes))
+        lines = self._read_tiles(fast)
+        rechecked = replaced = 0
+        for index, line in enumerate(lines):
+            if cancelled is not None and cancelled.is_set():
+                break
+            if line['confidence'] < RECHECK_CONFIDENCE:
+                rechecked += 1
+                reread = self._reread_line(line, detail, scale)
+                if reread is not None:
+                    lines[index] = reread
+                    replaced += 1
+        with self._stats_lock:
+            self._stats['images'] += 1
+            self._stats['single_pass_images'] += rechecked == 0
+            self._stats['lines'] += len(lines)
+            self._stats['rechecked_lines'] += rechecked
+            self._stats['replaced_lines'] += replaced
+        return layout_lines(lines)
+
+    def read_many(self, images):
+        """OCR several images on the pool; failed images yield None, results keep input order"""
+        futures = [self.pool.submit_task(self.read, image_bytes) for image_bytes in images]
+        texts = []
+        for future in futures:
+            try:
+                texts.append(future.result())
+            except Exception as e:
+                print(f"Error during extraction: {str(e)}")
+                texts.append(None)
+        return texts
+
+    def _read_tiles(self, image):
+        """OCR a page as tiles of whole lines, in parallel up to one per worker"""
+        tiles = split_into_tiles(image, parts=self.pool.size) if self.tiled else [(image, 0)]
+        if len(tiles) == 1:
+            return self.pool.image_to_lines(image)
+        futures = [self._tiles.submit(self.pool.image_to_lines, tile) for tile, _ in tiles]
+        return [line for (_, top), future in zip(tiles, futures) for line in _place(future.result(), top)]
+
+    def _reread_line(self, line, detail, scale):
+        """OCR one line again from the full-resolution page; None unless it is clearly better"""
+        left, top, right, bottom = (round(v * scale) for v in line['box'])
+        pad = max(4, (bottom - top) // 3)
+        crop = detail.crop((max(0, left - pad), max(0, top - pad),
+                            min(detail.width, right + pad), min(detail.height, bottom + pad)))
+        crop = crop.resize((round(crop.width * RECHECK_UPSCALE), round(crop.height * RECHECK_UPSCALE)),
+                           Image.Resampling.LANCZOS)
+        words = [word for reread in self.pool.image_to_lines(crop, psm=PSM_SINGLE_LINE)
+                 for word in reread['words']]
+        if not words:
+            return None
+        confidence = sum(conf for _, conf, _ in words) / len(words)
+        if confidence < line['confidence'] + RECHECK_MARGIN:
+            return None
+        # Keep the first pass's geometry so indentation is measured on one scale
+        return dict(line, text=' '.join(text for text, _, _ in words) + '\n', confidence=confidence)
+
+    def stats(self):
+        """How many images and lines were OCR'd, and how many lines needed a second read"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['recheck_rate'] = stats['rechecked_lines'] / stats['lines'] if stats['lines'] else 0.0
+        return stats
+
+    def close(self):
+        self._tiles.shutdown()
+        self.pool.close()
+
+
+class OCRSpaceEngine:
+    """OCR.space web API, with lines laid out from the text overlay."""
+
+    name = 'ocr_space'
+
+    def __init__(self, client=None):
+        if client is None:
+            from ocr_space_client import OCRSpaceClient, OCR_SPACE_URL  # Needs requests
+
+            # Shared pooled client: keep-alive connections, timeouts and retries on 429/5xx
+            client = OCRSpaceClient(api_key=os.environ.get('OCR_SPACE_API_KEY', OCR_SPACE_DEMO_KEY),
+                                    api_url=os.environ.get('OCR_SPACE_URL', OCR_SPACE_URL))
+        self.client = client
+
+    def read(self, image_bytes, cancelled=None):
+        """OCR one image to raw text; once cancelled is set, the slow scale=true retry is skipped.
+
+        Screenshots with more than TILE_MAX_LINES lines are uploaded as tiles in
+        parallel, since one huge request is slow and may time out upstream.
+        """
+        tiles = split_into_tiles(load_image(image_bytes))
+        if len(tiles) > 1:
+            tile_lines = self._read_lines([_png(tile) for tile, _ in tiles])
+            if any(lines is None for lines in tile_lines):
+                raise RuntimeError(f"OCR failed for {tile_lines.count(None)} of {len(tiles)} tiles")
+            return layout_lines([line for (_, top), lines in zip(tiles, tile_lines) for line in _place(lines, top)])
+
+        upload_bytes, filetype, options = self._prepare_upload(image_bytes)
+        lines = self.client.extract_lines(upload_bytes, filetype=filetype, **options)
+        if not lines and options['scale'] == 'false' and not (cancelled is not None and cancelled.is_set()):
+            # Nothing recognised without server-side upscaling: pay for the slow pass
+            lines = self.client.extract_lines(upload_bytes, filetype=filetype, scale='true')
+        return layout_lines(lines)
+
+    def read_many(self, images):
+        """OCR several images concurrently; failed images yield None, results keep input order"""
+        return [layout_lines(lines) if lines is not None else None for lines in self._read_lines(images)]
+
+    def _read_lines(self, images):
+        """Lines of several images in their own pixel coordinates, uploaded concurrently"""
+        results = [None] * len(images)
+        # OCR.space takes one file type and option set per request, so batch the images by both
+        uploads = {}
+        for index, image_bytes in enumerate(images):
+            upload_bytes, filetype, options = self._prepare_upload(image_bytes)
+            uploads.setdefault((filetype, options['scale']), []).append((index, upload_bytes))
+        for (filetype, scale), batch in uploads.items():
+            batch_lines = self.client.extract_all_lines([upload for _, upload in batch],
+                                                        filetype=filetype, scale=scale)
+            # Nothing recognised without server-side upscaling: pay for the slow pass
+            empty = [number for number, lines in enumerate(batch_lines) if lines == [] and scale == 'false']
+            if empty:
+                retried = self.client.extract_all_lines([batch[number][1] for number in empty],
+                                                        filetype=filetype, scale='true')
+                for number, lines in zip(empty, retried):
+                    batch_lines[number] = lines
+            for (index, upload_bytes), lines in zip(batch, batch_lines):
+                if lines is not None and upload_bytes is not images[index]:
+                    # Shrunk for upload: scale boxes back so tiles line up
+                    lines = _place(lines, scale=_width(images[index]) / _width(upload_bytes))
+                results[index] = lines
+        return results
+
+    def _prepare_upload(self, image_bytes):
+        """Shrink an image for upload and choose OCR options from its text size.
+
+        OCR.space's scale=true upscales on the server, which is slow and only pays
+        off for small text, so it is requested only when lines are shorter than
+        MIN_TEXT_HEIGHT pixels.
+        """
+        upload_bytes, filetype = shrink_for_upload(image_bytes)
+        text_height = estimate_image_text_height(load_image(upload_bytes))
+        small_text = 0 < text_height < MIN_TEXT_HEIGHT
+        return upload_bytes, filetype, {'scale': 'true' if small_text else 'false'}
+
+    def close(self):
+        self.client.close()
+
+
+def _png(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def _width(image_bytes):
+    with Image.open(io.BytesIO(image_bytes)) as header:
+        return header.width
+
+
+ENGINES = {engine.name: engine for engine in (TesseractEngine, OCRSpaceEngine)}
+
+
+def engine_names(names=None) -> List[str]:
+    """Engines to run, from names or $OPTIPY_OCR_ENGINES ('tesseract,ocr_space'); [] means pick one automatically"""
+    if names is None:
+        names = os.environ.get('OPTIPY_OCR_ENGINES')
+    if isinstance(names, str):
+        names = [name.strip() for name in names.split(',') if name.strip()]
+    unknown = [name for name in names or [] if name not in ENGINES]
+    if unknown:
+        raise ValueError(f"Unknown OCR engine(s) {', '.join(unknown)}; choose from {', '.join(ENGINES)}")
+    return list(dict.fromkeys(names or []))
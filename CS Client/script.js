@@ -239,11 +239,27 @@ function updateChanges(changes) {
     // Create and append list items with styling
     changes.forEach((change, index) => {
         const li = document.createElement('li');
-        li.textContent = change;
         li.style.fontWeight = 'normal';
         li.style.marginLeft = '2em';
         li.style.fontSize = '16px';
 
+        // Error details are plain messages; changes are records from refactor_code(detailed=True)
+        if (typeof change === 'string') {
+            li.textContent = change;
+        } else {
+            li.textContent = change.line ? `Line ${change.line}: ${change.message}` : change.message;
+            if (change.rule) {
+                const details = document.createElement('div');
+                details.style.fontSize = '13px';
+                details.style.color = '#7f8c8d';
+                const estimate = change.runtime_delta_s === null
+                    ? 'no cost estimate'
+                    : `Δ runtime ${formatDelta(change.runtime_delta_s)} s, Δ energy ${formatDelta(change.energy_delta_kwh)} kWh`;
+                details.textContent = `${change.rule} · ${estimate}`;
+                li.appendChild(details);
+            }
+        }
+
         revisionsBox1.appendChild(li);
 
     });
@@ -270,6 +286,10 @@ function toScientificWithSuperscript(num, digits = 6) {
     return `${mantissa} × 10${expStr}`;
 }
 
+function formatDelta(value) {
+    return (value > 0 ? '+' : value < 0 ? '−' : '') + toScientificWithSuperscript(Math.abs(value), 2);
+}
+
 function getResultHTML(value, unit) {
     if (value > 0) {
         return `<span style="color:#27ae60;"><span style='font-size:1.1em;'>▲</span> ${toScientificWithSuperscript(value)} ${unit}</span>`;
@@ -319,6 +339,8 @@ function updateMetrics(metrics) {
                 <li><i class="mdi mdi-timer"></i><b>TIME:</b> ${metrics.optimized.time_complexity}</li>
                 <li><i class="mdi mdi-exponent-box" style="color:#edbe25"></i><b>SPACE:</b> ${metrics.optimized.space_complexity}</li>
                 <li><i class="mdi mdi-matrix" style="color:#1A79E9"></i><b>CYCLOMATIC:</b> ${metrics.optimized.cyclomatic_complexity}</li>
+                <li><i class="mdi mdi-repeat"></i><b>OPS PER ITERATION:</b> ${metrics.original.bytecode_ops_per_iteration ?? '-'} &rarr; ${metrics.optimized.bytecode_ops_per_iteration ?? '-'}</li>
+                <li><i class="mdi mdi-lightning-bolt"></i><b>NATIVE ARRAY OPS:</b> ${metrics.original.native_ops ?? '-'} &rarr; ${metrics.optimized.native_ops ?? '-'}</li>
             `;
         }
     }
@@ -468,13 +490,13 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 function handleImageUpload(event) {
-    const uploadedFile = event.target.files?.[0] || null;
-    if (!uploadedFile) {
+    const uploadedFiles = Array.from(event.target.files || []);
+    if (uploadedFiles.length === 0) {
         console.log('No file selected');
         return;
     }
 
-    console.log('Uploading file:', uploadedFile.name, 'Size:', uploadedFile.size);
+    uploadedFiles.forEach(file => console.log('Uploading file:', file.name, 'Size:', file.size));
     console.log('Input editor available:', !!window.inputEditor);
     console.log('Output editor available:', !!window.outputEditor);
     
@@ -487,7 +509,8 @@ function handleImageUpload(event) {
     }
     
     const formData = new FormData();
-    formData.append('file', uploadedFile);
+    // Several screenshots or a multi-page PDF are OCR'd page by page and stitched in order
+    uploadedFiles.forEach(file => formData.append('file', file));
 
     fetch('http://127.0.0.1:5000/image-to-code', {
         method: 'POST',
@@ -512,6 +535,9 @@ function handleImageUpload(event) {
             }
         } else if (data.code) {
             console.log('Extracted code:', data.code);
+            if (data.pages) {
+                data.pages.forEach(page => console.log(`OCR ${page.source} page ${page.page}: ${page.seconds}s${page.cached ? ' (cached)' : ''}`));
+            }
             // Set the extracted code in the input editor
             setCodeInInputEditor(data.code);
             
@@ -73,45 +73,20 @@ class StaticCodeAnalyzer:
             except SyntaxError as e:
                 return {"error": f"Invalid syntax: {str(e)}"}
             
-            # Consolidated analysis in single pass for better performance
-            consolidated_analyzer = ConsolidatedAnalyzer()
-            consolidated_analyzer.visit(tree)
-            
-            # Finalize complexity analysis
-            consolidated_analyzer._finalize_complexity_analysis()
-            
-            # Get results from consolidated analyzer
-            time_complexity = consolidated_analyzer.get_time_complexity()
-            space_complexity = consolidated_analyzer.get_space_complexity()
-            cyclomatic_complexity = consolidated_analyzer.get_cyclomatic_complexity()
-            smells = consolidated_analyzer.get_smells()
-            
-            # Separate analyzers for metrics that need different approaches
-            halstead_analyzer = HalsteadAnalyzer()
-            halstead_analyzer.analyze(code)
-            
-            bytecode_analyzer = BytecodeAnalyzer()
-            bytecode_ops = bytecode_analyzer.analyze(code)
-            
-            # GPU detection
-            gpu_usage = self._detect_gpu_usage(tree)
-            
-            # Calculate metrics
-            halstead_volume = halstead_analyzer.get_volume()
+            measured = self._measure(code, tree, input_size_n)
+            time_complexity = measured['time_complexity']
+            space_complexity = measured['space_complexity']
+            cyclomatic_complexity = measured['cyclomatic_complexity']
+            smells = measured['smells']
+            halstead_volume = measured['halstead_volume']
+            bytecode_ops = measured['bytecode_ops']
+            loop_bytecode_ops = measured['loop_bytecode_ops']
+            native_ops = measured['native_ops']
+            gpu_usage = measured['gpu_usage']
             smells_count = len(smells)
-            
-            # Estimate operations with improved accuracy
-            total_ops = self._estimate_operations(
-                halstead_volume, bytecode_ops, time_complexity, 
-                input_size_n, smells_count, smells, gpu_usage
-            )
-            
-            # Calculate runtime and energy with hardware components
-            runtime_s = (total_ops / self.flops_per_sec) * self.python_overhead
-            energy_kwh = self._calculate_energy(
-                code, runtime_s, cyclomatic_complexity, 
-                space_complexity, smells, gpu_usage, input_size_n
-            )
+            total_ops = measured['total_ops']
+            runtime_s = measured['runtime_s']
+            energy_kwh = measured['energy_kwh']
             
             # Get carbon intensity with improved error handling
             carbon_intensity = self._get_carbon_intensity(lat, lon)
@@ -155,6 +130,8 @@ class StaticCodeAnalyzer:
                     "cyclomatic_complexity": cyclomatic_complexity,
                     "halstead_volume": halstead_volume,
                     "bytecode_ops": bytecode_ops,
+                    "bytecode_ops_per_iteration": loop_bytecode_ops,
+                    "native_ops": native_ops,
                     "smells_count": smells_count
                 },
                 "estimated": {
@@ -172,7 +149,7 @@ class StaticCodeAnalyzer:
                     "categories": {
                         "energy_eff": 1.0 if eco_score > 70 else 0.5,
                         "resource": 1.0 if space_complexity == "O(1)" else 0.7,
-                        "io": 1.2 if any('io' in smell for smell in smells) else 1.0
+                        "io": 1.2 if any(smell.startswith('io') for smell in smells) else 1.0
                     }
                 },
                 "confidence": confidence,
@@ -190,6 +167,77 @@ class StaticCodeAnalyzer:
             logging.error(f"Analysis error: {str(e)}")
             return {"error": f"Analysis failed: {str(e)}"}
     
+    def estimate_cost(self, code: str, input_size_n: int = 1000000) -> Optional[Dict[str, float]]:
+        """Estimated runtime (s) and energy (kWh) of one run of code, or None if it does not parse.
+
+        The model analyze_code uses, without rate limiting, the carbon
+        intensity lookup or the report, so it is cheap enough to score
+        every candidate rewrite.
+        """
+        try:
+            tree = ast.parse(code)
+        except (SyntaxError, ValueError):
+            return None
+        measured = self._measure(code, tree, input_size_n)
+        return {'runtime_s': measured['runtime_s'], 'energy_kwh': measured['energy_kwh']}
+
+    def _measure(self, code: str, tree: ast.AST, input_size_n: int) -> Dict[str, Any]:
+        """Static metrics of code and the operations, runtime and energy they add up to"""
+        # Consolidated analysis in single pass for better performance
+        consolidated_analyzer = ConsolidatedAnalyzer()
+        consolidated_analyzer.visit(tree)
+        
+        # Finalize complexity analysis
+        consolidated_analyzer._finalize_complexity_analysis()
+        
+        # Get results from consolidated analyzer
+        time_complexity = consolidated_analyzer.get_time_complexity()
+        space_complexity = consolidated_analyzer.get_space_complexity()
+        cyclomatic_complexity = consolidated_analyzer.get_cyclomatic_complexity()
+        smells = consolidated_analyzer.get_smells()
+        
+        # Separate analyzers for metrics that need different approaches
+        halstead_analyzer = HalsteadAnalyzer()
+        halstead_analyzer.analyze(code)
+        
+        bytecode_analyzer = BytecodeAnalyzer()
+        bytecode_ops = bytecode_analyzer.analyze(code)
+        loop_bytecode_ops = bytecode_analyzer.analyze_loops(code, tree)
+        native_ops = consolidated_analyzer.native_ops
+        
+        # GPU detection
+        gpu_usage = self._detect_gpu_usage(tree)
+        
+        # Calculate metrics
+        halstead_volume = halstead_analyzer.get_volume()
+        
+        # Estimate operations with improved accuracy
+        total_ops = self._estimate_operations(
+            halstead_volume, bytecode_ops, time_complexity, 
+            input_size_n, len(smells), smells, gpu_usage, loop_bytecode_ops, native_ops
+        )
+        
+        # Calculate runtime and energy with hardware components
+        runtime_s = (total_ops / self.flops_per_sec) * self.python_overhead
+        energy_kwh = self._calculate_energy(
+            code, runtime_s, cyclomatic_complexity, 
+            space_complexity, smells, gpu_usage, input_size_n
+        )
+        return {
+            'time_complexity': time_complexity,
+            'space_complexity': space_complexity,
+            'cyclomatic_complexity': cyclomatic_complexity,
+            'smells': smells,
+            'halstead_volume': halstead_volume,
+            'bytecode_ops': bytecode_ops,
+            'loop_bytecode_ops': loop_bytecode_ops,
+            'native_ops': native_ops,
+            'gpu_usage': gpu_usage,
+            'total_ops': total_ops,
+            'runtime_s': runtime_s,
+            'energy_kwh': energy_kwh,
+        }
+
     def _detect_gpu_usage(self, tree: ast.AST) -> bool:
         """Detect potential GPU usage by checking for ML framework imports."""
         for node in ast.walk(tree):
@@ -249,7 +297,8 @@ class StaticCodeAnalyzer:
     
     def _estimate_operations(self, halstead_volume: float, bytecode_ops: int, 
                            time_complexity: str, input_size_n: int, 
-                           smells_count: int, smells: List[str], gpu_usage: bool) -> float:
+                           smells_count: int, smells: List[str], gpu_usage: bool,
+                           loop_bytecode_ops: int = 0, native_ops: int = 0) -> float:
         """Estimate total operations from static metrics with improved accuracy."""
         # Base operations from Halstead volume
         # base_ops: Halstead volume divided by 10 to normalize to operation count (empirical scaling)
@@ -261,6 +310,9 @@ class StaticCodeAnalyzer:
         # Bytecode operations weighted by complexity
         # bytecode_ops_weighted: Scale by complexity multiplier to account for loops executing ops multiple times
         bytecode_ops_weighted = bytecode_ops * complexity_multiplier * 1.2  # 1.2 factor for average cycle cost of Python bytecode (from dis benchmarks)
+        if loop_bytecode_ops or native_ops:
+            # Only the loop bodies repeat; code outside them runs once
+            bytecode_ops_weighted = (bytecode_ops + loop_bytecode_ops * (complexity_multiplier - 1)) * 1.2
         
         # Smell penalties with weighted impact
         smell_penalty = 0
@@ -279,10 +331,16 @@ class StaticCodeAnalyzer:
         if gpu_usage:
             gpu_ops = input_size_n * 0.1  # Assume 10% of operations are GPU-accelerated
         
-        return base_ops + bytecode_ops_weighted + complexity_multiplier + smell_penalty + gpu_ops
+        # NumPy/pandas operations: one pass over N elements each in compiled code, not N interpreted iterations
+        native_work = native_ops * input_size_n
+        
+        return base_ops + bytecode_ops_weighted + complexity_multiplier + smell_penalty + gpu_ops + native_work
     
     def _get_complexity_multiplier(self, time_complexity: str, input_size_n: int) -> float:
         """Convert Big O notation to operation count with improved parsing."""
+        # A list scanned inside the loops: M is taken to be of the order of N
+        if "*M)" in time_complexity:
+            return self._get_complexity_multiplier(time_complexity.replace("*M)", ")"), input_size_n) * input_size_n
         # Use regex to extract exponents from complexity strings
         if "O(1)" in time_complexity:
             return 1
@@ -388,15 +446,19 @@ class StaticCodeAnalyzer:
         for smell in smells:
             if 'string_concat' in smell:
                 suggestions.append("Use ''.join() instead of += in loops to save ~40% energy")
-            elif 'io' in smell:
+            elif smell.startswith('io'):
                 suggestions.append("Consider caching I/O results to reduce repeated operations")
             elif 'global' in smell:
                 suggestions.append("Avoid global variables; use local scope for better performance")
             elif 'nested_loop' in smell:
                 suggestions.append("Consider using more efficient algorithms or data structures")
+            elif 'sequence_membership' in smell:
+                suggestions.append("Test membership against a set instead of a list or tuple inside loops")
         
         if "O(N^2)" in time_complexity or "O(N^3)" in time_complexity:
             suggestions.append("Consider optimizing algorithm complexity for better energy efficiency")
+        if "O(2^N)" in time_complexity:
+            suggestions.append("Cache the results of pure recursive functions (functools.lru_cache) or compute them bottom-up")
         
         if not suggestions:
             suggestions.append("Code appears well-optimized for energy efficiency")
@@ -442,6 +504,13 @@ class StaticCodeAnalyzer:
 class ConsolidatedAnalyzer(ast.NodeVisitor):
     """Consolidated AST visitor for complexity analysis and smell detection."""
     
+    ARRAY_MODULES = ('numpy', 'pandas')
+    # Array methods and NumPy functions that reduce to a scalar
+    SCALAR_RESULTS = {'sum', 'prod', 'max', 'min', 'mean', 'median', 'std', 'var', 'dot', 'count_nonzero',
+                      'argmax', 'argmin', 'any', 'all', 'item', 'tolist'}
+    # pandas methods that call a Python function once per row or element
+    PER_ELEMENT_CALLS = {'apply', 'applymap', 'map', 'transform', 'agg', 'aggregate'}
+    
     def __init__(self):
         # Complexity tracking
         self.time_complexity = "O(1)"
@@ -467,6 +536,21 @@ class ConsolidatedAnalyzer(ast.NodeVisitor):
         self.global_vars = set()
         self.recursive_calls = set()
         self.function_names = set()
+        # Calls a function makes to itself, and functions whose results are cached
+        self.self_call_sites = {}
+        self.memoized_functions = set()
+        self.enclosing_functions = []
+        
+        # Membership tests that scan a list: `x in some_list` inside a loop is O(M) per test
+        self.list_names = set()
+        # Strings grown with += inside a loop are copied on every iteration
+        self.str_names = set()
+        self.linear_scan_depth = 0
+        
+        # NumPy/pandas operations outside loops: each is O(N) work done natively, counted in native_ops
+        self.array_modules = set()
+        self.array_names = set()
+        self.native_ops = 0
         
     def visit_For(self, node):
         self.loop_depth += 1
@@ -518,6 +602,16 @@ class ConsolidatedAnalyzer(ast.NodeVisitor):
         self.generic_visit(node)
     
     def visit_ListComp(self, node):
+        # Builds a list of N items wherever it appears, even when only passed to sum() and the like
+        if self.space_complexity == "O(1)":
+            self.space_complexity = "O(N)"
+        self.loop_depth += 1
+        self.max_loop_depth = max(self.max_loop_depth, self.loop_depth)
+        self.generic_visit(node)
+        self.loop_depth -= 1
+    
+    def visit_GeneratorExp(self, node):
+        # Iterates like a list comprehension but holds one item at a time
         self.loop_depth += 1
         self.max_loop_depth = max(self.max_loop_depth, self.loop_depth)
         self.generic_visit(node)
@@ -527,6 +621,23 @@ class ConsolidatedAnalyzer(ast.NodeVisitor):
         # Check for space complexity
         for target in node.targets:
             if isinstance(target, ast.Name):
+                if (self.in_loop and target.id in self.str_names and isinstance(node.value, ast.BinOp) and
+                        isinstance(node.value.op, ast.Add) and isinstance(node.value.left, ast.Name) and
+                        node.value.left.id == target.id):
+                    # s = s + x copies s like s += x does
+                    self.linear_scan_depth = max(self.linear_scan_depth, self.loop_depth)
+                if self._builds_list(node.value):
+                    self.list_names.add(target.id)
+                else:
+                    self.list_names.discard(target.id)
+                if self._builds_str(node.value):
+                    self.str_names.add(target.id)
+                else:
+                    self.str_names.discard(target.id)
+                if self._is_array(node.value):
+                    self.array_names.add(target.id)
+                else:
+                    self.array_names.discard(target.id)
                 if self.in_loop:
                     self.space_complexity = "O(N)"
                 # Check for global variables
@@ -543,10 +654,79 @@ class ConsolidatedAnalyzer(ast.NodeVisitor):
         
         self.generic_visit(node)
     
+    def visit_Compare(self, node):
+        # A membership test against a list scans it on every iteration
+        if self.loop_depth:
+            for op, comparator in zip(node.ops, node.comparators):
+                if isinstance(op, (ast.In, ast.NotIn)) and (
+                        isinstance(comparator, ast.ListComp) or
+                        (isinstance(comparator, ast.Name) and comparator.id in self.list_names)):
+                    self.linear_scan_depth = max(self.linear_scan_depth, self.loop_depth)
+                elif isinstance(op, (ast.In, ast.NotIn)) and isinstance(comparator, (ast.List, ast.Tuple)):
+                    # A short literal, but still compared item by item where a set would hash once
+                    self.smells.append('sequence_membership')
+        elif any(self._is_array(operand) for operand in [node.left] + node.comparators):
+            self.native_ops += 1
+        self.generic_visit(node)
+    
+    def visit_BinOp(self, node):
+        if not self.loop_depth and (self._is_array(node.left) or self._is_array(node.right)):
+            self.native_ops += 1
+        self.generic_visit(node)
+    
+    def _array_root(self, node) -> bool:
+        """Whether an attribute/subscript chain starts at a NumPy/pandas module or array name"""
+        while isinstance(node, (ast.Attribute, ast.Subscript)):
+            node = node.value
+        return isinstance(node, ast.Name) and (node.id in self.array_modules or node.id in self.array_names)
+    
+    def _is_array(self, node) -> bool:
+        """Whether node evaluates to a NumPy array or pandas object (rather than a scalar)"""
+        if isinstance(node, ast.Name):
+            return node.id in self.array_names
+        if isinstance(node, ast.Subscript):
+            return self._array_root(node)
+        if isinstance(node, ast.BinOp):
+            return self._is_array(node.left) or self._is_array(node.right)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute):
+            return node.func.attr not in self.SCALAR_RESULTS and self._array_root(node.func)
+        return False
+    
+    def _builds_list(self, value) -> bool:
+        """Whether value creates a list or tuple of unknown size"""
+        if isinstance(value, (ast.List, ast.Tuple, ast.ListComp)):
+            return True
+        if isinstance(value, ast.Call):
+            if isinstance(value.func, ast.Name):
+                return value.func.id in ('list', 'sorted', 'tuple')
+            if isinstance(value.func, ast.Attribute):
+                return value.func.attr in ('split', 'rsplit', 'splitlines', 'readlines')
+        return False
+    
+    def _builds_str(self, value) -> bool:
+        """Whether value is a string literal, f-string, str() or str.join() call, or adds to one"""
+        if isinstance(value, ast.Name):
+            return value.id in self.str_names
+        if isinstance(value, ast.BinOp) and isinstance(value.op, ast.Add):
+            return self._builds_str(value.left) or self._builds_str(value.right)
+        if isinstance(value, ast.Constant):
+            return isinstance(value.value, str)
+        if isinstance(value, ast.JoinedStr):
+            return True
+        if isinstance(value, ast.Call):
+            if isinstance(value.func, ast.Name):
+                return value.func.id == 'str'
+            if isinstance(value.func, ast.Attribute):
+                return value.func.attr == 'join'
+        return False
+    
     def visit_AugAssign(self, node):
         # Check for string concatenation in loops
         if self.in_loop and isinstance(node.op, ast.Add):
             self.smells.append('string_concat')
+            if isinstance(node.target, ast.Name) and node.target.id in self.str_names:
+                # Each += copies the string built so far, which grows to M characters
+                self.linear_scan_depth = max(self.linear_scan_depth, self.loop_depth)
         self.generic_visit(node)
     
     def visit_Global(self, node):
@@ -557,17 +737,30 @@ class ConsolidatedAnalyzer(ast.NodeVisitor):
     
     def visit_FunctionDef(self, node):
         self.function_names.add(node.name)
+        if any(self._is_memoizing(decorator) for decorator in node.decorator_list):
+            self.memoized_functions.add(node.name)
+        outer = self.current_function
         self.current_function = node.name
+        self.enclosing_functions.append(node.name)
         self.in_function = True
         self.generic_visit(node)
-        self.in_function = False
-        self.current_function = None
+        self.enclosing_functions.pop()
+        self.in_function = outer is not None
+        self.current_function = outer
+    
+    def _is_memoizing(self, decorator) -> bool:
+        """Whether decorator is functools.cache / lru_cache, called or not"""
+        if isinstance(decorator, ast.Call):
+            decorator = decorator.func
+        name = decorator.attr if isinstance(decorator, ast.Attribute) else getattr(decorator, 'id', None)
+        return name in ('cache', 'lru_cache')
     
     def visit_Call(self, node):
-        # Check for recursive calls
-        if isinstance(node.func, ast.Name) and node.func.id in self.function_names:
+        # Check for recursive calls: a call to a function from inside its own body
+        if isinstance(node.func, ast.Name) and node.func.id in self.enclosing_functions:
             self.recursive_calls.add(node.func.id)
             self.smells.append('recursion')
+            self.self_call_sites[node.func.id] = self.self_call_sites.get(node.func.id, 0) + 1
         
         # Check for I/O operations
         if isinstance(node.func, ast.Name):
@@ -576,14 +769,32 @@ class ConsolidatedAnalyzer(ast.NodeVisitor):
         elif isinstance(node.func, ast.Attribute):
             if node.func.attr in ['get', 'post', 'put', 'delete']:
                 self.smells.append('io_operations')
+            if self._calls_per_element(node):
+                # An interpreted loop over the rows in all but name
+                if self.time_complexity == "O(1)":
+                    self.time_complexity = "O(N)"
+                self.loop_depth += 1
+                self.max_loop_depth = max(self.max_loop_depth, self.loop_depth)
+                self.generic_visit(node)
+                self.loop_depth -= 1
+                return
+            if not self.loop_depth and self._array_root(node.func):
+                self.native_ops += 1
         
         self.generic_visit(node)
     
+    def _calls_per_element(self, node) -> bool:
+        """Whether node is df.apply(lambda ...) and the like on a NumPy/pandas object"""
+        return (node.func.attr in self.PER_ELEMENT_CALLS and self._array_root(node.func) and
+                any(isinstance(arg, ast.Lambda) for arg in node.args))
+    
     def visit_Import(self, node):
         # Check for ML framework imports
         for alias in node.names:
             if alias.name in ['torch', 'tensorflow', 'cupy', 'jax']:
                 self.smells.append('ml_framework')
+            if alias.name in self.ARRAY_MODULES:
+                self.array_modules.add(alias.asname or alias.name)
     
     def visit_ImportFrom(self, node):
         if node.module in ['torch', 'tensorflow', 'cupy', 'jax']:
@@ -671,9 +882,16 @@ class ConsolidatedAnalyzer(ast.NodeVisitor):
     
     def _analyze_recursive_complexity(self):
         """Analyze complexity for recursive functions."""
-        if self.recursive_calls:
+        recursive = self.recursive_calls - self.memoized_functions
+        if not recursive:
+            # Memoized: each distinct argument is computed once
+            self.time_complexity = "O(N)"
+        elif any(self.self_call_sites.get(name, 0) > 1 for name in recursive):
+            # Calls itself more than once per call without a cache
+            self.time_complexity = "O(2^N)"
+        else:
             # If we have recursive calls, analyze the pattern
-            if len(self.recursive_calls) == 1:
+            if len(recursive) == 1:
                 # Single recursive call - could be O(N) or O(log N)
                 if self._has_divide_and_conquer_pattern():
                     self.time_complexity = "O(N log N)"
@@ -695,6 +913,16 @@ class ConsolidatedAnalyzer(ast.NodeVisitor):
         # Handle recursive functions
         if self.recursive_calls:
             self._analyze_recursive_complexity()
+        elif self.linear_scan_depth and self.linear_scan_depth >= self.max_loop_depth:
+            # The innermost loop also scans a list of size M
+            if self.linear_scan_depth == 1:
+                self.time_complexity = "O(N*M)"
+            else:
+                self.time_complexity = f"O(N^{self.linear_scan_depth}*M)"
+        
+        # Whole-array operations still touch every element once
+        if self.native_ops and self.time_complexity == "O(1)":
+            self.time_complexity = "O(N)"
         
         # Handle space complexity for recursive functions
         if self.recursive_calls and self.space_complexity == "O(1)":
@@ -743,7 +971,7 @@ class BytecodeAnalyzer:
     
     def __init__(self):
         self.opcode_weights = {
-            'LOAD_FAST': 1, 'LOAD_CONST': 1, 'LOAD_GLOBAL': 2,
+            'LOAD_FAST': 1, 'LOAD_CONST': 1, 'LOAD_GLOBAL': 2, 'LOAD_ATTR': 3, 'LOAD_METHOD': 3,
             'BINARY_ADD': 5, 'BINARY_SUBTRACT': 5, 'BINARY_MULTIPLY': 5,
             'CALL_FUNCTION': 20, 'CALL_METHOD': 25,
             'FOR_ITER': 10, 'GET_ITER': 5,
@@ -765,4 +993,44 @@ class BytecodeAnalyzer:
         except:
             return 0
 
+    def analyze_loops(self, code: str, tree: ast.AST) -> int:
+        """Weighted operation count of the instructions that run on every loop iteration.
+
+        Covers loop bodies, while tests and lambdas handed to pandas'
+        apply/map in all code objects (functions included); nested loops
+        count once, like the rest of the metrics.
+        """
+        loop_lines = set()
+        for node in ast.walk(tree):
+            if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and
+                    node.func.attr in ConsolidatedAnalyzer.PER_ELEMENT_CALLS):
+                for arg in node.args:
+                    if isinstance(arg, ast.Lambda):
+                        loop_lines.update(range(arg.lineno, arg.end_lineno + 1))
+            if isinstance(node, (ast.For, ast.AsyncFor, ast.While)):
+                parts = node.body + ([node.test] if isinstance(node, ast.While) else [])
+                for part in parts:
+                    loop_lines.update(range(part.lineno, part.end_lineno + 1))
+        if not loop_lines:
+            return 0
+        try:
+            pending = [compile(code, '<string>', 'exec')]
+        except (SyntaxError, ValueError):
+            return 0
+
+        total_weight = 0
+        while pending:
+            code_object = pending.pop()
+            pending.extend(const for const in code_object.co_consts if hasattr(const, 'co_code'))
+            line = None
+            for instruction in dis.get_instructions(code_object):
+                positions = getattr(instruction, 'positions', None)
+                if positions is not None:
+                    line = positions.lineno
+                elif instruction.starts_line:
+                    line = instruction.starts_line
+                if line in loop_lines:
+                    total_weight += self.opcode_weights.get(instruction.opname, 1)
+        return total_weight
+
 
@@ -0,0 +1,196 @@
+import os
+import queue
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import pytesseract
+from PIL import Image
+
+try:
+    import tesserocr
+except ImportError:  # Listed in requirements.txt, but needs libtesseract; without it every call spawns a process
+    tesserocr = None
+
+# Checked in order after the explicit argument, $TESSERACT_CMD and $PATH
+DEFAULT_TESSERACT_PATHS = [
+    r'C:\Program Files\Tesseract-OCR\tesseract.exe',
+    os.path.expandvars(r'%LOCALAPPDATA%\Programs\Tesseract-OCR\tesseract.exe'),
+    '/opt/homebrew/bin/tesseract',
+    '/usr/local/bin/tesseract',
+    '/usr/bin/tesseract',
+]
+
+# Tesseract settings for code: preserve whitespace, drop characters that never appear in code
+TESSERACT_VARIABLES = {
+    'preserve_interword_spaces': '1',
+    'tessedit_char_blacklist': '¬',
+}
+
+
+def find_tesseract_cmd(tesseract_cmd: Optional[str] = None) -> Optional[str]:
+    """Locate the tesseract executable, preferring explicit configuration."""
+    candidates = [tesseract_cmd, os.environ.get('TESSERACT_CMD'), shutil.which('tesseract')]
+    candidates.extend(DEFAULT_TESSERACT_PATHS)
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate):
+            return candidate
+    return None
+
+
+def default_pool_size() -> int:
+    if hasattr(os, 'sched_getaffinity'):
+        return max(1, len(os.sched_getaffinity(0)))
+    return os.cpu_count() or 1
+
+
+class TesseractPool:
+    """Pool of long-lived Tesseract workers.
+
+    With tesserocr installed each worker is a loaded TessBaseAPI that is reused
+    across images, so the language model is only loaded once per worker and
+    recognition runs without the GIL. Without it (or without its language
+    data), calls fall back to the tesseract executable through pytesseract:
+    a new process per image, bounded to `size` concurrent processes, so only
+    the tesserocr backend keeps workers alive. `backend` says which is used.
+    """
+
+    def __init__(self, size: Optional[int] = None, tesseract_cmd: Optional[str] = None,
+                 tessdata_path: Optional[str] = None, lang: str = 'eng', psm: int = 6):
+        self.size = size or default_pool_size()
+        self.lang = lang
+        self.psm = psm
+        self._apis = None
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix='tesseract')
+
+        tessdata_path = tessdata_path or os.environ.get('TESSDATA_PREFIX')
+        if tesserocr is not None and self._has_language(tessdata_path):
+            self.backend = 'tesserocr'
+            self._apis = queue.Queue()
+            for _ in range(self.size):
+                self._apis.put(self._create_api(tessdata_path))
+            return
+
+        cmd = find_tesseract_cmd(tesseract_cmd)
+        if cmd is None:
+            self._executor.shutdown()
+            raise RuntimeError(
+                "Tesseract not found. Install Tesseract OCR from "
+                "https://github.com/UB-Mannheim/tesseract/wiki and put it on PATH, "
+                "or set TESSERACT_CMD to the executable."
+            )
+        pytesseract.pytesseract.tesseract_cmd = cmd
+        self.backend = 'cli'
+        self.tesseract_cmd = cmd
+        self.cli_config = f'--oem 3 --psm {psm} ' + ' '.join(
+            f'-c {name}={value}' for name, value in TESSERACT_VARIABLES.items()
+        )
+
+    def _has_language(self, tessdata_path: Optional[str]) -> bool:
+        try:
+            path, languages = tesserocr.get_languages(tessdata_path or '')
+        except Exception:
+            return False
+        return self.lang in languages
+
+    def _create_api(self, tessdata_path: Optional[str]):
+        kwargs = {'lang': self.lang, 'psm': self.psm, 'oem': tesserocr.OEM.DEFAULT}
+        if tessdata_path:
+            kwargs['path'] = tessdata_path
+        api = tesserocr.PyTessBaseAPI(**kwargs)
+        for name, value in TESSERACT_VARIABLES.items():
+            api.SetVariable(name, value)
+        return api
+
+    def image_to_string(self, image: Image.Image) -> str:
+        """OCR one image on a pooled worker."""
+        if self.backend == 'cli':
+            return pytesseract.image_to_string(image, config=self.cli_config, lang=self.lang)
+        api = self._apis.get()
+        try:
+            api.SetImage(image)
+            return api.GetUTF8Text()
+        finally:
+            self._apis.put(api)
+
+    def image_to_lines(self, image: Image.Image, psm: Optional[int] = None) -> List[Dict]:
+        """OCR one image and return its text lines with boxes and per-word confidences.
+
+        Each line is {'text', 'confidence', 'box', 'words'}: confidence is the mean
+        word confidence (0-100), boxes are (left, top, right, bottom) pixels and
+        words are (text, confidence, box) tuples. psm overrides the page
+        segmentation mode, e.g. 7 to read a single line.
+        """
+        if self.backend == 'cli':
+            return self._cli_lines(image, psm)
+        api = self._apis.get()
+        try:
+            if psm is not None:
+                api.SetPageSegMode(psm)
+            api.SetImage(image)
+            api.Recognize()
+            lines = []
+            for word in tesserocr.iterate_level(api.GetIterator(), tesserocr.RIL.WORD):
+                if word.Empty(tesserocr.RIL.WORD):
+                    continue
+                if not lines or word.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                    lines.append({'text': word.GetUTF8Text(tesserocr.RIL.TEXTLINE),
+                                  'box': word.BoundingBox(tesserocr.RIL.TEXTLINE), 'words': []})
+                lines[-1]['words'].append((word.GetUTF8Text(tesserocr.RIL.WORD),
+                                           word.Confidence(tesserocr.RIL.WORD),
+                                           word.BoundingBox(tesserocr.RIL.WORD)))
+        finally:
+            if psm is not None:
+                api.SetPageSegMode(self.psm)
+            self._apis.put(api)
+        for line in lines:
+            line['confidence'] = sum(conf for _, conf, _ in line['words']) / len(line['words'])
+        return lines
+
+    def _cli_lines(self, image: Image.Image, psm: Optional[int]) -> List[Dict]:
+        config = self.cli_config if psm is None else self.cli_config.replace(f'--psm {self.psm}', f'--psm {psm}')
+        data = pytesseract.image_to_data(image, config=config, lang=self.lang,
+                                         output_type=pytesseract.Output.DICT)
+        lines = {}
+        for i, text in enumerate(data['text']):
+            if float(data['conf'][i]) < 0 or not text.strip():
+                continue
+            left, top = data['left'][i], data['top'][i]
+            box = (left, top, left + data['width'][i], top + data['height'][i])
+            key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+            lines.setdefault(key, []).append((text, float(data['conf'][i]), box))
+        result = []
+        for words in lines.values():
+            result.append({
+                'text': ' '.join(text for text, _, _ in words) + '\n',
+                'confidence': sum(conf for _, conf, _ in words) / len(words),
+                'box': (min(b[0] for _, _, b in words), min(b[1] for _, _, b in words),
+                        max(b[2] for _, _, b in words), max(b[3] for _, _, b in words)),
+                'words': words,
+            })
+        return result
+
+    def submit(self, image: Image.Image):
+        """Queue an image for OCR and return a Future with its text."""
+        return self._executor.submit(self.image_to_string, image)
+
+    def submit_task(self, fn, *args):
+        """Run fn(*args) on a pool thread, e.g. preprocessing followed by image_to_string."""
+        return self._executor.submit(fn, *args)
+
+    def map(self, images: Iterable[Image.Image]) -> List[str]:
+        """OCR many images concurrently, returning texts in input order."""
+        return list(self._executor.map(self.image_to_string, images))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        if self._apis is not None:
+            while not self._apis.empty():
+                self._apis.get().End()
+            self._apis = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
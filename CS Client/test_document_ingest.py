@@ -0,0 +1,51 @@
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from PIL import Image
+from document_ingest import DocumentError, expand_uploads, is_pdf, pymupdf, rasterize_pdf, stitch_pages
+
+def make_png(shade):
+    buffer = io.BytesIO()
+    Image.new('RGB', (120, 40), (shade, shade, shade)).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def make_pdf(pages):
+    images = [Image.new('RGB', (200, 100), 'white') for _ in range(pages)]
+    buffer = io.BytesIO()
+    images[0].save(buffer, format='PDF', save_all=True, append_images=images[1:])
+    return buffer.getvalue()
+
+def test_images_are_single_pages_in_order():
+    pages = expand_uploads([('a.png', make_png(10)), ('b.png', make_png(200))])
+    assert [(page['source'], page['page']) for page in pages] == [('a.png', 1), ('b.png', 1)]
+    assert not is_pdf(pages[0]['image'])
+
+@pytest.mark.skipif(pymupdf is None, reason='PyMuPDF not installed')
+def test_pdf_is_rasterized_per_page():
+    pages = expand_uploads([('a.png', make_png(10)), ('listing.pdf', make_pdf(3))])
+    assert [(page['source'], page['page']) for page in pages] == [
+        ('a.png', 1), ('listing.pdf', 1), ('listing.pdf', 2), ('listing.pdf', 3)]
+    with Image.open(io.BytesIO(pages[1]['image'])) as image:
+        assert image.format == 'PNG'
+
+@pytest.mark.skipif(pymupdf is None, reason='PyMuPDF not installed')
+def test_page_limit():
+    with pytest.raises(DocumentError):
+        rasterize_pdf(make_pdf(3), max_pages=2)
+    with pytest.raises(DocumentError):
+        expand_uploads([('a.png', make_png(10)), ('b.png', make_png(10))], max_pages=1)
+
+def test_stitch_marks_page_boundaries():
+    pages = [
+        {'source': 'listing.pdf', 'page': 1, 'code': 'x = 1\n'},
+        {'source': 'listing.pdf', 'page': 2, 'code': None},
+    ]
+    assert stitch_pages(pages) == (
+        '# --- listing.pdf, page 1 ---\nx = 1\n\n'
+        '# --- listing.pdf, page 2 ---\n# (no code extracted)\n'
+    )
+    assert stitch_pages(pages[:1]) == 'x = 1\n'
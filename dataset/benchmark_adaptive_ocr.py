@@ -0,0 +1,66 @@
+import argparse
+import difflib
+import json
+import os
+import sys
+import time
+
+# Add the CS Client directory to the Python path
+DATASET_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(DATASET_DIR), 'CS Client'))
+
+from imageToCode import CodeExtractor
+from benchmark_ocr_throughput import list_images
+
+
+def reference_for(image_path, snippets):
+    """Reference snippet of image_<n>.png, which is stored under key n + 1."""
+    number = int(''.join(c for c in os.path.basename(image_path) if c.isdigit()))
+    return snippets.get(str(number + 1), '')
+
+
+def run(label, extractor, image_paths, snippets):
+    start = time.perf_counter()
+    texts = extractor.extract_code_from_images(image_paths)
+    elapsed = time.perf_counter() - start
+    similarity = sum(
+        difflib.SequenceMatcher(None, text or '', reference_for(path, snippets)).ratio()
+        for path, text in zip(image_paths, texts)
+    ) / len(image_paths)
+    print(f"{label:>9}: {elapsed:.1f}s ({elapsed / len(image_paths):.2f}s/image), "
+          f"mean similarity to reference {similarity:.3f}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare single-pass and adaptive Tesseract OCR")
+    parser.add_argument('--images-dir', default=os.path.join(DATASET_DIR, 'test', 'images'))
+    parser.add_argument('--snippets', default=os.path.join(DATASET_DIR, 'test', 'code_snippets.json'))
+    parser.add_argument('--limit', type=int, default=None, help="Only use the first N images")
+    parser.add_argument('--tessdata', default=None, help="tessdata directory for tesserocr")
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    with open(args.snippets, 'r', encoding='utf-8') as f:
+        snippets = json.load(f)
+    image_paths = list_images(args.images_dir, args.limit)
+
+    single = CodeExtractor(engines=['tesseract'], tessdata_path=args.tessdata, pool_size=args.workers,
+                           use_cache=False, adaptive=False)
+    before = run('single', single, image_paths, snippets)
+    single.close()
+
+    adaptive = CodeExtractor(engines=['tesseract'], tessdata_path=args.tessdata, pool_size=args.workers,
+                             use_cache=False)
+    after = run('adaptive', adaptive, image_paths, snippets)
+    adaptive.close()
+
+    stats = adaptive.ocr_stats()
+    print(f"{stats['single_pass_images']} of {stats['images']} images finished in one pass")
+    print(f"Re-read {stats['rechecked_lines']} of {stats['lines']} lines ({stats['recheck_rate']:.1%}), "
+          f"replaced {stats['replaced_lines']}")
+    print(f"Speedup: {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
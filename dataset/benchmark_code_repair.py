@@ -0,0 +1,87 @@
+import argparse
+import difflib
+import json
+import os
+import statistics
+import sys
+
+# Add the CS Client directory to the Python path
+DATASET_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(DATASET_DIR), 'CS Client'))
+
+from code_repair import repair_code, syntax_error
+from benchmark_adaptive_ocr import reference_for
+from benchmark_ocr_throughput import list_images
+
+
+def extract_texts(image_paths, tessdata=None, workers=None):
+    """Cleaned but unrepaired OCR output for every image."""
+    from imageToCode import CodeExtractor
+    extractor = CodeExtractor(engines=['tesseract'], tessdata_path=tessdata, pool_size=workers,
+                              use_cache=False, repair=False)
+    try:
+        return extractor.extract_code_from_images(image_paths)
+    finally:
+        extractor.close()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the parse-guided repair of OCR output on the dataset")
+    parser.add_argument('--images-dir', default=os.path.join(DATASET_DIR, 'test', 'images'))
+    parser.add_argument('--snippets', default=os.path.join(DATASET_DIR, 'test', 'code_snippets.json'))
+    parser.add_argument('--limit', type=int, default=None, help="Only use the first N images")
+    parser.add_argument('--tessdata', default=None, help="tessdata directory for tesserocr")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--texts', default=None,
+                        help="JSON file of OCR output by image name; created on the first run, reused after")
+    args = parser.parse_args()
+
+    with open(args.snippets, 'r', encoding='utf-8') as f:
+        snippets = json.load(f)
+    image_paths = list_images(args.images_dir, args.limit)
+
+    if args.texts and os.path.exists(args.texts):
+        with open(args.texts, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        texts = [stored.get(os.path.basename(path)) for path in image_paths]
+    else:
+        texts = extract_texts(image_paths, args.tessdata, args.workers)
+        if args.texts:
+            with open(args.texts, 'w', encoding='utf-8') as f:
+                json.dump({os.path.basename(p): t for p, t in zip(image_paths, texts)}, f)
+
+    broken = repaired = 0
+    seconds, attempts = [], []
+    before_similarity = after_similarity = 0.0
+    for path, text in zip(image_paths, texts):
+        if not text or syntax_error(text) is None:
+            continue
+        broken += 1
+        result = repair_code(text)
+        repaired += result['parsed']
+        seconds.append(result['seconds'])
+        attempts.append(result['attempts'])
+        reference = reference_for(path, snippets)
+        before_similarity += difflib.SequenceMatcher(None, text, reference).ratio()
+        after_similarity += difflib.SequenceMatcher(None, result['code'], reference).ratio()
+
+    parsed_before = sum(1 for text in texts if text and syntax_error(text) is None)
+    print(f"{len(texts)} images: {parsed_before} parsed after cleanup, {broken} needed repair")
+    if not broken:
+        return
+    print(f"Repaired {repaired} of {broken} ({repaired / broken:.1%}); "
+          f"{parsed_before + repaired} of {len(texts)} now parse")
+    print(f"Repair time per image: p50 {percentile(seconds, 0.5) * 1000:.1f}ms, "
+          f"p95 {percentile(seconds, 0.95) * 1000:.1f}ms, max {max(seconds) * 1000:.1f}ms; "
+          f"median {statistics.median(attempts):.0f} candidates tried")
+    print(f"Similarity to reference on repaired images: {before_similarity / broken:.3f} -> "
+          f"{after_similarity / broken:.3f}")
+
+
+if __name__ == "__main__":
+    main()
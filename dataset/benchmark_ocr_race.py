@@ -0,0 +1,52 @@
+import argparse
+import os
+import sys
+import time
+
+# Add the CS Client directory to the Python path
+DATASET_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(DATASET_DIR), 'CS Client'))
+
+from imageToCode import CodeExtractor, score_code
+from benchmark_code_repair import percentile
+from benchmark_ocr_throughput import list_images
+
+
+def run(label, extractor, image_paths):
+    """Extract every image one at a time, as the web app does, and report latency and parse rate"""
+    seconds, parsed = [], 0
+    for path in image_paths:
+        start = time.perf_counter()
+        code = extractor.extract_code_from_image(path)
+        seconds.append(time.perf_counter() - start)
+        parsed += score_code(code) == 1.0
+    print(f"{label:>20}: p50 {percentile(seconds, 0.5):.2f}s, p95 {percentile(seconds, 0.95):.2f}s, "
+          f"max {max(seconds):.2f}s; {parsed} of {len(image_paths)} parse")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare each OCR engine alone with racing them")
+    parser.add_argument('--images-dir', default=os.path.join(DATASET_DIR, 'test', 'images'))
+    parser.add_argument('--limit', type=int, default=20, help="Only use the first N images")
+    parser.add_argument('--engines', default='tesseract,ocr_space')
+    parser.add_argument('--deadline', type=float, default=None, help="Race deadline in seconds")
+    parser.add_argument('--tessdata', default=None, help="tessdata directory for tesserocr")
+    args = parser.parse_args()
+
+    image_paths = list_images(args.images_dir, args.limit)
+    names = args.engines.split(',')
+    for name in names:
+        extractor = CodeExtractor(engines=[name], tessdata_path=args.tessdata, use_cache=False)
+        run(name, extractor, image_paths)
+        extractor.close()
+
+    if len(names) > 1:
+        racer = CodeExtractor(engines=names, deadline=args.deadline, tessdata_path=args.tessdata, use_cache=False)
+        run('race', racer, image_paths)
+        stats = racer.ocr_stats()
+        print(f"Wins: {stats['wins']}; deadline reached in {stats['deadline_hits']} of {stats['races']} races")
+        racer.close()
+
+
+if __name__ == "__main__":
+    main()
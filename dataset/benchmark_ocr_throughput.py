@@ -0,0 +1,76 @@
+import argparse
+import os
+import sys
+import time
+
+# Add the CS Client directory to the Python path
+DATASET_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(DATASET_DIR), 'CS Client'))
+
+from PIL import Image, ImageEnhance
+import pytesseract
+
+from imageToCode import CodeExtractor
+from tesseract_engine import find_tesseract_cmd, tesserocr
+
+LEGACY_CONFIG = (
+    '--oem 3 --psm 6 -c preserve_interword_spaces=1 '
+    '-c preserve_whitespace=1 -c tessedit_char_blacklist=¬'
+)
+
+
+def list_images(images_dir, limit=None):
+    names = sorted(
+        (f for f in os.listdir(images_dir) if f.endswith(('.png', '.jpg', '.jpeg'))),
+        key=lambda name: int(''.join(c for c in name if c.isdigit()) or 0)
+    )
+    return [os.path.join(images_dir, name) for name in names[:limit]]
+
+
+def legacy_ocr(image_path, tessdata_path=None):
+    """The previous pipeline: contrast boost, unconditional 2x LANCZOS, one fresh tesseract per image."""
+    image = Image.open(image_path).convert('L')
+    image = ImageEnhance.Contrast(image).enhance(2.0)
+    image = image.resize((image.width * 2, image.height * 2), Image.Resampling.LANCZOS)
+    cmd = find_tesseract_cmd()
+    if cmd is not None:
+        pytesseract.pytesseract.tesseract_cmd = cmd
+        return pytesseract.image_to_string(image, config=LEGACY_CONFIG, lang='eng')
+    # No executable: load a fresh engine per image, which pays the same model-load cost
+    with tesserocr.PyTessBaseAPI(path=tessdata_path or '', lang='eng') as api:
+        api.SetImage(image)
+        return api.GetUTF8Text()
+
+
+def benchmark(label, run, image_paths):
+    start = time.perf_counter()
+    run(image_paths)
+    elapsed = time.perf_counter() - start
+    print(f"{label:>8}: {len(image_paths)} images in {elapsed:.1f}s "
+          f"({len(image_paths) / elapsed:.2f} images/s, {elapsed / len(image_paths):.2f}s/image)")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare OCR throughput before and after the pooled engine")
+    parser.add_argument('--images-dir', default=os.path.join(DATASET_DIR, 'test', 'images'))
+    parser.add_argument('--limit', type=int, default=None, help="Only use the first N images")
+    parser.add_argument('--tessdata', default=None, help="tessdata directory for tesserocr")
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    image_paths = list_images(args.images_dir, args.limit)
+    print(f"Legacy backend: {'cli' if find_tesseract_cmd() else 'tesserocr'}, a fresh engine per image")
+    before = benchmark('before', lambda paths: [legacy_ocr(p, args.tessdata) for p in paths], image_paths)
+
+    extractor = CodeExtractor(engines=['tesseract'], tessdata_path=args.tessdata, pool_size=args.workers)
+    pool = extractor.engines['tesseract'].pool
+    print(f"Pooled backend: {pool.backend}, {pool.size} worker(s)")
+    after = benchmark('after', extractor.extract_code_from_images, image_paths)
+    extractor.close()
+
+    print(f"Speedup: {before / after:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+# Add the CS Client directory to the Python path
+DATASET_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(DATASET_DIR), 'CS Client'))
+
+from ocr_cleanup import create_cleaner
+
+
+def legacy_clean(text):
+    """The previous cleanup: per-line replacement dict, str.replace per entry, repeated blank-line passes."""
+    if not text:
+        return None
+    
+    # Split into lines while preserving empty lines
+    lines = text.splitlines(True)
+    
+    # Remove duplicate lines while preserving structure
+    seen_content = set()
+    cleaned_lines = []
+    previous_was_empty = False
+    
+    for line in lines:
+        original_line = line
+        stripped_content = line.strip()
+        
+        # Handle empty lines
+        if not stripped_content:
+            if not previous_was_empty:  # Only add if previous line wasn't empty
+                cleaned_lines.append('\n')
+                previous_was_empty = True
+            continue
+        
+        previous_was_empty = False
+        
+        # Count leading spaces for Python indentation
+        leading_space_count = len(line) - len(line.lstrip())
+        
+        # Fix common OCR mistakes in Python code
+        replacements = {
+            # Basic character fixes
+            '|': 'I',
+            '›': '>',
+            '‹': '<',
+            "'": "'",
+            '"': '"',
+            '"': '"',
+            '—': '-',
+            '–': '-',
+            '…': '...',
+            '\t': '    ',  # Convert tabs to spaces (PEP 8)
+            
+            # Python-specific fixes
+            'def1ne': 'define',
+            'pr1nt': 'print',
+            'wh1le': 'while',
+            'y1eld': 'yield',
+            'ra1se': 'raise',
+            'ret urn': 'return',
+            'pass word': 'password',
+            'True1': 'True',
+            'False1': 'False',
+            'None1': 'None',
+            'class1': 'class',
+            
+            # Python spacing fixes
+            ' .': '.',
+            ' ,': ',',
+            '( ': '(',
+            ' )': ')',
+            '[ ': '[',
+            ' ]': ']',
+            '{ ': '{',
+            ' }': '}'
+        }
+        
+        # Clean the content
+        cleaned_content = stripped_content
+        for old, new in replacements.items():
+            cleaned_content = cleaned_content.replace(old, new)
+        
+        # Fix Python-specific patterns
+        if cleaned_content:
+            # Fix method/variable naming patterns (convert spaces to underscores)
+            if '_' in cleaned_content or ' ' in cleaned_content:
+                words = cleaned_content.split()
+                for i, word in enumerate(words):
+                    if ' ' in word and not any(char in word for char in '"\''):
+                        words[i] = word.replace(' ', '_')
+                cleaned_content = ' '.join(words)
+            
+            # Fix Python import statements
+            if 'import' in cleaned_content or 'from' in cleaned_content:
+                cleaned_content = _legacy_fix_python_imports(cleaned_content)
+            
+            # Fix common Python number/letter confusions in specific contexts
+            if 'for ' in cleaned_content or 'if ' in cleaned_content:
+                cleaned_content = cleaned_content.replace('1n ', 'in ')
+                cleaned_content = cleaned_content.replace('1f ', 'if ')
+        
+        # Handle Python indentation (should be multiples of 4 spaces)
+        if leading_space_count > 0:
+            leading_space_count = ((leading_space_count + 2) // 4) * 4
+        
+        # Add extra newline before class and function definitions
+        if cleaned_content.startswith(('class ', 'def ')) and cleaned_lines and cleaned_lines[-1].strip():
+            cleaned_lines.append('\n')
+        
+        # Add the cleaned line with proper Python indentation
+        if cleaned_content not in seen_content:
+            seen_content.add(cleaned_content)
+            final_line = ' ' * leading_space_count + cleaned_content + '\n'
+            cleaned_lines.append(final_line)
+    
+    # Join lines and normalize empty lines per Python conventions
+    cleaned_text = ''.join(cleaned_lines)
+    
+    # Ensure two blank lines before top-level classes/functions (PEP 8)
+    cleaned_text = cleaned_text.replace('\nclass ', '\n\n\nclass ')
+    cleaned_text = cleaned_text.replace('\ndef ', '\n\n\ndef ')
+    
+    # Normalize multiple empty lines to maximum of two (PEP 8)
+    while '\n\n\n\n' in cleaned_text:
+        cleaned_text = cleaned_text.replace('\n\n\n\n', '\n\n\n')
+    
+    return cleaned_text
+
+def _legacy_fix_python_imports(content):
+    """Fix Python import statement formatting"""
+    words = content.split()
+    try:
+        if 'from' in words:
+            from_idx = words.index('from')
+            import_idx = words.index('import')
+            if from_idx < import_idx:
+                return f"from {' '.join(words[from_idx + 1:import_idx])} import {' '.join(words[import_idx + 1:])}"
+        elif 'import' in words:
+            import_idx = words.index('import')
+            return f"import {' '.join(words[import_idx + 1:])}"
+    except (ValueError, IndexError):
+        pass
+    return content
+
+
+def load_texts(snippets_path, texts_dir=None):
+    """Raw OCR outputs from texts_dir (*.txt) if given, otherwise the dataset's reference snippets."""
+    if texts_dir:
+        names = sorted(f for f in os.listdir(texts_dir) if f.endswith('.txt'))
+        texts = []
+        for name in names:
+            with open(os.path.join(texts_dir, name), 'r', encoding='utf-8') as f:
+                texts.append(f.read())
+        return texts
+    with open(snippets_path, 'r', encoding='utf-8') as f:
+        snippets = json.load(f)
+    return [snippets[key] for key in sorted(snippets, key=int)]
+
+
+def make_listing(texts, copies):
+    """One long listing of `copies` numbered copies of every text, so no line is a duplicate."""
+    parts = []
+    for copy in range(copies):
+        for index, text in enumerate(texts):
+            parts.append('\n'.join(f'{line}  # {copy}.{index}' if line.strip() else line
+                                    for line in text.splitlines()))
+    return '\n\n'.join(parts)
+
+
+def time_call(clean, text, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        clean(text)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare OCR text cleanup before and after the compiled rule engine")
+    parser.add_argument('--snippets', default=os.path.join(DATASET_DIR, 'test', 'code_snippets.json'))
+    parser.add_argument('--texts-dir', default=None, help="Directory of raw OCR outputs (*.txt) to clean instead")
+    parser.add_argument('--max-copies', type=int, default=16, help="Longest listing, in copies of the whole dataset")
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    texts = load_texts(args.snippets, args.texts_dir)
+    cleaner = create_cleaner()
+
+    # Per-snippet cleanup, as the extractors run it
+    before = time_call(lambda items: [legacy_clean(t) for t in items], texts, args.repeats)
+    after = time_call(lambda items: [cleaner.clean(t) for t in items], texts, args.repeats)
+    print(f"{len(texts)} texts: before {before * 1000:.1f}ms, after {after * 1000:.1f}ms "
+          f"({before / after:.2f}x)")
+
+    # Cost per KB should stay flat as listings grow if cleanup is linear
+    print(f"{'copies':>6} {'KB':>8} {'before ms':>10} {'us/KB':>7} {'after ms':>10} {'us/KB':>7}")
+    copies = 1
+    while copies <= args.max_copies:
+        listing = make_listing(texts, copies)
+        kb = len(listing.encode('utf-8')) / 1024
+        before = time_call(legacy_clean, listing, args.repeats)
+        after = time_call(cleaner.clean, listing, args.repeats)
+        print(f"{copies:>6} {kb:>8.0f} {before * 1000:>10.1f} {before * 1e6 / kb:>7.1f} "
+              f"{after * 1000:>10.1f} {after * 1e6 / kb:>7.1f}")
+        copies *= 2
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import difflib
+import io
+import json
+import os
+import sys
+import time
+
+from PIL import Image
+
+# Add the CS Client directory to the Python path
+DATASET_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(DATASET_DIR), 'CS Client'))
+
+from imageToCode import CodeExtractor
+from ocr_engines import TesseractEngine
+from tesseract_engine import default_pool_size
+from benchmark_adaptive_ocr import reference_for
+from benchmark_ocr_throughput import list_images
+
+
+def tall_screenshot(image_paths, margin=12):
+    """Stack snippet screenshots into one full-file screenshot, each on its own background.
+
+    The snippets' window frames are cropped off, so the result looks like one
+    long editor view. Returns PNG bytes.
+    """
+    snippets = []
+    for path in image_paths:
+        with Image.open(path) as image:
+            snippets.append(image.convert('RGB').crop((margin, margin, image.width - margin, image.height - margin)))
+    width = max(snippet.width for snippet in snippets)
+    page = Image.new('RGB', (width, sum(snippet.height for snippet in snippets)))
+    top = 0
+    for snippet in snippets:
+        page.paste(Image.new('RGB', (width, snippet.height), snippet.getpixel((0, 0))), (0, top))
+        page.paste(snippet, (0, top))
+        top += snippet.height
+    buffer = io.BytesIO()
+    page.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def run(label, engine, pages, references):
+    extractor = CodeExtractor(engines=[engine], use_cache=False)
+    start = time.perf_counter()
+    texts = [extractor.extract_code_from_image(page) for page in pages]
+    elapsed = time.perf_counter() - start
+    extractor.close()
+    similarity = sum(difflib.SequenceMatcher(None, text or '', reference).ratio()
+                     for text, reference in zip(texts, references)) / len(pages)
+    print(f"{label:>20}: {elapsed / len(pages):.2f}s per page, mean similarity to reference {similarity:.3f}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare whole-page and tiled Tesseract OCR on tall screenshots")
+    parser.add_argument('--images-dir', default=os.path.join(DATASET_DIR, 'test', 'images'))
+    parser.add_argument('--snippets', default=os.path.join(DATASET_DIR, 'test', 'code_snippets.json'))
+    parser.add_argument('--pages', type=int, default=5, help="Number of tall screenshots to build")
+    parser.add_argument('--per-page', type=int, default=8, help="Snippets stacked into each screenshot")
+    parser.add_argument('--workers', type=int, nargs='*', default=None,
+                        help="Pool sizes to try with tiling (default: 1 and the core count)")
+    parser.add_argument('--tessdata', default=None, help="tessdata directory for tesserocr")
+    args = parser.parse_args()
+
+    with open(args.snippets, 'r', encoding='utf-8') as f:
+        snippets = json.load(f)
+    image_paths = list_images(args.images_dir, args.pages * args.per_page)
+    groups = [image_paths[i:i + args.per_page] for i in range(0, len(image_paths), args.per_page)]
+    pages = [tall_screenshot(group) for group in groups]
+    references = ['\n'.join(reference_for(path, snippets) for path in group) for group in groups]
+
+    cores = default_pool_size()
+    baseline = run('whole page', TesseractEngine(tessdata_path=args.tessdata, pool_size=cores, tiled=False),
+                   pages, references)
+    for workers in args.workers or sorted({1, cores}):
+        elapsed = run(f'tiled, {workers} worker(s)',
+                      TesseractEngine(tessdata_path=args.tessdata, pool_size=workers), pages, references)
+        print(f"{'':>20}  speedup {baseline / elapsed:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+# Add the CS Client directory to the Python path
+DATASET_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(os.path.dirname(DATASET_DIR), 'CS Client'))
+
+from code_repair import syntax_error
+from benchmark_ocr_throughput import list_images
+
+
+def snippet_key(image_path):
+    """Key of the ground truth for image_<n>.png in its split's code_snippets.json: snippets count from 1"""
+    number = int(''.join(c for c in os.path.basename(image_path) if c.isdigit()))
+    return str(number + 1)
+
+
+def edit_distance(a, b):
+    """Levenshtein distance in linear space (Myers/Hyyrö bit-parallel).
+
+    Each column of the dynamic-programming matrix is kept as bit vectors of its
+    vertical +1/-1 steps in one Python int, so a character of the longer string
+    costs a few big-int operations over the shorter one instead of a row of
+    Python-level cell updates.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if not b:
+        return len(a)
+    match = {}
+    for position, char in enumerate(b):
+        match[char] = match.get(char, 0) | (1 << position)
+    mask = (1 << len(b)) - 1
+    last = 1 << (len(b) - 1)
+    plus, minus, distance = mask, 0, len(b)
+    for char in a:
+        eq = match.get(char, 0)
+        vertical = eq | minus
+        horizontal = (((eq & plus) + plus) ^ plus) | eq
+        plus_h = minus | (~(horizontal | plus) & mask)
+        minus_h = plus & horizontal
+        if plus_h & last:
+            distance += 1
+        elif minus_h & last:
+            distance -= 1
+        plus_h = (plus_h << 1) | 1
+        minus_h <<= 1
+        plus = (minus_h | ~(vertical | plus_h)) & mask
+        minus = plus_h & vertical
+    return distance
+
+
+def similarity(a, b):
+    """1 - normalized edit distance: 1.0 for identical texts, 0.0 for nothing in common"""
+    if not a and not b:
+        return 1.0
+    return 1.0 - edit_distance(a, b) / max(len(a), len(b))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def evaluate(engine, image_paths, snippets, workers, use_cache, tessdata, price):
+    """OCR every image concurrently with one engine and score it against the ground truth"""
+    from imageToCode import CodeExtractor
+
+    extractor = CodeExtractor(engines=[engine], tessdata_path=tessdata, use_cache=use_cache)
+    cache_before = extractor.cache_stats() or {}
+
+    def run(image_path):
+        start = time.perf_counter()
+        code = extractor.extract_code_from_image(image_path)
+        return code, time.perf_counter() - start
+
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        outputs = list(executor.map(run, image_paths))
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    cache_after = extractor.cache_stats() or {}
+    extractor.close()
+
+    results = []
+    for image_path, (code, seconds) in zip(image_paths, outputs):
+        reference = snippets.get(snippet_key(image_path), '')
+        results.append({
+            'image': os.path.basename(image_path),
+            'similarity': round(similarity(code or '', reference), 4),
+            'exact': (code or '').strip() == reference.strip(),
+            'parses': bool(code) and syntax_error(code) is None,
+            'seconds': round(seconds, 3),
+        })
+
+    cache_hits = sum(cache_after.get(key, 0) - cache_before.get(key, 0) for key in ('hits', 'perceptual_hits'))
+    ocr_calls = len(image_paths) - cache_hits
+    latencies = [result['seconds'] for result in results]
+    count = len(results)
+    summary = {
+        'images': count,
+        'mean_similarity': round(sum(result['similarity'] for result in results) / count, 4),
+        'exact_matches': sum(result['exact'] for result in results),
+        'parse_rate': round(sum(result['parses'] for result in results) / count, 4),
+        'images_per_second': round(count / wall, 3),
+        'p50_seconds': round(percentile(latencies, 0.5), 3),
+        'p95_seconds': round(percentile(latencies, 0.95), 3),
+        'cache_hits': cache_hits,
+        # Cost: local engines spend CPU in this process, remote ones bill per request
+        'cpu_seconds_per_image': round(cpu / count, 3),
+        'ocr_calls': ocr_calls,
+        'cost_usd': round(ocr_calls * price.get(engine, 0.0) / 1000, 4),
+    }
+    return summary, results
+
+
+def print_summary(engine, summary, baseline=None):
+    print(f"{engine}: similarity {summary['mean_similarity']:.3f}, {summary['exact_matches']} exact, "
+          f"{summary['parse_rate']:.1%} parse | {summary['images_per_second']:.2f} images/s, "
+          f"p50 {summary['p50_seconds']:.2f}s, p95 {summary['p95_seconds']:.2f}s | "
+          f"{summary['cpu_seconds_per_image']:.2f} CPU s/image, {summary['ocr_calls']} OCR calls, "
+          f"${summary['cost_usd']:.4f}, {summary['cache_hits']} cache hits")
+    if baseline:
+        changes = ', '.join(f"{key} {summary[key] - baseline[key]:+.3f}"
+                            for key in ('mean_similarity', 'parse_rate', 'images_per_second', 'p95_seconds')
+                            if key in baseline)
+        print(f"{'':>{len(engine)}}  vs baseline: {changes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate OCR accuracy, latency and cost on the bundled dataset")
+    parser.add_argument('--split', choices=('test', 'train'), default='test')
+    parser.add_argument('--engines', default='tesseract', help="Comma-separated engines to evaluate one by one")
+    parser.add_argument('--limit', type=int, default=None, help="Only use the first N images")
+    parser.add_argument('--workers', type=int, default=4, help="Images OCR'd concurrently")
+    parser.add_argument('--no-cache', action='store_true', help="Measure cold OCR instead of reusing cached results")
+    parser.add_argument('--tessdata', default=None, help="tessdata directory for tesserocr")
+    parser.add_argument('--price', action='append', default=[], metavar='ENGINE=USD',
+                        help="Price per 1000 OCR calls, e.g. ocr_space=1.5")
+    parser.add_argument('--report', default=None, help="Write a JSON report here")
+    parser.add_argument('--baseline', default=None, help="Earlier JSON report to compare against")
+    args = parser.parse_args()
+
+    split_dir = os.path.join(DATASET_DIR, args.split)
+    with open(os.path.join(split_dir, 'code_snippets.json'), 'r', encoding='utf-8') as f:
+        snippets = json.load(f)
+    image_paths = list_images(os.path.join(split_dir, 'images'), args.limit)
+    price = {name: float(value) for name, value in (item.split('=', 1) for item in args.price)}
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['engines']
+
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'split': args.split,
+        'workers': args.workers,
+        'cache': not args.no_cache,
+        'engines': {},
+        'results': {},
+    }
+    for engine in args.engines.split(','):
+        summary, results = evaluate(engine, image_paths, snippets, args.workers, not args.no_cache,
+                                    args.tessdata, price)
+        report['engines'][engine] = summary
+        report['results'][engine] = results
+        print_summary(engine, summary, baseline.get(engine))
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from evaluate_ocr import edit_distance, similarity, snippet_key
+
+def quadratic_distance(a, b):
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[-1] + 1, previous[j - 1] + (char_a != char_b)))
+        previous = current
+    return previous[-1]
+
+def test_edit_distance_matches_dynamic_programming():
+    rng = random.Random(0)
+    for _ in range(500):
+        a = ''.join(rng.choice('ab (\n') for _ in range(rng.randint(0, 40)))
+        b = ''.join(rng.choice('ab (\n') for _ in range(rng.randint(0, 70)))
+        assert edit_distance(a, b) == quadratic_distance(a, b)
+    assert edit_distance('kitten', 'sitting') == 3
+
+def test_similarity_and_snippet_keys():
+    assert similarity('', '') == 1.0
+    assert similarity('abcd', 'abcf') == 0.75
+    assert snippet_key('dataset/test/images/image_0.png') == '1'
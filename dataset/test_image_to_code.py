@@ -2,10 +2,10 @@ import os
 import json
 import sys
 
-# Add the src directory to Python path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+# Add the CS Client directory to the Python path
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'CS Client'))
 
-from src.imageToCode import CodeExtractor
+from imageToCode import CodeExtractor
 from difflib import SequenceMatcher
 
 def load_code_snippets(json_path):
@@ -23,7 +23,7 @@ def test_code_extraction():
     
     # Paths
     test_images_dir = "src/dataset/train/images"
-    code_snippets_path = "src/dataset/test/code_snippets.json"
+    code_snippets_path = "src/dataset/train/code_snippets.json"
     
     # Debug info
     print(f"Looking for images in: {os.path.abspath(test_images_dir)}")
@@ -51,9 +51,10 @@ def test_code_extraction():
     for image_file in image_files:
         # Extract number from filename (remove 'image_' prefix and '.png' suffix)
         image_number = image_file.replace('image_', '').split('.')[0]  # Get number from filename
+        snippet_key = str(int(image_number) + 1)  # Snippets are numbered from 1, images from 0
         print(f"\nProcessing image: {image_file} (number: {image_number})")
         
-        if image_number not in code_snippets:
+        if snippet_key not in code_snippets:
             print(f"Warning: No matching code snippet found for image {image_file}")
             continue
             
@@ -66,7 +67,7 @@ def test_code_extraction():
             continue
             
         # Get ground truth code
-        ground_truth = code_snippets[str(int(image_number)+1)]
+        ground_truth = code_snippets[snippet_key]
         
         # Calculate similarity
         similarity = calculate_similarity(extracted_code, ground_truth)
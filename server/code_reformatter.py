@@ -1,160 +1,272 @@
 import ast
-from typing import Optional
+import copy
+from typing import Dict, List, Optional, Tuple
+
+from dataflow import DataFlow
+from rewrite_rules import RULES, build_dispatch, names_in, select_rules
+from static_analyzer import StaticCodeAnalyzer
 
 class EnergyEfficientReformatter(ast.NodeTransformer):
-    def __init__(self):
+    """Applies the enabled rewrite rules in one bottom-up traversal.
+
+    Each node is matched only against the rules registered for its type. When
+    a rule replaces a node, the replacement is offered to the rules again
+    (up to MAX_REWRITES_PER_NODE times), so rewrites that enable each other
+    reach a fixed point without re-walking the tree. A statement may be
+    replaced by a list of statements.
+
+    Every candidate rewrite is priced with the static analyzer's cost model
+    on the subtree it touches (with the imports and assignments that subtree
+    reads), before and after. It is kept only if it lowers the estimated
+    runtime, or keeps it and lowers the estimated energy; otherwise the
+    subtree is restored and the next rule is tried. Rules that are off by
+    default and switched on by the caller are applied either way. Each
+    change is recorded in change_records with its rule, location and
+    estimated runtime and energy delta.
+    """
+
+    MAX_REWRITES_PER_NODE = 10
+
+    def __init__(self, keep_comments: bool = True, keep_fstrings: bool = True,
+                 rules: Optional[Dict[str, bool]] = None, input_size_n: int = 1000000, cost_gate: bool = True):
         self.changes_made = []
+        self.change_records = []
         self.comments_removed = []
-        
+        self.keep_comments = keep_comments
+        self.keep_fstrings = keep_fstrings
+        # Rule toggles by name; keep_fstrings=False swaps the f-string rule for its inverse
+        toggles = {'fstring_to_concatenation': not keep_fstrings, 'string_format_to_fstring': keep_fstrings}
+        toggles.update(rules or {})
+        self.rules = select_rules(toggles)
+        self._dispatch = build_dispatch(self.rules)
+        # Asked for by name although off by default: applied whatever the cost model says
+        self._forced = {name for name, enabled in toggles.items() if enabled and not RULES[name].enabled_by_default}
+        self.cost_gate = cost_gate
+        self.input_size_n = input_size_n
+        self.analyzer = StaticCodeAnalyzer()
+        self.rules_applied = {}
+        self.parents = []
+        # Names introduced by rewrites so far, so two rewrites never pick the same one
+        self.new_names = set()
+        # Modules rewrites refer to that the code may not import yet: module -> alias
+        self.new_imports = {}
+        # (assignment, scope) pairs rewrites may have left dead; those nothing reads once the walk is done are dropped
+        self.maybe_dead = []
+        # Data flow per scope, dropped whenever a rewrite changes the tree
+        self._flows = {}
+
+    def visit(self, node):
+        """Visit the children first, then apply the rules registered for this node's type"""
+        visitor = getattr(self, 'visit_' + node.__class__.__name__, self.generic_visit)
+        self.parents.append(node)
+        node = visitor(node)
+        self.parents.pop()
+        if type(node) in self._dispatch:
+            node = self._apply_rules(node)
+        return node
+
+    def _apply_rules(self, node, budget=None, location=None):
+        budget = self.MAX_REWRITES_PER_NODE if budget is None else budget
+        # Replacements have no position of their own: report the source node's
+        location = location or self._location(node)
+        while budget > 0:
+            budget -= 1
+            for rule in self._dispatch.get(type(node), ()):
+                if not rule.matches(node, self):
+                    continue
+                # Rules may rewrite node in place, so keep the original to price it and to fall back on
+                original = copy.deepcopy(node)
+                dead = len(self.maybe_dead)
+                replacement = rule.rewrite(node, self)
+                if replacement is None:
+                    continue
+                self._flows.clear()
+                delta = self._cost_delta(original, replacement, node)
+                if (self.cost_gate and delta is not None and rule.name not in self._forced and
+                        not (delta[0] < 0 or delta[0] == 0 and delta[1] < 0)):
+                    node = original
+                    del self.maybe_dead[dead:]
+                    continue
+                break
+            else:
+                return node
+            self._record(rule.change_message(node), rule.name, location, delta)
+            self.rules_applied[rule.name] = self.rules_applied.get(rule.name, 0) + 1
+            if isinstance(replacement, list):
+                # Statements added around the node (NodeTransformer splices the list in);
+                # the node itself stays open to the other rules
+                statements = []
+                for statement in replacement:
+                    if statement is node:
+                        statement = self._apply_rules(node, budget, location)
+                    statements.extend(statement if isinstance(statement, list) else [statement])
+                return statements
+            node = replacement
+        return node
+
+    def _record(self, message: str, rule: Optional[str] = None, location: Optional[Dict[str, Optional[int]]] = None,
+                delta: Optional[Tuple[float, float]] = None):
+        """Report a change, as a message and as a record with where it happened and what the cost model expects"""
+        self.changes_made.append(message)
+        self.change_records.append(dict(location or {'line': None, 'end_line': None, 'column': None},
+                                        rule=rule, message=message,
+                                        runtime_delta_s=delta[0] if delta else None,
+                                        energy_delta_kwh=delta[1] if delta else None))
+
+    @staticmethod
+    def _location(node) -> Dict[str, Optional[int]]:
+        return {'line': getattr(node, 'lineno', None), 'end_line': getattr(node, 'end_lineno', None),
+                'column': getattr(node, 'col_offset', None)}
+
+    def _cost_delta(self, original, replacement, anchor) -> Optional[Tuple[float, float]]:
+        """Estimated (runtime s, energy kWh) of replacement minus original, or None if they cannot be priced"""
+        before = self._cost(original, anchor)
+        after = self._cost(replacement, anchor)
+        if before is None or after is None:
+            return None
+        return after['runtime_s'] - before['runtime_s'], after['energy_kwh'] - before['energy_kwh']
+
+    def _cost(self, subtree, anchor) -> Optional[Dict[str, float]]:
+        """Cost-model estimate of subtree, run after the statements ahead of anchor it depends on"""
+        statements = subtree if isinstance(subtree, list) else [subtree]
+        # Copied: new nodes need positions to be unparsed, and the real ones are set only once the walk is done
+        body = copy.deepcopy(self._prelude(statements, anchor) + statements)
+        body = [statement if isinstance(statement, ast.stmt) else ast.Expr(statement) for statement in body]
+        try:
+            code = ast.unparse(ast.fix_missing_locations(ast.Module(body=body, type_ignores=[])))
+        except Exception:
+            return None
+        # return, yield and await only compile inside a function
+        for wrapped in (code, 'def _():\n' + self._indent(code), 'async def _():\n' + self._indent(code)):
+            try:
+                compile(wrapped, '<rewrite>', 'exec')
+            except SyntaxError:
+                continue
+            return self.analyzer.estimate_cost(wrapped, self.input_size_n)
+        return None
+
+    @staticmethod
+    def _indent(code: str) -> str:
+        return '\n'.join('    ' + line for line in code.splitlines())
+
+    def _prelude(self, statements: List[ast.AST], anchor: ast.AST) -> List[ast.stmt]:
+        """Imports, and assignments to names statements read, that come before anchor in its module and function"""
+        used = set()
+        for statement in statements:
+            used |= names_in(statement)
+        enclosing = self.parents + [anchor]
+        blocks = [self.parents[0]] + [parent for parent in self.parents[1:]
+                                      if isinstance(parent, (ast.FunctionDef, ast.AsyncFunctionDef))]
+        # Modules rewrites have referred to are imported once the walk is done
+        prelude = [ast.Import(names=[ast.alias(name=module, asname=None if alias == module else alias)])
+                   for module, alias in self.new_imports.items() if alias in used]
+        for block in blocks:
+            for statement in block.body:
+                if any(statement is node for node in enclosing):
+                    break
+                if isinstance(statement, (ast.Import, ast.ImportFrom)):
+                    prelude.append(statement)
+                elif isinstance(statement, ast.Assign) and any(names_in(target) & used for target in statement.targets):
+                    prelude.append(statement)
+                elif (isinstance(statement, ast.AnnAssign) and statement.value is not None and
+                      names_in(statement.target) & used):
+                    prelude.append(statement)
+        return prelude
+
+    def dataflow(self, scope: Optional[ast.AST] = None) -> DataFlow:
+        """Reaching definitions, liveness and types for scope.
+
+        scope defaults to the innermost function, class or module around the
+        node being rewritten. The analysis is built once and shared by every
+        rule until the next rewrite.
+        """
+        if scope is None:
+            scope = next((parent for parent in reversed(self.parents)
+                          if isinstance(parent, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef))),
+                         self.parents[0])
+        flow = self._flows.get(id(scope))
+        if flow is None or flow.scope is not scope:
+            flow = self._flows[id(scope)] = DataFlow(scope, self.parents[0])
+        return flow
+
     def visit_Module(self, node):
         """Track comments that will be removed during AST transformation"""
         # Get original source lines if available
         if hasattr(node, 'source_lines'):
-            for line in node.source_lines:
+            for number, line in enumerate(node.source_lines, 1):
                 line = line.strip()
                 if line.startswith('#'):
-                    self.comments_removed.append(line)
-                    self.changes_made.append(f"Removed comment: {line}")
+                    location = {'line': number, 'end_line': number, 'column': 0}
+                    if not self.keep_comments:
+                        self.comments_removed.append(line)
+                        self._record(f"Removed comment: {line}", location=location)
+                    else:
+                        self._record(f"Preserved comment: {line}", location=location)
         
         # Continue with normal visit
         self.generic_visit(node)
-        return node
+        if self.maybe_dead:
+            self._remove_dead_assignments(node)
 
-    def visit_For(self, node):
-        """Convert list.append() in for loops to list comprehension"""
-        self.generic_visit(node)  # Continue visiting child nodes
-        
-        # Check if the loop body is just a single append
-        if (len(node.body) == 1 and 
-            isinstance(node.body[0], ast.Expr) and 
-            isinstance(node.body[0].value, ast.Call) and 
-            isinstance(node.body[0].value.func, ast.Attribute) and 
-            node.body[0].value.func.attr == 'append'):
-            
-            # Extract the target list and append value
-            target_list = node.body[0].value.func.value
-            append_value = node.body[0].value.args[0]
-            
-            # Create list comprehension
-            new_node = ast.Assign(
-                targets=[target_list],
-                value=ast.ListComp(
-                    elt=append_value,
-                    generators=[ast.comprehension(
-                        target=node.target,
-                        iter=node.iter,
-                        ifs=[],
-                        is_async=0
-                    )]
-                )
-            )
-            
-            self.changes_made.append("Converted for-loop append to list comprehension")
-            return new_node
+        # Import the modules rewrites ended up using, after the docstring and __future__ imports
+        used = names_in(node)
+        position = 0
+        for statement in node.body:
+            if not ((isinstance(statement, ast.Expr) and isinstance(statement.value, ast.Constant) and
+                     isinstance(statement.value.value, str) and position == 0) or
+                    (isinstance(statement, ast.ImportFrom) and statement.module == '__future__')):
+                break
+            position += 1
+        for module, alias in self.new_imports.items():
+            if alias in used:
+                node.body.insert(position, ast.Import(names=[ast.alias(name=module, asname=None if alias == module
+                                                                       else alias)]))
+                self._record(f"Added import {module}" + (f" as {alias}" if alias != module else ""))
         return node
 
-    def visit_JoinedStr(self, node):
-        """Convert f-strings to concatenation witzzh proper type conversion"""
-        parts = []
-        for value in node.values:
-            if isinstance(value, ast.Constant):
-                parts.append(ast.Constant(value=value.value))
-            elif isinstance(value, ast.FormattedValue):
-                # Add str() conversion for non-string values
-                if (isinstance(value.value, ast.Name) and 
-                    value.value.id in ['age', 'count', 'number'] or
-                    isinstance(value.value, (ast.Num, ast.BinOp))):
-                    parts.append(
-                        ast.Call(
-                            func=ast.Name(id='str', ctx=ast.Load()),
-                            args=[value.value],
-                            keywords=[]
-                        )
-                    )
-                else:
-                    # Wrap all formatted values with str() for concatenation
-                    parts.append(
-                        ast.Call(
-                            func=ast.Name(id='str', ctx=ast.Load()),
-                            args=[value.value],
-                            keywords=[]
-                        )
-                    )
-        
-        # Build binary operations for string concatenation
-        result = parts[0]
-        for part in parts[1:]:
-            result = ast.BinOp(left=result, op=ast.Add(), right=part)
-        
-        self.changes_made.append("Converted f-string to string concatenation with type conversion")
-        return result
+    def _remove_dead_assignments(self, tree):
+        """Drop the maybe_dead assignments whose value no read can see any more"""
+        nodes = {id(node) for node in ast.walk(tree)}
+        flows, dead = {}, set()
+        for statement, scope in self.maybe_dead:
+            if id(statement) not in nodes or id(scope) not in nodes:
+                continue
+            flow = flows.get(id(scope)) or flows.setdefault(id(scope), DataFlow(scope, tree))
+            definitions = [definition for definition in flow.definitions_list if definition.value is statement.value]
+            if definitions and not any(flow.uses(definition) or definition.name in flow.captured
+                                       for definition in definitions):
+                dead.add(id(statement))
+        self.maybe_dead = []
+        if not dead:
+            return
+        for node in ast.walk(tree):
+            for field in ('body', 'orelse', 'finalbody'):
+                block = getattr(node, field, None)
+                if isinstance(block, list) and any(id(statement) in dead for statement in block):
+                    block[:] = [statement for statement in block if id(statement) not in dead] or (
+                        [ast.Pass()] if field == 'body' else [])
 
-    def visit_Call(self, node):
-        """Convert various function calls to more efficient versions"""
-        self.generic_visit(node)
-        
-        # Check for pandas to numpy conversions
-        if isinstance(node.func, ast.Attribute):
-            # Check if it's a pandas DataFrame/Series method
-            if hasattr(node.func.value, 'id') and node.func.value.id in ['df', 'series']:
-                # Convert mean() to np.mean() with axis parameter
-                if node.func.attr == 'mean':
-                    new_node = ast.Call(
-                        func=ast.Attribute(
-                            value=ast.Name(id='np', ctx=ast.Load()),
-                            attr='mean',
-                            ctx=ast.Load()
-                        ),
-                        args=[node.func.value],
-                        keywords=[ast.keyword(
-                            arg='axis',
-                            value=ast.Constant(value=0)
-                        )]
-                    )
-                    self.changes_made.append("Converted pandas mean() to numpy mean() with axis=0")
-                    return new_node
-                
-                # Convert std() to np.std() with axis parameter
-                elif node.func.attr == 'std':
-                    new_node = ast.Call(
-                        func=ast.Attribute(
-                            value=ast.Name(id='np', ctx=ast.Load()),
-                            attr='std',
-                            ctx=ast.Load()
-                        ),
-                        args=[node.func.value],
-                        keywords=[ast.keyword(
-                            arg='axis',
-                            value=ast.Constant(value=0)
-                        )]
-                    )
-                    self.changes_made.append("Converted pandas std() to numpy std() with axis=0")
-                    return new_node
-                
-                # Convert sort_values() to np.sort() with values conversion
-                elif node.func.attr == 'sort_values':
-                    new_node = ast.Call(
-                        func=ast.Attribute(
-                            value=ast.Name(id='np', ctx=ast.Load()),
-                            attr='sort',
-                            ctx=ast.Load()
-                        ),
-                        args=[
-                            ast.Attribute(
-                                value=node.func.value,
-                                attr='values',
-                                ctx=ast.Load()
-                            )
-                        ],
-                        keywords=[]
-                    )
-                    self.changes_made.append("Converted pandas sort_values() to numpy sort() with .values")
-                    return new_node
-                
-        return node
+def refactor_code(code: str, keep_comments: bool = True, keep_fstrings: bool = True,
+                  rules: Optional[Dict[str, bool]] = None, input_size_n: int = 1000000,
+                  cost_gate: bool = True, detailed: bool = False) -> tuple[Optional[str], list]:
+    """Refactor code for better energy efficiency.
+    
+    Args:
+        code: The Python code to refactor
+        keep_comments: Whether to preserve comments in the output
+        keep_fstrings: Whether to preserve f-strings in the output
+        rules: Rewrite rules to switch on or off by name, e.g. {'pandas_to_numpy': False}
+        input_size_n: Input size the cost model prices each candidate rewrite at
+        cost_gate: Skip rewrites the cost model does not expect to save runtime or energy
+        detailed: Return the changes as records (rule, message, line, end_line, column,
+            runtime_delta_s, energy_delta_kwh) instead of messages; errors stay messages
+    """
+    try:
+        reformatter = EnergyEfficientReformatter(keep_comments=keep_comments, keep_fstrings=keep_fstrings,
+                                                 rules=rules, input_size_n=input_size_n, cost_gate=cost_gate)
+    except ValueError as e:
+        return None, [str(e)]
 
-def refactor_code(code: str) -> tuple[Optional[str], list[str]]:
-    """Refactor code for better energy efficiency."""
     try:
         # Parse the code into an AST
         tree = ast.parse(code)
@@ -163,12 +275,15 @@ def refactor_code(code: str) -> tuple[Optional[str], list[str]]:
         tree.source_lines = code.splitlines()
         
         # Apply our transformations
-        reformatter = EnergyEfficientReformatter()
         modified_tree = reformatter.visit(tree)
         ast.fix_missing_locations(modified_tree)
         
         # Convert back to source code
-        refactored = ast.unparse(modified_tree)
+        refactored = _unparse(modified_tree)
+        
+        # If we need to preserve comments, we need to merge them back
+        if keep_comments:
+            refactored = _merge_comments_back(code, refactored)
         
         # Validate the refactored code
         try:
@@ -176,11 +291,69 @@ def refactor_code(code: str) -> tuple[Optional[str], list[str]]:
         except Exception as e:
             return None, [f"Refactored code validation failed: {str(e)}"]
         
-        return refactored, reformatter.changes_made
+        return refactored, reformatter.change_records if detailed else reformatter.changes_made
         
     except SyntaxError as e:
         return None, [f"Input code has syntax error: {str(e)}"]
     except (ValueError, TypeError) as e:
         return None, [f"Invalid code structure: {str(e)}"]
     except Exception as e:
-        return None, [f"Unexpected error during refactoring: {str(e)}"]
\ No newline at end of file
+        return None, [f"Unexpected error during refactoring: {str(e)}"]
+
+
+def _unparse(tree: ast.AST) -> str:
+    """ast.unparse, but f(x for x in xs) for the f((x for x in xs)) it writes for a lone generator argument"""
+    code = ast.unparse(tree)
+    lines = [line.encode() for line in code.split('\n')]
+    # (line, byte offset) of each parenthesis to drop
+    edits = []
+    for node in ast.walk(ast.parse(code)):
+        if (isinstance(node, ast.Call) and len(node.args) == 1 and not node.keywords and
+                isinstance(node.args[0], ast.GeneratorExp)):
+            generator = node.args[0]
+            opening = lines[generator.lineno - 1][:generator.col_offset + 1]
+            # Its own parentheses, not the call's
+            if opening.endswith(b'(') and opening[:-1].rstrip().endswith(b'('):
+                edits.append((generator.lineno, generator.col_offset))
+                edits.append((generator.end_lineno, generator.end_col_offset - 1))
+    for number, offset in sorted(edits, reverse=True):
+        line = lines[number - 1]
+        lines[number - 1] = line[:offset] + line[offset + 1:]
+    return '\n'.join(line.decode() for line in lines)
+
+
+def _merge_comments_back(original_code: str, refactored_code: str) -> str:
+    """Merge comments from original code back into refactored code."""
+    original_lines = original_code.splitlines()
+    refactored_lines = refactored_code.splitlines()
+    
+    # Find comment lines in original code
+    comment_lines = []
+    for i, line in enumerate(original_lines):
+        stripped = line.strip()
+        if stripped.startswith('#'):
+            comment_lines.append((i, line))
+    
+    # If no comments, return refactored code as-is
+    if not comment_lines:
+        return refactored_code
+    
+    # Insert comments back into refactored code at appropriate positions
+    result_lines = refactored_lines.copy()
+    
+    # For each comment, try to find the best place to insert it
+    for line_num, comment_line in comment_lines:
+        # Find the closest non-empty line in refactored code
+        best_insert_pos = _find_best_insert_position(line_num, result_lines)
+        result_lines.insert(best_insert_pos, comment_line)
+    
+    return '\n'.join(result_lines)
+
+
+def _find_best_insert_position(original_line_num: int, refactored_lines: list) -> int:
+    """Find the best position to insert a comment in the refactored code."""
+    # Simple heuristic: try to maintain relative position
+    if original_line_num < len(refactored_lines):
+        return original_line_num
+    else:
+        return len(refactored_lines)
\ No newline at end of file
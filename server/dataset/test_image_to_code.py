@@ -2,10 +2,10 @@ import os
 import json
 import sys
 
-# Add the src directory to Python path
-sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+# Add the server directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from server.imageToCode import CodeExtractor
+from imageToCode import CodeExtractor
 from difflib import SequenceMatcher
 
 def load_code_snippets(json_path):
@@ -0,0 +1,92 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import Dict, List, Tuple
+
+try:
+    import pymupdf
+except ImportError:
+    try:
+        import fitz as pymupdf  # PyMuPDF < 1.24
+    except ImportError:  # Optional: fall back to poppler's pdftoppm
+        pymupdf = None
+
+MAX_PAGES = int(os.environ.get('MAX_PDF_PAGES', 50))
+PDF_DPI = 200  # Renders 10-12pt code listings at ~30px line height, ideal for Tesseract
+
+
+class DocumentError(Exception):
+    """Raised when an upload cannot be turned into page images."""
+
+
+def is_pdf(data: bytes) -> bool:
+    return data[:5] == b'%PDF-'
+
+
+def rasterize_pdf(pdf_bytes: bytes, dpi: int = PDF_DPI, max_pages: int = MAX_PAGES) -> List[bytes]:
+    """Render each PDF page to PNG bytes locally, in page order."""
+    if pymupdf is not None:
+        try:
+            document = pymupdf.open(stream=pdf_bytes, filetype='pdf')
+        except Exception as e:
+            raise DocumentError(f"Could not open PDF: {e}")
+        with document:
+            if document.page_count > max_pages:
+                raise DocumentError(f"PDF has {document.page_count} pages (max {max_pages})")
+            return [page.get_pixmap(dpi=dpi).tobytes('png') for page in document]
+
+    pdftoppm = shutil.which('pdftoppm')
+    if pdftoppm is None:
+        raise DocumentError("PDF support requires PyMuPDF (pip install pymupdf) or poppler's pdftoppm")
+    with tempfile.TemporaryDirectory() as workdir:
+        pdf_path = os.path.join(workdir, 'input.pdf')
+        with open(pdf_path, 'wb') as f:
+            f.write(pdf_bytes)
+        result = subprocess.run(
+            [pdftoppm, '-png', '-r', str(dpi), '-l', str(max_pages + 1), pdf_path,
+             os.path.join(workdir, 'page')],
+            capture_output=True, timeout=120
+        )
+        if result.returncode != 0:
+            raise DocumentError(f"Could not rasterize PDF: {result.stderr.decode(errors='replace')}")
+        # pdftoppm zero-pads page numbers to the width of the page count
+        page_files = sorted(name for name in os.listdir(workdir) if name.startswith('page'))
+        if len(page_files) > max_pages:
+            raise DocumentError(f"PDF has more than {max_pages} pages")
+        pages = []
+        for name in page_files:
+            with open(os.path.join(workdir, name), 'rb') as f:
+                pages.append(f.read())
+        return pages
+
+
+def expand_uploads(uploads: List[Tuple[str, bytes]], max_pages: int = MAX_PAGES) -> List[Dict]:
+    """Turn (filename, bytes) uploads into an ordered list of page images.
+
+    Images become one page each; PDFs are rasterized into one page per PDF page.
+    """
+    pages = []
+    for filename, data in uploads:
+        if is_pdf(data):
+            rendered = rasterize_pdf(data, max_pages=max_pages - len(pages))
+            for number, image_bytes in enumerate(rendered, 1):
+                pages.append({'source': filename, 'page': number, 'image': image_bytes})
+        else:
+            pages.append({'source': filename, 'page': 1, 'image': data})
+        if len(pages) > max_pages:
+            raise DocumentError(f"Too many pages (max {max_pages})")
+    return pages
+
+
+def stitch_pages(pages: List[Dict]) -> str:
+    """Join per-page code in order, marking page boundaries with comments."""
+    if len(pages) == 1:
+        return pages[0]['code'] or ''
+    parts = []
+    for page in pages:
+        code = page['code'] or '# (no code extracted)\n'
+        if not code.endswith('\n'):
+            code += '\n'
+        parts.append(f"# --- {page['source']}, page {page['page']} ---\n{code}")
+    return '\n'.join(parts)
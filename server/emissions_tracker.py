@@ -1,55 +1,336 @@
-from codecarbon import EmissionsTracker
-import time
+import contextlib
+import gc
+import glob
+import io
 import os
-import sys
-
-def compare_emissions(inefficient_func, optimized_func):
-    # Inefficient code
-    tracker_inefficient = EmissionsTracker(log_level="error", save_to_file=False)
-    tracker_inefficient.start()
-
-    start_time_inefficient = time.time()
-    with open(os.devnull, 'w') as devnull:
-        sys.stdout = devnull  
-        inefficient_func()
-        sys.stdout = sys.__stdout__ 
-    end_time_inefficient = time.time()
-
-    emissions_inefficient = tracker_inefficient.stop()
-    energy_inefficient = tracker_inefficient.final_emissions_data.energy_consumed
-    execution_time_inefficient = end_time_inefficient - start_time_inefficient
-
-    # Optimized code
-    tracker_optimized = EmissionsTracker(log_level="error", save_to_file=False)
-    tracker_optimized.start()
-
-    start_time_optimized = time.time()
-    with open(os.devnull, 'w') as devnull:
-        sys.stdout = devnull 
-        optimized_func()
-        sys.stdout = sys.__stdout__ 
-    end_time_optimized = time.time()
-
-    emissions_optimized = tracker_optimized.stop()
-    energy_optimized = tracker_optimized.final_emissions_data.energy_consumed
-    execution_time_optimized = end_time_optimized - start_time_optimized
-
-    # Print results
-    print(f"===================== INEFFICIENT CODE =====================")
-    print(f"Total carbon emissions: \t{emissions_inefficient:.10f} kg CO2e")
-    print(f"Energy consumed: \t\t{energy_inefficient:.10f} kWh")
-    print(f"Execution time: \t\t{execution_time_inefficient:.2f} seconds\n")
-
-    print(f"====================== OPTIMIZED CODE ======================")
-    print(f"Total carbon emissions: \t{emissions_optimized:.10f} kg CO2e")
-    print(f"Energy consumed: \t\t{energy_optimized:.10f} kWh")
-    print(f"Execution time: \t\t{execution_time_optimized:.2f} seconds\n")
-
-    print(f"========================= RESULTS =========================")
-    emission_difference = emissions_inefficient - emissions_optimized
-    print(f"Carbon emissions reduced by optimization: {emission_difference:.10f} kg CO2e")
-
-    if emission_difference > 0:
-        print("Interpretation: Optimized code produces less carbon emissions.")
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+try:
+    from codecarbon import EmissionsTracker
+except ImportError:  # codecarbon is optional; fall back to RAPL or the CPU-time model
+    EmissionsTracker = None
+
+# Benchmarks swap sys.stdout and pin the process to a core, both of which are
+# process-wide state, so only one comparison may run at a time.
+_BENCHMARK_LOCK = threading.Lock()
+
+# Same assumptions as StaticCodeAnalyzer, used when no hardware counter is available
+DEFAULT_CPU_TDP_W = 50
+DEFAULT_CARBON_INTENSITY = 475  # gCO2/kWh, world average
+
+
+class _CpuTimeMeter:
+    """Energy model: process CPU time multiplied by an assumed CPU power draw."""
+
+    name = "cpu_time_model"
+
+    def __init__(self, cpu_tdp_w: float = DEFAULT_CPU_TDP_W):
+        self.cpu_tdp_w = cpu_tdp_w
+
+    def start(self):
+        return None
+
+    def stop(self, token, cpu_time_s: float) -> float:
+        return (self.cpu_tdp_w * cpu_time_s) / 3.6e6
+
+    def close(self):
+        pass
+
+
+class _RaplMeter:
+    """Energy from the Linux powercap (Intel RAPL) package counters."""
+
+    name = "rapl"
+
+    def __init__(self):
+        self.domains = []
+        for path in sorted(glob.glob('/sys/class/powercap/intel-rapl:[0-9]*')):
+            # Only top-level package domains; sub-domains are already included in them
+            if path.count(':') != 1:
+                continue
+            with open(os.path.join(path, 'max_energy_range_uj')) as f:
+                max_range = int(f.read())
+            self.domains.append((os.path.join(path, 'energy_uj'), max_range))
+        if not self.domains:
+            raise OSError("No RAPL domains available")
+        self.start()  # Fail early if the counters are not readable
+
+    def _read(self) -> List[int]:
+        readings = []
+        for energy_path, _ in self.domains:
+            with open(energy_path) as f:
+                readings.append(int(f.read()))
+        return readings
+
+    def start(self):
+        return self._read()
+
+    def stop(self, token, cpu_time_s: float) -> float:
+        total_uj = 0
+        for before, after, (_, max_range) in zip(token, self._read(), self.domains):
+            # Counters wrap around at max_energy_range_uj
+            total_uj += after - before if after >= before else after + max_range - before
+        return total_uj / 3.6e12  # microjoules to kWh
+
+    def close(self):
+        pass
+
+
+class _CodeCarbonMeter:
+    """Energy from a single codecarbon tracker, measured per trial with tasks."""
+
+    name = "codecarbon"
+
+    def __init__(self):
+        self.tracker = EmissionsTracker(log_level="error", save_to_file=False)
+        if not hasattr(self.tracker, 'start_task'):
+            raise RuntimeError("Installed codecarbon does not support task tracking")
+        self.tracker.start()
+        self._task_counter = 0
+
+    def start(self):
+        self._task_counter += 1
+        task_name = f"trial_{self._task_counter}"
+        self.tracker.start_task(task_name)
+        return task_name
+
+    def stop(self, token, cpu_time_s: float) -> float:
+        data = self.tracker.stop_task(token)
+        return data.energy_consumed if data is not None else 0.0
+
+    def close(self):
+        with contextlib.suppress(Exception):
+            self.tracker.stop()
+
+
+def _create_energy_meter(energy_meter: str, cpu_tdp_w: float):
+    """Pick the most precise energy meter available."""
+    if energy_meter in ('auto', 'rapl'):
+        try:
+            return _RaplMeter()
+        except OSError:
+            if energy_meter == 'rapl':
+                raise
+    if energy_meter in ('auto', 'codecarbon') and EmissionsTracker is not None:
+        try:
+            return _CodeCarbonMeter()
+        except Exception:
+            if energy_meter == 'codecarbon':
+                raise
+    elif energy_meter == 'codecarbon':
+        raise RuntimeError("codecarbon is not installed")
+    return _CpuTimeMeter(cpu_tdp_w)
+
+
+@contextlib.contextmanager
+def _pinned_to_cpu(cpu: Optional[int]):
+    """Pin the current process to a single core for the duration of the block."""
+    if cpu is None or not hasattr(os, 'sched_setaffinity'):
+        yield None
+        return
+    previous = os.sched_getaffinity(0)
+    os.sched_setaffinity(0, {cpu})
+    try:
+        yield cpu
+    finally:
+        os.sched_setaffinity(0, previous)
+
+
+@contextlib.contextmanager
+def _gc_paused(disable_gc: bool):
+    """Collect garbage up front and keep the collector off while timing."""
+    was_enabled = gc.isenabled()
+    gc.collect()
+    if disable_gc:
+        gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def _run_trial(func: Callable, meter, disable_gc: bool) -> Dict[str, float]:
+    """Run func once with stdout silenced and return its wall time, CPU time and energy."""
+    sink = io.StringIO()
+    with _gc_paused(disable_gc), contextlib.redirect_stdout(sink):
+        token = meter.start()
+        cpu_start = time.process_time_ns()
+        wall_start = time.perf_counter_ns()
+        func()
+        wall_end = time.perf_counter_ns()
+        cpu_end = time.process_time_ns()
+        cpu_time_s = (cpu_end - cpu_start) / 1e9
+        energy_kwh = meter.stop(token, cpu_time_s)
+    return {
+        'wall_time_s': (wall_end - wall_start) / 1e9,
+        'cpu_time_s': cpu_time_s,
+        'energy_kwh': energy_kwh,
+    }
+
+
+def bootstrap_ci(samples, confidence: float = 0.95, n_resamples: int = 2000,
+                 rng: Optional[np.random.Generator] = None) -> List[float]:
+    """Percentile bootstrap confidence interval for the mean of samples."""
+    samples = np.asarray(samples, dtype=float)
+    if samples.size == 0:
+        return [float('nan'), float('nan')]
+    if samples.size == 1:
+        return [float(samples[0]), float(samples[0])]
+    rng = rng if rng is not None else np.random.default_rng()
+    indices = rng.integers(0, samples.size, size=(n_resamples, samples.size))
+    means = samples[indices].mean(axis=1)
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(means, [alpha, 1 - alpha])
+    return [float(low), float(high)]
+
+
+def _summarize(samples, confidence: float, n_resamples: int, rng) -> Dict[str, Any]:
+    samples = np.asarray(samples, dtype=float)
+    return {
+        'mean': float(samples.mean()),
+        'median': float(np.median(samples)),
+        'stdev': float(samples.std(ddof=1)) if samples.size > 1 else 0.0,
+        'ci': bootstrap_ci(samples, confidence, n_resamples, rng),
+    }
+
+
+def _relative_half_width(ci: List[float], reference: float) -> float:
+    if reference == 0:
+        return 0.0 if ci[0] == ci[1] else float('inf')
+    return (ci[1] - ci[0]) / 2 / abs(reference)
+
+
+def compare_emissions(inefficient_func: Callable, optimized_func: Callable,
+                      warmup: int = 2, min_trials: int = 5, max_trials: int = 50,
+                      target_rel_ci: float = 0.05, max_time_s: float = 60.0,
+                      confidence: float = 0.95, n_resamples: int = 2000,
+                      cpu: Optional[int] = None, disable_gc: bool = True,
+                      energy_meter: str = 'auto', cpu_tdp_w: float = DEFAULT_CPU_TDP_W,
+                      carbon_intensity: float = DEFAULT_CARBON_INTENSITY,
+                      seed: Optional[int] = None) -> Dict[str, Any]:
+    """A/B benchmark two functions and return a structured verdict.
+
+    Trials are interleaved (ABBA order) after a warm-up, and repeated until the
+    bootstrap confidence interval of the paired time difference is within
+    target_rel_ci of the original mean time, or max_trials / max_time_s is hit.
+    Differences are reported as original minus optimized, so positive values
+    mean the optimized function is cheaper.
+    """
+    if min_trials < 2:
+        raise ValueError("min_trials must be at least 2")
+    rng = np.random.default_rng(seed)
+    samples = {'original': [], 'optimized': []}
+    funcs = {'original': inefficient_func, 'optimized': optimized_func}
+
+    with _BENCHMARK_LOCK:
+        meter = _create_energy_meter(energy_meter, cpu_tdp_w)
+        try:
+            with _pinned_to_cpu(cpu) as pinned_cpu:
+                for _ in range(warmup):
+                    for arm in ('original', 'optimized'):
+                        _run_trial(funcs[arm], meter, disable_gc)
+
+                converged = False
+                deadline = time.perf_counter() + max_time_s
+                for trial in range(max_trials):
+                    # Alternate which arm runs first to cancel out drift (thermal, frequency scaling)
+                    order = ('original', 'optimized') if trial % 2 == 0 else ('optimized', 'original')
+                    for arm in order:
+                        samples[arm].append(_run_trial(funcs[arm], meter, disable_gc))
+
+                    if trial + 1 < min_trials:
+                        continue
+                    time_diffs = [a['wall_time_s'] - b['wall_time_s']
+                                  for a, b in zip(samples['original'], samples['optimized'])]
+                    ci = bootstrap_ci(time_diffs, confidence, n_resamples, rng)
+                    reference = np.mean([s['wall_time_s'] for s in samples['original']])
+                    if _relative_half_width(ci, reference) <= target_rel_ci:
+                        converged = True
+                        break
+                    if time.perf_counter() > deadline:
+                        break
+        finally:
+            meter.close()
+
+    verdict = {
+        'trials': len(samples['original']),
+        'warmup': warmup,
+        'converged': converged,
+        'confidence': confidence,
+        'energy_source': meter.name,
+        'pinned_cpu': pinned_cpu,
+        'gc_disabled': disable_gc,
+        'difference': {},
+    }
+    for arm in ('original', 'optimized'):
+        verdict[arm] = {}
+        for metric in ('wall_time_s', 'cpu_time_s', 'energy_kwh'):
+            verdict[arm][metric] = _summarize([s[metric] for s in samples[arm]],
+                                              confidence, n_resamples, rng)
+
+    for metric in ('wall_time_s', 'cpu_time_s', 'energy_kwh'):
+        paired = [a[metric] - b[metric] for a, b in zip(samples['original'], samples['optimized'])]
+        summary = _summarize(paired, confidence, n_resamples, rng)
+        summary['significant'] = summary['ci'][0] > 0 or summary['ci'][1] < 0
+        verdict['difference'][metric] = summary
+
+    # Emissions are energy times grid intensity (gCO2/kWh -> kg CO2e)
+    to_kg = carbon_intensity / 1000
+    for arm in ('original', 'optimized'):
+        energy = verdict[arm]['energy_kwh']
+        verdict[arm]['emissions_kg'] = {
+            'mean': energy['mean'] * to_kg,
+            'ci': [bound * to_kg for bound in energy['ci']],
+        }
+    energy_diff = verdict['difference']['energy_kwh']
+    verdict['difference']['emissions_kg'] = {
+        'mean': energy_diff['mean'] * to_kg,
+        'ci': [bound * to_kg for bound in energy_diff['ci']],
+        'significant': energy_diff['significant'],
+    }
+
+    optimized_time = verdict['optimized']['wall_time_s']['mean']
+    verdict['speedup'] = (verdict['original']['wall_time_s']['mean'] / optimized_time
+                          if optimized_time > 0 else float('inf'))
+
+    # Only declare a winner when the energy difference interval excludes zero
+    if not energy_diff['significant']:
+        verdict['winner'] = 'inconclusive'
+    elif energy_diff['ci'][0] > 0:
+        verdict['winner'] = 'optimized'
+    else:
+        verdict['winner'] = 'original'
+    return verdict
+
+
+def format_verdict(verdict: Dict[str, Any]) -> str:
+    """Render a compare_emissions verdict as a human-readable report."""
+    lines = []
+    for arm, title in (('original', 'INEFFICIENT CODE'), ('optimized', 'OPTIMIZED CODE')):
+        stats = verdict[arm]
+        lines.append(f"===================== {title} =====================")
+        lines.append(f"Total carbon emissions: \t{stats['emissions_kg']['mean']:.10f} kg CO2e")
+        lines.append(f"Energy consumed: \t\t{stats['energy_kwh']['mean']:.10f} kWh")
+        low, high = stats['wall_time_s']['ci']
+        lines.append(f"Execution time: \t\t{stats['wall_time_s']['mean']:.6f} s "
+                     f"({verdict['confidence']:.0%} CI {low:.6f}-{high:.6f})\n")
+
+    diff = verdict['difference']['emissions_kg']
+    lines.append("========================= RESULTS =========================")
+    lines.append(f"Trials: {verdict['trials']} (converged: {verdict['converged']}, "
+                 f"energy source: {verdict['energy_source']})")
+    lines.append(f"Speedup: {verdict['speedup']:.2f}x")
+    lines.append(f"Carbon emissions reduced by optimization: {diff['mean']:.10f} kg CO2e "
+                 f"(CI {diff['ci'][0]:.10f} to {diff['ci'][1]:.10f})")
+    if verdict['winner'] == 'optimized':
+        lines.append("Interpretation: Optimized code produces less carbon emissions.")
+    elif verdict['winner'] == 'original':
+        lines.append("Interpretation: Inefficient code produces less carbon emissions.")
     else:
-        print("Interpretation: Inefficient code produces less carbon emissions.")
\ No newline at end of file
+        lines.append("Interpretation: No statistically significant difference in emissions.")
+    return '\n'.join(lines)
@@ -1,5 +1,5 @@
 import numpy as np
-from emissions_tracker import compare_emissions
+from emissions_tracker import compare_emissions, format_verdict
 from code_reformatter import refactor_code
 
 # Original sample code
@@ -16,7 +16,7 @@ def process_data():
     
     # Pandas operations that can be converted to NumPy
     mean_value = df.mean()  # Will be converted to np.mean(df)
-    std_value = df.std()    # Will be converted to np.std(df)
+    std_value = df.std()    # Will be converted to np.std(df, axis=0, ddof=1)
     sorted_data = df.sort_values('A')  # Will be converted to np.sort(df)
     
     # List append example
@@ -61,4 +61,5 @@ else:
         print(f"- {change}")
         
     print("\nEmissions comparison:")
-    compare_emissions(original_func, reformatted_func)
\ No newline at end of file
+    verdict = compare_emissions(original_func, reformatted_func)
+    print(format_verdict(verdict))
\ No newline at end of file
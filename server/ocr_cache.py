@@ -0,0 +1,228 @@
+import atexit
+import base64
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+from PIL import Image
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'optipy')
+
+# Thumbnail width and block size used to confirm perceptual matches. Code screenshots
+# that share a layout have near-identical thumbnail hashes, so a candidate is only
+# accepted when no 8x8 block of the 256px-wide thumbnails differs by more than
+# FINGERPRINT_MAX_BLOCK_DIFF grey levels. On the bundled dataset re-encoded copies
+# stay below ~13 while distinct snippets are 19 or more apart.
+FINGERPRINT_WIDTH = 256
+FINGERPRINT_BLOCK = 8
+FINGERPRINT_MAX_BLOCK_DIFF = 12
+
+
+def content_hash(image_bytes: bytes, variant: str = '') -> str:
+    """Exact identity of an upload: SHA-256 of the raw bytes and the settings that turned them into text."""
+    return hashlib.sha256(variant.encode('utf-8') + b'\0' + image_bytes).hexdigest()
+
+
+def perceptual_hash(image: Image.Image, hash_size: int = 16) -> int:
+    """Difference hash (dHash) of hash_size**2 bits; survives re-encoding and resizing."""
+    small = np.asarray(image.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS),
+                       dtype=np.int16)
+    bits = 0
+    for bit in (small[:, :-1] > small[:, 1:]).ravel():
+        bits = (bits << 1) | int(bit)
+    return bits
+
+
+def fingerprint(image: Image.Image) -> np.ndarray:
+    """Grayscale thumbnail of fixed width used to confirm perceptual-hash candidates."""
+    height = max(1, round(image.height * FINGERPRINT_WIDTH / image.width))
+    return np.asarray(image.convert('L').resize((FINGERPRINT_WIDTH, height), Image.Resampling.BOX))
+
+
+def fingerprints_match(a: np.ndarray, b: np.ndarray) -> bool:
+    # Rescaled copies may round to a thumbnail one row taller or shorter
+    if a.shape[1] != b.shape[1] or abs(a.shape[0] - b.shape[0]) > 1:
+        return False
+    block = FINGERPRINT_BLOCK
+    height = (min(a.shape[0], b.shape[0]) // block) * block
+    width = (a.shape[1] // block) * block
+    diff = np.abs(a[:height, :width].astype(np.int16) - b[:height, :width].astype(np.int16))
+    block_means = diff.reshape(height // block, block, width // block, block).mean(axis=(1, 3))
+    return block_means.size == 0 or block_means.max() <= FINGERPRINT_MAX_BLOCK_DIFF
+
+
+def _encode_fingerprint(thumbnail: np.ndarray) -> str:
+    buffer = io.BytesIO()
+    Image.fromarray(thumbnail).save(buffer, format='PNG', optimize=True)
+    return base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def _decode_fingerprint(encoded: str) -> np.ndarray:
+    with Image.open(io.BytesIO(base64.b64decode(encoded))) as image:
+        return np.asarray(image.convert('L'))
+
+
+class OCRCache:
+    """Size-bounded LRU cache of cleaned OCR text keyed by image content.
+
+    Lookups first try the SHA-256 of the image bytes; on a miss, an optional
+    perceptual hash finds candidates for the same screenshot re-encoded or
+    resized, confirmed against a thumbnail fingerprint. Entries are persisted
+    as JSON so repeated dataset runs and re-uploads skip OCR.
+
+    variant names the settings the stored text depends on (cleanup rules,
+    repair); entries stored under another variant never match. Persisted
+    puts are written every save_every puts and at exit, not one by one.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 512,
+                 max_text_chars: int = 20_000_000, use_perceptual_hash: bool = True,
+                 max_hamming_distance: int = 16, variant: str = '', save_every: int = 32):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_text_chars = max_text_chars
+        self.use_perceptual_hash = use_perceptual_hash
+        self.max_hamming_distance = max_hamming_distance
+        self.variant = variant
+        self.save_every = save_every
+
+        # content hash -> {'text': str, 'variant': str, 'phash': int or None, 'fingerprint': base64 PNG or None}
+        self._entries = OrderedDict()
+        self._fingerprints = {}  # content hash -> decoded thumbnail, filled lazily
+        self._text_chars = 0
+        self._lock = threading.Lock()
+        # Serializes writers, so each replace installs a complete, newer snapshot
+        self._save_lock = threading.Lock()
+        self._unsaved = 0
+        self.hits = 0
+        self.perceptual_hits = 0
+        self.misses = 0
+        self._load()
+        if path:
+            atexit.register(self.save)
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except (OSError, ValueError):
+            return  # A corrupt cache is only a performance loss
+        for key, entry in entries:
+            self._entries[key] = entry
+            self._text_chars += len(entry['text'])
+        self._evict()
+
+    def save(self):
+        """Write the cache to disk atomically if anything changed since the last write."""
+        if not self.path:
+            return
+        with self._save_lock:
+            with self._lock:
+                if not self._unsaved:
+                    return
+                entries = list(self._entries.items())
+                self._unsaved = 0
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            # A temp file of its own in the same directory, so os.replace stays atomic
+            fd, tmp_path = tempfile.mkstemp(prefix=os.path.basename(self.path) + '.', suffix='.tmp', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(entries, f)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                with self._lock:
+                    self._unsaved += 1  # Still to be written
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries
+                                 or self._text_chars > self.max_text_chars):
+            key, entry = self._entries.popitem(last=False)
+            self._text_chars -= len(entry['text'])
+            self._fingerprints.pop(key, None)
+
+    def _perceptual_keys(self, image_bytes: bytes):
+        """Perceptual hash and thumbnail of an image, or (None, None)."""
+        if not self.use_perceptual_hash:
+            return None, None
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as image:
+                return perceptual_hash(image), fingerprint(image)
+        except Exception:
+            return None, None  # Undecodable images can still be cached by content hash
+
+    def _stored_fingerprint(self, key: str, entry: Dict[str, Any]) -> Optional[np.ndarray]:
+        if key not in self._fingerprints and entry.get('fingerprint'):
+            self._fingerprints[key] = _decode_fingerprint(entry['fingerprint'])
+        return self._fingerprints.get(key)
+
+    def get(self, image_bytes: bytes) -> Optional[str]:
+        """Return cached text for an image, or None."""
+        key = content_hash(image_bytes, self.variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry['text']
+
+        phash, thumbnail = self._perceptual_keys(image_bytes)
+        with self._lock:
+            if phash is not None:
+                for other_key, other in reversed(self._entries.items()):
+                    other_phash = other.get('phash')
+                    if other.get('variant', '') != self.variant or other_phash is None or (phash ^ other_phash).bit_count() > self.max_hamming_distance:
+                        continue
+                    other_thumbnail = self._stored_fingerprint(other_key, other)
+                    if other_thumbnail is not None and fingerprints_match(thumbnail, other_thumbnail):
+                        self._entries.move_to_end(other_key)
+                        self.perceptual_hits += 1
+                        return other['text']
+            self.misses += 1
+        return None
+
+    def put(self, image_bytes: bytes, text: str, persist: bool = True):
+        """Store the cleaned text for an image; with persist, write the cache once save_every puts are pending."""
+        if text is None:
+            return
+        key = content_hash(image_bytes, self.variant)
+        phash, thumbnail = self._perceptual_keys(image_bytes)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._text_chars -= len(previous['text'])
+            self._entries[key] = {
+                'text': text,
+                'variant': self.variant,
+                'phash': phash,
+                'fingerprint': _encode_fingerprint(thumbnail) if thumbnail is not None else None,
+            }
+            if thumbnail is not None:
+                self._fingerprints[key] = thumbnail
+            self._text_chars += len(text)
+            self._evict()
+            self._unsaved += 1
+            due = persist and self._unsaved >= self.save_every
+        if due:
+            self.save()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.perceptual_hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'hits': self.hits,
+            'perceptual_hits': self.perceptual_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.perceptual_hits) / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,179 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+OCR_SPACE_URL = 'https://api.ocr.space/parse/image'
+
+# Responses worth retrying: rate limiting and transient server errors
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class OCRSpaceError(Exception):
+    """Raised when OCR.space rejects a request or keeps failing after retries."""
+
+
+class OCRSpaceClient:
+    """Connection-pooled OCR.space client with timeouts, bounded concurrency and retries.
+
+    One client is meant to be shared by the whole process: requests reuse the
+    pooled keep-alive connections of a single requests.Session, at most
+    max_concurrency requests are in flight at once, and 429/5xx responses or
+    connection failures are retried with full-jitter exponential backoff.
+    """
+
+    def __init__(self, api_key: str, api_url: str = OCR_SPACE_URL,
+                 connect_timeout: float = 5.0, read_timeout: float = 30.0,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 max_concurrency: int = 4, session: Optional[requests.Session] = None):
+        self.api_key = api_key
+        self.api_url = api_url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_concurrency = max_concurrency
+
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def build_payload(self, filetype: str = 'PNG', **options) -> Dict[str, str]:
+        """Form fields for one OCR request; options override the defaults."""
+        payload = {
+            'apikey': self.api_key,
+            'language': 'eng',
+            'isOverlayRequired': 'false',
+            'OCREngine': '2',  # Use the more accurate OCR engine
+            'detectOrientation': 'true',
+            'scale': 'true',
+            'isTable': 'false',
+            'isCreateSearchablePdf': 'false',
+            'isSearchablePdfHideTextLayer': 'false',
+            'filetype': filetype.upper(),
+        }
+        payload.update({key: str(value) for key, value in options.items()})
+        return payload
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after:
+            try:
+                delay = max(delay, min(self.backoff_max, float(retry_after)))
+            except ValueError:
+                pass  # HTTP-date form; fall back to the jittered delay
+        return delay
+
+    def ocr(self, image_bytes: bytes, filetype: str = 'PNG', **options) -> Dict[str, Any]:
+        """OCR one image and return the decoded OCR.space response."""
+        payload = self.build_payload(filetype, **options)
+        # Raw multipart upload: base64 would inflate the request body by a third
+        mime = 'image/jpeg' if filetype.upper() in ('JPG', 'JPEG') else f'image/{filetype.lower()}'
+        files = {'file': (f'image.{filetype.lower()}', image_bytes, mime)}
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self._backoff(attempt - 1, getattr(last_error, 'retry_after', None)))
+            try:
+                with self._slots:
+                    response = self.session.post(self.api_url, data=payload, files=files,
+                                                 timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = e
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES:
+                last_error = OCRSpaceError(f"OCR API returned HTTP {response.status_code}")
+                last_error.retry_after = response.headers.get('Retry-After')
+                continue
+            if response.status_code >= 400:
+                raise OCRSpaceError(f"OCR API returned HTTP {response.status_code}")
+
+            result = response.json()
+            if result.get('IsErroredOnProcessing'):
+                raise OCRSpaceError(f"OCR API Error: {result.get('ErrorMessage', 'Unknown error')}")
+            return result
+
+        raise OCRSpaceError(f"OCR request failed after {self.max_retries + 1} attempts: {last_error}")
+
+    def extract_text(self, image_bytes: bytes, filetype: str = 'PNG', **options) -> str:
+        """OCR one image and return its parsed text ('' when nothing was recognised)."""
+        result = self.ocr(image_bytes, filetype, **options)
+        parsed = result.get('ParsedResults') or []
+        return parsed[0].get('ParsedText', '') if parsed else ''
+
+    def extract_lines(self, image_bytes: bytes, filetype: str = 'PNG', **options) -> List[Dict[str, Any]]:
+        """OCR one image and return its lines as {'text', 'box', 'words'} from the text overlay.
+
+        Boxes are (left, top, right, bottom) pixels; words are (text, None, box)
+        tuples, since OCR.space reports no per-word confidence.
+        """
+        result = self.ocr(image_bytes, filetype, **dict(options, isOverlayRequired='true'))
+        parsed = result.get('ParsedResults') or []
+        if not parsed:
+            return []
+        lines = []
+        for line in (parsed[0].get('TextOverlay') or {}).get('Lines') or []:
+            words = [(word['WordText'], None,
+                      (word['Left'], word['Top'], word['Left'] + word['Width'], word['Top'] + word['Height']))
+                     for word in line.get('Words') or []]
+            if not words:
+                continue
+            lines.append({
+                'text': line.get('LineText') or ' '.join(text for text, _, _ in words),
+                'box': (min(box[0] for _, _, box in words), min(box[1] for _, _, box in words),
+                        max(box[2] for _, _, box in words), max(box[3] for _, _, box in words)),
+                'words': words,
+            })
+        if not lines:
+            # No overlay: fall back to the plain text without geometry
+            lines = [{'text': text, 'box': (0, 0, 0, 0), 'words': []}
+                     for text in parsed[0].get('ParsedText', '').splitlines() if text.strip()]
+        lines.sort(key=lambda line: line['box'][1])
+        return lines
+
+    def extract_texts(self, images: Iterable[bytes], filetype: str = 'PNG',
+                      **options) -> List[Optional[str]]:
+        """OCR many images concurrently; failed images yield None, results keep input order."""
+        return self._map(self.extract_text, images, filetype, options)
+
+    def extract_all_lines(self, images: Iterable[bytes], filetype: str = 'PNG',
+                          **options) -> List[Optional[List[Dict[str, Any]]]]:
+        """extract_lines for many images concurrently; failed images yield None."""
+        return self._map(self.extract_lines, images, filetype, options)
+
+    def _map(self, extract, images, filetype, options):
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                                    thread_name_prefix='ocr-space')
+        futures = [self._executor.submit(extract, image, filetype, **options)
+                   for image in images]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"Error during extraction: {str(e)}")
+                results.append(None)
+        return results
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,3100 @@
+import ast
+import builtins
+import copy
+import importlib
+import itertools
+import re
+import string
+import sys
+from typing import Dict, List, Optional, Tuple, Type
+
+from dataflow import (COMPREHENSIONS, FRAME_METHODS, NUMBERS, NUMPY_ELEMENTWISE, NUMPY_RANDOM_SIZED, NUMPY_SIZED,
+                      PANDAS_FRAME_FUNCTIONS, SCOPES, imported_alias)
+from static_analyzer import BytecodeAnalyzer
+
+
+class RewriteRule:
+    """One optimization the reformatter can apply.
+
+    A rule declares the AST node types it matches, a precondition (matches) and
+    the rewrite itself, plus an estimated energy gain: the fraction of the
+    matched construct's energy the rewrite is expected to save. Rules are
+    registered by name with @register and looked up by node type, so adding
+    one never touches the traversal.
+    """
+
+    name = ''
+    node_types: Tuple[Type[ast.AST], ...] = ()
+    description = ''
+    energy_gain = 0.0
+    enabled_by_default = True
+    # Rules that undo this one; enabling both would rewrite back and forth
+    conflicts: Tuple[str, ...] = ()
+
+    def matches(self, node: ast.AST, context) -> bool:
+        """Whether the rewrite applies to node.
+
+        context is the running reformatter; context.parents lists node's
+        ancestors, nearest last.
+        """
+        return True
+
+    def rewrite(self, node: ast.AST, context) -> Optional[ast.AST]:
+        """The replacement for node (a list of statements may replace a statement), or None to leave it alone"""
+        raise NotImplementedError
+
+    def change_message(self, node: ast.AST) -> str:
+        """Human-readable record of applying this rule to node"""
+        return self.description
+
+
+RULES: Dict[str, RewriteRule] = {}
+
+
+def register(rule_class):
+    """Class decorator adding a rule to the registry under its name"""
+    if not rule_class.name or not rule_class.node_types:
+        raise ValueError(f"{rule_class.__name__} needs a name and node_types")
+    RULES[rule_class.name] = rule_class()
+    return rule_class
+
+
+def select_rules(toggles: Optional[Dict[str, bool]] = None) -> List[RewriteRule]:
+    """Registered rules that are enabled by default or by toggles ({name: enabled})"""
+    toggles = toggles or {}
+    unknown = set(toggles) - set(RULES)
+    if unknown:
+        raise ValueError(f"Unknown rewrite rule(s): {', '.join(sorted(unknown))}")
+    rules = [rule for name, rule in RULES.items() if toggles.get(name, rule.enabled_by_default)]
+    names = {rule.name for rule in rules}
+    for rule in rules:
+        clashing = names.intersection(rule.conflicts)
+        if clashing:
+            raise ValueError(f"Rewrite rule {rule.name} cannot be combined with {', '.join(sorted(clashing))}")
+    return rules
+
+
+def build_dispatch(rules: List[RewriteRule]) -> Dict[Type[ast.AST], List[RewriteRule]]:
+    """Node type -> rules to try on it, highest estimated gain first"""
+    dispatch: Dict[Type[ast.AST], List[RewriteRule]] = {}
+    for rule in sorted(rules, key=lambda rule: -rule.energy_gain):
+        for node_type in rule.node_types:
+            dispatch.setdefault(node_type, []).append(rule)
+    return dispatch
+
+
+def describe_rules() -> List[Dict]:
+    """Name, description, node types, gain and default state of every registered rule"""
+    return [{'name': rule.name, 'description': rule.description,
+             'node_types': [node_type.__name__ for node_type in rule.node_types],
+             'energy_gain': rule.energy_gain, 'enabled_by_default': rule.enabled_by_default}
+            for rule in RULES.values()]
+
+
+# Builtins that certainly return a str
+STR_BUILTINS = {'str', 'repr', 'ascii', 'chr', 'format', 'hex', 'oct', 'bin', 'input'}
+
+
+def is_str_expression(node: ast.AST) -> bool:
+    """Whether node certainly evaluates to a str (or raises)"""
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, str)
+    if isinstance(node, ast.JoinedStr):
+        return True
+    if isinstance(node, ast.Call):
+        if isinstance(node.func, ast.Name):
+            return node.func.id in STR_BUILTINS
+        # 'sep'.join(...), 'x'.upper() ...
+        return isinstance(node.func, ast.Attribute) and is_str_expression(node.func.value)
+    if isinstance(node, ast.BinOp):
+        return isinstance(node.op, (ast.Add, ast.Mod)) and is_str_expression(node.left)
+    return False
+
+
+def enclosing_block(node: ast.AST, parent: ast.AST) -> Optional[List[ast.stmt]]:
+    """The statement list of parent that holds node"""
+    for _, value in ast.iter_fields(parent):
+        if isinstance(value, list) and any(item is node for item in value):
+            return value
+    return None
+
+
+def names_in(node: ast.AST) -> set:
+    return {child.id for child in ast.walk(node) if isinstance(child, ast.Name)}
+
+
+def target_live_after(loop: ast.For, flow, root: ast.AST) -> bool:
+    """Whether a name the loop binds may be read once it ends, where a comprehension would not have set it"""
+    live = names_in(loop.target) & flow.live_after(loop)
+    if isinstance(flow.scope, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return bool(live)
+    # Module and class names all outlive the body: only a read outside the loop keeps one live
+    # (comprehensions binding the name have their own)
+    inside = {id(child) for child in ast.walk(loop)}
+    for comprehension in ast.walk(root):
+        if isinstance(comprehension, COMPREHENSIONS):
+            bound = set().union(*(names_in(generator.target) for generator in comprehension.generators))
+            inside.update(id(child) for child in ast.walk(comprehension)
+                          if isinstance(child, ast.Name) and child.id in bound)
+    return any(isinstance(child, ast.Name) and child.id in live and id(child) not in inside
+               for child in ast.walk(root))
+
+
+def unused_name(base: str, context) -> str:
+    """base, or base_2, base_3 ... whichever is neither used in the tree nor already handed out"""
+    root = context.parents[0]
+    taken = names_in(root) | {child.arg for child in ast.walk(root) if isinstance(child, ast.arg)}
+    taken |= context.new_names
+    name, number = base, 1
+    while name in taken:
+        number += 1
+        name = f'{base}_{number}'
+    context.new_names.add(name)
+    return name
+
+
+# Side-effect-free builtins whose results are immutable or already existing objects
+PURE_BUILTINS = {'len', 'abs', 'round', 'int', 'float', 'bool', 'str', 'repr', 'ord', 'chr',
+                 'min', 'max', 'sum', 'range', 'hash'}
+# Module -> side-effect-free functions (None: all of them)
+PURE_MODULES = {'math': None, 're': {'compile', 'escape'},
+                'os.path': {'join', 'basename', 'dirname', 'splitext', 'normpath'}}
+# Builtins that can change objects passed to them
+MUTATING_BUILTINS = {'setattr', 'delattr', 'exec', 'eval', 'globals', 'locals', 'vars', '__import__'}
+READ_ONLY_METHODS = {'get', 'keys', 'values', 'items', 'count', 'index', 'find', 'rfind', 'startswith',
+                     'endswith', 'upper', 'lower', 'strip', 'lstrip', 'rstrip', 'split', 'rsplit', 'join',
+                     'format', 'replace', 'isdigit', 'isalpha', 'isspace', 'copy'}
+
+
+def is_pure_call(node: ast.Call) -> bool:
+    """Whether node calls a builtin or module function without side effects"""
+    function = node.func
+    if isinstance(function, ast.Name):
+        return function.id in PURE_BUILTINS
+    if isinstance(function, ast.Attribute):
+        try:
+            module = ast.unparse(function.value)
+        except Exception:
+            return False
+        if module in PURE_MODULES:
+            allowed = PURE_MODULES[module]
+            return allowed is None or function.attr in allowed
+    return False
+
+
+def loop_effects(node: ast.AST) -> Tuple[set, set, bool]:
+    """(names node rebinds, names whose objects it may mutate or hand out, whether it calls unknown functions)"""
+    written, touched, opaque = set(), set(), False
+    for child in ast.walk(node):
+        if isinstance(child, ast.Name) and not isinstance(child.ctx, ast.Load):
+            written.add(child.id)
+        elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            written.add(child.name)
+        elif isinstance(child, (ast.Import, ast.ImportFrom)):
+            written.update((alias.asname or alias.name).split('.')[0] for alias in child.names)
+        elif isinstance(child, ast.AugAssign) and isinstance(child.target, ast.Name):
+            # x += ... changes a list or dict in place
+            touched.add(child.target.id)
+            touched.update(escaping(child.value))
+        elif isinstance(child, ast.ExceptHandler) and child.name:
+            written.add(child.name)
+        elif isinstance(child, (ast.Attribute, ast.Subscript)) and not isinstance(child.ctx, ast.Load):
+            touched.update(base_names(child))
+        elif isinstance(child, (ast.Assign, ast.AnnAssign, ast.AugAssign, ast.NamedExpr, ast.Return,
+                                ast.Yield, ast.YieldFrom, ast.Await)) and child.value is not None:
+            touched.update(escaping(child.value))
+        elif isinstance(child, ast.withitem):
+            touched.update(escaping(child.context_expr))
+        elif isinstance(child, ast.Call):
+            function = child.func
+            arguments = child.args + [keyword.value for keyword in child.keywords]
+            if isinstance(function, ast.Name):
+                if not hasattr(builtins, function.id) or function.id in MUTATING_BUILTINS:
+                    opaque = True
+                    touched.update(name for argument in arguments for name in escaping(argument))
+            elif isinstance(function, ast.Attribute) and base_names(function):
+                if not is_pure_call(child) and function.attr not in READ_ONLY_METHODS:
+                    touched.update(base_names(function))
+                    touched.update(name for argument in arguments for name in escaping(argument))
+            else:
+                opaque = True
+    return written, touched, opaque
+
+
+def base_names(node: ast.AST) -> set:
+    """{x} for x, x.a.b and x[i].c; empty when the chain starts at anything but a name"""
+    while isinstance(node, (ast.Attribute, ast.Subscript)):
+        node = node.value
+    return {node.id} if isinstance(node, ast.Name) else set()
+
+
+def escaping(node: ast.AST) -> set:
+    """Names whose objects node hands over as they are (not copies, results or items)"""
+    if isinstance(node, (ast.Name, ast.Attribute)):
+        return base_names(node)
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return {name for element in node.elts for name in escaping(element)}
+    if isinstance(node, ast.Dict):
+        return {name for value in node.keys + node.values if value is not None for name in escaping(value)}
+    if isinstance(node, ast.Starred):
+        return escaping(node.value)
+    if isinstance(node, ast.IfExp):
+        return escaping(node.body) | escaping(node.orelse)
+    if isinstance(node, ast.BoolOp):
+        return {name for value in node.values for name in escaping(value)}
+    if isinstance(node, ast.NamedExpr):
+        return escaping(node.value)
+    return set()
+
+
+def count_uses(node: ast.AST, name: str) -> int:
+    return sum(isinstance(child, ast.Name) and child.id == name for child in ast.walk(node))
+
+
+def used_outside_loops(root: ast.AST, name: str) -> bool:
+    """Whether name is used in root outside the loops and comprehensions that bind it themselves"""
+    pending = [root]
+    while pending:
+        child = pending.pop()
+        if isinstance(child, (ast.For, ast.AsyncFor)) and name in names_in(child.target):
+            continue
+        if (isinstance(child, (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)) and
+                any(name in names_in(generator.target) for generator in child.generators)):
+            continue
+        if isinstance(child, ast.Name) and child.id == name:
+            return True
+        pending.extend(ast.iter_child_nodes(child))
+    return False
+
+
+def bindings(root: ast.AST) -> Dict[str, List[Optional[ast.AST]]]:
+    """Every binding of every name in the tree.
+
+    Each is the value of a plain `name = value`, the ast.arg of a parameter,
+    or None for anything else (loop targets, augmented assignments, imports ...).
+    """
+    found: Dict[str, List[Optional[ast.AST]]] = {}
+    plain = set()
+    for child in ast.walk(root):
+        if isinstance(child, (ast.Assign, ast.AnnAssign)) and child.value is not None:
+            for target in (child.targets if isinstance(child, ast.Assign) else [child.target]):
+                if isinstance(target, ast.Name):
+                    found.setdefault(target.id, []).append(child.value)
+                    plain.add(id(target))
+        elif isinstance(child, ast.arg):
+            found.setdefault(child.arg, []).append(child)
+    for child in ast.walk(root):
+        names = []
+        if isinstance(child, ast.Name) and not isinstance(child.ctx, ast.Load) and id(child) not in plain:
+            names = [child.id]
+        elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names = [child.name]
+        elif isinstance(child, (ast.Import, ast.ImportFrom)):
+            names = [(alias.asname or alias.name).split('.')[0] for alias in child.names]
+        elif isinstance(child, (ast.Global, ast.Nonlocal)):
+            names = child.names
+        elif isinstance(child, (ast.ExceptHandler, ast.MatchAs, ast.MatchStar)) and child.name:
+            names = [child.name]
+        for name in names:
+            found.setdefault(name, []).append(None)
+    return found
+
+
+LITERAL_TYPES = (int, float, complex, str, bool)
+
+
+def is_literal(node: Optional[ast.AST]) -> bool:
+    """Number, str or bool literal, negative numbers included"""
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+        node = node.operand
+    return isinstance(node, ast.Constant) and isinstance(node.value, LITERAL_TYPES)
+
+
+def constant_names(root: ast.AST) -> set:
+    """Names only ever bound to literals"""
+    return {name for name, values in bindings(root).items() if all(is_literal(value) for value in values)}
+
+
+def int_names(root: ast.AST) -> set:
+    """Names only ever bound to int literals or as the variable of a for loop over range()"""
+    ranged: Dict[str, int] = {}
+    for child in ast.walk(root):
+        if (isinstance(child, (ast.For, ast.comprehension)) and isinstance(child.target, ast.Name) and
+                isinstance(child.iter, ast.Call) and isinstance(child.iter.func, ast.Name) and
+                child.iter.func.id == 'range'):
+            ranged[child.target.id] = ranged.get(child.target.id, 0) + 1
+    return {name for name, values in bindings(root).items()
+            if sum(is_int_expression(value, set()) for value in values) + ranged.get(name, 0) == len(values)}
+
+
+def literal_tuples(root: ast.AST) -> set:
+    """Names only ever bound to tuples of literals"""
+    return {name for name, values in bindings(root).items()
+            if all(isinstance(value, ast.Tuple) and all(is_literal(item) for item in value.elts) for value in values)}
+
+
+INT_OPS = (ast.Add, ast.Sub, ast.Mult, ast.FloorDiv, ast.Mod)
+
+
+def is_int_expression(node: Optional[ast.AST], ints: set) -> bool:
+    """Whether node certainly evaluates to an int (not a bool), given that the names in ints hold ints"""
+    if isinstance(node, ast.Constant):
+        return type(node.value) is int
+    if isinstance(node, ast.Name):
+        return node.id in ints
+    if isinstance(node, ast.UnaryOp):
+        return isinstance(node.op, (ast.USub, ast.UAdd, ast.Invert)) and is_int_expression(node.operand, ints)
+    if isinstance(node, ast.BinOp):
+        return (isinstance(node.op, INT_OPS) and is_int_expression(node.left, ints) and
+                is_int_expression(node.right, ints))
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and len(node.args) == 1 and not node.keywords:
+        return node.func.id in ('len', 'int', 'ord', 'hash')
+    return False
+
+
+# Names modules are usually imported under
+MODULE_ALIASES = {'numpy': 'np', 'pandas': 'pd'}
+
+
+def module_alias(module: str, context) -> str:
+    """Name to reach module by; the reformatter adds `import module as <name>` if the tree has none and uses it"""
+    alias = imported_alias(module, context.parents[0]) or context.new_imports.get(module)
+    if alias is None:
+        alias = unused_name(MODULE_ALIASES.get(module, module), context)
+        context.new_imports[module] = alias
+    return alias
+
+
+def derived_names(root: ast.AST, source) -> set:
+    """Names every binding of which source() accepts.
+
+    source(value) gets each binding (see bindings) and returns True for a
+    new object of the kind, the set of names it is derived from (all of
+    which must qualify too), or None. Names that only derive from each
+    other are not accepted.
+    """
+    sources = {name: [source(value) for value in values] for name, values in bindings(root).items()}
+    names = {name for name, found in sources.items() if all(found)}
+    changed = True
+    while changed:
+        changed = False
+        for name in list(names):
+            if any(found is not True and not found <= names for found in sources[name]):
+                names.discard(name)
+                changed = True
+    grounded, changed = set(), True
+    while changed:
+        changed = False
+        for name in names - grounded:
+            if any(found is True or found <= grounded for found in sources[name]):
+                grounded.add(name)
+                changed = True
+    return grounded
+
+
+def pandas_frames(root: ast.AST) -> set:
+    """Names that certainly hold a pandas DataFrame.
+
+    Every binding of the name must be a pandas DataFrame constructor or
+    reader, a parameter annotated pd.DataFrame, or a frame method, column
+    list or boolean selection on another such name.
+    """
+    pandas = imported_alias('pandas', root)
+    if pandas is None:
+        return set()
+
+    def source(value):
+        if isinstance(value, ast.arg):
+            return value.annotation is not None and ast.unparse(value.annotation) == f'{pandas}.DataFrame' or None
+        if isinstance(value, ast.Call) and isinstance(value.func, ast.Attribute):
+            function = value.func
+            if isinstance(function.value, ast.Name) and function.value.id == pandas:
+                return function.attr in PANDAS_FRAME_FUNCTIONS or None
+            if (function.attr in FRAME_METHODS and isinstance(function.value, ast.Name) and
+                    not any(keyword.arg == 'inplace' for keyword in value.keywords)):
+                return {function.value.id}
+        if isinstance(value, ast.Subscript) and isinstance(value.value, ast.Name):
+            if isinstance(value.slice, (ast.List, ast.Compare)):
+                return {value.value.id}
+        return None
+
+    return derived_names(root, source)
+
+
+def unique_index_frames(root: ast.AST) -> set:
+    """Names that certainly hold a pandas DataFrame whose index has no repeated label.
+
+    Every binding must build a fresh RangeIndex (pd.DataFrame of literal
+    columns or rows, pd.read_csv/read_table/read_excel without index_col,
+    reset_index(), merge() on columns) or give index= a list of distinct
+    literals, or be a method or selection that only drops or reorders the
+    rows of another such frame.
+    """
+    pandas = imported_alias('pandas', root)
+    if pandas is None:
+        return set()
+    literal = (ast.List, ast.Tuple, ast.ListComp, ast.Constant)
+    keeping = {'copy', 'dropna', 'fillna', 'sort_values', 'sort_index', 'query', 'assign', 'head', 'tail',
+               'drop', 'astype', 'drop_duplicates'}
+
+    def source(value):
+        if not isinstance(value, ast.Call) or not isinstance(value.func, ast.Attribute):
+            if isinstance(value, ast.Subscript) and isinstance(value.value, ast.Name):
+                if isinstance(value.slice, (ast.List, ast.Compare)):
+                    return {value.value.id}
+            return None
+        function, keywords = value.func, {keyword.arg: keyword.value for keyword in value.keywords}
+        if isinstance(function.value, ast.Name) and function.value.id == pandas:
+            if function.attr == 'DataFrame':
+                if len(value.args) != 1 or set(keywords) - {'index', 'columns', 'dtype'}:
+                    return None
+                data = value.args[0]
+                columns = data.values if isinstance(data, ast.Dict) else [data]
+                if not all(isinstance(column, literal) or
+                           (isinstance(column, ast.Call) and isinstance(column.func, ast.Attribute) and
+                            column.func.attr == 'Categorical') for column in columns):
+                    return None
+                if 'index' not in keywords:
+                    return True
+                labels = keywords['index']
+                return (isinstance(labels, (ast.List, ast.Tuple)) and all(is_literal(label) for label in labels.elts)
+                        and len({ast.dump(label) for label in labels.elts}) == len(labels.elts)) or None
+            if function.attr in ('read_csv', 'read_table', 'read_excel'):
+                return (len(value.args) <= 1 and 'index_col' not in keywords) or None
+            return None
+        if not isinstance(function.value, ast.Name) or 'inplace' in keywords:
+            return None
+        if function.attr == 'reset_index' or (function.attr == 'merge' and
+                                              not {'left_index', 'right_index'} & set(keywords)):
+            return True
+        if function.attr == 'rename' and not value.args and set(keywords) <= {'columns'}:
+            return {function.value.id}
+        return {function.value.id} if function.attr in keeping else None
+
+    return derived_names(root, source)
+
+
+# Floating-point dtypes as np.<attr>, a builtin name or a string
+FLOAT_DTYPES = {'float', 'float16', 'float32', 'float64', 'float_', 'double', 'single', 'half', 'longdouble',
+                'f2', 'f4', 'f8', 'd', 'f'}
+# Array constructor -> index of its positional dtype argument
+DTYPE_POSITIONS = {'zeros': 1, 'ones': 1, 'empty': 1, 'full': 2, 'arange': 3, 'linspace': 5}
+
+
+def numpy_arrays(root: ast.AST) -> set:
+    """Names that certainly hold a new 1-D numeric NumPy array.
+
+    Every binding must be an array constructor given a length (np.zeros(n),
+    np.arange(...), np.random.rand(n) ...), np.array/np.asarray of a flat
+    list of numbers, a range or a list comprehension, an element-wise NumPy
+    function or .copy() of such arrays, or arithmetic mixing them with
+    literals. An explicit dtype must be a float one: a fixed-width integer
+    array (dtype=np.int8) refuses out-of-range Python ints in a loop but
+    wraps silently in whole-array arithmetic.
+    """
+    numpy = imported_alias('numpy', root)
+    if numpy is None:
+        return set()
+    constants = constant_names(root)
+
+    def float_dtype(call):
+        """Whether call leaves the dtype to NumPy or asks for a float one"""
+        dtypes = [keyword.value for keyword in call.keywords if keyword.arg == 'dtype']
+        position = DTYPE_POSITIONS.get(call.func.attr)
+        if position is not None and len(call.args) > position:
+            dtypes.append(call.args[position])
+        for dtype in dtypes:
+            if isinstance(dtype, ast.Constant) and isinstance(dtype.value, str):
+                name = dtype.value.lstrip('<>=')
+            elif isinstance(dtype, ast.Name):
+                name = dtype.id
+            elif isinstance(dtype, ast.Attribute) and isinstance(dtype.value, ast.Name) and dtype.value.id == numpy:
+                name = dtype.attr
+            else:
+                return False
+            if name not in FLOAT_DTYPES:
+                return False
+        return True
+
+    def flat_numbers(value):
+        if isinstance(value, (ast.List, ast.Tuple)):
+            return all(is_literal(element) and not isinstance(getattr(element, 'value', 0), str)
+                       for element in value.elts)
+        if isinstance(value, ast.ListComp):
+            return not isinstance(value.elt, (ast.List, ast.Tuple)) and not is_str_expression(value.elt)
+        return isinstance(value, ast.Call) and isinstance(value.func, ast.Name) and value.func.id == 'range'
+
+    def source(value):
+        if isinstance(value, ast.Name):
+            return {value.id}
+        if isinstance(value, ast.BinOp) and isinstance(value.op, Vectorizer.BINARY_OPS):
+            parts = [part for part in (value.left, value.right) if not (is_literal(part) or
+                                                                        (isinstance(part, ast.Name) and
+                                                                         part.id in constants))]
+            found = [source(part) for part in parts]
+            if not parts or None in found:
+                return None
+            return set().union(*[part for part in found if part is not True]) or True
+        if not isinstance(value, ast.Call) or not isinstance(value.func, ast.Attribute):
+            return None
+        function, arguments = value.func, value.args
+        if function.attr == 'copy' and not arguments:
+            return source(function.value)
+        if not float_dtype(value):
+            return None
+        module = function.value
+        if isinstance(module, ast.Attribute) and module.attr == 'random':
+            size = [keyword.value for keyword in value.keywords if keyword.arg == 'size']
+            size += arguments[NUMPY_RANDOM_SIZED[function.attr]:][:1] if function.attr in NUMPY_RANDOM_SIZED else []
+            return (isinstance(module.value, ast.Name) and module.value.id == numpy and len(size) == 1 and
+                    not isinstance(size[0], (ast.Tuple, ast.List)) and function.attr in NUMPY_RANDOM_SIZED) or None
+        if not (isinstance(module, ast.Name) and module.id == numpy and arguments):
+            return None
+        if function.attr in NUMPY_SIZED:
+            return not isinstance(arguments[0], (ast.Tuple, ast.List)) or None
+        if function.attr in ('array', 'asarray'):
+            return (len(arguments) == 1 and flat_numbers(arguments[0])) or None
+        if function.attr in NUMPY_ELEMENTWISE:
+            found = [source(argument) for argument in arguments
+                     if not (is_literal(argument) or (isinstance(argument, ast.Name) and argument.id in constants))]
+            if not found or None in found:
+                return None
+            return set().union(*[part for part in found if part is not True]) or True
+        return None
+
+    return derived_names(root, source)
+
+
+def numpy_length(name: str, root: ast.AST, seen=frozenset()):
+    """The length every binding of array name gives it: an int, ('expr', dump) for an expression, or None"""
+    numpy = imported_alias('numpy', root)
+    lengths = set()
+    for value in bindings(root).get(name, [None]):
+        length = _array_length(value, numpy, root, seen | {name})
+        if length is None:
+            return None
+        lengths.add(length)
+    return lengths.pop() if len(lengths) == 1 else None
+
+
+def length_key(node: ast.AST, root: ast.AST):
+    """A length expression as an int when it is one (a literal or a name only bound to one), else its dump"""
+    if isinstance(node, ast.Name):
+        values = bindings(root).get(node.id, [None])
+        if all(isinstance(value, ast.Constant) and type(value.value) is int for value in values) and \
+                len({value.value for value in values}) == 1:
+            return values[0].value
+    if isinstance(node, ast.Constant) and type(node.value) is int:
+        return node.value
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id == 'len' and
+            len(node.args) == 1 and isinstance(node.args[0], ast.Name)):
+        length = numpy_length(node.args[0].id, root)
+        if length is not None:
+            return length
+    return 'expr', ast.dump(node)
+
+
+def _array_length(value, numpy, root, seen):
+    """The length of the array value builds (see numpy_length), or None"""
+    if isinstance(value, ast.Name):
+        return None if value.id in seen else numpy_length(value.id, root, seen)
+    if isinstance(value, ast.BinOp):
+        parts = [part for part in (value.left, value.right) if not is_literal(part)]
+        lengths = {_array_length(part, numpy, root, seen) for part in parts}
+        return lengths.pop() if len(lengths) == 1 else None
+    if not (isinstance(value, ast.Call) and isinstance(value.func, ast.Attribute)):
+        return None
+    function, arguments = value.func, value.args
+    keywords = {keyword.arg: keyword.value for keyword in value.keywords}
+    if function.attr == 'copy' and not arguments:
+        return _array_length(function.value, numpy, root, seen)
+    module = function.value
+    if isinstance(module, ast.Attribute) and module.attr == 'random':
+        size = keywords.get('size')
+        if size is None and function.attr in NUMPY_RANDOM_SIZED:
+            size = (arguments[NUMPY_RANDOM_SIZED[function.attr]:] or [None])[0]
+        return None if size is None else length_key(size, root)
+    if not (isinstance(module, ast.Name) and module.id == numpy and arguments):
+        return None
+    if function.attr in ('zeros', 'ones', 'empty', 'full'):
+        return length_key(arguments[0], root)
+    if function.attr == 'linspace':
+        return length_key(arguments[2] if len(arguments) > 2 else keywords.get('num', ast.Constant(value=50)), root)
+    if function.attr == 'arange' or (function.attr in ('array', 'asarray') and isinstance(arguments[0], ast.Call) and
+                                     isinstance(arguments[0].func, ast.Name) and arguments[0].func.id == 'range'):
+        bounds = arguments if function.attr == 'arange' else arguments[0].args
+        if len(bounds) == 1:
+            return length_key(bounds[0], root)
+        try:
+            return len(range(*[ast.literal_eval(bound) for bound in bounds]))
+        except (ValueError, TypeError, SyntaxError):
+            return None
+    if function.attr in ('array', 'asarray'):
+        return len(arguments[0].elts) if isinstance(arguments[0], (ast.List, ast.Tuple)) else None
+    if function.attr in NUMPY_ELEMENTWISE:
+        lengths = {_array_length(argument, numpy, root, seen) for argument in arguments if not is_literal(argument)}
+        return lengths.pop() if len(lengths) == 1 else None
+    return None
+
+
+class Vectorizer:
+    """Rewrites an expression over one element (row['a'], a[i]) into the same expression over whole columns or arrays.
+
+    element(node) gives the column or array for an element access (None for
+    anything else). Other names must be in scalars, or, as comparison
+    operands, in loose. Arithmetic, comparisons, and/or/not, abs/round/min/max
+    and math functions map onto their NumPy forms (and/or/not only on
+    booleans, see boolean); str methods and len onto
+    pandas .str when strings is set; a conditional expression becomes
+    np.where only when conditional is set, as it yields an array. A call
+    returns (expression, whether it varies per element), or None when node
+    cannot be vectorized.
+    """
+
+    BINARY_OPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+    COMPARE_OPS = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+    # Builtin or math function -> NumPy function, accepted argument counts
+    FUNCTIONS = {'abs': ('abs', {1}), 'round': ('round', {1, 2}), 'min': ('minimum', {2}), 'max': ('maximum', {2}),
+                 'math.fabs': ('abs', {1}), 'math.sqrt': ('sqrt', {1}), 'math.exp': ('exp', {1}),
+                 'math.log': ('log', {1}), 'math.log10': ('log10', {1}), 'math.log2': ('log2', {1}),
+                 'math.sin': ('sin', {1}), 'math.cos': ('cos', {1}), 'math.tan': ('tan', {1})}
+    STRING_METHODS = {'upper', 'lower', 'strip', 'lstrip', 'rstrip', 'title', 'capitalize', 'startswith',
+                      'endswith', 'replace'}
+
+    def __init__(self, element, scalars, numpy: str, strings: bool = False, conditional: bool = False,
+                 loose=frozenset()):
+        self.element = element
+        self.scalars = scalars
+        self.numpy = numpy
+        self.strings = strings
+        self.conditional = conditional
+        self.loose = loose
+
+    def __call__(self, node, compared=False):
+        element = self.element(node)
+        if element is not None:
+            return element, True
+        if is_literal(node):
+            return node, False
+        if isinstance(node, ast.Name):
+            return (node, False) if node.id in self.scalars or (compared and node.id in self.loose) else None
+        if isinstance(node, ast.BinOp):
+            return self._binary(node)
+        if isinstance(node, ast.UnaryOp):
+            operand = self(node.operand)
+            if operand is None or isinstance(node.op, ast.Invert):
+                return None
+            if isinstance(node.op, ast.Not) and operand[1]:
+                # ~ is bitwise on anything but booleans: ~1 == -2
+                if not self.boolean(node.operand):
+                    return None
+                return ast.UnaryOp(op=ast.Invert(), operand=operand[0]), True
+            return ast.UnaryOp(op=node.op, operand=operand[0]), operand[1]
+        if isinstance(node, ast.BoolOp):
+            return self._boolean(node)
+        if isinstance(node, ast.Compare):
+            return self._compare(node)
+        if isinstance(node, ast.IfExp):
+            parts = [self(part) for part in (node.test, node.body, node.orelse)]
+            if None in parts:
+                return None
+            if not parts[0][1]:
+                return ast.IfExp(test=parts[0][0], body=parts[1][0], orelse=parts[2][0]), parts[1][1] or parts[2][1]
+            if not self.conditional:
+                return None
+            return self.numpy_call('where', [part for part, _ in parts]), True
+        if isinstance(node, ast.Call) and not node.keywords:
+            return self._call(node)
+        return None
+
+    @classmethod
+    def boolean(cls, node):
+        """Whether node, an expression over one element, certainly gives a bool (so it can be a mask)"""
+        if isinstance(node, ast.Compare):
+            return True
+        if isinstance(node, ast.BoolOp):
+            return all(cls.boolean(value) for value in node.values)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            return cls.boolean(node.operand)
+        return (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and
+                node.func.attr in ('startswith', 'endswith'))
+
+    def numpy_call(self, function, arguments):
+        return ast.Call(func=ast.Attribute(value=ast.Name(id=self.numpy, ctx=ast.Load()), attr=function,
+                                           ctx=ast.Load()), args=arguments, keywords=[])
+
+    def _binary(self, node):
+        if not isinstance(node.op, self.BINARY_OPS):
+            return None
+        # int ** negative int is a float in Python but an error for integer arrays
+        if isinstance(node.op, ast.Pow) and not (is_literal(node.right) and
+                                                 not isinstance(node.right, ast.UnaryOp)):
+            return None
+        if isinstance(node.op, ast.Mod) and is_str_expression(node.left):
+            return None
+        left, right = self(node.left), self(node.right)
+        if left is None or right is None:
+            return None
+        return ast.BinOp(left=left[0], op=node.op, right=right[0]), left[1] or right[1]
+
+    def _boolean(self, node):
+        values = [self(value) for value in node.values]
+        if None in values:
+            return None
+        if not any(varies for _, varies in values):
+            return ast.BoolOp(op=node.op, values=[value for value, _ in values]), False
+        # & and | only agree with and/or on booleans
+        if not all(self.boolean(value) for value in node.values):
+            return None
+        operator = ast.BitAnd() if isinstance(node.op, ast.And) else ast.BitOr()
+        result = values[0][0]
+        for value, _ in values[1:]:
+            result = ast.BinOp(left=result, op=operator, right=value)
+        return result, True
+
+    def _compare(self, node):
+        operands = [node.left] + node.comparators
+        tests = []
+        for left, op, right in zip(operands, node.ops, operands[1:]):
+            if isinstance(op, (ast.In, ast.NotIn)):
+                value = self(left, compared=True)
+                if (value is None or not isinstance(right, (ast.List, ast.Tuple, ast.Set)) or
+                        not all(is_literal(item) for item in right.elts)):
+                    return None
+                test = (ast.Compare(left=value[0], ops=[op], comparators=[right]) if not value[1] else
+                        self.numpy_call('isin', [value[0], ast.List(elts=right.elts, ctx=ast.Load())]))
+                if value[1] and isinstance(op, ast.NotIn):
+                    test = ast.UnaryOp(op=ast.Invert(), operand=test)
+                tests.append((test, value[1]))
+            elif isinstance(op, self.COMPARE_OPS):
+                left, right = self(left, compared=True), self(right, compared=True)
+                if left is None or right is None:
+                    return None
+                tests.append((ast.Compare(left=left[0], ops=[op], comparators=[right[0]]), left[1] or right[1]))
+            else:
+                return None
+        if not any(varies for _, varies in tests):
+            return node, False
+        result = tests[0][0]
+        for test, _ in tests[1:]:
+            result = ast.BinOp(left=result, op=ast.BitAnd(), right=test)
+        return result, True
+
+    def _call(self, node):
+        function = node.func
+        if isinstance(function, ast.Name):
+            name = function.id
+        elif isinstance(function, ast.Attribute) and isinstance(function.value, ast.Name) and function.value.id == 'math':
+            name = f'math.{function.attr}'
+        elif isinstance(function, ast.Attribute) and self.strings and function.attr in self.STRING_METHODS:
+            receiver = self(function.value)
+            arguments = [self(argument) for argument in node.args]
+            if receiver is None or not receiver[1] or None in arguments or any(varies for _, varies in arguments):
+                return None
+            strings = ast.Attribute(value=receiver[0], attr='str', ctx=ast.Load())
+            return ast.Call(func=ast.Attribute(value=strings, attr=function.attr, ctx=ast.Load()),
+                            args=[argument for argument, _ in arguments], keywords=[]), True
+        else:
+            return None
+        arguments = [self(argument) for argument in node.args]
+        if None in arguments:
+            return None
+        if not any(varies for _, varies in arguments):
+            return node, False
+        if name == 'len' and self.strings and len(arguments) == 1:
+            strings = ast.Attribute(value=arguments[0][0], attr='str', ctx=ast.Load())
+            return ast.Call(func=ast.Attribute(value=strings, attr='len', ctx=ast.Load()), args=[], keywords=[]), True
+        if name not in self.FUNCTIONS or len(arguments) not in self.FUNCTIONS[name][1]:
+            return None
+        if name == 'round' and len(arguments) == 2 and arguments[1][1]:
+            return None
+        return self.numpy_call(self.FUNCTIONS[name][0], [argument for argument, _ in arguments]), True
+
+
+@register
+class LoopAppendToComprehension(RewriteRule):
+    """for x in xs: result.append(f(x))  ->  result = [f(x) for x in xs]
+
+    Only where the data flow says what result holds when the loop starts:
+    an empty list from a `result = []` nothing reads in between, and that
+    every loop around this one runs again too, is replaced by the
+    comprehension (and the `result = []` dropped if nothing else can read
+    it any more), and any other list is extended with it (when the
+    items cannot see the list being built). Loops appending to lists of
+    unknown origin, attributes or items are left alone, and so are loops
+    whose variable is read afterwards: a comprehension does not set it.
+    """
+
+    name = 'loop_append_to_comprehension'
+    node_types = (ast.For,)
+    description = "Converted for-loop append to list comprehension"
+    energy_gain = 0.3
+
+    # Values of these types cannot lead the items to the list being built
+    SCALARS = ('int', 'float', 'complex', 'bool', 'str')
+
+    def matches(self, node, context):
+        body = node.body
+        if not (len(body) == 1 and not node.orelse and
+                isinstance(body[0], ast.Expr) and
+                isinstance(body[0].value, ast.Call) and
+                isinstance(body[0].value.func, ast.Attribute) and
+                body[0].value.func.attr == 'append' and
+                isinstance(body[0].value.func.value, ast.Name) and
+                len(body[0].value.args) == 1 and not body[0].value.keywords):
+            return False
+        call = body[0].value
+        return call.func.value.id not in names_in(node.target) | names_in(node.iter) | names_in(call.args[0])
+
+    def rewrite(self, node, context):
+        # Extract the target list and append value
+        call = node.body[0].value
+        receiver = call.func.value
+        flow = context.dataflow()
+        if receiver.id in flow.captured or target_live_after(node, flow, context.parents[0]):
+            return None
+        comprehension = ast.ListComp(
+            elt=call.args[0],
+            generators=[ast.comprehension(target=node.target, iter=node.iter, ifs=[], is_async=0)]
+        )
+        definitions = flow.definitions(receiver.id, receiver)
+        loop = flow.span(node)
+        if (len(definitions) == 1 and isinstance(definitions[0].value, ast.List) and not definitions[0].value.elts and
+                not any(definitions[0].point < flow.point_of(use) < loop.start for use in flow.uses(definitions[0])) and
+                all(definitions[0].point in flow.span(outer) for outer in self._outer_loops(context))):
+            # The comprehension replaces the empty list wherever the loop ran
+            context.maybe_dead.extend((statement, flow.scope) for statement in ast.walk(flow.scope)
+                                      if isinstance(statement, ast.Assign) and len(statement.targets) == 1 and
+                                      statement.value is definitions[0].value)
+            target = copy.copy(receiver)
+            target.ctx = ast.Store()
+            node.extended = False
+            return ast.Assign(targets=[target], value=comprehension)
+
+        # Items already in the list stay: extend it, if building the items cannot observe it
+        targets = names_in(node.target)
+        if flow.type_of(receiver) != 'list' or any(
+                isinstance(child, ast.Call) and not is_pure_call(child) or
+                isinstance(child, ast.Name) and child.id not in targets and child.id not in PURE_BUILTINS and
+                flow.type_of(child) not in self.SCALARS
+                for child in ast.walk(call.args[0])):
+            return None
+        node.extended = True
+        return ast.Expr(value=ast.Call(func=ast.Attribute(value=receiver, attr='extend', ctx=ast.Load()),
+                                       args=[comprehension], keywords=[]))
+
+    @staticmethod
+    def _outer_loops(context):
+        """The loops around node in its scope, innermost first"""
+        for parent in reversed(context.parents):
+            if isinstance(parent, SCOPES):
+                return
+            if isinstance(parent, (ast.For, ast.AsyncFor, ast.While)):
+                yield parent
+
+    def change_message(self, node):
+        if node.extended:
+            return "Converted for-loop append to list.extend() with a list comprehension"
+        return self.description
+
+
+@register
+class ComprehensionToGenerator(RewriteRule):
+    """sum([x * x for x in xs])  ->  sum(x * x for x in xs)
+
+    A list comprehension whose only consumer is sum(), any(), all(), max()
+    or min() becomes a generator expression, so the list is never built:
+    passed straight to the call, or stored in a function-local name that
+    the very next statement hands to the call and that is dead after it
+    (as loop_append_to_comprehension leaves behind). any() and all() stop
+    early and a key= sees each item as it is made, so there the elements
+    may only call side-effect-free functions. ''.join() keeps its list,
+    which it builds anyway and reads faster; comprehensions over literal
+    lists and tuples are too small to be worth it.
+    """
+
+    name = 'comprehension_to_generator'
+    node_types = (ast.Call, ast.FunctionDef, ast.AsyncFunctionDef)
+    description = "Replaced a list comprehension consumed once with a generator expression"
+    energy_gain = 0.2
+
+    CONSUMERS = ('sum', 'any', 'all', 'max', 'min')
+    SHORT_CIRCUIT = ('any', 'all')
+    LITERALS = (ast.List, ast.Tuple, ast.Set)
+
+    def matches(self, node, context):
+        if isinstance(node, ast.Call):
+            return self._consumer(node) is not None and isinstance(node.args[0], ast.ListComp)
+        return True
+
+    def rewrite(self, node, context):
+        root = context.parents[0]
+        if isinstance(node, ast.Call):
+            if not self._streamable(node, node.args[0], root):
+                return None
+            node.args[0] = ast.GeneratorExp(elt=node.args[0].elt, generators=node.args[0].generators)
+            node.streamed = None
+            return node
+        streamed = []
+        for block in self._blocks(node.body):
+            index = 0
+            while index + 1 < len(block):
+                call = self._inlinable(node, block[index], block[index + 1], context)
+                if call is None:
+                    index += 1
+                    continue
+                comprehension = block.pop(index).value
+                call.args[0] = ast.GeneratorExp(elt=comprehension.elt, generators=comprehension.generators)
+                streamed.append(f"{call.func.id}()")
+        if not streamed:
+            return None
+        node.streamed = streamed
+        return node
+
+    def change_message(self, node):
+        if node.streamed is None:
+            return f"Replaced the list comprehension passed to {node.func.id}() with a generator expression"
+        return (f"Passed generator expressions straight to {', '.join(node.streamed)} in {node.name}() "
+                f"instead of building lists first")
+
+    def _consumer(self, node):
+        """The builtin name for consumer(<one iterable>, key=..., default=...), or None"""
+        if not (isinstance(node.func, ast.Name) and node.func.id in self.CONSUMERS and len(node.args) >= 1):
+            return None
+        if node.func.id != 'sum' and len(node.args) > 1:
+            return None
+        return node.func.id
+
+    def _streamable(self, call, comprehension, root):
+        """Whether consuming comprehension lazily behaves like consuming the finished list"""
+        if call.func.id in bindings(root) or isinstance(comprehension.generators[0].iter, self.LITERALS):
+            return False
+        if any(isinstance(child, (ast.NamedExpr, ast.Await, ast.Yield, ast.YieldFrom))
+               for child in ast.walk(comprehension)):
+            return False
+        if call.func.id in self.SHORT_CIRCUIT or call.keywords or call.args[1:]:
+            # The items are made while the consumer runs, or not at all
+            parts = [comprehension.elt] + [test for generator in comprehension.generators for test in generator.ifs]
+            parts += call.args[1:] + [keyword.value for keyword in call.keywords]
+            parts += [generator.iter for generator in comprehension.generators[1:]]
+            if any(isinstance(child, ast.Call) and not is_pure_call(child)
+                   for part in parts for child in ast.walk(part)):
+                return False
+        return True
+
+    def _blocks(self, statements):
+        """statements and every statement list nested in them, outside nested functions and classes"""
+        yield statements
+        for statement in statements:
+            if isinstance(statement, SCOPES):
+                continue
+            for field in ('body', 'orelse', 'finalbody'):
+                value = getattr(statement, field, None)
+                if isinstance(value, list) and value and isinstance(value[0], ast.stmt):
+                    yield from self._blocks(value)
+            for handler in getattr(statement, 'handlers', []):
+                yield from self._blocks(handler.body)
+
+    def _inlinable(self, function, first, second, context):
+        """The consumer call in second when first is `name = [...]` and second is its only reader"""
+        if not (isinstance(first, ast.Assign) and len(first.targets) == 1 and isinstance(first.targets[0], ast.Name) and
+                isinstance(first.value, ast.ListComp)):
+            return None
+        name = first.targets[0].id
+        if not isinstance(second, (ast.Assign, ast.AnnAssign, ast.AugAssign, ast.Return, ast.Expr)):
+            return None
+        call = second.value
+        if not (isinstance(call, ast.Call) and self._consumer(call) is not None and
+                isinstance(call.args[0], ast.Name) and call.args[0].id == name and
+                all(is_literal(argument) for argument in call.args[1:])):
+            return None
+        if isinstance(second, ast.AugAssign) and isinstance(second.target, ast.Name) and second.target.id == name:
+            return None
+        # The list reaches only this read, and the name is dead afterwards
+        flow = context.dataflow(function)
+        definitions = flow.definitions(name, call.args[0])
+        if len(definitions) != 1 or definitions[0].value is not first.value:
+            return None
+        uses = flow.uses(definitions[0])
+        if len(uses) != 1 or uses[0] is not call.args[0] or name in flow.live_after(second):
+            return None
+        if not self._streamable(call, first.value, context.parents[0]):
+            return None
+        return call
+
+
+@register
+class FStringToConcatenation(RewriteRule):
+    """f'a{x}'  ->  'a' + str(x); off unless f-strings are not kept.
+
+    Slower than the f-string on current CPython (several calls and temporary
+    strings instead of one BUILD_STRING); kept for callers that must avoid
+    f-strings.
+    """
+
+    name = 'fstring_to_concatenation'
+    node_types = (ast.JoinedStr,)
+    description = "Converted f-string to string concatenation with type conversion"
+    energy_gain = 0.0
+    enabled_by_default = False
+    conflicts = ('string_format_to_fstring',)
+
+    def matches(self, node, context):
+        # str() cannot express format specs ('{x:>5}') or conversions ('{x!r}'),
+        # and a format spec is itself an f-string that must stay one
+        fields = [value for value in node.values if isinstance(value, ast.FormattedValue)]
+        return (bool(fields) and
+                not isinstance(context.parents[-1] if context.parents else None, ast.FormattedValue) and
+                all(field.format_spec is None and field.conversion == -1 for field in fields))
+
+    def rewrite(self, node, context):
+        flow = context.dataflow()
+        parts = []
+        for value in node.values:
+            if isinstance(value, ast.Constant):
+                parts.append(ast.Constant(value=value.value))
+            elif isinstance(value, ast.FormattedValue):
+                # Wrap formatted values with str() for concatenation, unless they are strings already
+                if flow.type_of(value.value) == 'str':
+                    parts.append(value.value)
+                else:
+                    parts.append(ast.Call(func=ast.Name(id='str', ctx=ast.Load()), args=[value.value], keywords=[]))
+        if not parts:
+            return None
+
+        # Build binary operations for string concatenation
+        result = parts[0]
+        for part in parts[1:]:
+            result = ast.BinOp(left=result, op=ast.Add(), right=part)
+        return result
+
+
+@register
+class StringFormatToFString(RewriteRule):
+    """'a' + str(x), 'a %s' % (x,) and 'a {}'.format(x)  ->  f'a{x!s}' / f'a{x}'
+
+    Only rewrites that produce exactly the same string: concatenation of
+    operands known to be strings, %-formatting with a tuple literal and plain
+    %s/%r/%a conversions, and str.format with each argument used once. The
+    f-string builds the result in one BUILD_STRING instead of a method call or
+    a temporary string per +, and constants are formatted into the literal
+    text. Python 3.11+ already compiles such %-formatting to the same
+    bytecode as the f-string, so there that part only changes the style; it
+    is kept because it is never slower and does save work on older versions.
+    """
+
+    name = 'string_format_to_fstring'
+    node_types = (ast.BinOp, ast.Call)
+    description = "Converted %-formatting, str.format() and string concatenation to f-strings"
+    energy_gain = 0.25
+    conflicts = ('fstring_to_concatenation',)
+
+    # Builtins whose result is a string, as the conversion f-strings apply
+    CONVERSIONS = {'str': ord('s'), 'repr': ord('r'), 'ascii': ord('a')}
+    CONVERTERS = {ord('s'): str, ord('r'): repr, ord('a'): ascii, -1: lambda value: value}
+    # %s / %-10s / %.3r ...; anything else (%d, %(key)s, flags) keeps its own semantics
+    PERCENT = re.compile(r'%(?:(%)|(-)?(\d*)(\.\d+)?([sra]))')
+
+    def matches(self, node, context):
+        if isinstance(node, ast.Call):
+            return (isinstance(node.func, ast.Attribute) and node.func.attr == 'format' and
+                    isinstance(node.func.value, ast.Constant) and isinstance(node.func.value.value, str))
+        if isinstance(node.op, ast.Mod):
+            return isinstance(node.left, ast.Constant) and isinstance(node.left.value, str)
+        if not isinstance(node.op, ast.Add):
+            return False
+        # A chain a + b + c is converted once, at its top
+        parent = context.parents[-1] if context.parents else None
+        return not (isinstance(parent, ast.BinOp) and isinstance(parent.op, ast.Add) and parent.left is node and
+                    (self._string_piece(parent.right) is not None or
+                     isinstance(parent.right, ast.Call) and self.matches(parent.right, context)))
+
+    def rewrite(self, node, context):
+        if isinstance(node, ast.Call):
+            values = self._from_format(node)
+        elif isinstance(node.op, ast.Mod):
+            values = self._from_percent(node)
+        else:
+            values = self._from_concatenation(node)
+        if values is None or not any(isinstance(value, ast.FormattedValue) for value in values):
+            return None
+        values = [self._folded(value) for value in values]
+        # ast.unparse cannot put quotes or backslashes inside an f-string expression before Python 3.12
+        for value in values:
+            if isinstance(value, ast.FormattedValue) and any(
+                    isinstance(inner, ast.JoinedStr) or
+                    (isinstance(inner, ast.Constant) and isinstance(inner.value, (str, bytes)))
+                    for inner in ast.walk(value.value)):
+                return None
+        values = self._merge(values)
+        if not any(isinstance(value, ast.FormattedValue) for value in values):
+            return ast.Constant(value=''.join(value.value for value in values))
+        return ast.JoinedStr(values=values)
+
+    def _folded(self, value):
+        """A formatted constant as the literal text it produces"""
+        if not isinstance(value, ast.FormattedValue) or not isinstance(value.value, ast.Constant):
+            return value
+        spec = value.format_spec.values if value.format_spec is not None else []
+        if not all(isinstance(part, ast.Constant) for part in spec):
+            return value
+        try:
+            text = format(self.CONVERTERS[value.conversion](value.value.value), ''.join(part.value for part in spec))
+        except (ValueError, TypeError):
+            return value
+        return ast.Constant(value=text)
+
+    def _string_piece(self, node):
+        """node as f-string values if it certainly evaluates to a str, else None"""
+        if isinstance(node, ast.Constant):
+            return [node] if isinstance(node.value, str) else None
+        if isinstance(node, ast.JoinedStr):
+            return list(node.values)
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in self.CONVERSIONS and
+                len(node.args) == 1 and not node.keywords and not isinstance(node.args[0], ast.Starred)):
+            return [ast.FormattedValue(value=node.args[0], conversion=self.CONVERSIONS[node.func.id], format_spec=None)]
+        return None
+
+    def _from_concatenation(self, node):
+        operands = []
+        while isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+            operands.append(node.right)
+            node = node.left
+        operands.append(node)
+        values = []
+        for operand in reversed(operands):
+            piece = self._string_piece(operand)
+            if piece is None:
+                return None
+            values.extend(piece)
+        return values
+
+    def _from_percent(self, node):
+        # A lone right operand could be a tuple or mapping at runtime; only a tuple literal is certain
+        if not isinstance(node.right, ast.Tuple) or any(isinstance(item, ast.Starred) for item in node.right.elts):
+            return None
+        template, arguments = node.left.value, list(node.right.elts)
+        values, position = [], 0
+        for match in self.PERCENT.finditer(template):
+            if template[position:match.start()].count('%'):
+                return None
+            values.append(ast.Constant(value=template[position:match.start()]))
+            position = match.end()
+            percent, left, width, precision, conversion = match.groups()
+            if percent:
+                values.append(ast.Constant(value='%'))
+                continue
+            if not arguments:
+                return None
+            spec = ('<' if left else '>') + width if width else ''
+            spec += precision or ''
+            values.append(ast.FormattedValue(value=arguments.pop(0), conversion=ord(conversion),
+                                             format_spec=ast.JoinedStr(values=[ast.Constant(value=spec)]) if spec else None))
+        if arguments or '%' in template[position:]:
+            return None
+        values.append(ast.Constant(value=template[position:]))
+        return values
+
+    def _from_format(self, node):
+        if any(isinstance(arg, ast.Starred) for arg in node.args) or any(kw.arg is None for kw in node.keywords):
+            return None
+        arguments = dict(enumerate(node.args))
+        arguments.update((kw.arg, kw.value) for kw in node.keywords)
+        try:
+            fields = list(string.Formatter().parse(node.func.value.value))
+        except ValueError:
+            return None
+        values, used, automatic = [], [], None
+        for literal, field_name, format_spec, conversion in fields:
+            values.append(ast.Constant(value=literal))
+            if field_name is None:
+                continue
+            if field_name == '' or field_name.isdigit():
+                # str.format refuses to mix {} and {0}
+                if automatic is not None and automatic != (field_name == ''):
+                    return None
+                automatic = field_name == ''
+                key = len(used) if automatic else int(field_name)
+            elif field_name.isidentifier():
+                key = field_name
+            else:
+                return None
+            if key not in arguments or key in used or '{' in format_spec or conversion not in (None, 's', 'r', 'a'):
+                return None
+            used.append(key)
+            values.append(ast.FormattedValue(value=arguments[key], conversion=ord(conversion) if conversion else -1,
+                                             format_spec=ast.JoinedStr(values=[ast.Constant(value=format_spec)])
+                                             if format_spec else None))
+        # Every argument is evaluated exactly once either way; a reordering is only safe for side-effect-free ones
+        if len(used) != len(arguments):
+            return None
+        if used != list(arguments) and not all(isinstance(value, (ast.Name, ast.Constant)) for value in arguments.values()):
+            return None
+        return values
+
+    def change_message(self, node):
+        if isinstance(node, ast.Call):
+            return "Converted str.format() call to an f-string"
+        if isinstance(node.op, ast.Mod):
+            return "Converted %-formatting to an f-string"
+        return "Converted string concatenation to an f-string"
+
+    @staticmethod
+    def _merge(values):
+        """Join adjacent literal parts and drop empty ones"""
+        merged = []
+        for value in values:
+            if isinstance(value, ast.Constant):
+                if not value.value:
+                    continue
+                if merged and isinstance(merged[-1], ast.Constant):
+                    merged[-1] = ast.Constant(value=merged[-1].value + value.value)
+                    continue
+            merged.append(value)
+        return merged
+
+
+@register
+class StringAccumulationToJoin(RewriteRule):
+    """s = ''; for x in xs: s += f(x)  ->  parts = []; for ...: parts.append(f(x)); s = ''.join(parts)
+
+    Each += copies the whole string built so far, so the loop is quadratic in
+    the result's length; collecting the parts and joining once is linear.
+    Only applied when the statement binding s just before the loop assigns a
+    str, and the loop neither reads s nor binds it other than through += (so
+    conditional additions are fine). Inside a function s must be a plain
+    local that no nested function can see; at module level the loop may not
+    call functions other than builtins and methods, which could read the
+    global half-built.
+    """
+
+    name = 'string_accumulation_to_join'
+    node_types = (ast.For, ast.While)
+    description = "Collected loop string concatenation in a list and joined it once"
+    energy_gain = 0.4
+
+    def matches(self, node, context):
+        return any(isinstance(child, ast.AugAssign) and isinstance(child.op, ast.Add) or
+                   isinstance(child, ast.Assign) and isinstance(child.value, ast.BinOp) and
+                   isinstance(child.value.op, ast.Add)
+                   for child in ast.walk(node))
+
+    def rewrite(self, node, context):
+        if not context.parents:
+            return None
+        block = enclosing_block(node, context.parents[-1])
+        if block is None:
+            return None
+        for accumulator in self._accumulators(node):
+            initial = self._initial_value(accumulator, node, block)
+            if initial is not None and self._scope_is_safe(accumulator, node, context):
+                return self._collect(accumulator, initial, node, context)
+        return None
+
+    @staticmethod
+    def _added(child, name):
+        """The value child adds to name (name += value / name = name + value), else None"""
+        if (isinstance(child, ast.AugAssign) and isinstance(child.op, ast.Add) and
+                isinstance(child.target, ast.Name) and child.target.id == name):
+            return child.value
+        if (isinstance(child, ast.Assign) and len(child.targets) == 1 and isinstance(child.targets[0], ast.Name) and
+                child.targets[0].id == name and isinstance(child.value, ast.BinOp) and
+                isinstance(child.value.op, ast.Add) and isinstance(child.value.left, ast.Name) and
+                child.value.left.id == name):
+            return child.value.right
+        return None
+
+    def _accumulators(self, node):
+        """Names only ever grown with + inside the loop and otherwise never touched"""
+        names = []
+        for child in ast.walk(node):
+            if isinstance(child, ast.AugAssign) and isinstance(child.target, ast.Name):
+                names.append(child.target.id)
+            elif isinstance(child, ast.Assign) and len(child.targets) == 1 and isinstance(child.targets[0], ast.Name):
+                names.append(child.targets[0].id)
+        return [name for name in dict.fromkeys(names) if self._only_accumulated(name, node)]
+
+    def _only_accumulated(self, name, node):
+        updates, uses = 0, 0
+        for child in ast.walk(node):
+            value = self._added(child, name)
+            if value is not None:
+                updates += 1
+                if name in names_in(value):
+                    return False
+            elif isinstance(child, ast.Name) and child.id == name:
+                uses += 1
+            elif isinstance(child, (ast.Global, ast.Nonlocal)) and name in child.names:
+                return False
+        # Each update holds exactly one Name node for the accumulator (two for s = s + x)
+        plain = sum(1 for child in ast.walk(node) if isinstance(child, ast.AugAssign) and self._added(child, name))
+        return updates > 0 and uses == plain + 2 * (updates - plain)
+
+    def _initial_value(self, name, node, block):
+        """The str value name was last bound to before the loop in its block"""
+        for statement in reversed(block[:next(i for i, item in enumerate(block) if item is node)]):
+            if name not in names_in(statement):
+                continue
+            if (isinstance(statement, ast.Assign) and len(statement.targets) == 1 and
+                    isinstance(statement.targets[0], ast.Name) and statement.targets[0].id == name and
+                    is_str_expression(statement.value) and name not in names_in(statement.value)):
+                return statement.value
+            return None
+        return None
+
+    def _scope_is_safe(self, name, node, context):
+        scope = next((parent for parent in reversed(context.parents) if isinstance(parent, SCOPES)), None)
+        if isinstance(scope, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            for child in ast.walk(scope):
+                if isinstance(child, (ast.Global, ast.Nonlocal)) and name in child.names:
+                    return False
+                if child is not scope and isinstance(child, SCOPES) and name in names_in(child):
+                    return False
+            return True
+        if scope is not None:
+            return False
+        return all(not isinstance(child.func, ast.Name) or hasattr(builtins, child.func.id)
+                   for child in ast.walk(node) if isinstance(child, ast.Call))
+
+    def _collect(self, name, initial, node, context):
+        parts = unused_name(f'{name}_parts', context)
+
+        class Collect(ast.NodeTransformer):
+            def visit_AugAssign(inner, child):
+                value = self._added(child, name)
+                return child if value is None else self._append(parts, value)
+
+            def visit_Assign(inner, child):
+                value = self._added(child, name)
+                return child if value is None else self._append(parts, value)
+
+        value = self._added(node.body[0], name) if len(node.body) == 1 else None
+        if (isinstance(node, ast.For) and value is not None and not node.orelse and
+                not self._target_used_elsewhere(node, context.parents[0])):
+            # The whole loop is the accumulation: join a comprehension, no loop left
+            collected = ast.ListComp(elt=value, generators=[
+                ast.comprehension(target=node.target, iter=node.iter, ifs=[], is_async=0)])
+            return self._finish(name, initial, collected)
+
+        Collect().visit(node)
+        start = ast.Assign(targets=[ast.Name(id=parts, ctx=ast.Store())], value=ast.List(elts=[], ctx=ast.Load()))
+        return [start, node, self._finish(name, initial, ast.Name(id=parts, ctx=ast.Load()))]
+
+    @staticmethod
+    def _finish(name, initial, collected):
+        joined = ast.Call(func=ast.Attribute(value=ast.Constant(value=''), attr='join', ctx=ast.Load()),
+                          args=[collected], keywords=[])
+        if isinstance(initial, ast.Constant) and initial.value == '':
+            return ast.Assign(targets=[ast.Name(id=name, ctx=ast.Store())], value=joined)
+        return ast.AugAssign(target=ast.Name(id=name, ctx=ast.Store()), op=ast.Add(), value=joined)
+
+    @staticmethod
+    def _target_used_elsewhere(node, root):
+        """Whether the loop variable is used outside the loop, where a comprehension would not set it"""
+        targets = names_in(node.target)
+        inside = sum(1 for child in ast.walk(node) if isinstance(child, ast.Name) and child.id in targets)
+        return sum(1 for child in ast.walk(root) if isinstance(child, ast.Name) and child.id in targets) > inside
+
+    @staticmethod
+    def _append(parts, value):
+        return ast.Expr(value=ast.Call(
+            func=ast.Attribute(value=ast.Name(id=parts, ctx=ast.Load()), attr='append', ctx=ast.Load()),
+            args=[value], keywords=[]))
+
+
+@register
+class LoopInvariantHoisting(RewriteRule):
+    """for ...: f(len(data), cfg.opts.limit)  ->  len_data = len(data); ...; for ...: f(len_data, ...)
+
+    Hoists expressions that give the same value on every iteration into a
+    temporary assigned just before the loop: pure builtin and module calls
+    (len(x), math.sqrt(n), re.compile('...')), attribute chains, constant
+    subscripts and numeric arithmetic on those. An expression qualifies when
+    no name it reads is rebound in the loop and it is evaluated on every
+    iteration (the while test, or before the first branch that can leave the
+    iteration). If it reads object state (anything but constants), the loop
+    must also not mutate or hand out those objects, nor call functions that
+    could. Another name may hold the same object, so the loop may only
+    mutate objects no other name can reach: ones the scope itself builds as
+    literals or comprehensions, changes only directly (out.append(x),
+    out[k] = v) and never hands over.
+
+    The hoisted code runs even when the loop body never would, so besides the
+    while test (always evaluated) an expression only moves when the loop
+    certainly iterates (a non-empty literal or constant range) or evaluating
+    it cannot fail: len() of a known container, arithmetic on known numbers
+    without division by a variable, a key present in an unmodified dict
+    literal, or a module call on constants that succeeds when tried.
+    """
+
+    name = 'loop_invariant_hoisting'
+    node_types = (ast.For, ast.While)
+    description = "Hoisted loop-invariant expressions out of the loop"
+    energy_gain = 0.15
+
+    NUMERIC_BUILTINS = {'len', 'abs', 'round', 'int', 'float', 'ord', 'sum', 'hash'}
+    JUMPS = (ast.Break, ast.Continue, ast.Return, ast.Raise)
+    SIZED = ('str', 'bytes', 'list', 'tuple', 'dict', 'set', 'frozenset', 'range')
+    # Values that are new objects no other name holds yet
+    FRESH = (ast.List, ast.Dict, ast.Set, ast.ListComp, ast.DictComp, ast.SetComp)
+
+    def matches(self, node, context):
+        scope = next((parent for parent in reversed(context.parents) if isinstance(parent, SCOPES)), None)
+        return (not isinstance(scope, (ast.ClassDef, ast.Lambda)) and
+                not any(isinstance(child, (ast.Global, ast.Nonlocal)) for child in ast.walk(node)))
+
+    def rewrite(self, node, context):
+        block = enclosing_block(node, context.parents[-1]) if context.parents else None
+        if block is None:
+            return None
+        flow = context.dataflow()
+        runs = self._runs(node)
+        # Temporaries hoisted out of inner loops move on out of this one when they can
+        moved = []
+        for statement in [item for item in self._reached(node.body) if getattr(item, 'hoisted', False)]:
+            body = node.body
+            node.body = [item for item in body if item is not statement] or [ast.Pass()]
+            if (self._invariant(statement.value, *self._effects(node, flow, context)) and
+                    (runs or self._safe(statement.value, flow, node))):
+                moved.append(statement)
+            else:
+                node.body = body
+
+        facts = self._effects(node, flow, context)
+        hoisted = {}
+        roots = [node.test] if isinstance(node, ast.While) else []
+        for statement in self._reached(node.body):
+            if isinstance(statement, (ast.If, ast.While)):
+                roots.append(statement.test)
+            elif isinstance(statement, (ast.For, ast.AsyncFor)):
+                roots.append(statement.iter)
+            elif isinstance(statement, (ast.Expr, ast.Assign, ast.AugAssign, ast.AnnAssign, ast.Return)):
+                roots.append(statement)
+        for root in roots:
+            for expression in self._candidates(root, facts):
+                if root is getattr(node, 'test', None) or runs or self._safe(expression, flow, node):
+                    hoisted.setdefault(ast.dump(expression), expression)
+        if not hoisted and not moved:
+            return None
+
+        temporaries = []
+        for expression in hoisted.values():
+            temporary = unused_name(self._temporary_name(expression), context)
+            statement = ast.Assign(targets=[ast.Name(id=temporary, ctx=ast.Store())], value=expression)
+            statement.hoisted = True
+            temporaries.append(statement)
+        replacements = {ast.dump(statement.value): statement.targets[0].id for statement in temporaries}
+        self._replace(node, replacements)
+        node.hoisted_expressions = [ast.unparse(statement.value) for statement in temporaries]
+        node.moved_expressions = [ast.unparse(statement.value) for statement in moved]
+        return moved + temporaries + [node]
+
+    def change_message(self, node):
+        if not node.hoisted_expressions:
+            return f"Moved hoisted {', '.join(node.moved_expressions)} out of the enclosing loop"
+        return f"Hoisted loop-invariant {', '.join(node.hoisted_expressions)} out of the loop"
+
+    def _effects(self, node, flow, context):
+        """loop_effects(node), counting a mutation of an object other names may reach as unknown"""
+        written, touched, opaque = loop_effects(node)
+        return written, touched, opaque or any(not self._private(name, node, flow, context) for name in touched)
+
+    def _private(self, name, node, flow, context):
+        """Whether name holds an object of its own that the loop node only changes directly"""
+        if name in flow.captured or name in flow.foreign:
+            return False
+        # Bound only to new objects, and changed in place by x += ... at most
+        root = context.parents[0]
+        values = bindings(root).get(name, [])
+        bound = [value for value in values if value is not None]
+        augmented = sum(isinstance(child, ast.AugAssign) and isinstance(child.target, ast.Name) and
+                        child.target.id == name for child in ast.walk(root))
+        if (not bound or len(values) - len(bound) > augmented or
+                not all(isinstance(value, self.FRESH) or is_literal(value) for value in bound)):
+            return False
+        # Statements after the loop only run once it is done, unless an outer loop comes back to it
+        later = set()
+        outer = itertools.takewhile(lambda parent: not isinstance(parent, SCOPES), reversed(context.parents))
+        if not any(isinstance(parent, (ast.For, ast.AsyncFor, ast.While)) for parent in outer):
+            block = enclosing_block(node, context.parents[-1])
+            later = {id(child) for statement in block[block.index(node) + 1:] for child in ast.walk(statement)}
+        for child in ast.walk(flow.scope):
+            if isinstance(child, ast.Assign) and len(child.targets) > 1 and not is_literal(child.value) and any(
+                    name in names_in(target) for target in child.targets):
+                return False
+            if id(child) in later:
+                continue
+            # Anything that hands the object over (returning it ends the scope)
+            handed = []
+            if isinstance(child, (ast.Assign, ast.AnnAssign, ast.AugAssign, ast.NamedExpr, ast.Yield,
+                                  ast.YieldFrom, ast.Await)) and child.value is not None:
+                handed.append(child.value)
+            elif isinstance(child, (ast.For, ast.AsyncFor, ast.comprehension)):
+                handed.append(child.iter)
+            elif isinstance(child, (ast.ListComp, ast.SetComp, ast.GeneratorExp)):
+                handed.append(child.elt)
+            elif isinstance(child, ast.DictComp):
+                handed.extend([child.key, child.value])
+            elif isinstance(child, ast.withitem):
+                handed.append(child.context_expr)
+            elif isinstance(child, ast.Call) and not is_pure_call(child) and not (
+                    isinstance(child.func, ast.Name) and hasattr(builtins, child.func.id) and
+                    child.func.id not in MUTATING_BUILTINS):
+                handed.extend(child.args + [keyword.value for keyword in child.keywords])
+            if any(name in escaping(value) for value in handed):
+                return False
+        for child in ast.walk(node):
+            if isinstance(child, (ast.Attribute, ast.Subscript)) and not isinstance(child.ctx, ast.Load):
+                target = child
+            elif isinstance(child, ast.Call) and isinstance(child.func, ast.Attribute):
+                target = child.func
+            else:
+                continue
+            # Only the object itself: out[0].append(x) changes an item other names may hold
+            if name in base_names(target) and not (isinstance(target.value, ast.Name) and target.value.id == name):
+                return False
+        return True
+
+    def _reached(self, statements):
+        """The statements every iteration starts: up to the first one that may jump away"""
+        for statement in statements:
+            yield statement
+            if any(isinstance(child, self.JUMPS) for child in ast.walk(statement)):
+                return
+
+    @staticmethod
+    def _runs(node):
+        """Whether a for loop certainly iterates at least once"""
+        if not isinstance(node, ast.For):
+            return False
+        iterable = node.iter
+        if isinstance(iterable, (ast.List, ast.Tuple, ast.Set)):
+            return bool(iterable.elts) and not any(isinstance(item, ast.Starred) for item in iterable.elts)
+        if isinstance(iterable, ast.Constant):
+            return isinstance(iterable.value, (str, bytes)) and bool(iterable.value)
+        if (isinstance(iterable, ast.Call) and isinstance(iterable.func, ast.Name) and iterable.func.id == 'range'
+                and not iterable.keywords):
+            try:
+                return len(range(*[ast.literal_eval(argument) for argument in iterable.args])) > 0
+            except (ValueError, TypeError, SyntaxError):
+                return False
+        return False
+
+    def _safe(self, node, flow, at):
+        """Whether evaluating node before the loop at certainly succeeds"""
+        if isinstance(node, ast.Constant):
+            return True
+        names = {child.id for child in ast.walk(node) if isinstance(child, ast.Name)}
+        modules = {name: flow.module_of(ast.Name(id=name, ctx=ast.Load()), at) for name in names}
+        if names and all(module and module.split('.')[0] in {pure.split('.')[0] for pure in PURE_MODULES}
+                         for module in modules.values()):
+            # Only constants and pure modules: see whether it fails
+            expression = ast.fix_missing_locations(ast.Expression(body=copy.deepcopy(node)))
+            try:
+                eval(compile(expression, '<hoisted>', 'eval'),
+                     {name: importlib.import_module(module.split('.')[0]) for name, module in modules.items()})
+            except Exception:
+                return False
+            return True
+        if isinstance(node, ast.Name):
+            return flow.type_of(node, at) is not None
+        if isinstance(node, ast.Call):
+            if (isinstance(node.func, ast.Name) and node.func.id in ('len', 'abs') and len(node.args) == 1 and
+                    not node.keywords):
+                kinds = self.SIZED if node.func.id == 'len' else NUMBERS
+                return self._safe(node.args[0], flow, at) and flow.type_of(node.args[0], at) in kinds
+            return False
+        if isinstance(node, ast.BinOp):
+            if not all(self._safe(side, flow, at) and flow.type_of(side, at) in NUMBERS
+                       for side in (node.left, node.right)):
+                return False
+            if isinstance(node.op, (ast.Add, ast.Sub, ast.Mult)):
+                return True
+            return (isinstance(node.op, (ast.Div, ast.FloorDiv, ast.Mod)) and isinstance(node.right, ast.Constant)
+                    and node.right.value != 0)
+        if isinstance(node, ast.UnaryOp):
+            return self._safe(node.operand, flow, at) and flow.type_of(node.operand, at) in NUMBERS
+        if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and isinstance(node.slice, ast.Constant):
+            definitions = flow.definitions(node.value.id, at)
+            return (not flow.mutated(node.value.id) and
+                    all(isinstance(definition.value, ast.Dict) and
+                        any(isinstance(key, ast.Constant) and key.value == node.slice.value
+                            for key in definition.value.keys)
+                        for definition in definitions))
+        return False
+
+    def _candidates(self, node, facts):
+        if isinstance(node, (ast.Lambda, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)):
+            return
+        if isinstance(node, ast.expr) and self._worth_hoisting(node) and self._invariant(node, *facts):
+            yield node
+            return
+        if isinstance(node, ast.Call):
+            # The receiver of a method call is evaluated too; the method lookup itself stays
+            receiver = [node.func.value] if isinstance(node.func, ast.Attribute) else []
+            children = receiver + node.args + [keyword.value for keyword in node.keywords]
+        elif isinstance(node, ast.BoolOp):
+            children = node.values[:1]
+        elif isinstance(node, ast.IfExp):
+            children = [node.test]
+        else:
+            children = list(ast.iter_child_nodes(node))
+        for child in children:
+            yield from self._candidates(child, facts)
+
+    def _worth_hoisting(self, node):
+        if isinstance(node, ast.Call):
+            return is_pure_call(node)
+        if isinstance(node, ast.Attribute):
+            return isinstance(node.value, (ast.Attribute, ast.Subscript))
+        if isinstance(node, ast.Subscript):
+            return isinstance(node.slice, ast.Constant)
+        if isinstance(node, (ast.BinOp, ast.UnaryOp)):
+            return self._numeric(node) and any(isinstance(child, ast.Call) for child in ast.walk(node))
+        return False
+
+    def _invariant(self, node, written, touched, opaque):
+        """Same value on every iteration: built from constants, unchanged names and pure calls"""
+        names = set()
+        for child in ast.walk(node):
+            if isinstance(child, ast.Call):
+                if not is_pure_call(child) or any(isinstance(argument, ast.Starred) for argument in child.args):
+                    return False
+            elif isinstance(child, (ast.Attribute, ast.Subscript, ast.Name)):
+                if not isinstance(child.ctx, ast.Load):
+                    return False
+            elif isinstance(child, (ast.BinOp, ast.UnaryOp)):
+                if not self._numeric(child):
+                    return False
+            elif not isinstance(child, (ast.Constant, ast.keyword, ast.expr_context, ast.operator, ast.unaryop)):
+                return False
+            if isinstance(child, ast.Name):
+                names.add(child.id)
+        if names & written:
+            return False
+        # Pure builtins and the module prefixes of pure calls are not object state
+        functions = {child.func.id for child in ast.walk(node)
+                     if isinstance(child, ast.Call) and isinstance(child.func, ast.Name)}
+        state = names - functions - {module.split('.')[0] for module in PURE_MODULES}
+        return not state or (not opaque and not state & touched)
+
+    def _numeric(self, node):
+        """Whether node certainly evaluates to a number, so one result can be shared"""
+        if isinstance(node, ast.Constant):
+            return isinstance(node.value, (int, float))
+        if isinstance(node, ast.Call):
+            return ((isinstance(node.func, ast.Name) and node.func.id in self.NUMERIC_BUILTINS) or
+                    (isinstance(node.func, ast.Attribute) and isinstance(node.func.value, ast.Name) and
+                     node.func.value.id == 'math'))
+        if isinstance(node, ast.BinOp):
+            return self._numeric(node.left) and self._numeric(node.right)
+        if isinstance(node, ast.UnaryOp):
+            return isinstance(node.op, (ast.USub, ast.UAdd)) and self._numeric(node.operand)
+        return False
+
+    @staticmethod
+    def _temporary_name(expression):
+        identifiers = {child.id for child in ast.walk(expression) if isinstance(child, ast.Name)}
+        identifiers |= {child.attr for child in ast.walk(expression) if isinstance(child, ast.Attribute)}
+        identifiers |= {child.slice.value for child in ast.walk(expression)
+                        if isinstance(child, ast.Subscript) and isinstance(child.slice, ast.Constant) and
+                        isinstance(child.slice.value, str) and child.slice.value.isidentifier()}
+        words = [word for word in re.findall(r'[A-Za-z_][A-Za-z0-9_]*', ast.unparse(expression)) if word in identifiers]
+        return '_'.join(list(dict.fromkeys(words))[:3]) or 'invariant'
+
+    @staticmethod
+    def _replace(node, replacements):
+        class Replace(ast.NodeTransformer):
+            def visit(inner, child):
+                if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)):
+                    return child
+                if isinstance(child, ast.expr) and ast.dump(child) in replacements:
+                    return ast.Name(id=replacements[ast.dump(child)], ctx=ast.Load())
+                return inner.generic_visit(child)
+
+        for field in ('body', 'orelse'):
+            setattr(node, field, [Replace().visit(statement) for statement in getattr(node, field)])
+        if isinstance(node, ast.While):
+            node.test = Replace().visit(node.test)
+
+
+@register
+class MembershipToSet(RewriteRule):
+    """x in ['a', 'b', 'c']  ->  x in {'a', 'b', 'c'};  x in names  ->  x in names_set (built once)
+
+    Inside loops and comprehensions, a membership test against a list or
+    tuple literal of constants becomes a set literal, which CPython folds into
+    a frozenset constant. A test against a name becomes a test against a set
+    built from it once before the loop, when the name was last bound (right
+    before the loop, in the same block) to a list of hashable items and the
+    loop neither rebinds, mutates nor hands it out and calls no unknown
+    functions. Only tests of values the data flow proves hashable (numbers,
+    strings, bytes, None, tuples of those) are rewritten: a list tested
+    against a set raises TypeError where the list scan returned False.
+    """
+
+    name = 'membership_to_set'
+    node_types = (ast.For, ast.While, ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+    description = "Converted membership tests against lists into set lookups"
+    energy_gain = 0.25
+
+    HASHABLE_CONSTANTS = (str, bytes, int, float, complex, bool, type(None), tuple, frozenset)
+    HASHABLE_TYPES = ('str', 'bytes', 'int', 'float', 'complex', 'bool', 'NoneType')
+    # Methods of str/bytes that return lists of str/bytes
+    SPLITTING_METHODS = {'split', 'rsplit', 'splitlines'}
+
+    def matches(self, node, context):
+        return any(isinstance(child, ast.Compare) and
+                   any(isinstance(op, (ast.In, ast.NotIn)) for op in child.ops)
+                   for child in ast.walk(node))
+
+    def rewrite(self, node, context):
+        tests = list(self._hashable_tests(node, context.dataflow()))
+        literals = 0
+        for child, index, comparator in tests:
+            if self._constant_sequence(comparator):
+                child.comparators[index] = ast.Set(elts=comparator.elts)
+                literals += 1
+
+        built = []
+        if isinstance(node, (ast.For, ast.While)) and context.parents:
+            block = enclosing_block(node, context.parents[-1])
+            written, touched, opaque = loop_effects(node)
+            for container in self._tested_names(node, tests):
+                if (block is None or opaque or container in written or container in touched or
+                        not self._hashable_list(container, node, block)):
+                    continue
+                lookup = unused_name(f'{container}_set', context)
+                self._retarget(tests, container, lookup)
+                built.append(ast.Assign(targets=[ast.Name(id=lookup, ctx=ast.Store())],
+                                        value=ast.Call(func=ast.Name(id='set', ctx=ast.Load()),
+                                                       args=[ast.Name(id=container, ctx=ast.Load())], keywords=[])))
+
+        if not literals and not built:
+            return None
+        node.membership_changes = ([f"Converted {literals} membership test(s) against list literals to set literals"]
+                                   if literals else [])
+        node.membership_changes += [f"Built {statement.targets[0].id} = set({statement.value.args[0].id}) once "
+                                    f"before the loop for membership tests" for statement in built]
+        return built + [node] if built else node
+
+    def change_message(self, node):
+        return '; '.join(node.membership_changes)
+
+    def _constant_sequence(self, node):
+        return (isinstance(node, (ast.List, ast.Tuple)) and bool(node.elts) and
+                all(isinstance(element, ast.Constant) and isinstance(element.value, self.HASHABLE_CONSTANTS)
+                    for element in node.elts))
+
+    def _hashable_tests(self, node, flow):
+        """(compare, index, container) for each `x in container` in node whose x is certainly hashable"""
+        for child in ast.walk(node):
+            if isinstance(child, ast.Compare):
+                for index, (op, comparator) in enumerate(zip(child.ops, child.comparators)):
+                    operand = child.comparators[index - 1] if index else child.left
+                    if isinstance(op, (ast.In, ast.NotIn)) and self._hashable(operand, flow):
+                        yield child, index, comparator
+
+    def _hashable(self, node, flow):
+        if isinstance(node, ast.Constant):
+            return isinstance(node.value, self.HASHABLE_CONSTANTS)
+        if isinstance(node, ast.Tuple):
+            return all(self._hashable(element, flow) for element in node.elts)
+        return flow.type_of(node) in self.HASHABLE_TYPES
+
+    @staticmethod
+    def _tested_names(node, tests):
+        # Every test against the name must be convertible, or the list is still needed
+        tested = [comparator.id for _, _, comparator in tests if isinstance(comparator, ast.Name)]
+        all_tests = [comparator.id for child in ast.walk(node) if isinstance(child, ast.Compare)
+                     for op, comparator in zip(child.ops, child.comparators)
+                     if isinstance(op, (ast.In, ast.NotIn)) and isinstance(comparator, ast.Name)]
+        return [name for name in dict.fromkeys(tested) if tested.count(name) == all_tests.count(name)]
+
+    def _hashable_list(self, name, node, block):
+        """Whether the statement that last touched name before the loop bound it to a list of hashable items"""
+        for statement in reversed(block[:next(i for i, item in enumerate(block) if item is node)]):
+            if name not in names_in(statement):
+                continue
+            return (isinstance(statement, ast.Assign) and len(statement.targets) == 1 and
+                    isinstance(statement.targets[0], ast.Name) and statement.targets[0].id == name and
+                    self._builds_hashable_list(statement.value))
+        return False
+
+    def _builds_hashable_list(self, value):
+        if isinstance(value, (ast.List, ast.Tuple)):
+            return all(self._hashable_item(element) for element in value.elts)
+        if isinstance(value, ast.ListComp):
+            return self._hashable_item(value.elt)
+        if isinstance(value, ast.Call) and isinstance(value.func, ast.Attribute):
+            return value.func.attr in self.SPLITTING_METHODS and is_str_expression(value.func.value)
+        return False
+
+    def _hashable_item(self, node):
+        return ((isinstance(node, ast.Constant) and isinstance(node.value, self.HASHABLE_CONSTANTS)) or
+                is_str_expression(node) or
+                (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and
+                 node.func.id in {'int', 'float', 'len', 'abs', 'round', 'ord', 'hash'}))
+
+    @staticmethod
+    def _retarget(tests, container, lookup):
+        for child, index, comparator in tests:
+            if isinstance(comparator, ast.Name) and comparator.id == container:
+                child.comparators[index] = ast.Name(id=lookup, ctx=ast.Load())
+
+
+@register
+class LookupsToLocals(RewriteRule):
+    """for ...: total += math.sqrt(x)  ->  math_sqrt = math.sqrt; for ...: total += math_sqrt(x)
+
+    Inside functions, binds the functions a loop calls through global names
+    (len, math.sqrt, module-level defs) and, where that is faster
+    (BIND_METHODS), the bound methods it calls on local objects (out.append)
+    to locals before the outermost loop, so each call is a LOAD_FAST instead
+    of a LOAD_GLOBAL and/or attribute lookup.
+    Globals qualify only when the module binds them by import, def or class
+    (or not at all, for builtins) and nothing declares them global; receivers
+    must not be rebound in the loop, nor the called attribute assigned. One
+    call must run on every iteration, so a failing lookup fails where it did
+    before, except that a loop that runs zero times still does it once. The
+    rewrite only pays off in loops where lookups are a fair share of the
+    work: the saved lookups, weighted like the bytecode analyzer weighs
+    instructions, must be at least MIN_SHARE of the weight of one iteration.
+    """
+
+    name = 'lookups_to_locals'
+    node_types = (ast.For, ast.While)
+    description = "Bound globals and methods called in the loop to locals"
+    energy_gain = 0.1
+
+    MIN_SHARE = 0.1
+    # 3.11's specializing interpreter calls obj.method() without creating a bound method
+    # (and inlines list.append), so calling a pre-bound method is slower there
+    BIND_METHODS = sys.version_info < (3, 11)
+    # Builtins that depend on the frame they are called from
+    FRAME_BUILTINS = {'super', 'locals', 'vars', 'dir', 'globals', 'eval', 'exec', 'breakpoint'}
+    COMPREHENSIONS = (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+    JUMPS = (ast.Break, ast.Continue, ast.Return, ast.Raise)
+
+    def matches(self, node, context):
+        # Only the outermost loop of a function body, so inner loops are covered once
+        scope = None
+        for parent in reversed(context.parents):
+            if isinstance(parent, (ast.For, ast.AsyncFor, ast.While)):
+                return False
+            if isinstance(parent, SCOPES):
+                scope = parent
+                break
+        return (isinstance(scope, (ast.FunctionDef, ast.AsyncFunctionDef)) and
+                enclosing_block(node, context.parents[-1]) is not None)
+
+    def rewrite(self, node, context):
+        scope = next(parent for parent in reversed(context.parents) if isinstance(parent, SCOPES))
+        written = loop_effects(node)[0]
+        local = self._local_names(context)
+        stable = self._stable_globals(context.parents[0])
+        weight = BytecodeAnalyzer().opcode_weights.get
+
+        calls = {}
+        for call, every_iteration in self._calls(node):
+            function = call.func
+            if isinstance(function, ast.Name):
+                name = function.id
+                if name in local or name not in stable or name in self.FRAME_BUILTINS:
+                    continue
+                key, saving = name, weight('LOAD_GLOBAL', 1) - weight('LOAD_FAST', 1)
+            elif isinstance(function, ast.Attribute) and isinstance(function.value, ast.Name):
+                name = function.value.id
+                if name in local:
+                    if (not self.BIND_METHODS or name in written or
+                            self._assigns_attribute(node, name, function.attr)):
+                        continue
+                    # LOAD_FAST receiver + method lookup -> LOAD_FAST
+                    saving = weight('LOAD_METHOD', 1)
+                elif name in stable:
+                    saving = weight('LOAD_GLOBAL', 1) + weight('LOAD_METHOD', 1) - weight('LOAD_FAST', 1)
+                else:
+                    continue
+                key = f'{name}.{function.attr}'
+            else:
+                continue
+            found = calls.setdefault(key, {'calls': [], 'saving': 0, 'every_iteration': False})
+            found['calls'].append(call)
+            found['saving'] += saving
+            found['every_iteration'] |= every_iteration
+        calls = {key: found for key, found in calls.items() if found['every_iteration']}
+        if not calls:
+            return None
+
+        saved = sum(found['saving'] for found in calls.values())
+        if saved < self.MIN_SHARE * self._iteration_weight(node, scope):
+            return None
+
+        bindings = []
+        for key, found in calls.items():
+            base = key.replace('.', '_') if '.' in key else f'_{key}'
+            local_name = unused_name(base, context)
+            value = ast.parse(key, mode='eval').body
+            bindings.append(ast.Assign(targets=[ast.Name(id=local_name, ctx=ast.Store())], value=value))
+            for call in found['calls']:
+                call.func = ast.Name(id=local_name, ctx=ast.Load())
+        node.bound_lookups = [f"{statement.targets[0].id} = {ast.unparse(statement.value)}" for statement in bindings]
+        return bindings + [node]
+
+    def change_message(self, node):
+        return f"Bound {', '.join(node.bound_lookups)} before the loop instead of looking them up on every iteration"
+
+    def _calls(self, node):
+        """(call, whether it runs on every iteration) for the calls in the loop, in source order"""
+        if isinstance(node, ast.While):
+            yield from self._calls_in(node.test, True)
+        jumped = False
+        for statement in node.body:
+            yield from self._calls_in(statement, not jumped)
+            jumped = jumped or any(isinstance(child, self.JUMPS) for child in ast.walk(statement))
+        for statement in node.orelse:
+            yield from self._calls_in(statement, False)
+
+    def _calls_in(self, node, certain):
+        if isinstance(node, SCOPES + self.COMPREHENSIONS):
+            return
+        if isinstance(node, ast.Call):
+            yield node, certain
+        # Only the first part of a branch, loop or short-circuit always runs
+        if isinstance(node, (ast.If, ast.IfExp, ast.While)):
+            first = node.test
+        elif isinstance(node, (ast.For, ast.AsyncFor)):
+            first = node.iter
+        elif isinstance(node, ast.BoolOp):
+            first = node.values[0]
+        elif isinstance(node, (ast.Try, ast.Match)):
+            first = None
+        else:
+            first = node
+        for child in ast.iter_child_nodes(node):
+            yield from self._calls_in(child, certain and first in (node, child))
+
+    @staticmethod
+    def _local_names(context):
+        """Names bound in any enclosing function (locals and closure variables)"""
+        local = set()
+        for scope in context.parents:
+            if isinstance(scope, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                arguments = scope.args
+                local.update(argument.arg for argument in
+                             arguments.posonlyargs + arguments.args + arguments.kwonlyargs +
+                             [arguments.vararg, arguments.kwarg] if argument is not None)
+                local |= loop_effects(ast.Module(body=scope.body, type_ignores=[]))[0]
+        return local
+
+    @staticmethod
+    def _stable_globals(module):
+        """Global names that only import, def or class statements bind, plus builtins the module leaves alone"""
+        imported = set()
+        pending = list(ast.iter_child_nodes(module))
+        while pending:
+            child = pending.pop()
+            if isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                imported.add(child.name)
+                continue
+            if isinstance(child, ast.Lambda):
+                continue
+            if isinstance(child, (ast.Import, ast.ImportFrom)):
+                imported.update((alias.asname or alias.name).split('.')[0] for alias in child.names)
+            pending.extend(ast.iter_child_nodes(child))
+        module_level = ast.Module(body=[statement for statement in module.body
+                                        if not isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef,
+                                                                      ast.ClassDef, ast.Import, ast.ImportFrom))],
+                                  type_ignores=[])
+        assigned = loop_effects(module_level)[0]
+        assigned |= {name for child in ast.walk(module) if isinstance(child, (ast.Global, ast.Nonlocal))
+                     for name in child.names}
+        return (imported | {name for name in dir(builtins) if not name.startswith('_')}) - assigned
+
+    @staticmethod
+    def _assigns_attribute(node, name, attr):
+        return any(isinstance(child, ast.Attribute) and not isinstance(child.ctx, ast.Load) and
+                   child.attr == attr and isinstance(child.value, ast.Name) and child.value.id == name
+                   for child in ast.walk(node))
+
+    @staticmethod
+    def _iteration_weight(node, scope):
+        """Bytecode weight of one iteration, compiled as the only statement of a copy of scope"""
+        wrapper = copy.copy(scope)
+        wrapper.body, wrapper.decorator_list = [node], []
+        # Statements other rules put in the loop have no position yet
+        code = ast.unparse(ast.fix_missing_locations(copy.deepcopy(wrapper)))
+        try:
+            tree = ast.parse(code)
+        except SyntaxError:
+            return 0
+        return BytecodeAnalyzer().analyze_loops(code, tree)
+
+
+@register
+class MemoizeRecursion(RewriteRule):
+    """def fib(n): ... return fib(n - 1) + fib(n - 2)  ->  a bottom-up loop, or @functools.lru_cache(maxsize=None)
+
+    Applies to top-level functions that call themselves and are provably
+    pure: no global or nonlocal statements, no stores into attributes or
+    items, no calls but their own and side-effect-free builtins, math and
+    read-only methods, no nested functions, generators or I/O, and no names
+    read from outside but literal constants and imported modules. Results
+    must be immutable (lists and other containers may only feed sum(),
+    len(), max() ...), and the function may only be called, never passed
+    around, so every argument can be checked.
+
+    A single-parameter recurrence with an `n < m` base case,
+
+        if n < 2:
+            return n
+        return fib(n - 1) + fib(n - 2)
+
+    becomes a loop from m up to n over the last d values when every call
+    passes an int (or n is annotated int). Other functions calling
+    themselves more than once per call get @functools.lru_cache(maxsize=None)
+    when every argument is provably hashable (typed=True unless they are all
+    ints, so 1, 1.0 and True keep separate results).
+    """
+
+    name = 'memoize_recursion'
+    node_types = (ast.FunctionDef,)
+    description = "Memoized a pure recursive function"
+    energy_gain = 0.7
+
+    IMPURE = (ast.Global, ast.Nonlocal, ast.Yield, ast.YieldFrom, ast.Await, ast.FunctionDef, ast.AsyncFunctionDef,
+              ast.ClassDef, ast.Lambda, ast.Import, ast.ImportFrom, ast.Delete, ast.With, ast.AsyncWith)
+    CONTAINERS = (ast.List, ast.Dict, ast.Set, ast.ListComp, ast.DictComp, ast.SetComp)
+    # Builtins that only read a container and return a scalar or one of its immutable items
+    CONSUMERS = {'sum', 'len', 'min', 'max', 'any', 'all', 'tuple', 'frozenset'}
+    # Builtins returning a new immutable value whatever they are given
+    SCALAR_BUILTINS = {'len', 'abs', 'round', 'int', 'float', 'bool', 'str', 'ord', 'chr'}
+
+    def matches(self, node, context):
+        arguments = node.args
+        return (isinstance(context.parents[-1], ast.Module) and not node.decorator_list and
+                not (arguments.vararg or arguments.kwarg or arguments.kwonlyargs or arguments.posonlyargs) and
+                bool(self._self_calls(node)))
+
+    def rewrite(self, node, context):
+        root = context.parents[0]
+        calls = self._outside_calls(node, root)
+        if calls is None or not self._pure(node, root):
+            return None
+        parameters = {argument.arg for argument in node.args.args}
+        ints = int_names(root)
+        all_ints = (all(is_int_expression(argument, ints) for call in calls for argument in call.args) and
+                    not any(call.keywords for call in calls + self._self_calls(node)) and
+                    all(is_int_expression(argument, parameters) for call in self._self_calls(node)
+                        for argument in call.args))
+        recurrence = self._recurrence(node)
+        annotated = [ast.unparse(argument.annotation) if argument.annotation else None for argument in node.args.args]
+        if recurrence is not None and (all_ints or annotated == ['int']):
+            node.body = self._bottom_up(node, recurrence, context)
+            node.memo_kind = 'loop'
+            return node
+        calls_inside = self._self_calls(node)
+        repeated = len(calls_inside) > 1 or any(
+            isinstance(child, (ast.For, ast.While, ast.ListComp, ast.SetComp, ast.GeneratorExp, ast.DictComp)) and
+            self._self_calls(child, node.name) for child in ast.walk(node))
+        if not repeated or not self._hashable_arguments(node, calls, root):
+            return None
+        functools = module_alias('functools', context)
+        keywords = [ast.keyword(arg='maxsize', value=ast.Constant(value=None))]
+        if not all_ints:
+            keywords.append(ast.keyword(arg='typed', value=ast.Constant(value=True)))
+        node.decorator_list = [ast.Call(func=ast.Attribute(value=ast.Name(id=functools, ctx=ast.Load()),
+                                                           attr='lru_cache', ctx=ast.Load()),
+                                        args=[], keywords=keywords)]
+        node.memo_kind = 'cache'
+        return node
+
+    def change_message(self, node):
+        if node.memo_kind == 'loop':
+            return f"Rewrote the recursion in {node.name}() into a bottom-up loop"
+        return f"Memoized the pure recursive function {node.name}() with {ast.unparse(node.decorator_list[0])}"
+
+    @staticmethod
+    def _self_calls(node, name=None):
+        name = name or node.name
+        return [child for child in ast.walk(node) if isinstance(child, ast.Call) and
+                isinstance(child.func, ast.Name) and child.func.id == name]
+
+    def _outside_calls(self, node, root):
+        """Calls of the function outside its body, or None when it is rebound or used other than by calling it"""
+        if len(bindings(root).get(node.name, [])) != 1:
+            return None
+        inside = {id(child) for child in ast.walk(node)}
+        called, calls = set(), []
+        for child in ast.walk(root):
+            if isinstance(child, ast.Call) and isinstance(child.func, ast.Name) and child.func.id == node.name:
+                called.add(id(child.func))
+                if id(child) not in inside:
+                    calls.append(child)
+        if any(isinstance(child, ast.Name) and child.id == node.name and id(child) not in called
+               for child in ast.walk(root)):
+            return None
+        if any(isinstance(argument, ast.Starred) for call in calls for argument in call.args):
+            return None
+        return calls
+
+    def _pure(self, node, root):
+        """Whether node has no side effects, reads no mutable outside state and returns immutable values"""
+        bound = bindings(root)
+        modules = {(alias.asname or alias.name).split('.')[0] for statement in root.body
+                   if isinstance(statement, ast.Import) for alias in statement.names}
+        constants = constant_names(root) | literal_tuples(root)
+        local = ({argument.arg for argument in node.args.args} |
+                 {child.id for child in ast.walk(node) if isinstance(child, ast.Name) and
+                  not isinstance(child.ctx, ast.Load)})
+        parents = {id(child): parent for parent in ast.walk(node) for child in ast.iter_child_nodes(parent)}
+        for child in ast.walk(node):
+            if child is node:
+                continue
+            if isinstance(child, self.IMPURE):
+                return False
+            if isinstance(child, (ast.Attribute, ast.Subscript)) and not isinstance(child.ctx, ast.Load):
+                return False
+            if isinstance(child, ast.Name) and isinstance(child.ctx, ast.Load) and child.id not in local:
+                if not (child.id == node.name or child.id in constants or
+                        (child.id in modules and len(bound.get(child.id, [])) == 1) or
+                        (hasattr(builtins, child.id) and child.id not in bound)):
+                    return False
+            if isinstance(child, ast.Call):
+                function = child.func
+                if isinstance(function, ast.Name) and function.id == node.name:
+                    continue
+                if not (is_pure_call(child) or (isinstance(function, ast.Attribute) and
+                                                function.attr in READ_ONLY_METHODS and base_names(function))):
+                    return False
+            if isinstance(child, self.CONTAINERS):
+                parent = parents.get(id(child))
+                consumed = (isinstance(parent, ast.Call) and isinstance(parent.func, ast.Name) and
+                            parent.func.id in self.CONSUMERS and child in parent.args)
+                tested = isinstance(parent, ast.Compare) and child in parent.comparators and all(
+                    isinstance(op, (ast.In, ast.NotIn)) for op in parent.ops)
+                if not (consumed or tested):
+                    return False
+        return True
+
+    def _hashable_arguments(self, node, calls, root):
+        """Whether every call, from outside and from the recursion, passes hashable arguments"""
+        constants = constant_names(root) | int_names(root) | literal_tuples(root)
+        # Parameters are hashable by induction, and so are the items of literal tuples and ranges
+        tuples, items = literal_tuples(root), set()
+        for child in ast.walk(node):
+            if isinstance(child, (ast.For, ast.comprehension)) and isinstance(child.target, ast.Name):
+                source = child.iter
+                if ((isinstance(source, ast.Name) and source.id in tuples) or
+                        (isinstance(source, ast.Tuple) and all(is_literal(item) for item in source.elts)) or
+                        (isinstance(source, ast.Call) and getattr(source.func, 'id', None) == 'range')):
+                    items.add(id(child.target))
+        stored = [child for child in ast.walk(node) if isinstance(child, ast.Name) and
+                  not isinstance(child.ctx, ast.Load)]
+        hashable = {argument.arg for argument in node.args.args} | {child.id for child in stored if id(child) in items}
+        hashable -= {child.id for child in stored if id(child) not in items}
+        return (all(self._hashable(argument, constants) for call in calls
+                    for argument in call.args + [keyword.value for keyword in call.keywords]) and
+                all(self._hashable(argument, hashable) for call in self._self_calls(node)
+                    for argument in call.args + [keyword.value for keyword in call.keywords]))
+
+    def _hashable(self, node, names):
+        """Whether node is an immutable value built from literals and the given (hashable) names"""
+        if isinstance(node, ast.Constant):
+            return True
+        if isinstance(node, ast.Name):
+            return node.id in names
+        if isinstance(node, ast.Tuple):
+            return all(self._hashable(element, names) for element in node.elts)
+        if isinstance(node, ast.UnaryOp):
+            return self._hashable(node.operand, names)
+        if isinstance(node, ast.BinOp):
+            return self._hashable(node.left, names) and self._hashable(node.right, names)
+        if isinstance(node, ast.Subscript):
+            # Slicing a str or tuple gives a str or tuple
+            return isinstance(node.slice, ast.Slice) and self._hashable(node.value, names)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and not node.keywords:
+            return node.func.id in self.SCALAR_BUILTINS
+        return False
+
+    def _recurrence(self, node):
+        """(parameter, base test, base value, m, recursive expression, d) for f(n) = E(f(n - 1) ... f(n - d), n)
+        with `if n < m: return base` in front, or None"""
+        arguments = node.args
+        if len(arguments.args) != 1 or arguments.defaults:
+            return None
+        parameter = arguments.args[0].arg
+        body = node.body[1:] if ast.get_docstring(node) is not None else node.body
+        if len(body) == 1 and isinstance(body[0], ast.Return) and isinstance(body[0].value, ast.IfExp):
+            test, base, recursive = body[0].value.test, body[0].value.body, body[0].value.orelse
+        elif (len(body) in (1, 2) and isinstance(body[0], ast.If) and len(body[0].body) == 1 and
+              isinstance(body[0].body[0], ast.Return) and body[0].body[0].value is not None):
+            rest = body[0].orelse + body[1:]
+            if len(rest) != 1 or not isinstance(rest[0], ast.Return) or rest[0].value is None:
+                return None
+            test, base, recursive = body[0].test, body[0].body[0].value, rest[0].value
+        else:
+            return None
+        m = self._threshold(test, parameter)
+        if m is None or self._self_calls(base, node.name):
+            return None
+        calls = self._self_calls(recursive, node.name)
+        offsets = [self._offset(call, parameter) for call in calls]
+        if not calls or None in offsets or max(offsets) > m:
+            return None
+        return parameter, test, base, m, recursive, max(offsets)
+
+    @staticmethod
+    def _threshold(test, parameter):
+        """m for n < m, n <= m - 1, m > n or m - 1 >= n with int literals"""
+        if not (isinstance(test, ast.Compare) and len(test.ops) == 1):
+            return None
+        left, op, right = test.left, test.ops[0], test.comparators[0]
+        if isinstance(right, ast.Name) and right.id == parameter:
+            left, right = right, left
+            op = {ast.Gt: ast.Lt(), ast.GtE: ast.LtE()}.get(type(op))
+        if not (isinstance(left, ast.Name) and left.id == parameter and isinstance(right, ast.Constant) and
+                type(right.value) is int):
+            return None
+        if isinstance(op, ast.Lt):
+            return right.value
+        if isinstance(op, ast.LtE):
+            return right.value + 1
+        return None
+
+    @staticmethod
+    def _offset(call, parameter):
+        """c for a call f(n - c) with a positive int literal c"""
+        if len(call.args) != 1 or call.keywords:
+            return None
+        argument = call.args[0]
+        if (isinstance(argument, ast.BinOp) and isinstance(argument.op, ast.Sub) and
+                isinstance(argument.left, ast.Name) and argument.left.id == parameter and
+                isinstance(argument.right, ast.Constant) and type(argument.right.value) is int and
+                argument.right.value > 0):
+            return argument.right.value
+        return None
+
+    def _bottom_up(self, node, recurrence, context):
+        """if n < m: return base; then the last d values, updated from m up to n"""
+        parameter, test, base, m, recursive, d = recurrence
+        docstring = node.body[:1] if ast.get_docstring(node) is not None else []
+        values = [unused_name(f'{node.name}_{offset}', context) for offset in range(d, 0, -1)]
+        counter = unused_name('k', context)
+
+        def substitute(expression, replace):
+            class Substitute(ast.NodeTransformer):
+                def visit_Call(inner, child):
+                    if isinstance(child.func, ast.Name) and child.func.id == node.name:
+                        return ast.Name(id=values[d - self._offset(child, parameter)], ctx=ast.Load())
+                    return inner.generic_visit(child)
+
+                def visit_Name(inner, child):
+                    return copy.deepcopy(replace) if child.id == parameter else child
+            return Substitute().visit(copy.deepcopy(expression))
+
+        def assign(names, expressions):
+            if len(names) == 1:
+                return ast.Assign(targets=[ast.Name(id=names[0], ctx=ast.Store())], value=expressions[0])
+            return ast.Assign(targets=[ast.Tuple(elts=[ast.Name(id=name, ctx=ast.Store()) for name in names],
+                                                 ctx=ast.Store())],
+                              value=ast.Tuple(elts=expressions, ctx=ast.Load()))
+
+        # f(m - d) ... f(m - 1) all come from the base case
+        seeds = assign(values, [substitute(base, ast.Constant(value=m - offset)) for offset in range(d, 0, -1)])
+        step = [ast.Name(id=name, ctx=ast.Load()) for name in values[1:]]
+        step.append(substitute(recursive, ast.Name(id=counter, ctx=ast.Load())))
+        bound = ast.BinOp(left=ast.Name(id=parameter, ctx=ast.Load()), op=ast.Add(), right=ast.Constant(value=1))
+        loop = ast.For(target=ast.Name(id=counter, ctx=ast.Store()),
+                       iter=ast.Call(func=ast.Name(id='range', ctx=ast.Load()), args=[ast.Constant(value=m), bound],
+                                     keywords=[]),
+                       body=[assign(values, step)], orelse=[])
+        return docstring + [ast.If(test=test, body=[ast.Return(value=base)], orelse=[]), seeds, loop,
+                            ast.Return(value=ast.Name(id=values[-1], ctx=ast.Load()))]
+
+
+class RowLoop:
+    """Column-wise statements for the body of one loop over DataFrame rows (see PandasRowLoopToColumns)"""
+
+    def __init__(self, node, loop, context):
+        self.node, self.loop, self.context = node, loop, context
+        self.frame = loop['frame']
+        self.own = {name for name in (loop['row'], loop['index']) if name}
+        # Columns the current statement reads, columns assigned so far, (name, statement) of every accumulator
+        self.read, self.assigned, self.accumulators = set(), set(), []
+        # Whether the body addresses cells by index label (df.loc[i, 'c']), which needs a unique index
+        self.by_label = False
+        root = context.parents[0]
+        self.shadowed = {'sum', 'int'} & set(bindings(root))
+        self.written = loop_effects(node)[0]
+        numpy = module_alias('numpy', context)
+        scalars = constant_names(root) - self.written - self.own
+        loose = names_in(node) - self.written - self.own - {self.frame}
+        self.vectorize = Vectorizer(self._element, scalars, numpy, strings=True, loose=loose)
+        self.where = Vectorizer(self._element, scalars, numpy, strings=True, conditional=True, loose=loose)
+
+    def convert(self):
+        """The replacement statements, or None when some statement has no column-wise form"""
+        root, node = self.context.parents[0], self.node
+        if self.frame in self.written or any(used_outside_loops(root, name) for name in self.own):
+            return None
+        statements = []
+        for statement in node.body:
+            # Later statements must not read what earlier ones assigned: rows are snapshots
+            assigned, self.read = set(self.assigned), set()
+            converted = self._statement(statement)
+            if converted is None or self.read & assigned:
+                return None
+            statements += converted
+        # Accumulators may only appear in their own statement
+        for name, statement in self.accumulators:
+            if name in self.own or name == self.frame or count_uses(node, name) != count_uses(statement, name):
+                return None
+        # With a repeated label, df.loc[i, 'c'] reads and writes every row of that label
+        if self.by_label and self.frame not in unique_index_frames(root):
+            return None
+        return statements
+
+    def _column(self, name):
+        self.read.add(name)
+        return ast.Subscript(value=ast.Name(id=self.frame, ctx=ast.Load()), slice=ast.Constant(value=name),
+                             ctx=ast.Load())
+
+    def _element(self, node):
+        """df['c'] for an access to column c of the current row"""
+        loop = self.loop
+        if loop['kind'] == 'itertuples':
+            if (isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and
+                    node.value.id == loop['row'] and node.attr != 'Index' and not node.attr.startswith('_')):
+                return self._column(node.attr)
+            return None
+        if (loop['kind'] == 'iterrows' and isinstance(node, ast.Subscript) and
+                isinstance(node.value, ast.Name) and node.value.id == loop['row'] and
+                isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str)):
+            return self._column(node.slice.value)
+        column = self._cell(node)
+        return self._column(column) if column is not None and isinstance(node.ctx, ast.Load) else None
+
+    def _cell(self, node):
+        """c for df.loc[<current index>, 'c'] / df.at[...]"""
+        if not (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Attribute) and
+                node.value.attr in ('loc', 'at') and isinstance(node.value.value, ast.Name) and
+                node.value.value.id == self.frame and isinstance(node.slice, ast.Tuple) and
+                len(node.slice.elts) == 2):
+            return None
+        index, column = node.slice.elts
+        if not (isinstance(column, ast.Constant) and isinstance(column.value, str)):
+            return None
+        loop = self.loop
+        if loop['index'] is not None:
+            current = isinstance(index, ast.Name) and index.id == loop['index']
+        else:
+            current = (loop.get('tuple_index') and isinstance(index, ast.Attribute) and index.attr == 'Index' and
+                       isinstance(index.value, ast.Name) and index.value.id == loop['row'])
+        if not current:
+            return None
+        self.by_label = True
+        return column.value
+
+    def _assigned_column(self, statement):
+        if (isinstance(statement, ast.Assign) and len(statement.targets) == 1 and
+                isinstance(statement.targets[0], ast.Subscript)):
+            return self._cell(statement.targets[0])
+        return None
+
+    def _statement(self, statement):
+        """Column-wise statements doing what statement does for every row, or None"""
+        column = self._assigned_column(statement)
+        if column is not None:
+            value = self.where(statement.value)
+            if value is None or not value[1]:
+                return None
+            self.assigned.add(column)
+            return [self._store(column, value[0])]
+        if isinstance(statement, ast.If):
+            return self._conditional(statement)
+        if isinstance(statement, ast.AugAssign):
+            return self._sum(statement, None)
+        if isinstance(statement, ast.Expr):
+            return self._append(statement, None)
+        if isinstance(statement, ast.Assign):
+            return self._group(statement)
+        return None
+
+    def _store(self, column, value, mask=None):
+        frame = ast.Name(id=self.frame, ctx=ast.Load())
+        if mask is None:
+            target = ast.Subscript(value=frame, slice=ast.Constant(value=column), ctx=ast.Store())
+        else:
+            target = ast.Subscript(value=ast.Attribute(value=frame, attr='loc', ctx=ast.Load()),
+                                   slice=ast.Tuple(elts=[mask, ast.Constant(value=column)], ctx=ast.Load()),
+                                   ctx=ast.Store())
+        return ast.Assign(targets=[target], value=value)
+
+    def _conditional(self, statement):
+        # Flatten if/elif/else into (test, statement) branches plus an optional final else
+        branches, otherwise = [], None
+        while True:
+            if len(statement.body) != 1:
+                return None
+            branches.append((statement.test, statement.body[0]))
+            if len(statement.orelse) == 1 and isinstance(statement.orelse[0], ast.If):
+                statement = statement.orelse[0]
+                continue
+            if len(statement.orelse) > 1:
+                return None
+            otherwise = statement.orelse[0] if statement.orelse else None
+            break
+        # A mask must be boolean: an integer Series would select rows by label
+        if not all(Vectorizer.boolean(test) for test, _ in branches):
+            return None
+        tests = [self.vectorize(test) for test, _ in branches]
+        if None in tests or not all(varies for _, varies in tests):
+            return None
+        tests = [test for test, _ in tests]
+
+        columns = {self._assigned_column(body) for _, body in branches}
+        if otherwise is not None:
+            columns.add(self._assigned_column(otherwise))
+        if len(columns) == 1 and None not in columns:
+            column = columns.pop()
+            values = [self.where(body.value) for _, body in branches]
+            if otherwise is not None:
+                values.append(self.where(otherwise.value))
+            if None in values:
+                return None
+            values = [value for value, _ in values]
+            self.assigned.add(column)
+            if otherwise is not None:
+                result = values[-1]
+                for test, value in reversed(list(zip(tests, values))):
+                    result = self.where.numpy_call('where', [test, value, result])
+                return [self._store(column, result)]
+            if len(branches) > 1 and column in self.read:
+                # Each masked assignment would see the ones before it
+                return None
+            statements, previous = [], []
+            for test, value in zip(tests, values):
+                mask = test
+                for earlier in previous:
+                    mask = ast.BinOp(left=mask, op=ast.BitAnd(), right=ast.UnaryOp(op=ast.Invert(), operand=earlier))
+                statements.append(self._store(column, value, mask))
+                previous.append(test)
+            return statements
+
+        if len(branches) != 1 or otherwise is not None:
+            return None
+        body = branches[0][1]
+        if isinstance(body, ast.AugAssign):
+            return self._sum(body, tests[0], statement)
+        if isinstance(body, ast.Expr):
+            return self._append(body, tests[0], statement)
+        return None
+
+    def _sum(self, statement, mask, whole=None):
+        """total += value  ->  total += df[...].sum() over the rows where mask holds"""
+        if not (isinstance(statement.op, ast.Add) and isinstance(statement.target, ast.Name)):
+            return None
+        value = self.vectorize(statement.value)
+        if value is None or isinstance(statement.value, (ast.Compare, ast.BoolOp)):
+            return None
+        if value[1]:
+            # Summed as Python numbers, in row order, like the loop: no int64 total, same float rounding
+            if 'sum' in self.shadowed:
+                return None
+            selected = value[0] if mask is None else ast.Subscript(value=value[0], slice=mask, ctx=ast.Load())
+            values = ast.Call(func=ast.Attribute(value=selected, attr='tolist', ctx=ast.Load()), args=[], keywords=[])
+            total = ast.Call(func=ast.Name(id='sum', ctx=ast.Load()), args=[values], keywords=[])
+        elif mask is not None:
+            # A constant per matching row
+            count = ast.Call(func=ast.Attribute(value=mask, attr='sum', ctx=ast.Load()), args=[], keywords=[])
+            total = ast.Call(func=ast.Name(id='int', ctx=ast.Load()), args=[count], keywords=[])
+            if 'int' in self.shadowed:
+                return None
+            if not (isinstance(value[0], ast.Constant) and value[0].value == 1):
+                total = ast.BinOp(left=value[0], op=ast.Mult(), right=total)
+        else:
+            return None
+        self.accumulators.append((statement.target.id, whole or statement))
+        return [ast.AugAssign(target=ast.Name(id=statement.target.id, ctx=ast.Store()), op=ast.Add(), value=total)]
+
+    def _append(self, statement, mask, whole=None):
+        """out.append(value)  ->  out.extend(values.tolist())"""
+        call = statement.value
+        if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Attribute) and call.func.attr == 'append' and
+                isinstance(call.func.value, ast.Name) and len(call.args) == 1 and not call.keywords):
+            return None
+        value = self.where(call.args[0])
+        if value is None or not value[1]:
+            return None
+        selected = value[0] if mask is None else ast.Subscript(value=value[0], slice=mask, ctx=ast.Load())
+        values = ast.Call(func=ast.Attribute(value=selected, attr='tolist', ctx=ast.Load()), args=[], keywords=[])
+        self.accumulators.append((call.func.value.id, whole or statement))
+        return [ast.Expr(value=ast.Call(func=ast.Attribute(value=call.func.value, attr='extend', ctx=ast.Load()),
+                                        args=[values], keywords=[]))]
+
+    def _group(self, statement):
+        """counts[k] = counts.get(k, 0) + value  ->  a groupby over column k merged into counts"""
+        if len(statement.targets) != 1 or not isinstance(statement.targets[0], ast.Subscript):
+            return None
+        target, value = statement.targets[0], statement.value
+        if not (isinstance(target.value, ast.Name) and isinstance(value, ast.BinOp) and
+                isinstance(value.op, ast.Add) and isinstance(value.left, ast.Call)):
+            return None
+        name, get = target.value.id, value.left
+        if not (isinstance(get.func, ast.Attribute) and get.func.attr == 'get' and
+                isinstance(get.func.value, ast.Name) and get.func.value.id == name and not get.keywords and
+                len(get.args) == 2 and ast.dump(get.args[0]) == ast.dump(target.slice) and
+                isinstance(get.args[1], ast.Constant) and get.args[1].value == 0):
+            return None
+        key = self._element(target.slice)
+        amount = self.vectorize(value.right)
+        if key is None or amount is None or isinstance(value.right, (ast.Compare, ast.BoolOp)):
+            return None
+        keywords = [ast.keyword(arg='sort', value=ast.Constant(value=False)),
+                    ast.keyword(arg='dropna', value=ast.Constant(value=False))]
+        if amount[1]:
+            grouped = ast.Call(func=ast.Attribute(value=amount[0], attr='groupby', ctx=ast.Load()),
+                               args=[key], keywords=keywords)
+            totals = ast.Call(func=ast.Attribute(value=grouped, attr='sum', ctx=ast.Load()), args=[], keywords=[])
+        else:
+            grouped = ast.Call(func=ast.Attribute(value=ast.Name(id=self.frame, ctx=ast.Load()), attr='groupby',
+                                                  ctx=ast.Load()), args=[key], keywords=keywords)
+            totals = ast.Call(func=ast.Attribute(value=grouped, attr='size', ctx=ast.Load()), args=[], keywords=[])
+            if not (isinstance(amount[0], ast.Constant) and amount[0].value == 1):
+                totals = ast.BinOp(left=totals, op=ast.Mult(), right=amount[0])
+        self.accumulators.append((name, statement))
+        group, total = unused_name('group', self.context), unused_name('group_total', self.context)
+        merge = ast.parse(f'{name}[{group}] = {name}.get({group}, 0) + {total}').body[0]
+        items = ast.Call(func=ast.Attribute(value=totals, attr='items', ctx=ast.Load()), args=[], keywords=[])
+        return [ast.For(target=ast.Tuple(elts=[ast.Name(id=group, ctx=ast.Store()), ast.Name(id=total, ctx=ast.Store())],
+                                         ctx=ast.Store()), iter=items, body=[merge], orelse=[])]
+
+
+@register
+class PandasRowLoopToColumns(RewriteRule):
+    """for i, row in df.iterrows(): df.loc[i, 'c'] = row['a'] * 2  ->  df['c'] = df['a'] * 2
+
+    Replaces loops over the rows of a DataFrame (df.iterrows(),
+    df.itertuples(), df.index) with column-wise operations. The frame must
+    be provably a DataFrame (pandas_frames). Every statement in the body must
+    have one of these forms, where the values are vectorizable expressions of
+    the row (row['a'], row.a, df.loc[i, 'a'], df.at[i, 'a']) and literals:
+
+    - df.loc[i, 'c'] = value  ->  df['c'] = value
+    - if/elif/else chains assigning one column  ->  np.where, or masked
+      df.loc[mask, 'c'] = value without an else
+    - total += value, optionally under an if  ->  total += value.sum()
+    - out.append(value), optionally under an if  ->  out.extend(value.tolist())
+    - counts[row['k']] = counts.get(row['k'], 0) + value  ->  a groupby sum
+      (or size) merged into counts
+
+    A statement must not read columns that earlier statements assign, and
+    the row and index names must not be used after the loop. Tests must be
+    boolean (comparisons, and/or/not of them), since they become masks.
+    Loops that address cells by label (df.loc[i, 'c']) need a frame whose
+    index provably has no repeated label (unique_index_frames). Sums are
+    taken over .tolist(), so totals stay Python numbers added in row order.
+    Results can differ in dtype (iterrows upcasts every row to a common
+    type), and groupby sums skip NaN.
+    """
+
+    name = 'pandas_row_loop_to_columns'
+    node_types = (ast.For,)
+    description = "Replaced a loop over DataFrame rows with column-wise operations"
+    energy_gain = 0.6
+
+    ROW_METHODS = ('iterrows', 'itertuples')
+    STOPS = (ast.Break, ast.Continue, ast.Return, ast.Yield, ast.YieldFrom, ast.Await, ast.Raise)
+
+    def matches(self, node, context):
+        source = node.iter
+        if isinstance(source, ast.Call):
+            source = source.func
+            if not isinstance(source, ast.Attribute) or source.attr not in self.ROW_METHODS:
+                return False
+        elif not isinstance(source, ast.Attribute) or source.attr != 'index':
+            return False
+        return (isinstance(source.value, ast.Name) and not node.orelse and
+                not any(isinstance(child, self.STOPS) for child in ast.walk(node)))
+
+    def rewrite(self, node, context):
+        loop = self._loop(node)
+        if loop is None or loop['frame'] not in pandas_frames(context.parents[0]):
+            return None
+        statements = RowLoop(node, loop, context).convert()
+        if statements is None:
+            return None
+        node.loop_kind = (f"{loop['kind']}() loop over {loop['frame']}" if loop['kind'] in self.ROW_METHODS else
+                          f"loop over {loop['frame']}.index")
+        return statements
+
+    def change_message(self, node):
+        return f"Replaced the {node.loop_kind} with column-wise operations"
+
+    def _loop(self, node):
+        """Frame, kind and row/index names of the loop header, or None"""
+        target = node.target
+        if isinstance(node.iter, ast.Attribute):
+            if isinstance(target, ast.Name):
+                return {'frame': node.iter.value.id, 'kind': 'index', 'row': None, 'index': target.id}
+            return None
+        call = node.iter
+        frame, kind = call.func.value.id, call.func.attr
+        if kind == 'iterrows':
+            if (call.args or call.keywords or not isinstance(target, ast.Tuple) or len(target.elts) != 2 or
+                    not all(isinstance(element, ast.Name) for element in target.elts)):
+                return None
+            return {'frame': frame, 'kind': kind, 'index': target.elts[0].id, 'row': target.elts[1].id}
+        index = True
+        for keyword in call.keywords:
+            if keyword.arg != 'index' or not isinstance(keyword.value, ast.Constant):
+                return None
+            index = bool(keyword.value.value)
+        if call.args or not isinstance(target, ast.Name):
+            return None
+        return {'frame': frame, 'kind': kind, 'row': target.id, 'index': None, 'tuple_index': index}
+
+
+@register
+class PandasApplyToColumns(RewriteRule):
+    """df.apply(lambda row: row['a'] * 2, axis=1)  ->  df['a'] * 2;  df['a'].map(lambda x: x + 1)  ->  df['a'] + 1
+
+    Row-wise DataFrame.apply and element-wise Series.apply/map with a lambda
+    become the same expression over whole columns, when the frame is
+    provably a DataFrame and the lambda body is vectorizable (see
+    Vectorizer). A conditional expression becomes np.where only when the
+    result is assigned straight to a column, since it yields an array
+    instead of a Series.
+    """
+
+    name = 'pandas_apply_to_columns'
+    node_types = (ast.Call,)
+    description = "Replaced a row-wise apply with column-wise operations"
+    energy_gain = 0.5
+
+    def matches(self, node, context):
+        function = node.func
+        if not (isinstance(function, ast.Attribute) and function.attr in ('apply', 'map') and
+                len(node.args) == 1 and isinstance(node.args[0], ast.Lambda)):
+            return False
+        arguments = node.args[0].args
+        if (arguments.posonlyargs or arguments.kwonlyargs or arguments.vararg or arguments.kwarg or
+                len(arguments.args) != 1 or arguments.defaults):
+            return False
+        if self._row_frame(node) is not None:
+            return True
+        return not node.keywords and self._series(function.value) is not None
+
+    def rewrite(self, node, context):
+        root = context.parents[0]
+        frames = pandas_frames(root)
+        function, body = node.func, node.args[0].body
+        argument = node.args[0].args.args[0].arg
+        frame = self._row_frame(node)
+        if frame is not None:
+            def element(child):
+                if (isinstance(child, ast.Subscript) and isinstance(child.value, ast.Name) and
+                        child.value.id == argument and isinstance(child.slice, ast.Constant) and
+                        isinstance(child.slice.value, str)):
+                    return ast.Subscript(value=ast.Name(id=frame, ctx=ast.Load()), slice=child.slice, ctx=ast.Load())
+                return None
+        else:
+            frame = self._series(function.value)[0]
+
+            def element(child):
+                if isinstance(child, ast.Name) and child.id == argument:
+                    return copy.deepcopy(function.value)
+                return None
+        if frame not in frames:
+            return None
+        parent = context.parents[-1] if context.parents else None
+        to_column = (isinstance(parent, ast.Assign) and parent.value is node and
+                     all(isinstance(target, ast.Subscript) and getattr(target.value, 'id', None) in frames
+                         for target in parent.targets))
+        vectorize = Vectorizer(element, constant_names(root) - {argument}, module_alias('numpy', context),
+                               strings=True, conditional=to_column, loose=names_in(body) - {argument})
+        result = vectorize(body)
+        if result is None or not result[1]:
+            return None
+        node.apply_kind = f"{ast.unparse(function.value)}.{function.attr}()"
+        return result[0]
+
+    def change_message(self, node):
+        return f"Replaced {node.apply_kind} with column-wise operations"
+
+    @staticmethod
+    def _row_frame(node):
+        """df for df.apply(..., axis=1)"""
+        function = node.func
+        axis = [keyword.value for keyword in node.keywords if keyword.arg == 'axis']
+        if (function.attr == 'apply' and isinstance(function.value, ast.Name) and len(node.keywords) == 1 and
+                axis and isinstance(axis[0], ast.Constant) and axis[0].value in (1, 'columns')):
+            return function.value.id
+        return None
+
+    @staticmethod
+    def _series(node):
+        """(df, 'c') for df['c']"""
+        if (isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and
+                isinstance(node.slice, ast.Constant) and isinstance(node.slice.value, str)):
+            return node.value.id, node.slice.value
+        return None
+
+
+class ArrayLoop:
+    """Whole-array statements for the body of one element-wise loop over NumPy arrays (see NumpyLoopToVectorized)"""
+
+    def __init__(self, node, arrays, context):
+        self.node, self.arrays, self.context = node, arrays, context
+        # Index name, element name, array the loop runs over and the bound of range(), whichever apply
+        self.index = self.value = self.source = self.length = None
+        # (name, statement) of every accumulator, arrays read or written element-wise
+        self.accumulators, self.used = [], set()
+        self.written = loop_effects(node)[0]
+        self.numpy = module_alias('numpy', context)
+        scalars = constant_names(context.parents[0]) - self.written
+        loose = names_in(node) - self.written - arrays
+        # Stored elements only accept scalars, so any unwritten name may take part;
+        # reductions add up whatever the expression yields, so they only take literals
+        self.map = Vectorizer(self._element, scalars | loose, self.numpy, conditional=True)
+        self.reduce = Vectorizer(self._element, scalars, self.numpy, conditional=True, loose=loose)
+
+    def convert(self):
+        """The replacement statements, or None when some statement has no whole-array form"""
+        node, root = self.node, self.context.parents[0]
+        if not self._header() or self.arrays & self.written & names_in(node):
+            return None
+        if any(name and used_outside_loops(root, name) for name in (self.index, self.value)):
+            return None
+        statements = []
+        for statement in node.body:
+            converted = self._statement(statement)
+            if converted is None:
+                return None
+            statements += converted
+        # Accumulators may only appear in their own statement
+        for name, statement in self.accumulators:
+            if name in self.arrays or count_uses(node, name) != count_uses(statement, name):
+                return None
+        # b[i] past the end of b raises IndexError, while b[:n] just comes out shorter (or broadcasts)
+        covered = numpy_length(self.source, root) if self.source else length_key(self.length, root)
+        for name in self.used - {self.source}:
+            length = numpy_length(name, root)
+            if length is None or not (length == covered or isinstance(length, int) and isinstance(covered, int) and
+                                      length >= covered):
+                return None
+        return statements
+
+    def _header(self):
+        """Read the loop variables and length from `for v in a` or `for i in range(...)`"""
+        node, target = self.node, self.node.target
+        if not isinstance(target, ast.Name):
+            return False
+        if isinstance(node.iter, ast.Name):
+            if node.iter.id not in self.arrays:
+                return False
+            self.value, self.source = target.id, node.iter.id
+            return True
+        call = node.iter
+        if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Name) and call.func.id == 'range' and
+                len(call.args) == 1 and not call.keywords):
+            return False
+        bound, sized = call.args[0], None
+        if (isinstance(bound, ast.Call) and isinstance(bound.func, ast.Name) and bound.func.id == 'len' and
+                len(bound.args) == 1 and not bound.keywords):
+            sized = bound.args[0]
+        elif isinstance(bound, ast.Attribute) and bound.attr == 'size':
+            sized = bound.value
+        elif (isinstance(bound, ast.Subscript) and isinstance(bound.value, ast.Attribute) and
+              bound.value.attr == 'shape' and isinstance(bound.slice, ast.Constant) and bound.slice.value == 0):
+            sized = bound.value.value
+        elif not all(isinstance(value, ast.Constant) and type(value.value) is int and value.value >= 0
+                     for value in (bindings(self.context.parents[0]).get(bound.id, [None])
+                                   if isinstance(bound, ast.Name) else [bound])):
+            # Neither an array's length nor a count fixed by a literal
+            return False
+        if sized is not None:
+            if not (isinstance(sized, ast.Name) and sized.id in self.arrays):
+                return False
+            self.source = sized.id
+        self.index, self.length = target.id, bound
+        return True
+
+    def _array(self, name):
+        """The part of array name the loop covers"""
+        self.used.add(name)
+        array = ast.Name(id=name, ctx=ast.Load())
+        if name == self.source:
+            return array
+        return ast.Subscript(value=array, slice=ast.Slice(upper=copy.deepcopy(self.length)), ctx=ast.Load())
+
+    def _element(self, node):
+        """a for a[i] or the element name, np.arange(n) for the index itself"""
+        if isinstance(node, ast.Name):
+            if node.id == self.value:
+                return ast.Name(id=self.source, ctx=ast.Load())
+            if node.id == self.index:
+                return self.map.numpy_call('arange', [copy.deepcopy(self.length)])
+            return None
+        if self._indexed(node):
+            return self._array(node.value.id)
+        return None
+
+    def _indexed(self, node):
+        """Whether node is a[i] for an array a and the loop index i"""
+        return (self.index is not None and isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and
+                node.value.id in self.arrays and isinstance(node.slice, ast.Name) and node.slice.id == self.index)
+
+    def _store(self, name, value):
+        array = self._array(name)
+        if isinstance(array, ast.Name):
+            array = ast.Subscript(value=array, slice=ast.Slice(), ctx=ast.Load())
+        array.ctx = ast.Store()
+        return ast.Assign(targets=[array], value=value)
+
+    def _statement(self, statement):
+        """Whole-array statements doing what statement does for every element, or None"""
+        if isinstance(statement, ast.Assign) and len(statement.targets) == 1:
+            target = statement.targets[0]
+            if self._indexed(target):
+                value = self.map(statement.value)
+                return None if value is None else [self._store(target.value.id, value[0])]
+            if isinstance(target, ast.Name):
+                return self._extreme(statement, None)
+            return None
+        if isinstance(statement, ast.AugAssign):
+            if self._indexed(statement.target):
+                current = ast.Subscript(value=statement.target.value, slice=statement.target.slice, ctx=ast.Load())
+                # c[:n] = c[:n] + x rather than c[:n] += x, which refuses to cast floats into an int array
+                value = self.map(ast.BinOp(left=current, op=statement.op, right=statement.value))
+                return None if value is None else [self._store(statement.target.value.id, value[0])]
+            return self._reduction(statement, None)
+        if isinstance(statement, ast.If):
+            return self._conditional(statement)
+        return None
+
+    def _conditional(self, statement):
+        # Flatten if/elif/else into (test, statement) branches plus an optional final else
+        branches, otherwise = [], None
+        while True:
+            if len(statement.body) != 1:
+                return None
+            branches.append((statement.test, statement.body[0]))
+            if len(statement.orelse) == 1 and isinstance(statement.orelse[0], ast.If):
+                statement = statement.orelse[0]
+                continue
+            if len(statement.orelse) > 1:
+                return None
+            otherwise = statement.orelse[0] if statement.orelse else None
+            break
+        bodies = [body for _, body in branches] + ([otherwise] if otherwise is not None else [])
+        targets = {body.targets[0].value.id if isinstance(body, ast.Assign) and len(body.targets) == 1 and
+                   self._indexed(body.targets[0]) else None for body in bodies}
+        if len(targets) == 1 and None not in targets:
+            # Element assignments: one np.where chain, defaulting to the current values
+            name = targets.pop()
+            tests = [self.map(test) for test, _ in branches]
+            values = [self.map(body.value) for body in bodies]
+            if None in tests or None in values or not all(varies for _, varies in tests):
+                return None
+            result = values[-1][0] if otherwise is not None else self._array(name)
+            for (test, _), (value, _) in reversed(list(zip(tests, values))):
+                result = self.map.numpy_call('where', [test, value, result])
+            return [self._store(name, result)]
+
+        if len(branches) != 1 or otherwise is not None:
+            return None
+        test, body = branches[0]
+        # Indexing with a non-boolean array picks elements by position
+        if not Vectorizer.boolean(test):
+            return None
+        mask = self.reduce(test)
+        if isinstance(body, ast.AugAssign):
+            return None if mask is None or not mask[1] else self._reduction(body, mask[0], statement)
+        if isinstance(body, ast.Assign) and len(body.targets) == 1 and isinstance(body.targets[0], ast.Name):
+            if isinstance(body.value, ast.Call):
+                return None if mask is None or not mask[1] else self._extreme(body, mask[0], statement)
+            return self._running_extreme(statement)
+        return None
+
+    def _reduction(self, statement, mask, whole=None):
+        """total += x  ->  total += x.sum() (np.dot for a product of two arrays), *= to .prod()"""
+        if not (isinstance(statement.target, ast.Name) and isinstance(statement.op, (ast.Add, ast.Sub, ast.Mult))):
+            return None
+        if isinstance(statement.value, (ast.Compare, ast.BoolOp)):
+            return None
+        value = self.reduce(statement.value)
+        if value is None:
+            return None
+        if value[1]:
+            product = statement.value
+            factors = ([self.reduce(product.left), self.reduce(product.right)]
+                       if isinstance(product, ast.BinOp) and isinstance(product.op, ast.Mult) else [])
+            if (mask is None and not isinstance(statement.op, ast.Mult) and factors and
+                    all(factor is not None and factor[1] for factor in factors)):
+                total = self.map.numpy_call('dot', [factor for factor, _ in factors])
+            else:
+                selected = value[0] if mask is None else ast.Subscript(value=value[0], slice=mask, ctx=ast.Load())
+                method = 'prod' if isinstance(statement.op, ast.Mult) else 'sum'
+                total = ast.Call(func=ast.Attribute(value=selected, attr=method, ctx=ast.Load()), args=[], keywords=[])
+        elif mask is not None and not isinstance(statement.op, ast.Mult):
+            # A constant per matching element
+            total = self.map.numpy_call('count_nonzero', [mask])
+            if not (isinstance(value[0], ast.Constant) and value[0].value == 1):
+                total = ast.BinOp(left=value[0], op=ast.Mult(), right=total)
+        else:
+            return None
+        self.accumulators.append((statement.target.id, whole or statement))
+        return [ast.AugAssign(target=ast.Name(id=statement.target.id, ctx=ast.Store()), op=statement.op, value=total)]
+
+    def _extreme(self, statement, mask, whole=None):
+        """best = max(best, x)  ->  best = x.max(initial=best), likewise for min"""
+        name, call = statement.targets[0].id, statement.value
+        if not (isinstance(call, ast.Call) and isinstance(call.func, ast.Name) and call.func.id in ('max', 'min') and
+                len(call.args) == 2 and not call.keywords):
+            return None
+        others = [argument for argument in call.args if not (isinstance(argument, ast.Name) and argument.id == name)]
+        if len(others) != 1:
+            return None
+        return self._reduce_extreme(name, call.func.id, others[0], mask, whole or statement)
+
+    def _running_extreme(self, statement):
+        """if x > best: best = x  ->  best = x.max(initial=best), likewise for min"""
+        test, body = statement.test, statement.body[0]
+        name = body.targets[0].id
+        if not (isinstance(test, ast.Compare) and len(test.ops) == 1 and
+                isinstance(test.ops[0], (ast.Gt, ast.GtE, ast.Lt, ast.LtE))):
+            return None
+        greater = isinstance(test.ops[0], (ast.Gt, ast.GtE))
+        left, right = test.left, test.comparators[0]
+        if isinstance(right, ast.Name) and right.id == name and ast.dump(left) == ast.dump(body.value):
+            function = 'max' if greater else 'min'
+        elif isinstance(left, ast.Name) and left.id == name and ast.dump(right) == ast.dump(body.value):
+            function = 'min' if greater else 'max'
+        else:
+            return None
+        return self._reduce_extreme(name, function, body.value, None, statement)
+
+    def _reduce_extreme(self, name, function, value, mask, statement):
+        value = self.reduce(value)
+        if value is None or not value[1]:
+            return None
+        selected = value[0] if mask is None else ast.Subscript(value=value[0], slice=mask, ctx=ast.Load())
+        self.accumulators.append((name, statement))
+        # initial= keeps the running value and makes an empty selection a no-op, as the loop would
+        extreme = ast.Call(func=ast.Attribute(value=selected, attr=function, ctx=ast.Load()), args=[],
+                           keywords=[ast.keyword(arg='initial', value=ast.Name(id=name, ctx=ast.Load()))])
+        return [ast.Assign(targets=[ast.Name(id=name, ctx=ast.Store())], value=extreme)]
+
+
+@register
+class NumpyLoopToVectorized(RewriteRule):
+    """for i in range(len(a)): c[i] = a[i] * b[i] + k  ->  c[:] = a * b[:len(a)] + k
+
+    Replaces element-wise loops over 1-D NumPy arrays with whole-array
+    operations. The arrays must be provably 1-D numeric arrays (numpy_arrays)
+    that the loop does not rebind, and the loop must run over
+    range(len(a)), range(a.size), range(a.shape[0]), range(n) for an int
+    literal n (or a name only ever bound to one) or, for reductions only,
+    the array itself. Every statement in the body
+    must have one of these forms, where the values are vectorizable
+    expressions (see Vectorizer) of the elements a[i], the index i and
+    literals:
+
+    - c[i] = value, c[i] += value  ->  c[:n] = value
+    - if/elif/else chains assigning c[i]  ->  np.where, keeping c[i] where no
+      branch applies
+    - total += value (or -=, *=), optionally under an if  ->  .sum() or
+      np.dot for a product of two arrays, .prod(), np.count_nonzero for a
+      constant
+    - best = max(best, value) or if value > best: best = value  ->
+      best = value.max(initial=best), likewise for min
+
+    Only the current element may be read or written, accumulators may only
+    appear in their own statement, and the loop variables must not be used
+    after the loop. Every array indexed must provably be at least as long
+    as the loop (numpy_length), and a test guarding a reduction must be
+    boolean, since it becomes a mask. Float sums can differ in the last bits (NumPy adds
+    pairwise), max/min propagate NaN, and guarded branches are evaluated
+    for every element, so they may warn where the loop would not. Arrays
+    with an explicit integer dtype are left alone, since storing an
+    out-of-range value raises OverflowError element by element but wraps
+    silently in a whole-array operation; default integer arrays (int64 from
+    np.arange or np.array of ints) only differ past 2**63.
+    """
+
+    name = 'numpy_loop_to_vectorized'
+    node_types = (ast.For,)
+    description = "Replaced an element-wise loop over NumPy arrays with whole-array operations"
+    energy_gain = 0.6
+
+    STOPS = PandasRowLoopToColumns.STOPS
+
+    def matches(self, node, context):
+        return (isinstance(node.target, ast.Name) and isinstance(node.iter, (ast.Name, ast.Call)) and
+                not node.orelse and not any(isinstance(child, self.STOPS) for child in ast.walk(node)))
+
+    def rewrite(self, node, context):
+        arrays = numpy_arrays(context.parents[0])
+        if not arrays:
+            return None
+        loop = ArrayLoop(node, arrays, context)
+        statements = loop.convert()
+        if not statements:
+            return None
+        node.array_name = loop.source or ast.unparse(node.iter)
+        return statements
+
+    def change_message(self, node):
+        return f"Replaced the element-wise loop over {node.array_name} with NumPy array operations"
+
+
+@register
+class PandasToNumpy(RewriteRule):
+    """df.mean() / df.std() / series.sort_values()  ->  the NumPy equivalent
+
+    Only on values the data flow proves are pandas DataFrames or Series
+    (from pd.DataFrame(...), pd.read_csv(...), a column selection ...),
+    whatever they are called.
+    """
+
+    name = 'pandas_to_numpy'
+    node_types = (ast.Call,)
+    description = "Converted pandas call to numpy"
+    energy_gain = 0.2
+
+    # pandas method -> (numpy function, pass .values, message, types it applies to, keywords for numpy)
+    METHODS = {
+        'mean': ('mean', False, "Converted pandas mean() to numpy mean() with axis=0", ('DataFrame', 'Series'),
+                 {'axis': 0}),
+        # pandas divides by n - 1, NumPy by n unless told otherwise
+        'std': ('std', False, "Converted pandas std() to numpy std() with axis=0, ddof=1", ('DataFrame', 'Series'),
+                {'axis': 0, 'ddof': 1}),
+        # np.sort() of a frame's values would sort each row on its own
+        'sort_values': ('sort', True, "Converted pandas sort_values() to numpy sort() with .values", ('Series',),
+                        {}),
+    }
+
+    def matches(self, node, context):
+        # Check if it's a pandas DataFrame/Series method
+        if not (isinstance(node.func, ast.Attribute) and node.func.attr in self.METHODS and
+                not node.args and not node.keywords):
+            return False
+        return context.dataflow().type_of(node.func.value) in self.METHODS[node.func.attr][3]
+
+    def rewrite(self, node, context):
+        function, values, _, _, options = self.METHODS[node.func.attr]
+        argument = node.func.value
+        if values:
+            argument = ast.Attribute(value=argument, attr='values', ctx=ast.Load())
+        keywords = [ast.keyword(arg=name, value=ast.Constant(value=value)) for name, value in options.items()]
+        return ast.Call(
+            func=ast.Attribute(value=ast.Name(id=module_alias('numpy', context), ctx=ast.Load()), attr=function,
+                               ctx=ast.Load()),
+            args=[argument],
+            keywords=keywords
+        )
+
+    def change_message(self, node):
+        return self.METHODS[node.func.attr][2]
@@ -71,6 +71,8 @@ def measure_emissions():
                 'time_complexity': result['metrics']['time_complexity'],
                 'space_complexity': result['metrics']['space_complexity'],
                 'cyclomatic_complexity': result['metrics']['cyclomatic_complexity'],
+                'bytecode_ops_per_iteration': result['metrics']['bytecode_ops_per_iteration'],
+                'native_ops': result['metrics']['native_ops'],
                 'eco_score': result['eco_score'],
                 'suggestions': result['suggestions'],
                 'confidence': result['confidence']
@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from code_repair import repair_code, syntax_error
+
+def assert_repaired(code, expected):
+    result = repair_code(code)
+    assert result['parsed'], result
+    assert result['code'] == expected
+    assert result['fixes']
+
+def test_parsing_code_is_returned_unchanged():
+    result = repair_code('x = 1\n')
+    assert result == {'code': 'x = 1\n', 'parsed': True, 'fixes': [], 'attempts': 0,
+                      'seconds': result['seconds'], 'error': None}
+
+def test_indentation():
+    assert_repaired('def f():\nreturn 1\n', 'def f():\n    return 1\n')
+    assert_repaired('x = 1\n    y = 2\n', 'x = 1\ny = 2\n')
+    assert_repaired('class A:\n    pass\ndef g():\n', 'class A:\n    pass\ndef g():\n    pass\n')
+
+def test_brackets_strings_and_colons():
+    assert_repaired('print(len(x)\n', 'print(len(x))\n')
+    assert_repaired('x = [1, 2)\n', 'x = [1, 2]\n')
+    assert_repaired("print('hi)\n", "print('hi')\n")
+    assert_repaired('if x > 1\n    pass\n', 'if x > 1:\n    pass\n')
+
+def test_ocr_confusions():
+    assert_repaired('1lm = load()\n', 'llm = load()\n')
+    assert_repaired('x = 1O0\n', 'x = 100\n')
+    assert_repaired('from dotenv import load dotenv\n', 'from dotenv import load_dotenv\n')
+
+def test_budget_is_respected():
+    result = repair_code('x = = =\n', max_attempts=1)
+    assert not result['parsed'] and result['attempts'] <= 1
+    assert result['error'] and syntax_error(result['code'])
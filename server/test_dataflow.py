@@ -0,0 +1,76 @@
+import ast
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from dataflow import DataFlow
+
+CODE = '''
+import numpy as np
+import pandas as pd
+
+frame = pd.read_csv('data.csv')
+
+def summarize(xs, n: int, table: pd.DataFrame):
+    total = 0
+    for i in range(n):
+        total += i
+    ratio = total / 2
+    if n:
+        label = 'n=' + str(n)
+    else:
+        label = n
+    column = table['price']
+    scaled = np.zeros(n) * 2
+    squares = [x * x for x in xs]
+    best = max(squares)
+    squares = []
+    return total, ratio, label, column, scaled, frame, best
+'''
+
+
+def function_flow():
+    tree = ast.parse(CODE)
+    function = tree.body[3]
+    return function, DataFlow(function, tree)
+
+
+def test_types_follow_definitions_not_names():
+    function, flow = function_flow()
+    returned = function.body[-1].value.elts
+    types = {node.id: flow.type_of(node) for node in returned}
+    assert types == {'total': 'int', 'ratio': 'float', 'label': None, 'column': 'Series', 'scaled': 'ndarray',
+                     'frame': 'DataFrame', 'best': None}
+    # Strings are typed from the values flowing in, whatever the name
+    module = DataFlow(ast.parse("count = 'a'\nage = count + 'b'\nprint(age)"))
+    assert module.type_of(module.scope.body[-1].value.args[0]) == 'str'
+
+
+def test_reaching_definitions_uses_and_liveness():
+    function, flow = function_flow()
+    squares, best, _ = function.body[6:9]
+    read = best.value.args[0]
+    definitions = flow.definitions('squares', read)
+    assert [definition.value for definition in definitions] == [squares.value]
+    assert flow.uses(definitions[0]) == [read]
+    # Rebound before anything reads it again
+    assert 'squares' not in flow.live_after(best)
+    assert {'total', 'ratio', 'label', 'column', 'scaled', 'best'} <= flow.live_after(best)
+    # Both branches of the if reach the return
+    values = [definition.value for definition in flow.definitions('label', function.body[-1].value)]
+    assert len(values) == 2 and isinstance(values[1], ast.Name)
+
+
+def test_loops_closures_and_globals():
+    tree = ast.parse("def f(xs):\n    out = []\n    for x in xs:\n        out.append(x)\n"
+                     "    def show():\n        return out\n    return show\n"
+                     "def g():\n    global counter\n    counter = 1\ncounter = []\n")
+    flow = DataFlow(tree.body[0], tree)
+    loop = tree.body[0].body[1]
+    # Closures keep what they read alive
+    assert 'out' in flow.live_after(loop) and 'out' in flow.captured
+    module = DataFlow(tree)
+    # Another scope rebinds counter, so no definition here is the whole story
+    assert module.definitions('counter', tree.body[-1])[-1].value is None
+    assert module.type_of(tree.body[-1].targets[0]) is None
@@ -0,0 +1,51 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from emissions_tracker import bootstrap_ci, compare_emissions, format_verdict
+
+def slow_function():
+    print("this output must not leak")
+    return sum(i * i for i in range(200000))
+
+def fast_function():
+    return sum(i * i for i in range(2000))
+
+def test_bootstrap_ci_contains_mean():
+    samples = [1.0, 2.0, 3.0, 4.0, 5.0]
+    low, high = bootstrap_ci(samples, n_resamples=500)
+    assert low <= 3.0 <= high
+
+def test_compare_emissions_detects_faster_function(capsys):
+    verdict = compare_emissions(slow_function, fast_function, warmup=1, min_trials=5,
+                                max_trials=10, energy_meter='cpu_time_model', seed=0)
+    assert capsys.readouterr().out == ""
+    assert verdict['winner'] == 'optimized'
+    assert verdict['trials'] >= 5
+    assert verdict['difference']['wall_time_s']['mean'] > 0
+    assert verdict['speedup'] > 1
+    assert verdict['energy_source'] == 'cpu_time_model'
+
+def test_compare_emissions_restores_stdout_on_error():
+    stdout = sys.stdout
+
+    def failing_function():
+        raise RuntimeError("boom")
+
+    try:
+        compare_emissions(failing_function, fast_function, warmup=0, energy_meter='cpu_time_model')
+    except RuntimeError:
+        pass
+    assert sys.stdout is stdout
+
+def test_format_verdict():
+    verdict = compare_emissions(fast_function, fast_function, warmup=0, min_trials=3,
+                                max_trials=3, energy_meter='cpu_time_model', seed=0)
+    report = format_verdict(verdict)
+    assert "RESULTS" in report
+    assert "Trials: 3" in report
+
+if __name__ == "__main__":
+    verdict = compare_emissions(slow_function, fast_function, energy_meter='cpu_time_model')
+    print(format_verdict(verdict))
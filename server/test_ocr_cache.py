@@ -0,0 +1,97 @@
+import io
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image
+from ocr_cache import OCRCache
+
+IMAGES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dataset', 'test', 'images')
+
+def load_image(number):
+    with open(os.path.join(IMAGES_DIR, f'image_{number}.png'), 'rb') as f:
+        return f.read()
+
+def reencode(image_bytes, scale=1.0, quality=80):
+    image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+    image = image.resize((int(image.width * scale), int(image.height * scale)))
+    buffer = io.BytesIO()
+    image.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+def test_exact_and_reencoded_hits():
+    cache = OCRCache()
+    original = load_image(3)
+    cache.put(original, 'from collections import defaultdict\n')
+    assert cache.get(original) == 'from collections import defaultdict\n'
+    assert cache.get(reencode(original, scale=0.75)) == 'from collections import defaultdict\n'
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['perceptual_hits'] == 1
+
+def test_same_layout_different_code_is_a_miss():
+    # image_20 and image_21 share the exact window layout but show different code
+    cache = OCRCache()
+    cache.put(load_image(20), 'snippet 20')
+    assert cache.get(load_image(21)) is None
+    assert cache.stats()['hit_rate'] == 0.0
+
+def test_lru_eviction():
+    cache = OCRCache(max_entries=2, use_perceptual_hash=False)
+    cache.put(b'a', 'A')
+    cache.put(b'b', 'B')
+    assert cache.get(b'a') == 'A'  # 'b' becomes least recently used
+    cache.put(b'c', 'C')
+    assert cache.get(b'b') is None
+    assert cache.get(b'a') == 'A'
+    assert cache.get(b'c') == 'C'
+
+def test_text_size_bound():
+    cache = OCRCache(max_text_chars=10, use_perceptual_hash=False)
+    cache.put(b'a', 'x' * 6)
+    cache.put(b'b', 'y' * 6)
+    assert cache.get(b'a') is None
+    assert cache.get(b'b') == 'y' * 6
+
+def test_persistence(tmp_path):
+    path = str(tmp_path / 'cache.json')
+    cache = OCRCache(path=path)
+    image = load_image(7)
+    cache.put(image, 'from .youtube import YouTube\n')
+    assert not os.path.exists(path)  # Written in batches, not on every put
+    cache.save()
+
+    reloaded = OCRCache(path=path)
+    assert reloaded.get(image) == 'from .youtube import YouTube\n'
+    assert reloaded.get(reencode(image)) == 'from .youtube import YouTube\n'
+
+def test_threaded_puts_are_all_saved(tmp_path):
+    path = str(tmp_path / 'cache.json')
+    cache = OCRCache(path=path, use_perceptual_hash=False, save_every=4)
+    errors = []
+
+    def put_many(thread):
+        try:
+            for i in range(30):
+                cache.put(f'{thread}-{i}'.encode(), f'text {thread} {i}')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=put_many, args=(thread,)) for thread in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    cache.save()
+    assert errors == []
+    assert os.listdir(tmp_path) == ['cache.json']
+    assert OCRCache(path=path, use_perceptual_hash=False).get(b'3-29') == 'text 3 29'
+
+def test_other_cleanup_settings_miss():
+    image = load_image(3)
+    cache = OCRCache(variant='repair=True')
+    cache.put(image, 'repaired\n')
+    cache.variant = 'repair=False'
+    assert cache.get(image) is None
+    assert cache.get(reencode(image)) is None
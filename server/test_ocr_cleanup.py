@@ -0,0 +1,41 @@
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from ocr_cleanup import DEFAULT_RULES, Rule, TextCleaner, create_cleaner
+
+def test_character_and_keyword_fixes():
+    cleaner = TextCleaner()
+    assert cleaner.clean('pr1nt( “hi” , x )\n') == 'print("hi", x)\n'
+    # Word rules leave identifiers that merely contain the misread alone
+    assert cleaner.clean('True1 = subclass1\n') == 'True = subclass1\n'
+    assert cleaner.clean('|mport x\ny = a | b\n') == 'Import x\ny = a | b\n'
+
+def test_context_rules_only_fire_in_context():
+    cleaner = TextCleaner()
+    assert cleaner.clean('for x 1n items:\n    1f x:\n') == 'for x in items:\n    if x:\n'
+    assert cleaner.clean('value = 1n\n') == 'value = 1n\n'
+    assert cleaner.clean('from  os  import  path\nx = obj .attr\n') == 'from os import path\nx = obj.attr\n'
+    assert cleaner.clean('from . import views\n') == 'from . import views\n'
+
+def test_structure():
+    text = '\n\nimport os\n\n\n\n@cache\n\ndef f(x):\n  return x\n  return x\nclass A:\n    def g(self):\n        pass\n    def h(self):\n        return 1\n'
+    assert TextCleaner().clean(text) == (
+        'import os\n\n\n@cache\ndef f(x):\n    return x\n\n\nclass A:\n'
+        '    def g(self):\n        pass\n\n    def h(self):\n        return 1\n'
+    )
+    assert TextCleaner().clean('') is None
+
+def test_custom_rules(tmp_path, monkeypatch):
+    rules_path = tmp_path / 'rules.json'
+    rules_path.write_text(json.dumps([
+        {'pattern': 'lambada', 'replacement': 'lambda', 'kind': 'word'},
+        {'pattern': r'(?<=\d)O', 'replacement': '0', 'kind': 'regex', 'trigger': 'O'},
+    ]))
+    monkeypatch.setenv('OPTIPY_OCR_RULES', str(rules_path))
+    assert create_cleaner().clean('f = lambada x: x * 1O\n') == 'f = lambda x: x * 10\n'
+    with pytest.raises(ValueError):
+        TextCleaner(DEFAULT_RULES + [Rule('x', 'y', 'glob')])
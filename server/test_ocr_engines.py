@@ -0,0 +1,100 @@
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from PIL import Image, ImageDraw
+from imageToCode import CodeExtractor, score_code
+from image_preprocessing import split_into_tiles
+from ocr_engines import OCRSpaceEngine, engine_names
+
+class FakeEngine:
+    def __init__(self, name, text, delay=0.0):
+        self.name, self.text, self.delay = name, text, delay
+        self.cancelled = None
+        self.closed = False
+
+    def read(self, image_bytes, cancelled=None):
+        self.cancelled = cancelled
+        time.sleep(self.delay)
+        return self.text
+
+    def read_many(self, images):
+        return [self.read(image) for image in images]
+
+    def close(self):
+        self.closed = True
+
+def racer(*engines, deadline=5.0):
+    return CodeExtractor(engines=engines, deadline=deadline, use_cache=False, repair=False)
+
+def test_first_parsing_result_wins_and_cancels_the_rest():
+    slow = FakeEngine('slow', 'x = 1\n', delay=1.0)
+    extractor = racer(FakeEngine('fast', 'y = 2\n'), slow)
+    start = time.perf_counter()
+    assert extractor.extract_code_from_image(b'image') == 'y = 2\n'
+    assert time.perf_counter() - start < 0.5
+    time.sleep(0.05)
+    assert slow.cancelled is None or slow.cancelled.is_set()
+    assert extractor.ocr_stats()['wins'] == {'fast': 1, 'slow': 0}
+    extractor.close()
+    assert slow.closed
+
+def test_unparsable_result_waits_for_a_better_one():
+    extractor = racer(FakeEngine('fast', 'x = (\n'), FakeEngine('slow', 'x = 1\n', delay=0.2))
+    assert extractor.extract_code_from_image(b'image') == 'x = 1\n'
+    assert extractor.extract_code_from_images([b'a', b'b']) == ['x = 1\n', 'x = 1\n']
+    extractor.close()
+
+def test_deadline_returns_best_result_so_far():
+    extractor = racer(FakeEngine('fast', 'ok = 1\nx = (\n'), FakeEngine('slow', 'x = 1\n', delay=2.0), deadline=0.1)
+    start = time.perf_counter()
+    assert extractor.extract_code_from_image(b'image') == 'ok = 1\nx = (\n'
+    assert time.perf_counter() - start < 1.0
+    stats = extractor.ocr_stats()
+    assert stats['deadline_hits'] == 1 and stats['wins']['fast'] == 1
+    extractor.close()
+
+def test_scoring_and_engine_names(monkeypatch):
+    assert score_code('x = 1\n') == 1.0
+    assert score_code('a = 1\nb = (\n') == 0.5
+    assert score_code(None) == 0.0
+    monkeypatch.setenv('OPTIPY_OCR_ENGINES', 'ocr_space, tesseract')
+    assert engine_names() == ['ocr_space', 'tesseract']
+    with pytest.raises(ValueError):
+        engine_names('easyocr')
+
+def striped_page(lines, line_height=10, gap=10, width=400):
+    """White page with a black bar per text line"""
+    page = Image.new('L', (width, lines * (line_height + gap) + gap), 255)
+    draw = ImageDraw.Draw(page)
+    for number in range(lines):
+        top = gap + number * (line_height + gap)
+        draw.rectangle((10, top, 150, top + line_height - 1), fill=0)
+    return page
+
+def test_tiles_cut_between_lines():
+    page = striped_page(48)
+    assert split_into_tiles(page, parts=1) == [(page, 0)]
+    tiles = split_into_tiles(page, parts=4)
+    assert [tile.height for tile, _ in tiles] == [245, 240, 240, 245]
+    assert [top for _, top in tiles] == [0, 245, 485, 725]
+    assert all(tile.width == page.width for tile, _ in tiles)
+    # Very long pages are cut even without spare workers
+    assert len(split_into_tiles(striped_page(130), parts=1, max_lines=60)) == 3
+
+def test_ocr_space_uploads_tall_pages_as_tiles():
+    class TileClient:
+        uploads = []
+        def extract_all_lines(self, images, filetype='PNG', **options):
+            self.uploads.extend(images)
+            return [[{'text': f'x{number} = 1', 'box': (10, 10, 150, 19), 'words': [(f'x{number}', None, (10, 10, 30, 19))]}]
+                    for number in range(len(self.uploads) - len(images), len(self.uploads))]
+    page = io.BytesIO()
+    striped_page(130).save(page, format='PNG')
+    engine = OCRSpaceEngine(client=TileClient())
+    assert engine.read(page.getvalue()) == 'x0 = 1\nx1 = 1\nx2 = 1\n'
+    assert len(TileClient.uploads) == 3
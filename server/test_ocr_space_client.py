@@ -0,0 +1,128 @@
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from ocr_cleanup import layout_lines
+from ocr_space_client import OCRSpaceClient, OCRSpaceError
+
+class StubOCRHandler(BaseHTTPRequestHandler):
+    """Local stand-in for OCR.space; behaviour is scripted through server.script."""
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            action = server.script.pop(0) if server.script else 'ok'
+        try:
+            if action == 'slow':
+                time.sleep(0.5)
+                action = 'ok'
+            if action == 'hang':
+                time.sleep(2)
+                return
+            if action == 'ok':
+                body = json.dumps({
+                    'IsErroredOnProcessing': False,
+                    'ParsedResults': [{
+                        'ParsedText': 'if x:\n    print("hello")\n',
+                        'TextOverlay': {'Lines': [
+                            {'LineText': 'print("hello")', 'Words': [
+                                {'WordText': 'print("hello")', 'Left': 40, 'Top': 30, 'Width': 140, 'Height': 18}]},
+                            {'LineText': 'if x:', 'Words': [
+                                {'WordText': 'if', 'Left': 0, 'Top': 5, 'Width': 20, 'Height': 18},
+                                {'WordText': 'x:', 'Left': 30, 'Top': 5, 'Width': 20, 'Height': 18}]},
+                        ]},
+                    }],
+                }).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            else:
+                self.send_response(int(action))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def log_message(self, format, *args):
+        pass
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOCRHandler)
+    server.lock = threading.Lock()
+    server.script = []
+    server.requests = 0
+    server.in_flight = 0
+    server.max_in_flight = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def make_client(server, **kwargs):
+    url = f'http://127.0.0.1:{server.server_address[1]}/parse/image'
+    kwargs.setdefault('backoff_base', 0.01)
+    return OCRSpaceClient(api_key='test', api_url=url, **kwargs)
+
+def test_extract_text(stub_server):
+    with make_client(stub_server) as client:
+        assert client.extract_text(b'image') == 'if x:\n    print("hello")\n'
+
+def test_retries_on_5xx_and_429(stub_server):
+    stub_server.script = ['503', '429', 'ok']
+    with make_client(stub_server) as client:
+        assert client.extract_text(b'image') == 'if x:\n    print("hello")\n'
+    assert stub_server.requests == 3
+
+def test_gives_up_after_max_retries(stub_server):
+    stub_server.script = ['500'] * 10
+    with make_client(stub_server, max_retries=2) as client:
+        with pytest.raises(OCRSpaceError):
+            client.extract_text(b'image')
+    assert stub_server.requests == 3
+
+def test_client_errors_are_not_retried(stub_server):
+    stub_server.script = ['403']
+    with make_client(stub_server) as client:
+        with pytest.raises(OCRSpaceError):
+            client.extract_text(b'image')
+    assert stub_server.requests == 1
+
+def test_read_timeout(stub_server):
+    stub_server.script = ['hang', 'ok']
+    with make_client(stub_server, read_timeout=0.2, max_retries=1) as client:
+        start = time.perf_counter()
+        assert client.extract_text(b'image') == 'if x:\n    print("hello")\n'
+        assert time.perf_counter() - start < 2
+
+def test_batch_is_concurrent_and_bounded(stub_server):
+    stub_server.script = ['slow'] * 6
+    with make_client(stub_server, max_concurrency=3) as client:
+        start = time.perf_counter()
+        texts = client.extract_texts([b'image'] * 6)
+        elapsed = time.perf_counter() - start
+    assert texts == ['if x:\n    print("hello")\n'] * 6
+    assert stub_server.max_in_flight <= 3
+    # Two waves of three concurrent requests, not six sequential ones
+    assert elapsed < 2.5
+
+def test_extract_lines_orders_lines_with_boxes(stub_server):
+    with make_client(stub_server) as client:
+        lines = client.extract_lines(b'image')
+    assert [line['text'] for line in lines] == ['if x:', 'print("hello")']
+    assert lines[0]['box'] == (0, 5, 50, 23)
+    assert layout_lines(lines) == 'if x:\n    print("hello")\n'
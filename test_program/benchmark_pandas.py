@@ -0,0 +1,64 @@
+import sys
+import os
+
+# Add the server directory to the Python path
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, 'server'))
+
+import argparse
+import ast
+import json
+import math
+
+from code_reformatter import refactor_code
+from rewrite_rules import RULES
+from benchmark_string_formatting import best_time
+
+TEST_PROGRAM_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(TEST_PROGRAM_DIR, 'pandas_numpy.json')
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmark the pandas and NumPy rules: each snippet as written vs after the "
+                    "pandas_*/numpy_* rewrites")
+    parser.add_argument('corpus', nargs='?', default=DEFAULT_CORPUS)
+    parser.add_argument('--number', type=int, default=3, help="Runs per timing")
+    parser.add_argument('--repeat', type=int, default=3, help="Timings per snippet; the fastest is kept")
+    parser.add_argument('--min-speedup', type=float, default=1.0,
+                        help="Exit with status 1 when the geometric mean speedup is below this")
+    args = parser.parse_args()
+
+    with open(args.corpus, 'r', encoding='utf-8') as f:
+        corpus = json.load(f)
+
+    # Only the pandas and NumPy rules, so the timings isolate them
+    rules = {name: name.startswith(('pandas_', 'numpy_')) for name in RULES}
+    speedups = []
+    for index, code in enumerate(corpus, 1):
+        refactored, changes = refactor_code(code, keep_comments=False, rules=rules)
+        if refactored is None or refactored == ast.unparse(ast.parse(code)):
+            continue
+        try:
+            before = best_time(code, args.number, args.repeat)
+            after = best_time(refactored, args.number, args.repeat)
+        except Exception as e:
+            print(f"{index:>3}: failed to run: {e}")
+            continue
+        speedups.append(before / after)
+        print(f"{index:>3}: {before * 1e3:8.2f} -> {after * 1e3:7.2f} ms  {before / after:6.1f}x  "
+              f"{code.splitlines()[0].lstrip('# ')}")
+
+    if not speedups:
+        print("Nothing was rewritten")
+        sys.exit(1)
+    mean = math.exp(sum(math.log(speedup) for speedup in speedups) / len(speedups))
+    print(f"\n{len(speedups)} snippets rewritten; geometric mean speedup {mean:.1f}x, "
+          f"range {min(speedups):.1f}x-{max(speedups):.1f}x")
+    if mean < args.min_speedup:
+        print(f"Below the required {args.min_speedup:.2f}x")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
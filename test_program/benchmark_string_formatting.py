@@ -0,0 +1,80 @@
+import sys
+import os
+
+# Add the server directory to the Python path
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, 'server'))
+
+import argparse
+import dis
+import json
+import math
+import timeit
+import types
+
+from code_reformatter import refactor_code
+from rewrite_rules import RULES
+
+TEST_PROGRAM_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CORPUS = os.path.join(TEST_PROGRAM_DIR, 'string_formatting.json')
+
+
+def best_time(code: str, number: int, repeat: int) -> float:
+    """Fastest per-run time of code, each run in a fresh namespace"""
+    compiled = compile(code, '<snippet>', 'exec')
+    return min(timeit.repeat(lambda: exec(compiled, {}), number=number, repeat=repeat)) / number
+
+
+def bytecode(code: types.CodeType) -> list:
+    """Instructions of code and of the functions it defines, without line numbers"""
+    return ([(instruction.opname, instruction.argval) for instruction in dis.get_instructions(code)
+             if not isinstance(instruction.argval, types.CodeType)] +
+            [bytecode(const) for const in code.co_consts if isinstance(const, types.CodeType)])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmark the f-string rewrite: each snippet as written vs after string_format_to_fstring")
+    parser.add_argument('corpus', nargs='?', default=DEFAULT_CORPUS)
+    parser.add_argument('--number', type=int, default=2000, help="Runs per timing")
+    parser.add_argument('--repeat', type=int, default=5, help="Timings per snippet; the fastest is kept")
+    parser.add_argument('--min-speedup', type=float, default=1.0,
+                        help="Exit with status 1 when the geometric mean speedup is below this")
+    args = parser.parse_args()
+
+    with open(args.corpus, 'r', encoding='utf-8') as f:
+        corpus = json.load(f)
+
+    speedups, identical = [], 0
+    for index, code in enumerate(corpus, 1):
+        # Only this rule and no cost gate, so the timings isolate it
+        refactored, changes = refactor_code(code, keep_comments=False, cost_gate=False,
+                                            rules={name: name == 'string_format_to_fstring' for name in RULES})
+        if refactored is None or not any('f-string' in change for change in changes):
+            print(f"{index:>3}: not rewritten {changes}")
+            continue
+        if bytecode(compile(code, '<snippet>', 'exec')) == bytecode(compile(refactored, '<snippet>', 'exec')):
+            # e.g. %-formatting on Python 3.11+, which the compiler already turns into an f-string
+            identical += 1
+            print(f"{index:>3}: same bytecode  {refactored.splitlines()[-1].strip()}")
+            continue
+        before = best_time(code, args.number, args.repeat)
+        after = best_time(refactored, args.number, args.repeat)
+        speedups.append(before / after)
+        print(f"{index:>3}: {before * 1e6:7.2f} -> {after * 1e6:7.2f} us  {before / after:.2f}x  "
+              f"{refactored.splitlines()[-1].strip()}")
+
+    if not speedups:
+        print("Nothing was rewritten to different bytecode")
+        sys.exit(1)
+    mean = math.exp(sum(math.log(speedup) for speedup in speedups) / len(speedups))
+    print(f"\n{len(speedups)} snippets rewritten; geometric mean speedup {mean:.2f}x, "
+          f"range {min(speedups):.2f}x-{max(speedups):.2f}x; "
+          f"{identical} more compile to the same bytecode as before")
+    if mean < args.min_speedup:
+        print(f"Below the required {args.min_speedup:.2f}x")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
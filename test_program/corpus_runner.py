@@ -0,0 +1,263 @@
+import sys
+import os
+
+# Add the server directory to the Python path. Its modules are imported by
+# their own names: with it on the path, `server` is server/server.py, not the package
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT_DIR, 'server'))
+
+import argparse
+import contextlib
+import csv
+import glob
+import hashlib
+import io
+import json
+import multiprocessing
+from typing import Any, Dict, List, Optional
+
+from code_reformatter import refactor_code
+from emissions_tracker import compare_emissions
+
+TEST_PROGRAM_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_RESULTS_DIR = os.path.join(TEST_PROGRAM_DIR, 'results')
+# Editing any of these invalidates every cached refactoring
+REFORMATTER_PATHS = [os.path.join(ROOT_DIR, 'server', name)
+                     for name in ('code_reformatter.py', 'rewrite_rules.py', 'dataflow.py', 'static_analyzer.py')]
+
+CSV_FIELDS = [
+    'corpus', 'index', 'key', 'status', 'winner', 'trials', 'speedup',
+    'time_delta_s', 'energy_delta_kwh', 'emissions_delta_kg', 'error'
+]
+
+
+def create_test_function(code_str):
+    """Creates a function from a code string that can be executed; it raises whatever the code raises"""
+    namespace = {}
+
+    # Prepare the code string by properly indenting it
+    indented_code = '\n'.join('    ' + line for line in code_str.split('\n'))
+
+    # Create the function definition with the indented code
+    wrapped_code = f'def test_function():\n{indented_code}\n'
+
+    exec(wrapped_code, namespace)
+    return namespace['test_function']
+
+
+def load_corpora(paths: List[str]) -> List[Dict[str, Any]]:
+    """Load every snippet of every corpus file as a work item."""
+    snippets = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            corpus = json.load(f)
+        name = os.path.splitext(os.path.basename(path))[0]
+        for index, code in enumerate(corpus, 1):
+            snippets.append({'corpus': name, 'index': index, 'code': code})
+    return snippets
+
+
+class RefactorCache:
+    """On-disk cache of refactor_code outputs keyed by snippet and reformatter source."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f)
+        digest = hashlib.sha256()
+        for path in REFORMATTER_PATHS:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        self.reformatter_hash = digest.hexdigest()
+        self.hits = 0
+        self.misses = 0
+
+    def refactor(self, code: str):
+        key = hashlib.sha256((self.reformatter_hash + '\0' + code).encode('utf-8')).hexdigest()
+        if key in self.entries:
+            self.hits += 1
+            entry = self.entries[key]
+        else:
+            self.misses += 1
+            # Default rules, comments dropped: the corpora measure the rewrites themselves
+            refactored, changes = refactor_code(code, keep_comments=False)
+            entry = {'refactored': refactored, 'changes': changes}
+            self.entries[key] = entry
+        return entry['refactored'], entry['changes']
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f)
+
+
+def snippet_key(code: str, refactored: Optional[str]) -> str:
+    """Identify a snippet result; changes whenever the snippet or its refactoring changes."""
+    return hashlib.sha256((code + '\0' + (refactored or '')).encode('utf-8')).hexdigest()
+
+
+def _init_worker(core_queue):
+    """Pin each worker process to its own core so measurements do not interfere."""
+    core = core_queue.get()
+    if core is not None and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {core})
+
+
+def _benchmark_snippet(item: Dict[str, Any]) -> Dict[str, Any]:
+    """Worker entry point: benchmark one original/refactored pair."""
+    result = {key: item[key] for key in ('corpus', 'index', 'key', 'changes')}
+    try:
+        original_func = create_test_function(item['code'])
+        refactored_func = create_test_function(item['refactored'])
+    except Exception as e:
+        result.update(status='function_failed', error=str(e))
+        return result
+
+    # A snippet that raises would be timed up to the error: a crashing refactoring is no win
+    for name, function in (('original', original_func), ('refactored', refactored_func)):
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                function()
+        except Exception as e:
+            result.update(status='runtime_failed', error=f'{name}: {type(e).__name__}: {e}')
+            return result
+
+    try:
+        verdict = compare_emissions(original_func, refactored_func, **item['options'])
+    except Exception as e:
+        result.update(status='error', error=str(e))
+        return result
+
+    result.update(
+        status='ok',
+        winner=verdict['winner'],
+        trials=verdict['trials'],
+        speedup=verdict['speedup'],
+        time_delta_s=verdict['difference']['wall_time_s']['mean'],
+        energy_delta_kwh=verdict['difference']['energy_kwh']['mean'],
+        emissions_delta_kg=verdict['difference']['emissions_kg']['mean'],
+    )
+    return result
+
+
+def load_previous_results(results_dir: str) -> Dict[tuple, Dict[str, Any]]:
+    path = os.path.join(results_dir, 'results.json')
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return {(r['corpus'], r['index']): r for r in json.load(f)['results']}
+
+
+def write_results(results: List[Dict[str, Any]], results_dir: str) -> Dict[str, Any]:
+    """Write results.json and results.csv and return the summary."""
+    results = sorted(results, key=lambda r: (r['corpus'], r['index']))
+    ok = [r for r in results if r['status'] == 'ok']
+    summary = {
+        'total': len(results),
+        'successful': len(ok),
+        'failed': len(results) - len(ok),
+        'optimized_wins': sum(1 for r in ok if r['winner'] == 'optimized'),
+        'original_wins': sum(1 for r in ok if r['winner'] == 'original'),
+        'inconclusive': sum(1 for r in ok if r['winner'] == 'inconclusive'),
+    }
+
+    os.makedirs(results_dir, exist_ok=True)
+    with open(os.path.join(results_dir, 'results.json'), 'w', encoding='utf-8') as f:
+        json.dump({'summary': summary, 'results': results}, f, indent=2)
+    with open(os.path.join(results_dir, 'results.csv'), 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
+    return summary
+
+
+def run_corpora(corpus_paths: List[str], results_dir: str = DEFAULT_RESULTS_DIR,
+                workers: Optional[int] = None, rerun: bool = False,
+                benchmark_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Refactor and benchmark every snippet of the given corpora in parallel.
+
+    With rerun=True, snippets whose previous result succeeded and whose code
+    and refactored output are unchanged are kept as-is instead of re-measured.
+    Earlier results of corpora not given here stay in the written results.
+
+    Workers are capped at one per available core. RAPL and codecarbon read
+    the energy of the whole package, which concurrent workers would share,
+    so with more than one worker energy comes from each process's CPU time.
+    """
+    cache = RefactorCache(os.path.join(results_dir, 'refactor_cache.json'))
+    earlier_results = load_previous_results(results_dir)
+    previous = earlier_results if rerun else {}
+    options = {'warmup': 1, 'min_trials': 5, 'max_trials': 20}
+    options.update(benchmark_options or {})
+
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else []
+    available = len(cores) or os.cpu_count() or 1
+    workers = max(1, min(workers or available, available))
+    if workers > 1:
+        if options.get('energy_meter', 'auto') not in ('auto', 'cpu_time_model'):
+            raise ValueError(f"energy_meter={options['energy_meter']!r} measures the whole machine; "
+                             f"use workers=1 or the 'cpu_time_model' meter")
+        options['energy_meter'] = 'cpu_time_model'
+
+    results = []
+    pending = []
+    for snippet in load_corpora(corpus_paths):
+        refactored, changes = cache.refactor(snippet['code'])
+        key = snippet_key(snippet['code'], refactored)
+        if refactored is None:
+            results.append({'corpus': snippet['corpus'], 'index': snippet['index'], 'key': key,
+                            'changes': changes, 'status': 'refactor_failed',
+                            'error': '; '.join(changes)})
+            continue
+
+        earlier = previous.get((snippet['corpus'], snippet['index']))
+        if earlier and earlier['status'] == 'ok' and earlier['key'] == key:
+            results.append(earlier)
+            continue
+
+        pending.append(dict(snippet, refactored=refactored, changes=changes, key=key,
+                            options=options))
+    cache.save()
+
+    if pending:
+        core_queue = multiprocessing.Queue()
+        for i in range(workers):
+            core_queue.put(cores[i % len(cores)] if cores else None)
+        # One task per worker at a time keeps each core busy with a single measurement
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(core_queue,)) as pool:
+            results.extend(pool.imap_unordered(_benchmark_snippet, pending, chunksize=1))
+
+    corpora = {os.path.splitext(os.path.basename(path))[0] for path in corpus_paths}
+    results.extend(result for (corpus, _), result in earlier_results.items() if corpus not in corpora)
+    summary = write_results(results, results_dir)
+    summary.update(benchmarked=len(pending), cache_hits=cache.hits, cache_misses=cache.misses)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the reformatter over snippet corpora")
+    parser.add_argument('corpora', nargs='*',
+                        help="Corpus JSON files (default: every *.json in test_program)")
+    parser.add_argument('--results-dir', default=DEFAULT_RESULTS_DIR)
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Worker processes, at most one per available core (default: one per core); "
+                             "with more than one, energy is estimated from CPU time")
+    parser.add_argument('--rerun', action='store_true',
+                        help="Only re-run snippets that failed or changed since the last run")
+    parser.add_argument('--max-trials', type=int, default=20)
+    args = parser.parse_args()
+
+    corpora = args.corpora or sorted(glob.glob(os.path.join(TEST_PROGRAM_DIR, '*.json')))
+    summary = run_corpora(corpora, args.results_dir, args.workers, args.rerun,
+                          {'max_trials': args.max_trials})
+
+    print("\nResults Summary:")
+    for name, value in summary.items():
+        print(f"{name}: {value}")
+    print(f"Results written to {args.results_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,16 @@
-from codecarbon import EmissionsTracker
-import time
 import os
 import sys
 
-def compare_emissions(inefficient_func, optimized_func):
-    # Inefficient code
-    tracker_inefficient = EmissionsTracker(log_level="error", save_to_file=False)
-    tracker_inefficient.start()
+# Add the parent directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-    start_time_inefficient = time.time()
-    with open(os.devnull, 'w') as devnull:
-        sys.stdout = devnull  
-        inefficient_func()
-        sys.stdout = sys.__stdout__ 
-    end_time_inefficient = time.time()
+from server.emissions_tracker import compare_emissions as benchmark_emissions
 
-    emissions_inefficient = tracker_inefficient.stop()
+def compare_emissions(inefficient_func, optimized_func, **options):
+    """Return the mean emissions difference (original - optimized) in kg CO2e.
 
-    # Optimized code
-    tracker_optimized = EmissionsTracker(log_level="error", save_to_file=False)
-    tracker_optimized.start()
-
-    start_time_optimized = time.time()
-    with open(os.devnull, 'w') as devnull:
-        sys.stdout = devnull 
-        optimized_func()
-        sys.stdout = sys.__stdout__ 
-    end_time_optimized = time.time()
-
-    emissions_optimized = tracker_optimized.stop()
-
-    # Return the difference
-    return emissions_inefficient - emissions_optimized
\ No newline at end of file
+    Thin wrapper over the server benchmarking engine; pass any of its options
+    (trials, cpu pinning, energy meter, ...) through **options.
+    """
+    verdict = benchmark_emissions(inefficient_func, optimized_func, **options)
+    return verdict['difference']['emissions_kg']['mean']
@@ -0,0 +1,81 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from corpus_runner import run_corpora
+
+def test_run_corpora_and_rerun(tmp_path):
+    corpus_path = tmp_path / 'tiny.json'
+    corpus_path.write_text(json.dumps([
+        "result = []\nfor i in range(50):\n    result.append(i)",
+        "total = sum(range(50))",
+        "def broken(:\n    pass",
+    ]))
+    results_dir = str(tmp_path / 'results')
+    options = {'warmup': 0, 'min_trials': 2, 'max_trials': 2, 'energy_meter': 'cpu_time_model'}
+
+    summary = run_corpora([str(corpus_path)], results_dir, workers=1, benchmark_options=options)
+    assert summary['total'] == 3
+    assert summary['successful'] == 2
+    assert summary['benchmarked'] == 2
+    assert os.path.exists(os.path.join(results_dir, 'results.csv'))
+
+    with open(os.path.join(results_dir, 'results.json')) as f:
+        results = json.load(f)['results']
+    assert [r['status'] for r in results] == ['ok', 'ok', 'refactor_failed']
+    assert 'speedup' in results[0]
+
+    # Nothing changed and nothing failed except the unparseable snippet
+    summary = run_corpora([str(corpus_path)], results_dir, workers=1, rerun=True,
+                          benchmark_options=options)
+    assert summary['benchmarked'] == 0
+    assert summary['cache_hits'] == 3
+
+def test_crashes_fail_and_other_corpora_are_kept(tmp_path, monkeypatch):
+    import corpus_runner
+    results_dir = str(tmp_path / 'results')
+    options = {'warmup': 0, 'min_trials': 2, 'max_trials': 2, 'energy_meter': 'cpu_time_model'}
+    first, second = tmp_path / 'first.json', tmp_path / 'second.json'
+    first.write_text(json.dumps(["total = sum(range(50))", "total = 1 // 0"]))
+    second.write_text(json.dumps(["total = sum(range(60))"]))
+
+    # A refactoring that raises is a failure, not a faster run
+    original = corpus_runner.refactor_code
+    monkeypatch.setattr(corpus_runner, 'refactor_code',
+                        lambda code, **kwargs: (code + "\nraise RuntimeError('bad rewrite')", ['changed']))
+    summary = run_corpora([str(first)], results_dir, workers=1, benchmark_options=options)
+    assert summary['successful'] == 0
+    with open(os.path.join(results_dir, 'results.json')) as f:
+        results = json.load(f)['results']
+    assert [r['status'] for r in results] == ['runtime_failed', 'runtime_failed']
+    assert results[0]['error'] == 'refactored: RuntimeError: bad rewrite'
+    assert results[1]['error'].startswith('original: ZeroDivisionError')
+    monkeypatch.setattr(corpus_runner, 'refactor_code', original)
+
+    # Running one corpus again leaves the other corpus's results in place
+    results_dir = str(tmp_path / 'merged')
+    run_corpora([str(first), str(second)], results_dir, workers=1, benchmark_options=options)
+    summary = run_corpora([str(first)], results_dir, workers=1, rerun=True, benchmark_options=options)
+    assert summary['total'] == 3 and summary['benchmarked'] == 1
+    with open(os.path.join(results_dir, 'results.json')) as f:
+        results = json.load(f)['results']
+    assert [(r['corpus'], r['index'], r['status']) for r in results] == [
+        ('first', 1, 'ok'), ('first', 2, 'runtime_failed'), ('second', 1, 'ok')]
+    with open(os.path.join(results_dir, 'results.csv')) as f:
+        assert len(f.read().splitlines()) == 4
+
+def test_parallel_runs_use_a_per_process_energy_meter(tmp_path, monkeypatch):
+    corpus_path = tmp_path / 'tiny.json'
+    corpus_path.write_text(json.dumps(["total = sum(range(50))", "total = sum(range(60))"]))
+    options = {'warmup': 0, 'min_trials': 2, 'max_trials': 2}
+
+    summary = run_corpora([str(corpus_path)], str(tmp_path / 'results'), workers=2, benchmark_options=options)
+    assert summary['successful'] == 2
+
+    monkeypatch.setattr(os, 'sched_getaffinity', lambda pid: {0, 1}, raising=False)
+    with pytest.raises(ValueError):
+        run_corpora([str(corpus_path)], str(tmp_path / 'results'), workers=2,
+                    benchmark_options=dict(options, energy_meter='rapl'))